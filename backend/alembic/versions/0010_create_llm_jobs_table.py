@@ -0,0 +1,61 @@
+"""
+Create llm_jobs table for background LLM execution
+
+Revision ID: 0010_create_llm_jobs
+Revises: 0009_expand_mst_ai_jobs
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_create_llm_jobs"
+down_revision: Union[str, None] = "0009_expand_mst_ai_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_jobs",
+        sa.Column("id", mysql.BIGINT(unsigned=True), autoincrement=True, nullable=False),
+        sa.Column("job_code", sa.String(length=64), nullable=False),
+        sa.Column(
+            "session_id",
+            mysql.BIGINT(unsigned=True),
+            sa.ForeignKey("sessions.id", ondelete="RESTRICT", name="fk_llm_jobs_session"),
+            nullable=False,
+        ),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("request_json", mysql.JSON(), nullable=True),
+        sa.Column("attempts", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("error_code", sa.String(length=16), nullable=True),
+        sa.Column("error_detail", sa.Text(), nullable=True),
+        sa.Column("started_at", mysql.DATETIME(fsp=3), nullable=True),
+        sa.Column("finished_at", mysql.DATETIME(fsp=3), nullable=True),
+        sa.Column("created_at", mysql.DATETIME(fsp=3), server_default=sa.text("CURRENT_TIMESTAMP(3)"), nullable=False),
+        sa.Column(
+            "updated_at",
+            mysql.DATETIME(fsp=3),
+            server_default=sa.text("CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", name="pk_llm_jobs"),
+        sa.UniqueConstraint("job_code", name="uq_llm_jobs_job_code"),
+        mysql_engine="InnoDB",
+        mysql_charset="utf8mb4",
+        mysql_collate="utf8mb4_0900_ai_ci",
+    )
+    op.create_index("idx_llm_jobs_status_created", "llm_jobs", ["status", "created_at"], unique=False)
+    op.create_index("idx_llm_jobs_session", "llm_jobs", ["session_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_llm_jobs_session", table_name="llm_jobs")
+    op.drop_index("idx_llm_jobs_status_created", table_name="llm_jobs")
+    op.drop_constraint("uq_llm_jobs_job_code", "llm_jobs", type_="unique")
+    op.drop_table("llm_jobs")
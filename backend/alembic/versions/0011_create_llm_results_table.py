@@ -0,0 +1,195 @@
+"""
+Create content-addressed llm_results table and link sessions to it
+
+Revision ID: 0011_create_llm_results
+Revises: 0010_create_llm_jobs
+Create Date: 2026-10-17
+"""
+import hashlib
+from typing import Any, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011_create_llm_results"
+down_revision: Union[str, None] = "0010_create_llm_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+sessions_table = sa.table(
+    "sessions",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_options_hash", sa.String(128)),
+    sa.column("llm_result", sa.JSON()),
+    sa.column("llm_result_id", sa.String(64)),
+)
+
+llm_results_table = sa.table(
+    "llm_results",
+    sa.column("id", sa.String(64)),
+    sa.column("version_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_options_hash", sa.String(128)),
+    sa.column("provider", sa.String(16)),
+    sa.column("model", sa.String(255)),
+    sa.column("temperature", sa.Float()),
+    sa.column("top_p", sa.Float()),
+    sa.column("document", sa.JSON()),
+)
+
+
+def _format_sampling_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    return format(float(value), ".6g")
+
+
+def _result_key(
+    version_id: int,
+    options_hash: str,
+    provider: str,
+    model: str,
+    temperature: Any,
+    top_p: Any,
+) -> str:
+    # Frozen copy of app.core.registry.compute_llm_result_key at this revision.
+    raw = "|".join(
+        (
+            f"v{version_id}",
+            options_hash,
+            provider.strip().lower(),
+            model.strip(),
+            f"t={_format_sampling_value(temperature)}",
+            f"p={_format_sampling_value(top_p)}",
+        )
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _as_float(value: Any) -> float | None:
+    try:
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backfill_llm_results() -> None:
+    """Move inline `sessions.llm_result` documents into `llm_results` in batches."""
+
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                sessions_table.c.id,
+                sessions_table.c.version_id,
+                sessions_table.c.version_options_hash,
+                sessions_table.c.llm_result,
+            )
+            .where(
+                sessions_table.c.id > last_id,
+                sessions_table.c.llm_result.is_not(None),
+                sessions_table.c.llm_result_id.is_(None),
+            )
+            .order_by(sessions_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+
+        for session_id, version_id, options_hash, document in rows:
+            if not isinstance(document, dict):
+                continue
+            provider = str(document.get("provider") or "bedrock").strip().lower() or "bedrock"
+            model = str(document.get("model") or "")
+            temperature = _as_float(document.get("temperature"))
+            top_p = _as_float(document.get("top_p"))
+            stored_hash = str(document.get("hash") or options_hash)
+            key = _result_key(version_id, stored_hash, provider, model, temperature, top_p)
+
+            insert_stmt = mysql.insert(llm_results_table).values(
+                id=key,
+                version_id=version_id,
+                version_options_hash=stored_hash,
+                provider=provider,
+                model=model[:255],
+                temperature=temperature,
+                top_p=top_p,
+                document=document,
+            )
+            # Keep the first document written for a key; later copies are identical in intent.
+            bind.execute(insert_stmt.prefix_with("IGNORE"))
+            bind.execute(
+                sa.update(sessions_table)
+                .where(sessions_table.c.id == session_id)
+                .values(llm_result_id=key, llm_result=None)
+            )
+
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_results",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column(
+            "version_id",
+            mysql.BIGINT(unsigned=True),
+            sa.ForeignKey("diagnostic_versions.id", ondelete="RESTRICT", name="fk_llm_results_version"),
+            nullable=False,
+        ),
+        sa.Column("version_options_hash", sa.String(length=128), nullable=False),
+        sa.Column("provider", sa.String(length=16), nullable=False),
+        sa.Column("model", sa.String(length=255), nullable=False),
+        sa.Column("temperature", sa.Float(), nullable=True),
+        sa.Column("top_p", sa.Float(), nullable=True),
+        sa.Column("document", mysql.JSON(), nullable=False),
+        sa.Column("created_at", mysql.DATETIME(fsp=3), server_default=sa.text("CURRENT_TIMESTAMP(3)"), nullable=False),
+        sa.Column(
+            "updated_at",
+            mysql.DATETIME(fsp=3),
+            server_default=sa.text("CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", name="pk_llm_results"),
+        mysql_engine="InnoDB",
+        mysql_charset="utf8mb4",
+        mysql_collate="utf8mb4_0900_ai_ci",
+    )
+    op.create_index(
+        "idx_llm_results_version_hash",
+        "llm_results",
+        ["version_id", "version_options_hash"],
+        unique=False,
+    )
+
+    op.add_column("sessions", sa.Column("llm_result_id", sa.String(length=64), nullable=True))
+    op.create_foreign_key(
+        "fk_sessions_llm_result",
+        "sessions",
+        "llm_results",
+        ["llm_result_id"],
+        ["id"],
+        ondelete="RESTRICT",
+    )
+
+    _backfill_llm_results()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    bind.execute(
+        sa.text(
+            "UPDATE sessions s JOIN llm_results r ON r.id = s.llm_result_id "
+            "SET s.llm_result = r.document WHERE s.llm_result IS NULL"
+        )
+    )
+    op.drop_constraint("fk_sessions_llm_result", "sessions", type_="foreignkey")
+    op.drop_column("sessions", "llm_result_id")
+    op.drop_index("idx_llm_results_version_hash", table_name="llm_results")
+    op.drop_table("llm_results")
@@ -0,0 +1,186 @@
+"""
+Rewrite llm_results documents in the compact storage format
+
+Revision ID: 0012_compact_llm_results
+Revises: 0011_create_llm_results
+Create Date: 2026-10-17
+"""
+import base64
+import json
+import zlib
+from typing import Any, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012_compact_llm_results"
+down_revision: Union[str, None] = "0011_create_llm_results"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+COMPRESS_THRESHOLD_BYTES = 16384
+FORMAT_VERSION = 2
+
+llm_results_table = sa.table(
+    "llm_results",
+    sa.column("id", sa.String(64)),
+    sa.column("version_id", mysql.BIGINT(unsigned=True)),
+    sa.column("document", sa.JSON()),
+)
+
+versions_table = sa.table(
+    "diagnostic_versions",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("system_prompt", sa.Text()),
+    sa.column("src_hash", sa.String(128)),
+)
+
+version_options_table = sa.table(
+    "version_options",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("llm_op", sa.JSON()),
+)
+
+
+# Frozen copy of app.services.diagnostics.llm_result_format at this revision.
+def _compact_raw(provider: str, raw: Any) -> Any:
+    if not isinstance(raw, dict):
+        return raw
+    if provider == "gemini":
+        compact = {key: raw[key] for key in ("text", "usage_metadata", "model_version") if raw.get(key) is not None}
+        candidates = raw.get("candidates")
+        if isinstance(candidates, list):
+            keep_parts = not isinstance(compact.get("text"), str)
+            compact_candidates = []
+            for candidate in candidates:
+                if not isinstance(candidate, dict):
+                    continue
+                entry: dict[str, Any] = {}
+                if candidate.get("finish_reason") is not None:
+                    entry["finish_reason"] = candidate["finish_reason"]
+                if keep_parts:
+                    content = candidate.get("content") or {}
+                    parts = content.get("parts") if isinstance(content, dict) else None
+                    entry["content"] = {
+                        "role": content.get("role") if isinstance(content, dict) else None,
+                        "parts": [
+                            {"text": part.get("text")}
+                            for part in parts or []
+                            if isinstance(part, dict) and part.get("text") is not None
+                        ],
+                    }
+                compact_candidates.append(entry)
+            compact["candidates"] = compact_candidates
+        return compact
+
+    compact = {
+        key: raw[key]
+        for key in ("id", "type", "role", "model", "stop_reason", "stop_sequence", "usage")
+        if raw.get(key) is not None
+    }
+    content = raw.get("content")
+    if isinstance(content, list):
+        compact["content"] = [
+            {"type": "text", "text": block.get("text") or ""}
+            for block in content
+            if isinstance(block, dict) and block.get("type", "text") == "text"
+        ]
+    elif content is not None:
+        compact["content"] = content
+    return compact
+
+
+def _document_raw(document: dict[str, Any]) -> Any:
+    packed = document.get("raw_z")
+    if isinstance(packed, str):
+        return json.loads(zlib.decompress(base64.b64decode(packed)).decode("utf-8"))
+    return document.get("raw")
+
+
+def _encode_raw(raw: Any) -> dict[str, Any]:
+    if raw is not None:
+        encoded = json.dumps(raw, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(encoded) > COMPRESS_THRESHOLD_BYTES:
+            return {"raw_z": base64.b64encode(zlib.compress(encoded, 6)).decode("ascii")}
+    return {"raw": raw}
+
+
+def _iter_batches(bind: sa.engine.Connection):
+    last_id = ""
+    while True:
+        rows = bind.execute(
+            sa.select(
+                llm_results_table.c.id,
+                llm_results_table.c.version_id,
+                llm_results_table.c.document,
+                versions_table.c.src_hash,
+                versions_table.c.system_prompt,
+            )
+            .join(versions_table, versions_table.c.id == llm_results_table.c.version_id)
+            .where(llm_results_table.c.id > last_id)
+            .order_by(llm_results_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for rows in _iter_batches(bind):
+        for result_id, version_id, document, src_hash, _ in rows:
+            if not isinstance(document, dict) or document.get("format") == FORMAT_VERSION:
+                continue
+            provider = str(document.get("provider") or "bedrock").strip().lower() or "bedrock"
+            compacted = {key: value for key, value in document.items() if key not in {"messages", "raw", "raw_z"}}
+            compacted["format"] = FORMAT_VERSION
+            compacted.setdefault("prompt", {"version_id": version_id, "src_hash": src_hash})
+            compacted.update(_encode_raw(_compact_raw(provider, _document_raw(document))))
+            bind.execute(
+                sa.update(llm_results_table)
+                .where(llm_results_table.c.id == result_id)
+                .values(document=compacted)
+            )
+
+
+def downgrade() -> None:
+    """Inline `raw` and rebuild `messages`; fields dropped from `raw` are not restored."""
+
+    bind = op.get_bind()
+    for rows in _iter_batches(bind):
+        for result_id, _, document, _, system_prompt in rows:
+            if not isinstance(document, dict) or document.get("format") != FORMAT_VERSION:
+                continue
+            option_ids = [int(option_id) for option_id in document.get("option_ids") or []]
+            llm_ops_by_id: dict[int, Any] = {}
+            if option_ids:
+                llm_ops_by_id = dict(
+                    bind.execute(
+                        sa.select(version_options_table.c.id, version_options_table.c.llm_op).where(
+                            version_options_table.c.id.in_(option_ids)
+                        )
+                    ).all()
+                )
+            llm_ops = [llm_ops_by_id.get(option_id) for option_id in option_ids]
+
+            expanded = {
+                key: value
+                for key, value in document.items()
+                if key not in {"format", "prompt", "raw", "raw_z"}
+            }
+            expanded["messages"] = [
+                {"role": "system", "content": (system_prompt or "").strip()},
+                {"role": "user", "content": json.dumps(llm_ops, ensure_ascii=False, separators=(",", ":"))},
+            ]
+            expanded["raw"] = _document_raw(document)
+            bind.execute(
+                sa.update(llm_results_table)
+                .where(llm_results_table.c.id == result_id)
+                .values(document=expanded)
+            )
@@ -0,0 +1,67 @@
+"""
+Create llm_batch_jobs table for bulk regeneration through batch inference
+
+Revision ID: 0013_create_llm_batch_jobs
+Revises: 0012_compact_llm_results
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013_create_llm_batch_jobs"
+down_revision: Union[str, None] = "0012_compact_llm_results"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_batch_jobs",
+        sa.Column("id", mysql.BIGINT(unsigned=True), autoincrement=True, nullable=False),
+        sa.Column("job_code", sa.String(length=64), nullable=False),
+        sa.Column(
+            "version_id",
+            mysql.BIGINT(unsigned=True),
+            sa.ForeignKey("diagnostic_versions.id", ondelete="RESTRICT", name="fk_llm_batch_jobs_version"),
+            nullable=False,
+        ),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("provider_status", sa.String(length=32), nullable=True),
+        sa.Column("provider_job_id", sa.String(length=255), nullable=True),
+        sa.Column("model", sa.String(length=255), nullable=False),
+        sa.Column("records", mysql.JSON(), nullable=False),
+        sa.Column("record_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("loaded_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("failed_count", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("error_detail", sa.Text(), nullable=True),
+        sa.Column("submitted_at", mysql.DATETIME(fsp=3), nullable=True),
+        sa.Column("finished_at", mysql.DATETIME(fsp=3), nullable=True),
+        sa.Column("created_at", mysql.DATETIME(fsp=3), server_default=sa.text("CURRENT_TIMESTAMP(3)"), nullable=False),
+        sa.Column(
+            "updated_at",
+            mysql.DATETIME(fsp=3),
+            server_default=sa.text("CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", name="pk_llm_batch_jobs"),
+        sa.UniqueConstraint("job_code", name="uq_llm_batch_jobs_job_code"),
+        mysql_engine="InnoDB",
+        mysql_charset="utf8mb4",
+        mysql_collate="utf8mb4_0900_ai_ci",
+    )
+    op.create_index(
+        "idx_llm_batch_jobs_status_created", "llm_batch_jobs", ["status", "created_at"], unique=False
+    )
+    op.create_index("idx_llm_batch_jobs_version", "llm_batch_jobs", ["version_id", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_llm_batch_jobs_version", table_name="llm_batch_jobs")
+    op.drop_index("idx_llm_batch_jobs_status_created", table_name="llm_batch_jobs")
+    op.drop_constraint("uq_llm_batch_jobs_job_code", "llm_batch_jobs", type_="unique")
+    op.drop_table("llm_batch_jobs")
@@ -0,0 +1,100 @@
+"""
+Add packed answer vector to sessions and backfill it from answer_choices
+
+Revision ID: 0014_add_session_answer_ids
+Revises: 0013_create_llm_batch_jobs
+Create Date: 2026-10-17
+"""
+import struct
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0014_add_session_answer_ids"
+down_revision: Union[str, None] = "0013_create_llm_batch_jobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+sessions_table = sa.table(
+    "sessions",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("answer_ids", mysql.BLOB()),
+)
+
+answer_choices_table = sa.table(
+    "answer_choices",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("session_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_option_id", mysql.BIGINT(unsigned=True)),
+)
+
+
+# Frozen copy of app.services.diagnostics.answer_vector.pack_answer_ids at this revision.
+def _pack_answer_ids(option_ids: list[int]) -> bytes:
+    return struct.pack(f"<{len(option_ids)}Q", *option_ids)
+
+
+def upgrade() -> None:
+    op.add_column("sessions", sa.Column("answer_ids", mysql.BLOB(), nullable=True))
+
+    bind = op.get_bind()
+    last_session_id = 0
+    while True:
+        session_ids = list(
+            bind.execute(
+                sa.select(answer_choices_table.c.session_id)
+                .where(answer_choices_table.c.session_id > last_session_id)
+                .group_by(answer_choices_table.c.session_id)
+                .order_by(answer_choices_table.c.session_id)
+                .limit(BATCH_SIZE)
+            ).scalars()
+        )
+        if not session_ids:
+            break
+        last_session_id = session_ids[-1]
+
+        answers: dict[int, list[int]] = {session_id: [] for session_id in session_ids}
+        rows = bind.execute(
+            sa.select(answer_choices_table.c.session_id, answer_choices_table.c.version_option_id)
+            .where(answer_choices_table.c.session_id.in_(session_ids))
+            .order_by(answer_choices_table.c.session_id, answer_choices_table.c.id)
+        )
+        for session_id, option_id in rows:
+            answers[session_id].append(int(option_id))
+        for session_id, option_ids in answers.items():
+            bind.execute(
+                sa.update(sessions_table)
+                .where(sessions_table.c.id == session_id)
+                .values(answer_ids=_pack_answer_ids(option_ids))
+            )
+
+    # The remaining sessions have no answers yet: give them an empty vector,
+    # in batches so that no single statement locks the whole table.
+    last_session_id = 0
+    while True:
+        session_ids = list(
+            bind.execute(
+                sa.select(sessions_table.c.id)
+                .where(sessions_table.c.id > last_session_id, sessions_table.c.answer_ids.is_(None))
+                .order_by(sessions_table.c.id)
+                .limit(BATCH_SIZE)
+            ).scalars()
+        )
+        if not session_ids:
+            break
+        last_session_id = session_ids[-1]
+        bind.execute(
+            sa.update(sessions_table)
+            .where(sessions_table.c.id.in_(session_ids), sessions_table.c.answer_ids.is_(None))
+            .values(answer_ids=b"")
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("sessions", "answer_ids")
@@ -0,0 +1,204 @@
+"""
+Recompute version_options_hash as an additive multiset hash and rekey llm_results
+
+Revision ID: 0015_multiset_options_hash
+Revises: 0014_add_session_answer_ids
+Create Date: 2026-10-17
+"""
+import hashlib
+import struct
+from typing import Any, Callable, Iterable, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0015_multiset_options_hash"
+down_revision: Union[str, None] = "0014_add_session_answer_ids"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 500
+
+sessions_table = sa.table(
+    "sessions",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_options_hash", sa.String(128)),
+    sa.column("answer_ids", mysql.BLOB()),
+    sa.column("llm_result", sa.JSON()),
+    sa.column("llm_result_id", sa.String(64)),
+)
+
+answer_choices_table = sa.table(
+    "answer_choices",
+    sa.column("id", mysql.BIGINT(unsigned=True)),
+    sa.column("session_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_option_id", mysql.BIGINT(unsigned=True)),
+)
+
+llm_results_table = sa.table(
+    "llm_results",
+    sa.column("id", sa.String(64)),
+    sa.column("version_id", mysql.BIGINT(unsigned=True)),
+    sa.column("version_options_hash", sa.String(128)),
+    sa.column("provider", sa.String(16)),
+    sa.column("model", sa.String(255)),
+    sa.column("temperature", sa.Float()),
+    sa.column("top_p", sa.Float()),
+    sa.column("document", sa.JSON()),
+    sa.column("created_at", mysql.DATETIME(fsp=3)),
+    sa.column("updated_at", mysql.DATETIME(fsp=3)),
+)
+
+OptionsHash = Callable[[int, Iterable[int]], str]
+
+
+# Frozen copies of app.core.registry (sorted SHA-256 before, multiset after this revision).
+def _sorted_sha256_hash(version_id: int, option_ids: Iterable[int]) -> str:
+    payload = ",".join(sorted(str(option_id) for option_id in option_ids))
+    return hashlib.sha256(f"v{version_id}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _digest_int(raw: str) -> int:
+    return int.from_bytes(hashlib.sha256(raw.encode("utf-8")).digest(), "big")
+
+
+def _multiset_hash(version_id: int, option_ids: Iterable[int]) -> str:
+    total = _digest_int(f"v{version_id}")
+    for option_id in option_ids:
+        total += _digest_int(f"v{version_id}:{option_id}")
+    return format(total % (1 << 256), "064x")
+
+
+def _format_sampling_value(value: float | None) -> str:
+    if value is None:
+        return "-"
+    return format(float(value), ".6g")
+
+
+def _llm_result_key(
+    version_id: int, options_hash: str, provider: str, model: str, temperature: float | None, top_p: float | None
+) -> str:
+    raw = "|".join(
+        (
+            f"v{version_id}",
+            options_hash,
+            provider.strip().lower(),
+            model.strip(),
+            f"t={_format_sampling_value(temperature)}",
+            f"p={_format_sampling_value(top_p)}",
+        )
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _unpack_answer_ids(data: bytes) -> list[int]:
+    return list(struct.unpack(f"<{len(data) // 8}Q", data))
+
+
+def _document_option_ids(document: Any) -> list[int] | None:
+    if not isinstance(document, dict) or not isinstance(document.get("option_ids"), list):
+        return None
+    return [int(option_id) for option_id in document["option_ids"]]
+
+
+def _rehash_sessions(bind: sa.engine.Connection, options_hash: OptionsHash) -> None:
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                sessions_table.c.id,
+                sessions_table.c.version_id,
+                sessions_table.c.answer_ids,
+                sessions_table.c.llm_result,
+            )
+            .where(sessions_table.c.id > last_id)
+            .order_by(sessions_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        unknown = [row.id for row in rows if row.answer_ids is None]
+        answers: dict[int, list[int]] = {session_id: [] for session_id in unknown}
+        if unknown:
+            for session_id, option_id in bind.execute(
+                sa.select(answer_choices_table.c.session_id, answer_choices_table.c.version_option_id).where(
+                    answer_choices_table.c.session_id.in_(unknown)
+                )
+            ):
+                answers[session_id].append(int(option_id))
+
+        for row in rows:
+            option_ids = answers[row.id] if row.answer_ids is None else _unpack_answer_ids(row.answer_ids)
+            values: dict[str, Any] = {"version_options_hash": options_hash(row.version_id, option_ids)}
+            # Legacy inline documents are matched on their own hash.
+            document_option_ids = _document_option_ids(row.llm_result)
+            if document_option_ids is not None and "hash" in row.llm_result:
+                values["llm_result"] = {**row.llm_result, "hash": options_hash(row.version_id, document_option_ids)}
+            bind.execute(sa.update(sessions_table).where(sessions_table.c.id == row.id).values(**values))
+
+
+def _rekey_llm_results(bind: sa.engine.Connection, options_hash: OptionsHash) -> None:
+    """Move each result to the key derived from the new hash; rows without `option_ids` stay as they are."""
+
+    last_id = ""
+    while True:
+        rows = bind.execute(
+            sa.select(llm_results_table)
+            .where(llm_results_table.c.id > last_id)
+            .order_by(llm_results_table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        for row in rows:
+            option_ids = _document_option_ids(row.document)
+            if option_ids is None:
+                continue
+            new_hash = options_hash(row.version_id, option_ids)
+            if new_hash == row.version_options_hash:
+                continue  # already moved (or revisited after being inserted under a later key)
+            new_id = _llm_result_key(row.version_id, new_hash, row.provider, row.model, row.temperature, row.top_p)
+            exists = bind.execute(
+                sa.select(llm_results_table.c.id).where(llm_results_table.c.id == new_id)
+            ).first()
+            if exists is None:
+                bind.execute(
+                    sa.insert(llm_results_table).values(
+                        id=new_id,
+                        version_id=row.version_id,
+                        version_options_hash=new_hash,
+                        provider=row.provider,
+                        model=row.model,
+                        temperature=row.temperature,
+                        top_p=row.top_p,
+                        document={**row.document, "hash": new_hash},
+                        created_at=row.created_at,
+                        updated_at=row.updated_at,
+                    )
+                )
+            bind.execute(
+                sa.update(sessions_table)
+                .where(sessions_table.c.llm_result_id == row.id)
+                .values(llm_result_id=new_id)
+            )
+            bind.execute(sa.delete(llm_results_table).where(llm_results_table.c.id == row.id))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    _rehash_sessions(bind, _multiset_hash)
+    _rekey_llm_results(bind, _multiset_hash)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    _rehash_sessions(bind, _sorted_sha256_hash)
+    _rekey_llm_results(bind, _sorted_sha256_hash)
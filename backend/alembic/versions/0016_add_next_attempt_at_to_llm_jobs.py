@@ -0,0 +1,30 @@
+"""
+Add next_attempt_at to llm_jobs for retry backoff
+
+Revision ID: 0016_llm_jobs_next_attempt_at
+Revises: 0015_multiset_options_hash
+Create Date: 2026-10-17
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0016_llm_jobs_next_attempt_at"
+down_revision: Union[str, None] = "0015_multiset_options_hash"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "llm_jobs",
+        sa.Column("next_attempt_at", mysql.DATETIME(fsp=3), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("llm_jobs", "next_attempt_at")
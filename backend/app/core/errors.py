@@ -41,7 +41,13 @@ class ErrorCode(str, Enum):
     DIAGNOSTICS_SYSTEM_PROMPT_MISSING = "E043"
     DIAGNOSTICS_LLM_OP_INCOMPLETE = "E044"
     DIAGNOSTICS_NO_ANSWERS = "E045"
+    DIAGNOSTICS_LLM_JOB_NOT_FOUND = "E046"
+    DIAGNOSTICS_LLM_BATCH_JOB_NOT_FOUND = "E047"
+    DIAGNOSTICS_LLM_BATCH_UNAVAILABLE = "E048"
     DIAGNOSTICS_LLM_CALL_FAILED = "E050"
+    DIAGNOSTICS_LLM_UNAVAILABLE = "E051"
+    DIAGNOSTICS_LLM_QUEUE_FULL = "E052"
+    DIAGNOSTICS_LLM_SERVER_BUSY = "E053"
     DIAGNOSTICS_INVALID_SESSION_CODE = "E062"
     DIAGNOSTICS_SESSION_OWNED_BY_OTHER = "E063"
     AUTH_EMAIL_ALREADY_REGISTERED = "E10100"
@@ -117,7 +123,13 @@ ERROR_DEFINITIONS: Final[dict[ErrorCode, ErrorDefinition]] = {
     ErrorCode.DIAGNOSTICS_SYSTEM_PROMPT_MISSING: ErrorDefinition(code="E043", domain="diagnostics", name="SYSTEM_PROMPT_MISSING", http_status=400, message="system_prompt が設定されていません"),
     ErrorCode.DIAGNOSTICS_LLM_OP_INCOMPLETE: ErrorDefinition(code="E044", domain="diagnostics", name="LLM_OP_INCOMPLETE", http_status=400, message="選択肢の llm_op が不足しています"),
     ErrorCode.DIAGNOSTICS_NO_ANSWERS: ErrorDefinition(code="E045", domain="diagnostics", name="NO_ANSWERS", http_status=400, message="回答が0件のため結果を生成できません"),
+    ErrorCode.DIAGNOSTICS_LLM_JOB_NOT_FOUND: ErrorDefinition(code="E046", domain="diagnostics", name="LLM_JOB_NOT_FOUND", http_status=404, message="指定した LLM ジョブが存在しません"),
+    ErrorCode.DIAGNOSTICS_LLM_BATCH_JOB_NOT_FOUND: ErrorDefinition(code="E047", domain="diagnostics", name="LLM_BATCH_JOB_NOT_FOUND", http_status=404, message="指定した LLM バッチジョブが存在しません"),
+    ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE: ErrorDefinition(code="E048", domain="diagnostics", name="LLM_BATCH_UNAVAILABLE", http_status=400, message="LLM バッチ推論を実行できません"),
     ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED: ErrorDefinition(code="E050", domain="diagnostics", name="LLM_CALL_FAILED", http_status=502, message="LLM 呼び出しに失敗しました"),
+    ErrorCode.DIAGNOSTICS_LLM_UNAVAILABLE: ErrorDefinition(code="E051", domain="diagnostics", name="LLM_UNAVAILABLE", http_status=503, message="LLM プロバイダが一時的に利用できません"),
+    ErrorCode.DIAGNOSTICS_LLM_QUEUE_FULL: ErrorDefinition(code="E052", domain="diagnostics", name="LLM_QUEUE_FULL", http_status=429, message="この診断の LLM 実行待ちが上限に達しています"),
+    ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY: ErrorDefinition(code="E053", domain="diagnostics", name="LLM_SERVER_BUSY", http_status=503, message="LLM 実行枠が埋まっているため受け付けられません"),
     ErrorCode.DIAGNOSTICS_INVALID_SESSION_CODE: ErrorDefinition(code="E062", domain="diagnostics", name="INVALID_SESSION_CODE", http_status=400, message="指定した診断セッションコードは利用できません"),
     ErrorCode.DIAGNOSTICS_SESSION_OWNED_BY_OTHER: ErrorDefinition(code="E063", domain="diagnostics", name="SESSION_OWNED_BY_OTHER", http_status=409, message="指定した診断セッションは既に別のユーザーに紐付けられています"),
     ErrorCode.AUTH_EMAIL_ALREADY_REGISTERED: ErrorDefinition(code="E10100", domain="auth", name="EMAIL_ALREADY_REGISTERED", http_status=400, message="メールアドレスは既に登録されています"),
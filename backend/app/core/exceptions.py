@@ -21,12 +21,14 @@ class BaseAppException(Exception):
         detail: Any | None = None,
         extra: dict[str, Any] | None = None,
         status_code: int | None = None,
+        headers: dict[str, str] | None = None,
     ) -> None:
         super().__init__(error_code.value)
         self.error_code = error_code
         self.detail = detail
         self.extra = extra or {}
         self.status_code = status_code or error_code.http_status
+        self.headers = headers or {}
 
     def to_response_body(self) -> dict[str, Any]:
         document: dict[str, Any] = {
@@ -50,12 +52,19 @@ def raise_app_error(
     detail: Any | None = None,
     extra: dict[str, Any] | None = None,
     status_code: int | None = None,
+    headers: dict[str, str] | None = None,
 ) -> None:
-    raise BaseAppException(error_code, detail=detail, extra=extra, status_code=status_code)
+    raise BaseAppException(
+        error_code, detail=detail, extra=extra, status_code=status_code, headers=headers
+    )
 
 
 def _build_response(exc: BaseAppException) -> JSONResponse:
-    return JSONResponse(status_code=exc.status_code, content=exc.to_response_body())
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=exc.to_response_body(),
+        headers=exc.headers or None,
+    )
 
 
 async def base_exception_handler(_: Request, exc: BaseAppException) -> JSONResponse:
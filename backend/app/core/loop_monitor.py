@@ -0,0 +1,169 @@
+"""Event-loop lag monitor.
+
+A heartbeat task sleeps on the event loop for a fixed interval and measures
+how late it wakes up; the lateness is the time the loop spent running
+something else without yielding. A watchdog thread notices a heartbeat that
+is overdue by more than the threshold while the loop is still stuck, grabs
+the loop thread's stack and reports the innermost application frame, so a
+blocking handler shows up by name in the logs and in
+`event_loop_blocked_total{location=...}` on `/metrics`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_APP_ROOT = Path(__file__).resolve().parent.parent
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event-loop heartbeat woke up (time the loop was blocked).",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_BLOCKED = registry.counter(
+    "event_loop_blocked_total",
+    "Event-loop stalls longer than EVENT_LOOP_BLOCK_THRESHOLD_SECONDS, by blocking code location.",
+    ("location",),
+)
+
+UNKNOWN_LOCATION = "unknown"
+
+
+def _blocking_location(frame, app_root: Path) -> tuple[str, str]:
+    """Return (`module.py:function`, formatted stack) for the innermost frame under `app_root`."""
+
+    stack = traceback.extract_stack(frame)
+    location = UNKNOWN_LOCATION
+    for entry in reversed(stack):
+        path = Path(entry.filename)
+        if path.is_relative_to(app_root) and path.name != Path(__file__).name:
+            location = f"{path.relative_to(app_root.parent).as_posix()}:{entry.name}"
+            break
+    return location, "".join(traceback.format_list(stack[-15:]))
+
+
+class EventLoopMonitor:
+    def __init__(
+        self,
+        *,
+        interval_seconds: float,
+        threshold_seconds: float,
+        app_root: Path = _APP_ROOT,
+    ) -> None:
+        self._interval = max(0.01, interval_seconds)
+        self._threshold = max(0.001, threshold_seconds)
+        self._app_root = app_root
+        self._lock = threading.Lock()
+        self._beat = 0
+        self._due = 0.0
+        self._reported_beat = -1
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running loop (call from a coroutine)."""
+
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        with self._lock:
+            self._due = time.monotonic() + self._interval
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="event-loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="event-loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        watchdog, self._watchdog = self._watchdog, None
+        if watchdog is not None:
+            watchdog.join(timeout=1.0)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            with self._lock:
+                lag = max(0.0, now - self._due)
+                beat = self._beat
+                reported = self._reported_beat == beat
+                self._beat += 1
+                self._due = now + self._interval
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self._threshold and not reported:
+                # Stalled and resumed between two watchdog checks: no stack to show.
+                LOOP_BLOCKED.inc(location=UNKNOWN_LOCATION)
+                logger.warning("Event loop blocked for %.3fs", lag)
+
+    def _watch(self) -> None:
+        poll = min(self._interval, self._threshold) / 2
+        while not self._stopped.wait(poll):
+            with self._lock:
+                overdue = time.monotonic() - self._due
+                beat = self._beat
+                if overdue < self._threshold or self._reported_beat == beat:
+                    continue
+                self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            if frame is None:  # pragma: no cover - loop thread exited
+                continue
+            location, stack = _blocking_location(frame, self._app_root)
+            del frame
+            LOOP_BLOCKED.inc(location=location)
+            logger.warning(
+                "Event loop blocked for more than %.3fs in %s\n%s",
+                overdue,
+                location,
+                stack,
+            )
+
+
+_MONITOR: EventLoopMonitor | None = None
+
+
+async def start_event_loop_monitor() -> EventLoopMonitor | None:
+    global _MONITOR
+    if not settings.event_loop_monitor_enabled or _MONITOR is not None:
+        return _MONITOR
+    _MONITOR = EventLoopMonitor(
+        interval_seconds=float(settings.event_loop_monitor_interval_seconds),
+        threshold_seconds=float(settings.event_loop_block_threshold_seconds),
+    )
+    _MONITOR.start()
+    return _MONITOR
+
+
+async def stop_event_loop_monitor() -> None:
+    global _MONITOR
+    monitor, _MONITOR = _MONITOR, None
+    if monitor is not None:
+        await monitor.stop()
+
+
+__all__ = [
+    "EventLoopMonitor",
+    "LOOP_BLOCKED",
+    "LOOP_LAG_SECONDS",
+    "start_event_loop_monitor",
+    "stop_event_loop_monitor",
+]
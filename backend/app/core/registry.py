@@ -4,7 +4,8 @@ This module centralises two pieces of shared logic required across the
 diagnostics endpoints:
 
 * Stable computation of the `version_options_hash` that is stored on
-  `sessions` to act as a cache key for LLM results.
+  `sessions`, and of the `llm_results` key derived from it, which act as
+  cache keys for LLM results.
 * Lookup of the concrete SQLAlchemy model that backs a diagnostic's
   outcome master table based on the value stored in
   `diagnostics.outcome_table_name`.
@@ -70,32 +71,105 @@ def resolve_outcome_model(table_name: str) -> OutcomeModelBinding:
         raise OutcomeModelResolutionError(f"Unsupported outcome table: {table_name}") from exc
 
 
+_MULTISET_HASH_MODULUS: Final = 1 << 256
+
+
+def _digest_int(raw: str) -> int:
+    return int.from_bytes(hashlib.sha256(raw.encode("utf-8")).digest(), "big")
+
+
+def _format_multiset_hash(value: int) -> str:
+    return format(value % _MULTISET_HASH_MODULUS, "064x")
+
+
 def compute_version_options_hash(version_id: int, option_ids: Iterable[int | str]) -> str:
     """Compute the canonical hash for a set of option ids.
 
     The implementation follows the contract described in the common API
-    specification: option identifiers are transformed into strings,
-    sorted in ascending order, joined with commas, prefixed with the
-    version identifier, and finally hashed via SHA-256.
+    specification: an additive multiset hash. Each option contributes the
+    SHA-256 digest of ``v{version_id}:{option_id}`` read as a 256-bit
+    integer, and the contributions are summed modulo 2**256 on top of the
+    digest of ``v{version_id}``. The sum does not depend on the order of the
+    ids, and further answers can be folded in later with
+    `extend_version_options_hash` without revisiting earlier ones.
 
     Parameters
     ----------
     version_id:
         Identifier of the diagnostic version the options belong to. It
-        is embedded in the hash input to prevent collisions across
-        versions that may reuse the same option ids.
+        seeds the hash and is part of every element, so versions that
+        reuse the same option ids (or have no answers) never collide.
     option_ids:
         An iterable of identifiers (integers or strings are supported).
 
     Returns
     -------
     str
-        Lowercase hexadecimal SHA-256 digest.
+        Lowercase hexadecimal 256-bit value (64 characters).
+    """
+
+    return extend_version_options_hash(
+        version_id,
+        _format_multiset_hash(_digest_int(f"v{version_id}")),
+        option_ids,
+    )
+
+
+def extend_version_options_hash(
+    version_id: int,
+    version_options_hash: str,
+    option_ids: Iterable[int | str],
+) -> str:
+    """Fold additional option ids into a hash from `compute_version_options_hash`.
+
+    ``extend_version_options_hash(v, compute_version_options_hash(v, a), b)``
+    equals ``compute_version_options_hash(v, [*a, *b])``.
+    """
+
+    total = int(version_options_hash, 16)
+    for opt_id in option_ids:
+        total += _digest_int(f"v{version_id}:{opt_id}")
+    return _format_multiset_hash(total)
+
+
+def _format_sampling_value(value: float | None) -> str:
+    if value is None:
+        return "-"
+    return format(float(value), ".6g")
+
+
+def compute_llm_result_key(
+    *,
+    version_id: int,
+    version_options_hash: str,
+    provider: str,
+    model: str,
+    temperature: float | None,
+    top_p: float | None,
+) -> str:
+    """Compute the content address of an LLM result.
+
+    Every input that changes the provider response participates in the key,
+    so sessions resolving to the same key can share a single `llm_results`
+    row. Sampling values are normalised to six significant digits to keep
+    float noise (e.g. `0.2` vs `0.20000000001`) from splitting the cache.
+
+    Returns
+    -------
+    str
+        Lowercase hexadecimal SHA-256 digest (64 characters).
     """
 
-    sorted_ids = sorted(str(opt_id) for opt_id in option_ids)
-    payload = ",".join(sorted_ids)
-    raw = f"v{version_id}:{payload}"
+    raw = "|".join(
+        (
+            f"v{version_id}",
+            version_options_hash,
+            provider.strip().lower(),
+            model.strip(),
+            f"t={_format_sampling_value(temperature)}",
+            f"p={_format_sampling_value(top_p)}",
+        )
+    )
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
@@ -103,6 +177,8 @@ __all__ = [
     "OutcomeModelBinding",
     "OutcomeModelResolutionError",
     "OUTCOME_MODEL_REGISTRY",
+    "compute_llm_result_key",
     "compute_version_options_hash",
+    "extend_version_options_hash",
     "resolve_outcome_model",
 ]
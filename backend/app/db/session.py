@@ -1,4 +1,10 @@
+from __future__ import annotations
+
+import threading
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
@@ -7,3 +13,42 @@ from app.core.config import settings
 engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+# Async sessions for the user-facing hot paths. The engine is created on first
+# use so that processes which never touch it (scripts, Alembic) do not need aiomysql.
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+_async_engine: AsyncEngine | None = None
+_async_engine_lock = threading.Lock()
+
+
+def async_database_url() -> str:
+    """`ASYNC_DATABASE_URL`, or `DATABASE_URL` with the PyMySQL driver swapped for aiomysql."""
+
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = make_url(settings.database_url)
+    if url.drivername in {"mysql", "mysql+pymysql"}:
+        url = url.set(drivername="mysql+aiomysql")
+    return url.render_as_string(hide_password=False)
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    async_database_url(),
+                    pool_pre_ping=True,
+                    pool_size=settings.async_database_pool_size,
+                    max_overflow=settings.async_database_max_overflow,
+                    pool_timeout=settings.async_database_pool_timeout_seconds,
+                )
+    return _async_engine
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine
+    async_engine, _async_engine = _async_engine, None
+    if async_engine is not None:
+        await async_engine.dispose()
@@ -1,12 +1,16 @@
+from collections.abc import AsyncIterator, Callable
+
 from fastapi import Depends
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.exceptions import raise_app_error
 from app.core.errors import ErrorCode
 from app.core.security import validate_jwt_token
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal, get_async_engine
 from app.models.user import User
+from app.services.diagnostics.llm_admission import run_in_llm_pool
 
 
 security = HTTPBearer()
@@ -41,6 +45,31 @@ def get_db():
         db.close()
 
 
+async def get_llm_db() -> AsyncIterator[Session]:
+    """Synchronous session for the LLM endpoints, kept off the shared threadpool.
+
+    Creating the session does no I/O; closing it returns the connection, so
+    that runs on the LLM thread pool like the rest of the endpoint's DB work.
+    """
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        await run_in_llm_pool(db.close)
+
+
+def get_session_factory() -> Callable[[], Session]:
+    """Session factory for work that outlives the request (streamed responses)."""
+
+    return SessionLocal
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
@@ -59,10 +88,33 @@ def get_optional_current_user(
     return _resolve_user(token, db)
 
 
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db),
+) -> User:
+    token = credentials.credentials
+    return await db.run_sync(lambda session: _resolve_user(token, session))
+
+
+async def get_optional_current_user_async(
+    credentials: HTTPAuthorizationCredentials | None = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db),
+) -> User | None:
+    if credentials is None:
+        return None
+    token = credentials.credentials
+    return await db.run_sync(lambda session: _resolve_user(token, session))
+
+
 __all__ = [
     "get_db",
+    "get_async_db",
+    "get_llm_db",
+    "get_session_factory",
     "get_current_user",
+    "get_current_user_async",
     "get_optional_current_user",
+    "get_optional_current_user_async",
     "security",
     "optional_security",
 ]
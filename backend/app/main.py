@@ -1,17 +1,47 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.exceptions import register_exception_handlers
+from app.core.loop_monitor import start_event_loop_monitor, stop_event_loop_monitor
+from app.db.session import dispose_async_engine
 from app.routers import admin_auth as admin_auth_router
 from app.routers import admin_diagnostics as admin_diagnostics_router
 from app.routers import auth as auth_router
 from app.routers import diagnostics as diagnostics_router
 from app.routers import master as master_router
+from app.routers import metrics as metrics_router
 from app.routers import sessions as sessions_router
 from app.routers import users as users_router
+from app.services.diagnostics import llm_admission, llm_executor, llm_jobs
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    try:
+        llm_executor.warm_llm_clients()
+    except Exception:  # pragma: no cover - credentials may be unavailable at boot
+        logger.exception("Failed to warm LLM provider clients")
+    try:
+        llm_jobs.get_llm_job_runner().recover()
+    except Exception:  # pragma: no cover - DB may be unavailable at boot
+        logger.exception("Failed to recover pending LLM jobs")
+    await start_event_loop_monitor()
+    try:
+        yield
+    finally:
+        await stop_event_loop_monitor()
+        llm_jobs.shutdown_llm_job_runner()
+        llm_admission.shutdown_llm_thread_pool()
+        await dispose_async_engine()
+
 
-app = FastAPI(title="Auth API")
+app = FastAPI(title="Auth API", lifespan=lifespan)
 
 origins = [
     o.strip()
@@ -35,7 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"]
+    expose_headers=["Content-Disposition", "Retry-After"]
 )
 
 
@@ -51,5 +81,6 @@ app.include_router(sessions_router.router)
 app.include_router(master_router.router)
 app.include_router(admin_auth_router.router)
 app.include_router(admin_diagnostics_router.router)
+app.include_router(metrics_router.router)
 
 register_exception_handlers(app)
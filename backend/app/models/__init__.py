@@ -14,6 +14,9 @@ from .diagnostic import (  # noqa: F401
     VersionOutcome,
     DiagnosticSession,
     AnswerChoice,
+    LlmResult,
+    LlmJob,
+    LlmBatchJob,
 )
 
 __all__ = [
@@ -34,4 +37,7 @@ __all__ = [
     "VersionOutcome",
     "DiagnosticSession",
     "AnswerChoice",
+    "LlmResult",
+    "LlmJob",
+    "LlmBatchJob",
 ]
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Boolean, ForeignKey, Index, Integer, String, Text, UniqueConstraint, text
+from sqlalchemy import Boolean, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint, text
 from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import TypeDecorator
@@ -518,7 +518,15 @@ class DiagnosticSession(Base):
         ForeignKey("diagnostic_versions.id", ondelete="RESTRICT"),
     )
     llm_result: Mapped[dict | None] = mapped_column(mysql.JSON(), nullable=True)
+    llm_result_id: Mapped[str | None] = mapped_column(
+        String(64),
+        ForeignKey("llm_results.id", ondelete="RESTRICT"),
+        nullable=True,
+    )
     version_options_hash: Mapped[str] = mapped_column(String(128))
+    # Answered version_option ids in answer order, packed by `answer_vector`;
+    # NULL when unknown (the answers are then read from answer_choices).
+    answer_ids: Mapped[bytes | None] = mapped_column(mysql.BLOB(), nullable=True)
     ended_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         UTCDateTime(), default=utcnow, server_default=text("CURRENT_TIMESTAMP(3)")
@@ -537,6 +545,8 @@ class DiagnosticSession(Base):
     answer_choices: Mapped[list[AnswerChoice]] = relationship(
         "AnswerChoice", back_populates="session"
     )
+    llm_jobs: Mapped[list[LlmJob]] = relationship("LlmJob", back_populates="session")
+    llm_result_record: Mapped[LlmResult | None] = relationship("LlmResult")
 
 
 class AnswerChoice(Base):
@@ -569,6 +579,127 @@ class AnswerChoice(Base):
     )
 
 
+class LlmResult(Base):
+    """Content-addressed LLM result shared by every session with the same key.
+
+    `id` is `compute_llm_result_key(...)` over the version, options hash,
+    provider, model and sampling parameters.
+    """
+
+    __tablename__ = "llm_results"
+    __table_args__ = (
+        Index("idx_llm_results_version_hash", "version_id", "version_options_hash"),
+    )
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version_id: Mapped[int] = mapped_column(
+        mysql.BIGINT(unsigned=True),
+        ForeignKey("diagnostic_versions.id", ondelete="RESTRICT"),
+    )
+    version_options_hash: Mapped[str] = mapped_column(String(128))
+    provider: Mapped[str] = mapped_column(String(16))
+    model: Mapped[str] = mapped_column(String(255))
+    temperature: Mapped[float | None] = mapped_column(Float, nullable=True)
+    top_p: Mapped[float | None] = mapped_column(Float, nullable=True)
+    document: Mapped[dict] = mapped_column(mysql.JSON())
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), default=utcnow, server_default=text("CURRENT_TIMESTAMP(3)")
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(),
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=text("CURRENT_TIMESTAMP(3)"),
+        server_onupdate=text("CURRENT_TIMESTAMP(3)"),
+    )
+
+
+class LlmJob(Base):
+    __tablename__ = "llm_jobs"
+    __table_args__ = (
+        UniqueConstraint("job_code", name="uq_llm_jobs_job_code"),
+        Index("idx_llm_jobs_status_created", "status", "created_at"),
+        Index("idx_llm_jobs_session", "session_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        mysql.BIGINT(unsigned=True), primary_key=True, autoincrement=True
+    )
+    job_code: Mapped[str] = mapped_column(String(64))
+    session_id: Mapped[int] = mapped_column(
+        mysql.BIGINT(unsigned=True),
+        ForeignKey("sessions.id", ondelete="RESTRICT"),
+    )
+    status: Mapped[str] = mapped_column(String(16))
+    request_json: Mapped[dict | None] = mapped_column(mysql.JSON(), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    error_code: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    error_detail: Mapped[str | None] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
+    # Earliest time a requeued job may be claimed again (retry backoff).
+    next_attempt_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), default=utcnow, server_default=text("CURRENT_TIMESTAMP(3)")
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(),
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=text("CURRENT_TIMESTAMP(3)"),
+        server_onupdate=text("CURRENT_TIMESTAMP(3)"),
+    )
+
+    session: Mapped[DiagnosticSession] = relationship(
+        "DiagnosticSession", back_populates="llm_jobs"
+    )
+
+
+class LlmBatchJob(Base):
+    """Bedrock batch-inference job regenerating `llm_results` for a version.
+
+    `records` lists the version option ids of each submitted combination; the
+    index of an entry is its batch `recordId`.
+    """
+
+    __tablename__ = "llm_batch_jobs"
+    __table_args__ = (
+        UniqueConstraint("job_code", name="uq_llm_batch_jobs_job_code"),
+        Index("idx_llm_batch_jobs_status_created", "status", "created_at"),
+        Index("idx_llm_batch_jobs_version", "version_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(
+        mysql.BIGINT(unsigned=True), primary_key=True, autoincrement=True
+    )
+    job_code: Mapped[str] = mapped_column(String(64))
+    version_id: Mapped[int] = mapped_column(
+        mysql.BIGINT(unsigned=True),
+        ForeignKey("diagnostic_versions.id", ondelete="RESTRICT"),
+    )
+    status: Mapped[str] = mapped_column(String(16))
+    provider_status: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    provider_job_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    model: Mapped[str] = mapped_column(String(255))
+    records: Mapped[list] = mapped_column(mysql.JSON())
+    record_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    loaded_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    failed_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    error_detail: Mapped[str | None] = mapped_column(Text, nullable=True)
+    submitted_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(UTCDateTime(), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(), default=utcnow, server_default=text("CURRENT_TIMESTAMP(3)")
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        UTCDateTime(),
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=text("CURRENT_TIMESTAMP(3)"),
+        server_onupdate=text("CURRENT_TIMESTAMP(3)"),
+    )
+
+
 __all__ = [
     "Diagnostic",
     "DiagnosticVersion",
@@ -581,4 +712,7 @@ __all__ = [
     "VersionOutcome",
     "DiagnosticSession",
     "AnswerChoice",
+    "LlmResult",
+    "LlmJob",
+    "LlmBatchJob",
 ]
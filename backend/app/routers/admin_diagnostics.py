@@ -5,11 +5,13 @@ import json
 from datetime import datetime, timezone
 from typing import Any
 
-from fastapi import APIRouter, Body, Depends, File, Query, Response, UploadFile, status
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, File, Query, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
+from app.core.config import settings
 from app.core.errors import ErrorCode
 from app.core.exceptions import BaseAppException, raise_app_error
 from app.deps import admin as admin_deps
@@ -19,6 +21,7 @@ from app.models.diagnostic import (
     Diagnostic,
     DiagnosticVersion,
     DiagnosticVersionAuditLog,
+    LlmBatchJob,
     VersionOption,
     VersionOutcome,
     VersionQuestion,
@@ -39,11 +42,17 @@ from app.schemas.diagnostics import (
     AdminFinalizeSummary,
     AdminFinalizeVersionResponse,
     AdminImportStructureResponse,
+    AdminLlmBatchJobResponse,
+    AdminLlmBatchRequest,
+    AdminLlmPregenerationRequest,
+    AdminLlmPregenerationResponse,
     AdminActivateVersionRequest,
     AdminActivateVersionResponse,
     AdminUpdateSystemPromptRequest,
     AdminUpdateSystemPromptResponse,
 )
+from app.services.diagnostics import llm_batch, llm_pregeneration
+from app.services.diagnostics.active_version_cache import invalidate_active_versions
 from app.services.diagnostics.audit import record_diagnostic_version_log
 from app.services.diagnostics.template_exporter import TemplateExporter
 from app.services.diagnostics.structure_importer import (
@@ -611,13 +620,23 @@ async def import_diagnostic_structure(
     content = await file.read()
     if not content:
         raise_app_error(ErrorCode.DIAGNOSTICS_IMPORT_VALIDATION, detail="空のファイルは取り込めません")
+    # Workbook parsing and the inserts are blocking; keep them off the event loop.
+    return await run_in_threadpool(_import_structure, db, version_id=version_id, admin_id=admin.id, content=content)
 
+
+def _import_structure(
+    db: Session,
+    *,
+    version_id: int,
+    admin_id: int,
+    content: bytes,
+) -> AdminImportStructureResponse:
     importer = StructureImporter(db)
     nested_tx = db.begin_nested()
     try:
         summary = importer.import_version_structure(
             version_id=version_id,
-            admin_id=admin.id,
+            admin_id=admin_id,
             content=content,
         )
         nested_tx.commit()
@@ -775,6 +794,9 @@ def finalize_diagnostic_version(
         db.rollback()
         raise_app_error(ErrorCode.COMMON_UNEXPECTED_ERROR)
 
+    if settings.diagnostics_allow_fallback_version:
+        # Without an active version, session start falls back to the latest finalized one.
+        invalidate_active_versions(diagnostic_id=version.diagnostic_id)
     db.refresh(version)
 
     return AdminFinalizeVersionResponse(
@@ -796,6 +818,7 @@ def finalize_diagnostic_version(
 )
 def activate_diagnostic_version(
     version_id: int,
+    background_tasks: BackgroundTasks,
     payload: AdminActivateVersionRequest | None = Body(default=None),
     admin: AdminUser = Depends(admin_deps.get_current_admin),
     db: Session = Depends(admin_deps.get_db),
@@ -877,11 +900,107 @@ def activate_diagnostic_version(
         db.rollback()
         raise_app_error(ErrorCode.COMMON_UNEXPECTED_ERROR)
 
+    invalidate_active_versions(diagnostic_id=diagnostic_id)
     db.refresh(active)
 
+    if settings.llm_pregeneration_on_activate:
+        # Planning reads session history; keep it off the activation request.
+        background_tasks.add_task(
+            llm_pregeneration.run_pregeneration,
+            diagnostic_id=diagnostic_id,
+            limit=None,
+        )
+
     return AdminActivateVersionResponse(
         diagnostic_id=diagnostic_id,
         version_id=version.id,
         activated_at=active.updated_at,
         activated_by_admin_id=admin.id,
     )
+
+
+def _schedule_pregeneration(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    *,
+    diagnostic_id: int,
+    limit: int | None,
+) -> llm_pregeneration.PregenerationPlan:
+    plan = llm_pregeneration.plan_pregeneration(db, diagnostic_id=diagnostic_id, limit=limit)
+    if plan.missing:
+        # Provider calls run after the response, on their own DB session.
+        background_tasks.add_task(llm_pregeneration.execute_pregeneration, plan)
+    return plan
+
+
+@router.post(
+    "/{diagnostic_id}/llm-pregeneration",
+    response_model=AdminLlmPregenerationResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def pregenerate_llm_results(
+    diagnostic_id: int,
+    background_tasks: BackgroundTasks,
+    payload: AdminLlmPregenerationRequest | None = Body(default=None),
+    _: AdminUser = Depends(admin_deps.get_current_admin),
+    db: Session = Depends(admin_deps.get_db),
+) -> AdminLlmPregenerationResponse:
+    limit = payload.limit if payload is not None else None
+    plan = _schedule_pregeneration(db, background_tasks, diagnostic_id=diagnostic_id, limit=limit)
+    missing = len(plan.missing)
+    return AdminLlmPregenerationResponse(
+        diagnostic_id=plan.diagnostic_id,
+        version_id=plan.version_id,
+        candidates=len(plan.candidates),
+        cached=len(plan.candidates) - missing,
+        queued=missing,
+    )
+
+
+def _batch_job_response(job: LlmBatchJob) -> AdminLlmBatchJobResponse:
+    return AdminLlmBatchJobResponse(
+        job_id=job.job_code,
+        version_id=job.version_id,
+        status=job.status,
+        provider_status=job.provider_status,
+        model=job.model,
+        record_count=job.record_count,
+        loaded_count=job.loaded_count,
+        failed_count=job.failed_count,
+        error_detail=job.error_detail,
+        submitted_at=job.submitted_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post(
+    "/versions/{version_id}/llm-batch",
+    response_model=AdminLlmBatchJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def submit_llm_batch(
+    version_id: int,
+    payload: AdminLlmBatchRequest | None = Body(default=None),
+    _: AdminUser = Depends(admin_deps.get_current_admin),
+    db: Session = Depends(admin_deps.get_db),
+) -> AdminLlmBatchJobResponse:
+    limit = payload.limit if payload is not None else None
+    job = llm_batch.submit_batch_regeneration(db, version_id=version_id, limit=limit)
+    db.commit()
+    return _batch_job_response(job)
+
+
+@router.get(
+    "/versions/{version_id}/llm-batch/{job_id}",
+    response_model=AdminLlmBatchJobResponse,
+)
+def get_llm_batch(
+    version_id: int,
+    job_id: str,
+    _: AdminUser = Depends(admin_deps.get_current_admin),
+    db: Session = Depends(admin_deps.get_db),
+) -> AdminLlmBatchJobResponse:
+    # Read-only: provider polling and output loading run in
+    # `scripts/llm_batch_regenerate.py poll`, never on a request thread.
+    job = llm_batch.get_batch_job(db, job_code=job_id, version_id=version_id)
+    return _batch_job_response(job)
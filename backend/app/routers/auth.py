@@ -7,6 +7,7 @@ from authlib.integrations.base_client.errors import OAuthError
 from fastapi import APIRouter, Body, Depends, Request
 import logging
 from sqlalchemy import select, delete, update as sa_update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
@@ -18,7 +19,7 @@ from app.core.security import (
     get_password_hash,
     verify_password,
 )
-from app.deps.auth import get_current_user, get_db
+from app.deps.auth import get_async_db, get_current_user, get_current_user_async, get_db
 from app.models.user import OAuthAccount, RefreshToken, User
 from app.schemas.auth import (
     LinkSessionRequest,
@@ -221,27 +222,30 @@ def refresh(payload: RefreshRequest, request: Request, db: Session = Depends(get
 
 
 @router.post("/link-session", response_model=LinkSessionResponse)
-def link_session(
+async def link_session(
     raw_payload: dict[str, Any] = Body(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ) -> LinkSessionResponse:
     try:
         payload = LinkSessionRequest.model_validate(raw_payload)
     except ValidationError:
         raise_app_error(ErrorCode.DIAGNOSTICS_INVALID_SESSION_CODE)
 
+    user_id = current_user.id
     try:
-        linked, already_linked = link_sessions_to_user(
-            db,
-            user_id=current_user.id,
-            session_codes=payload.session_codes,
+        linked, already_linked = await db.run_sync(
+            lambda session: link_sessions_to_user(
+                session,
+                user_id=user_id,
+                session_codes=payload.session_codes,
+            )
         )
-        db.commit()
+        await db.commit()
     except BaseAppException:
         raise
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise
 
     return LinkSessionResponse(linked=linked, already_linked=already_linked)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, Header, Response, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.deps.auth import get_db, get_optional_current_user
+from app.deps.auth import get_async_db, get_optional_current_user_async
+from app.models.diagnostic import DiagnosticVersion
 from app.models.user import User
 from app.schemas.diagnostics import (
     UserFormOption,
@@ -15,7 +16,9 @@ from app.schemas.diagnostics import (
 from app.services.diagnostics import (
     create_diagnostic_session,
     ensure_option_buckets,
+    get_form_cache,
     load_finalized_version,
+    load_version_src_hash,
     sorted_options,
     sorted_outcomes,
     sorted_questions,
@@ -54,18 +57,16 @@ def _format_etag(value: str) -> str:
 )
 async def start_session(
     diagnostic_code: str,
-    db: Session = Depends(get_db),
-    current_user: User | None = Depends(get_optional_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User | None = Depends(get_optional_current_user_async),
 ) -> UserSessionStartResponse:
     """Start a diagnostic session for the requested diagnostic code."""
 
-    session = create_diagnostic_session(
-        db,
-        diagnostic_code,
-        user_id=current_user.id if current_user else None,
+    user_id = current_user.id if current_user else None
+    session = await db.run_sync(
+        lambda sync_db: create_diagnostic_session(sync_db, diagnostic_code, user_id=user_id)
     )
-    db.commit()
-    db.refresh(session)
+    await db.commit()
     return UserSessionStartResponse(
         session_code=session.session_code,
         diagnostic_id=session.diagnostic_id,
@@ -80,23 +81,31 @@ async def start_session(
 )
 async def get_version_form(
     version_id: int,
-    response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     if_none_match: str | None = Header(default=None),
-) -> UserGetFormResponse | Response:
-    version = load_finalized_version(db, version_id=version_id)
-
-    if version.src_hash:
-        if if_none_match:
-            candidates = _normalize_if_none_match(if_none_match)
-            if "*" in candidates or version.src_hash in candidates:
-                not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
-                not_modified.headers["ETag"] = _format_etag(version.src_hash)
-                not_modified.headers["Cache-Control"] = CACHE_CONTROL_VALUE
-                return not_modified
-        response.headers["ETag"] = _format_etag(version.src_hash)
-    response.headers["Cache-Control"] = CACHE_CONTROL_VALUE
+) -> Response:
+    # The ETag check and the cache lookup need only src_hash, so neither
+    # conditional nor warm requests load the version graph.
+    src_hash = await db.run_sync(lambda sync_db: load_version_src_hash(sync_db, version_id=version_id))
 
+    headers = {"ETag": _format_etag(src_hash), "Cache-Control": CACHE_CONTROL_VALUE}
+    if if_none_match:
+        candidates = _normalize_if_none_match(if_none_match)
+        if "*" in candidates or src_hash in candidates:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache = get_form_cache()
+    cached = cache.get(version_id, src_hash)
+    if cached is None:
+        version = await db.run_sync(lambda sync_db: load_finalized_version(sync_db, version_id=version_id))
+        body = _build_form_response(version).model_dump_json().encode("utf-8")
+        cached = cache.put(version.id, version.src_hash, body)
+        headers["ETag"] = _format_etag(cached.src_hash)
+
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+def _build_form_response(version: DiagnosticVersion) -> UserGetFormResponse:
     questions = sorted_questions(version)
     options = sorted_options(version)
     outcomes = sorted_outcomes(version)
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import hmac
+
+from fastapi import APIRouter, Header, Response
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import raise_app_error
+from app.core.metrics import PROMETHEUS_CONTENT_TYPE, registry
+
+# Importing the module registers the LLM metrics even before the first call.
+from app.services.diagnostics import llm_metrics  # noqa: F401
+
+router = APIRouter(tags=["metrics"])
+
+
+def _authorize(authorization: str | None) -> None:
+    token = settings.metrics_token
+    if not token:
+        return
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip(), token):
+        raise_app_error(ErrorCode.COMMON_UNAUTHENTICATED)
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics(authorization: str | None = Header(default=None)) -> Response:
+    if not settings.metrics_enabled:
+        raise_app_error(ErrorCode.COMMON_RESOURCE_NOT_FOUND)
+    _authorize(authorization)
+    return Response(content=registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
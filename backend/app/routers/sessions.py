@@ -1,70 +1,272 @@
 from __future__ import annotations
 
+import json
+import logging
+from collections.abc import Callable, Iterator
 from typing import Any
 
-from fastapi import APIRouter, Body, Depends, Response, status
+from fastapi import APIRouter, Body, Depends, Query, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.errors import ErrorCode
-from app.core.exceptions import raise_app_error
-from app.deps.auth import get_db
+from app.core.exceptions import BaseAppException, raise_app_error
+from app.deps.auth import get_async_db, get_db, get_llm_db, get_session_factory
 from app.schemas.sessions import (
     UserCallLlmRequest,
     UserCallLlmResponse,
+    UserCompleteSessionRequest,
     UserGetSessionResponse,
+    UserLlmJobResponse,
     UserSubmitAnswersRequest,
 )
-from app.services.diagnostics import llm_executor, submit_session_answers
-from app.services.diagnostics.session_reader import get_public_session_payload
+from app.models.diagnostic import LlmJob
+from app.services.diagnostics import (
+    FinalAnswers,
+    llm_admission,
+    llm_executor,
+    llm_jobs,
+    submit_session_answers,
+)
+from app.services.diagnostics.session_reader import (
+    get_public_session_payload,
+    wait_for_public_session_payload_async,
+)
 
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
+logger = logging.getLogger(__name__)
+
+
+def _job_response(job: LlmJob, session_code: str) -> UserLlmJobResponse:
+    return UserLlmJobResponse(
+        job_id=job.job_code,
+        session_code=session_code,
+        status=job.status,
+        error_code=job.error_code,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
 
 
 @router.get("/{session_code}", response_model=UserGetSessionResponse)
-def get_session(session_code: str, db: Session = Depends(get_db)) -> UserGetSessionResponse:
-    payload = get_public_session_payload(db, session_code=session_code)
+async def get_session(
+    session_code: str,
+    wait: float = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+) -> UserGetSessionResponse:
+    if wait > 0:
+        payload = await wait_for_public_session_payload_async(
+            db,
+            session_code=session_code,
+            wait_seconds=min(wait, float(settings.llm_long_poll_max_seconds)),
+            interval_seconds=float(settings.llm_long_poll_interval_seconds),
+        )
+    else:
+        payload = await db.run_sync(lambda session: get_public_session_payload(session, session_code=session_code))
     return UserGetSessionResponse.model_validate(payload)
 
 
 @router.post("/{session_code}/answers", status_code=status.HTTP_204_NO_CONTENT)
-def submit_answers(
+async def submit_answers(
     session_code: str,
     raw_payload: dict[str, Any] = Body(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Response:
     try:
         payload = UserSubmitAnswersRequest.model_validate(raw_payload)
     except ValidationError:
         raise_app_error(ErrorCode.DIAGNOSTICS_INVALID_PAYLOAD)
 
+    await db.run_sync(
+        lambda session: submit_session_answers(
+            session,
+            session_code=session_code,
+            version_option_ids=payload.version_option_ids,
+            answered_at=payload.answered_at,
+        )
+    )
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post(
+    "/{session_code}/llm",
+    response_model=UserCallLlmResponse,
+    responses={status.HTTP_202_ACCEPTED: {"model": UserLlmJobResponse}},
+)
+async def execute_llm(
+    session_code: str,
+    payload: UserCallLlmRequest = Body(...),
+    db: Session = Depends(get_llm_db),
+) -> UserCallLlmResponse | JSONResponse:
+    ticket = await llm_admission.aadmit_llm_request(db, session_code)
+    try:
+        if payload.run_async:
+            # Queued requests pass admission too; the slot is held only while enqueueing.
+            return await llm_admission.run_in_llm_pool(_enqueue_llm_job, db, session_code, payload)
+        # The provider call is awaited on the event loop; only the database
+        # phases occupy a slot of the LLM thread pool.
+        result = await llm_executor.acall_session_llm(
+            db,
+            session_code=session_code,
+            model_id=payload.model,
+            temperature=payload.temperature,
+            top_p=payload.top_p,
+            force_regenerate=payload.force_regenerate,
+        )
+        await llm_admission.run_in_llm_pool(db.commit)
+    finally:
+        ticket.release()
+    return UserCallLlmResponse.model_validate(result)
+
+
+def _enqueue_llm_job(db: Session, session_code: str, payload: UserCallLlmRequest) -> JSONResponse:
+    job = llm_jobs.enqueue_llm_job(
+        db,
+        session_code=session_code,
+        model_id=payload.model,
+        temperature=payload.temperature,
+        top_p=payload.top_p,
+        force_regenerate=payload.force_regenerate,
+    )
+    db.commit()
+    job_response = _job_response(job, session_code)
+    # Submit only after commit so the worker's own connection can see the row.
+    if job.status == llm_jobs.JOB_STATUS_QUEUED:
+        llm_jobs.get_llm_job_runner().submit(job.id)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=job_response.model_dump(mode="json"),
+    )
+
+
+@router.post(
+    "/{session_code}/complete",
+    response_model=UserCallLlmResponse,
+    responses={status.HTTP_202_ACCEPTED: {"model": UserLlmJobResponse}},
+)
+async def complete_session(
+    session_code: str,
+    raw_payload: dict[str, Any] = Body(...),
+    db: Session = Depends(get_llm_db),
+) -> UserCallLlmResponse | JSONResponse:
+    """Record the final answers and evaluate the session in a single transaction."""
+
+    try:
+        payload = UserCompleteSessionRequest.model_validate(raw_payload)
+    except ValidationError:
+        raise_app_error(ErrorCode.DIAGNOSTICS_INVALID_PAYLOAD)
+
+    ticket = await llm_admission.aadmit_llm_request(db, session_code)
+    try:
+        if payload.run_async:
+            return await llm_admission.run_in_llm_pool(_enqueue_completion, db, session_code, payload)
+        result = await llm_executor.acall_session_llm(
+            db,
+            session_code=session_code,
+            model_id=payload.model,
+            temperature=payload.temperature,
+            top_p=payload.top_p,
+            force_regenerate=payload.force_regenerate,
+            final_answers=FinalAnswers(
+                version_option_ids=payload.version_option_ids,
+                answered_at=payload.answered_at,
+            ),
+        )
+        await llm_admission.run_in_llm_pool(db.commit)
+    finally:
+        ticket.release()
+    return UserCallLlmResponse.model_validate(result)
+
+
+def _enqueue_completion(db: Session, session_code: str, payload: UserCompleteSessionRequest) -> JSONResponse:
+    # The job is committed together with the answers it will evaluate.
     submit_session_answers(
         db,
         session_code=session_code,
         version_option_ids=payload.version_option_ids,
         answered_at=payload.answered_at,
     )
-    db.commit()
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
+    return _enqueue_llm_job(db, session_code, payload)
+
 
+def _format_sse(event: str, data: dict[str, Any]) -> str:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {event}\ndata: {body}\n\n"
 
-@router.post("/{session_code}/llm", response_model=UserCallLlmResponse)
-def execute_llm(
+
+def _iter_sse(events: Iterator[tuple[str, dict[str, Any]]]) -> Iterator[str]:
+    # Headers are already sent, so every failure must end the stream with an
+    # `error` event rather than a dropped connection.
+    try:
+        for event, data in events:
+            if event == "done":
+                data = UserCallLlmResponse.model_validate(data).model_dump(mode="json")
+            yield _format_sse(event, data)
+    except BaseAppException as exc:
+        yield _format_sse("error", exc.to_response_body())
+    except Exception:
+        logger.exception("LLM stream failed")
+        yield _format_sse("error", BaseAppException(ErrorCode.COMMON_UNEXPECTED_ERROR).to_response_body())
+
+
+def _open_llm_stream(
+    db: Session,
     session_code: str,
-    payload: UserCallLlmRequest = Body(...),
-    db: Session = Depends(get_db),
-) -> UserCallLlmResponse:
-    result = llm_executor.call_session_llm(
+    payload: UserCallLlmRequest,
+    session_factory: Callable[[], Session],
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    events = llm_executor.stream_session_llm(
         db,
         session_code=session_code,
         model_id=payload.model,
         temperature=payload.temperature,
         top_p=payload.top_p,
         force_regenerate=payload.force_regenerate,
+        session_factory=session_factory,
     )
+    # A reused result is applied on the request session (`llm_result_id`, and
+    # `ended_at` if unset); commit it before that session is torn down. A
+    # provider call leaves nothing pending here: it runs on its own session.
     db.commit()
-    return UserCallLlmResponse.model_validate(result)
+    return events
+
+
+@router.post("/{session_code}/llm/stream")
+async def stream_llm(
+    session_code: str,
+    payload: UserCallLlmRequest = Body(...),
+    db: Session = Depends(get_llm_db),
+    session_factory: Callable[[], Session] = Depends(get_session_factory),
+) -> StreamingResponse:
+    ticket = await llm_admission.aadmit_llm_request(db, session_code)
+    try:
+        events = await llm_admission.run_in_llm_pool(_open_llm_stream, db, session_code, payload, session_factory)
+    except BaseException:
+        ticket.release()
+        raise
+    # The relay blocks on provider events for the whole stream, so it runs on
+    # the LLM thread pool rather than the shared one; the admission slot is
+    # held until the stream is closed.
+    return StreamingResponse(
+        llm_admission.iterate_in_llm_pool(_iter_sse(events), on_close=ticket.release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{session_code}/llm/jobs/{job_id}", response_model=UserLlmJobResponse)
+def get_llm_job_status(
+    session_code: str,
+    job_id: str,
+    db: Session = Depends(get_db),
+) -> UserLlmJobResponse:
+    job = llm_jobs.get_llm_job(db, session_code=session_code, job_code=job_id)
+    return _job_response(job, session_code)
 
 
 __all__ = ["router"]
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Any, Literal
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class AdminDiagnosticItem(BaseModel):
@@ -154,6 +154,36 @@ class AdminActivateVersionResponse(BaseModel):
     activated_by_admin_id: int
 
 
+class AdminLlmPregenerationRequest(BaseModel):
+    limit: int | None = Field(default=None, ge=1, le=500)
+
+
+class AdminLlmPregenerationResponse(BaseModel):
+    diagnostic_id: int
+    version_id: int
+    candidates: int
+    cached: int
+    queued: int
+
+
+class AdminLlmBatchRequest(BaseModel):
+    limit: int | None = Field(default=None, ge=1, le=50000)
+
+
+class AdminLlmBatchJobResponse(BaseModel):
+    job_id: str
+    version_id: int
+    status: str
+    provider_status: str | None = None
+    model: str
+    record_count: int
+    loaded_count: int
+    failed_count: int
+    error_detail: str | None = None
+    submitted_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
 class UserSessionStartResponse(BaseModel):
     session_code: str
     diagnostic_id: int
@@ -45,6 +45,7 @@ class UserCallLlmRequest(BaseModel):
     temperature: float | None = None
     top_p: float | None = None
     force_regenerate: bool = False
+    run_async: bool = False
 
     model_config = ConfigDict(extra="ignore")
 
@@ -61,13 +62,39 @@ class UserCallLlmRequest(BaseModel):
         return self
 
 
+class UserCompleteSessionRequest(UserSubmitAnswersRequest, UserCallLlmRequest):
+    """Request payload recording the final answers and evaluating the session in one call."""
+
+
 class LlmMessage(BaseModel):
     role: Literal["system", "user"]
     content: str
 
 
+class RankedOutcomeScore(BaseModel):
+    score: float | None = None
+    reason: str | None = None
+
+
+class RankedOutcome(BaseModel):
+    """One entry of the ranking parsed from the LLM output.
+
+    Entries naming no active outcome keep the model's name with
+    `matched=False` and no `outcome_id`.
+    """
+
+    rank: int
+    outcome_id: int | None
+    name: str
+    matched: bool = True
+    total_match: RankedOutcomeScore
+    personality_match: RankedOutcomeScore
+    work_match: RankedOutcomeScore
+
+
 class UserCallLlmResult(BaseModel):
     raw: Any
+    ranking: list[RankedOutcome] | None = None
     generated_at: str
 
 
@@ -79,6 +106,17 @@ class UserCallLlmResponse(BaseModel):
     llm_result: UserCallLlmResult
 
 
+class UserLlmJobResponse(BaseModel):
+    """Status payload for an LLM execution handed off to the job queue."""
+
+    job_id: str
+    session_code: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    error_code: str | None = None
+    created_at: datetime
+    finished_at: datetime | None = None
+
+
 class SessionOutcome(BaseModel):
     outcome_id: int
     sort_order: int
@@ -95,10 +133,13 @@ class UserGetSessionResponse(BaseModel):
 
 __all__ = [
     "LlmMessage",
+    "RankedOutcome",
+    "RankedOutcomeScore",
     "UserCallLlmRequest",
     "UserCallLlmResponse",
     "UserCallLlmResult",
     "SessionOutcome",
     "UserGetSessionResponse",
+    "UserLlmJobResponse",
     "UserSubmitAnswersRequest",
 ]
@@ -30,6 +30,10 @@ _LAZY_IMPORTS: dict[str, tuple[str, str]] = {
         "app.services.diagnostics.answer_recorder",
         "submit_session_answers",
     ),
+    "FinalAnswers": (
+        "app.services.diagnostics.answer_recorder",
+        "FinalAnswers",
+    ),
     "ensure_option_buckets": (
         "app.services.diagnostics.form_loader",
         "ensure_option_buckets",
@@ -38,6 +42,18 @@ _LAZY_IMPORTS: dict[str, tuple[str, str]] = {
         "app.services.diagnostics.form_loader",
         "load_finalized_version",
     ),
+    "load_version_src_hash": (
+        "app.services.diagnostics.form_loader",
+        "load_version_src_hash",
+    ),
+    "get_form_cache": (
+        "app.services.diagnostics.form_cache",
+        "get_form_cache",
+    ),
+    "reset_form_cache": (
+        "app.services.diagnostics.form_cache",
+        "reset_form_cache",
+    ),
     "sorted_options": (
         "app.services.diagnostics.form_loader",
         "sorted_options",
@@ -70,6 +86,14 @@ _LAZY_IMPORTS: dict[str, tuple[str, str]] = {
         "app.services.diagnostics.llm_executor",
         "call_session_llm",
     ),
+    "acall_session_llm": (
+        "app.services.diagnostics.llm_executor",
+        "acall_session_llm",
+    ),
+    "stream_session_llm": (
+        "app.services.diagnostics.llm_executor",
+        "stream_session_llm",
+    ),
     "create_bedrock_client": (
         "app.services.diagnostics.llm_executor",
         "create_bedrock_client",
@@ -86,6 +110,50 @@ _LAZY_IMPORTS: dict[str, tuple[str, str]] = {
         "app.services.diagnostics.llm_executor",
         "set_gemini_client_factory",
     ),
+    "reset_llm_clients": (
+        "app.services.diagnostics.llm_executor",
+        "reset_llm_clients",
+    ),
+    "warm_llm_clients": (
+        "app.services.diagnostics.llm_executor",
+        "warm_llm_clients",
+    ),
+    "plan_pregeneration": (
+        "app.services.diagnostics.llm_pregeneration",
+        "plan_pregeneration",
+    ),
+    "execute_pregeneration": (
+        "app.services.diagnostics.llm_pregeneration",
+        "execute_pregeneration",
+    ),
+    "pregenerate_active_versions": (
+        "app.services.diagnostics.llm_pregeneration",
+        "pregenerate_active_versions",
+    ),
+    "run_pregeneration": (
+        "app.services.diagnostics.llm_pregeneration",
+        "run_pregeneration",
+    ),
+    "LlmJobRunner": (
+        "app.services.diagnostics.llm_jobs",
+        "LlmJobRunner",
+    ),
+    "enqueue_llm_job": (
+        "app.services.diagnostics.llm_jobs",
+        "enqueue_llm_job",
+    ),
+    "get_llm_job": (
+        "app.services.diagnostics.llm_jobs",
+        "get_llm_job",
+    ),
+    "get_llm_job_runner": (
+        "app.services.diagnostics.llm_jobs",
+        "get_llm_job_runner",
+    ),
+    "set_llm_job_runner": (
+        "app.services.diagnostics.llm_jobs",
+        "set_llm_job_runner",
+    ),
 }
 
 __all__ = sorted(_LAZY_IMPORTS)
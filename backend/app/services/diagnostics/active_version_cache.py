@@ -0,0 +1,85 @@
+"""In-process cache of diagnostic code → (diagnostic id, active version id).
+
+Session start resolves the active version of a diagnostic on every request,
+but the mapping only changes when an admin activates (or, with the fallback
+enabled, finalizes) a version. The admin endpoints invalidate this worker's
+entries once their transaction commits; other workers pick the change up
+when their entry expires after `ACTIVE_VERSION_CACHE_TTL_SECONDS`, which
+bounds how long they can keep starting sessions on the previous version.
+Failed lookups are not cached.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class ActiveVersion:
+    diagnostic_id: int
+    version_id: int
+    expires_at: float
+
+
+_ENTRIES: dict[str, ActiveVersion] = {}
+_LOCK = threading.Lock()
+
+
+def _ttl_seconds() -> float:
+    return max(0.0, float(settings.active_version_cache_ttl_seconds or 0))
+
+
+def resolve_active_version(
+    diagnostic_code: str,
+    loader: Callable[[], tuple[int, int]],
+    *,
+    clock: Callable[[], float] = time.monotonic,
+) -> tuple[int, int]:
+    """Return `(diagnostic_id, version_id)`, calling `loader` on a miss or expired entry."""
+
+    ttl = _ttl_seconds()
+    if ttl <= 0:
+        return loader()
+
+    now = clock()
+    with _LOCK:
+        entry = _ENTRIES.get(diagnostic_code)
+    if entry is not None and entry.expires_at > now:
+        return entry.diagnostic_id, entry.version_id
+
+    diagnostic_id, version_id = loader()
+    with _LOCK:
+        if len(_ENTRIES) >= _CACHE_SIZE and diagnostic_code not in _ENTRIES:
+            # Diagnostics are few; dropping everything is simpler than tracking recency.
+            _ENTRIES.clear()
+        _ENTRIES[diagnostic_code] = ActiveVersion(
+            diagnostic_id=diagnostic_id,
+            version_id=version_id,
+            expires_at=now + ttl,
+        )
+    return diagnostic_id, version_id
+
+
+def invalidate_active_versions(*, diagnostic_id: int | None = None) -> None:
+    """Drop cached entries for a diagnostic (or all of them); call after the change commits."""
+
+    with _LOCK:
+        if diagnostic_id is None:
+            _ENTRIES.clear()
+            return
+        for code in [code for code, entry in _ENTRIES.items() if entry.diagnostic_id == diagnostic_id]:
+            del _ENTRIES[code]
+
+
+__all__ = [
+    "ActiveVersion",
+    "invalidate_active_versions",
+    "resolve_active_version",
+]
@@ -1,23 +1,45 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Iterable
+from typing import Any, Iterable
 
-from sqlalchemy import Select, select
+from sqlalchemy import LargeBinary, Row, func, insert, literal, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.core.errors import ErrorCode
 from app.core.exceptions import raise_app_error
-from app.core.registry import compute_version_options_hash
-from app.models.diagnostic import AnswerChoice, DiagnosticSession, VersionOption
+from app.core.registry import extend_version_options_hash
+from app.models.diagnostic import AnswerChoice, DiagnosticSession, DiagnosticVersion
 
+from .answer_vector import pack_answer_ids
+from .option_index import get_version_option_index
 
-def _fetch_session(db: Session, session_code: str) -> DiagnosticSession:
-    stmt: Select[DiagnosticSession] = select(DiagnosticSession).where(
-        DiagnosticSession.session_code == session_code
+
+@dataclass(frozen=True)
+class FinalAnswers:
+    """Answers submitted together with the request that evaluates the session."""
+
+    version_option_ids: list[int]
+    answered_at: datetime | None = None
+
+
+def _fetch_session(db: Session, session_code: str) -> Row[Any]:
+    """Return the session's id, version and hash together with the version's `src_hash`."""
+
+    stmt = (
+        select(
+            DiagnosticSession.id,
+            DiagnosticSession.version_id,
+            DiagnosticSession.version_options_hash,
+            DiagnosticVersion.src_hash,
+        )
+        .join(DiagnosticVersion, DiagnosticVersion.id == DiagnosticSession.version_id)
+        .where(DiagnosticSession.session_code == session_code)
     )
-    session = db.execute(stmt).scalar_one_or_none()
+    session = db.execute(stmt).one_or_none()
     if session is None:
         raise_app_error(ErrorCode.DIAGNOSTICS_SESSION_NOT_FOUND)
     return session
@@ -35,15 +57,11 @@ def _ensure_option_membership(
     db: Session,
     *,
     version_id: int,
+    src_hash: str | None,
     option_ids: Iterable[int],
 ) -> None:
-    ids = list(option_ids)
-    stmt = select(VersionOption.id).where(
-        VersionOption.version_id == version_id,
-        VersionOption.id.in_(ids),
-    )
-    found = {row for row in db.scalars(stmt)}
-    if len(found) != len(ids):
+    index = get_version_option_index(db, version_id=version_id, src_hash=src_hash)
+    if not index.contains_all(option_ids):
         raise_app_error(ErrorCode.DIAGNOSTICS_OPTION_OUT_OF_VERSION)
 
 
@@ -66,45 +84,154 @@ def _is_duplicate_answer(exc: IntegrityError) -> bool:
     return "duplicate" in message and "answer_choices" in message
 
 
-def submit_session_answers(
+def _insert_answers(
     db: Session,
     *,
-    session_code: str,
+    session_id: int,
+    version_id: int,
+    src_hash: str | None,
     version_option_ids: list[int],
     answered_at: datetime | None,
-) -> str:
-    session = _fetch_session(db, session_code)
-
+) -> None:
     if not version_option_ids or len(version_option_ids) > 20:
         raise_app_error(ErrorCode.DIAGNOSTICS_INVALID_PAYLOAD)
 
-    _ensure_option_membership(db, version_id=session.version_id, option_ids=version_option_ids)
+    _ensure_option_membership(
+        db,
+        version_id=version_id,
+        src_hash=src_hash,
+        option_ids=version_option_ids,
+    )
 
     timestamp = _normalise_answered_at(answered_at)
 
-    records = [
-        AnswerChoice(
-            session_id=session.id,
-            version_option_id=option_id,
-            answered_at=timestamp,
-        )
-        for option_id in version_option_ids
-    ]
-    db.add_all(records)
-
+    # One multi-row INSERT; the ORM would issue a statement per row to fetch each primary key.
+    stmt = insert(AnswerChoice).values(
+        [
+            {
+                "session_id": session_id,
+                "version_option_id": option_id,
+                "answered_at": timestamp,
+            }
+            for option_id in version_option_ids
+        ]
+    )
     try:
-        db.flush()
+        db.execute(stmt)
     except IntegrityError as exc:
         db.rollback()
         if _is_duplicate_answer(exc):
             raise_app_error(ErrorCode.DIAGNOSTICS_DUPLICATE_ANSWER)
         raise
 
-    new_hash = compute_version_options_hash(session.version_id, version_option_ids)
-    session.version_options_hash = new_hash
-    db.flush()
 
+def _fold_into_session(
+    db: Session,
+    *,
+    session_id: int,
+    version_id: int,
+    version_options_hash: str,
+    version_option_ids: list[int],
+) -> tuple[str, bool]:
+    """Fold new answers into the session's hash and answer vector.
+
+    The hash is extended from the value the caller read, guarded by that
+    value so a concurrent submission for the same session is never lost.
+    Returns the stored hash and whether the caller's read was still current.
+    """
+
+    packed = literal(pack_answer_ids(version_option_ids), LargeBinary())
+    current_hash = version_options_hash
+    current = True
+    while True:
+        new_hash = extend_version_options_hash(version_id, current_hash, version_option_ids)
+        result = db.execute(
+            update(DiagnosticSession)
+            .where(
+                DiagnosticSession.id == session_id,
+                DiagnosticSession.version_options_hash == current_hash,
+            )
+            .values(
+                version_options_hash=new_hash,
+                # CONCAT keeps an unknown (NULL) vector NULL, so it never covers only part of the answers.
+                answer_ids=func.concat(DiagnosticSession.answer_ids, packed),
+            )
+        )
+        if result.rowcount:
+            return new_hash, current
+        # Another submission committed first; the locking read sees its hash and holds the row.
+        current = False
+        current_hash = db.scalar(
+            select(DiagnosticSession.version_options_hash)
+            .where(DiagnosticSession.id == session_id)
+            .with_for_update()
+        )
+        if current_hash is None:  # pragma: no cover - session deleted concurrently
+            raise_app_error(ErrorCode.DIAGNOSTICS_SESSION_NOT_FOUND)
+
+
+def submit_session_answers(
+    db: Session,
+    *,
+    session_code: str,
+    version_option_ids: list[int],
+    answered_at: datetime | None,
+) -> str:
+    session = _fetch_session(db, session_code)
+
+    _insert_answers(
+        db,
+        session_id=session.id,
+        version_id=session.version_id,
+        src_hash=session.src_hash,
+        version_option_ids=version_option_ids,
+        answered_at=answered_at,
+    )
+
+    new_hash, _ = _fold_into_session(
+        db,
+        session_id=session.id,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+        version_option_ids=version_option_ids,
+    )
     return new_hash
 
 
-__all__ = ["submit_session_answers"]
+def record_final_answers(
+    db: Session,
+    *,
+    session: DiagnosticSession,
+    src_hash: str | None,
+    version_option_ids: list[int],
+    answered_at: datetime | None,
+) -> None:
+    """Record the last answers of an already-loaded session ahead of its evaluation.
+
+    The session's hash and answer vector are updated in the database and on
+    the loaded instance, so the evaluation can use them right away.
+    """
+
+    _insert_answers(
+        db,
+        session_id=session.id,
+        version_id=session.version_id,
+        src_hash=src_hash,
+        version_option_ids=version_option_ids,
+        answered_at=answered_at,
+    )
+    new_hash, current = _fold_into_session(
+        db,
+        session_id=session.id,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+        version_option_ids=version_option_ids,
+    )
+    set_committed_value(session, "version_options_hash", new_hash)
+    if not current:
+        db.expire(session, ["answer_ids"])
+    elif session.answer_ids is not None:
+        set_committed_value(session, "answer_ids", session.answer_ids + pack_answer_ids(version_option_ids))
+
+
+__all__ = ["FinalAnswers", "record_final_answers", "submit_session_answers"]
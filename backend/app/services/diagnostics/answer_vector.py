@@ -0,0 +1,28 @@
+"""Packed per-session answer vector stored in `sessions.answer_ids`.
+
+The vector holds the answered `version_options.id` values in answer order as
+little-endian unsigned 64-bit integers, so appending a submission is a plain
+byte concatenation (`CONCAT` in SQL) and reading a session's answers needs no
+join against `answer_choices`.
+"""
+
+from __future__ import annotations
+
+import struct
+from collections.abc import Iterable
+
+_ITEM_SIZE = 8
+
+
+def pack_answer_ids(option_ids: Iterable[int]) -> bytes:
+    ids = [int(option_id) for option_id in option_ids]
+    return struct.pack(f"<{len(ids)}Q", *ids)
+
+
+def unpack_answer_ids(data: bytes) -> list[int]:
+    if len(data) % _ITEM_SIZE:
+        raise ValueError("answer vector length must be a multiple of 8 bytes")
+    return list(struct.unpack(f"<{len(data) // _ITEM_SIZE}Q", data))
+
+
+__all__ = ["pack_answer_ids", "unpack_answer_ids"]
@@ -0,0 +1,226 @@
+"""Amazon Bedrock batch inference (`CreateModelInvocationJob`) for diagnostics.
+
+A batch job reads a JSONL file of `{"recordId", "modelInput"}` lines from S3
+and, once finished, writes `<input file>.out` with one
+`{"recordId", "modelInput", "modelOutput" | "error"}` line per record under
+`<output prefix>/<job id>/`. Batch jobs are billed at the batch rate and run
+asynchronously, typically within hours.
+
+`LocalBatchClient` is a stand-in with the same interface that runs every
+record through a runtime client (`invoke_model`). It is used in tests and
+with the simulated provider (`MODE=fake`).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from typing import Any, Protocol
+from urllib.parse import urlparse
+
+try:  # pragma: no cover - dependency may be unavailable in test environments
+    import boto3
+    from botocore.exceptions import BotoCoreError, ClientError
+except ImportError:  # pragma: no cover - boto3 not installed
+    boto3 = None  # type: ignore[assignment]
+    BotoCoreError = ClientError = Exception  # type: ignore[misc]
+
+logger = logging.getLogger(__name__)
+
+# Statuses reported by GetModelInvocationJob.
+PROVIDER_STATUS_COMPLETED = "Completed"
+PROVIDER_STATUS_PARTIALLY_COMPLETED = "PartiallyCompleted"
+PROVIDER_FINISHED_STATUSES = frozenset({PROVIDER_STATUS_COMPLETED, PROVIDER_STATUS_PARTIALLY_COMPLETED})
+PROVIDER_FAILED_STATUSES = frozenset({"Failed", "Stopped", "Expired"})
+
+
+class BedrockBatchError(RuntimeError):
+    """Raised when a batch job cannot be submitted, inspected or read back."""
+
+
+@dataclass(frozen=True)
+class BatchJobState:
+    status: str
+    message: str | None = None
+
+
+@dataclass(frozen=True)
+class BatchRecordOutput:
+    record_id: str
+    model_output: dict[str, Any] | None
+    error: str | None = None
+
+
+class BatchClientProtocol(Protocol):
+    def submit(self, *, job_name: str, model_id: str, records: Sequence[dict[str, Any]]) -> str:
+        ...
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        ...
+
+    def read_outputs(self, job_id: str) -> Iterator[BatchRecordOutput]:
+        ...
+
+
+def _split_s3_uri(uri: str) -> tuple[str, str]:
+    parsed = urlparse(uri)
+    if parsed.scheme != "s3" or not parsed.netloc:
+        raise BedrockBatchError(f"Invalid S3 URI: {uri!r}")
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+def _parse_output_line(line: str) -> BatchRecordOutput | None:
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        logger.warning("Skipping undecodable batch output line")
+        return None
+    record_id = entry.get("recordId")
+    if not isinstance(record_id, str):
+        return None
+    error = entry.get("error")
+    if error:
+        message = error.get("errorMessage") if isinstance(error, dict) else str(error)
+        return BatchRecordOutput(record_id=record_id, model_output=None, error=str(message or error))
+    model_output = entry.get("modelOutput")
+    if not isinstance(model_output, dict) or not model_output:
+        return BatchRecordOutput(record_id=record_id, model_output=None, error="empty modelOutput")
+    return BatchRecordOutput(record_id=record_id, model_output=model_output)
+
+
+class BedrockBatchClient:
+    """Submit and read back Bedrock batch inference jobs through S3."""
+
+    def __init__(self, *, region: str, s3_uri: str, role_arn: str) -> None:
+        if boto3 is None:
+            raise BedrockBatchError("boto3 is required to use Bedrock batch inference")
+        self._bucket, prefix = _split_s3_uri(s3_uri)
+        self._prefix = prefix.rstrip("/")
+        self._role_arn = role_arn
+        session = boto3.session.Session()
+        self._bedrock = session.client("bedrock", region_name=region)
+        self._s3 = session.client("s3", region_name=region)
+
+    def _key(self, *parts: str) -> str:
+        return "/".join(part for part in (self._prefix, *parts) if part)
+
+    def submit(self, *, job_name: str, model_id: str, records: Sequence[dict[str, Any]]) -> str:
+        """Upload the records as JSONL and start the job; returns the job ARN."""
+
+        input_key = self._key("input", f"{job_name}.jsonl")
+        body = "\n".join(json.dumps(record, ensure_ascii=False) for record in records).encode("utf-8")
+        try:
+            self._s3.put_object(Bucket=self._bucket, Key=input_key, Body=body)
+            response = self._bedrock.create_model_invocation_job(
+                jobName=job_name,
+                roleArn=self._role_arn,
+                modelId=model_id,
+                inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{self._bucket}/{input_key}"}},
+                outputDataConfig={
+                    "s3OutputDataConfig": {"s3Uri": f"s3://{self._bucket}/{self._key('output')}/"}
+                },
+            )
+        except (BotoCoreError, ClientError) as exc:
+            logger.exception("Bedrock batch submission failed: job_name=%s", job_name)
+            raise BedrockBatchError("Failed to submit Bedrock batch job") from exc
+        return str(response["jobArn"])
+
+    def _describe(self, job_id: str) -> dict[str, Any]:
+        try:
+            return self._bedrock.get_model_invocation_job(jobIdentifier=job_id)
+        except (BotoCoreError, ClientError) as exc:
+            logger.exception("Bedrock batch lookup failed: job=%s", job_id)
+            raise BedrockBatchError("Failed to read Bedrock batch job status") from exc
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        job = self._describe(job_id)
+        return BatchJobState(status=str(job.get("status") or ""), message=job.get("message"))
+
+    def read_outputs(self, job_id: str) -> Iterator[BatchRecordOutput]:
+        job = self._describe(job_id)
+        input_uri = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+        _, input_key = _split_s3_uri(input_uri)
+        bucket, output_prefix = _split_s3_uri(output_uri)
+        output_key = "/".join(
+            part
+            for part in (output_prefix.rstrip("/"), job_id.rsplit("/", 1)[-1], input_key.rsplit("/", 1)[-1] + ".out")
+            if part
+        )
+        try:
+            body = self._s3.get_object(Bucket=bucket, Key=output_key)["Body"]
+            for raw_line in body.iter_lines():
+                line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+                if line.strip():
+                    output = _parse_output_line(line)
+                    if output is not None:
+                        yield output
+        except (BotoCoreError, ClientError) as exc:
+            logger.exception("Bedrock batch output download failed: job=%s", job_id)
+            raise BedrockBatchError("Failed to read Bedrock batch output") from exc
+
+
+class LocalBatchClient:
+    """In-process stand-in for `BedrockBatchClient`.
+
+    Submitted jobs stay `Submitted` until their state is first read; the
+    records then run through `runtime_client.invoke_model` one by one and the
+    job reports `Completed` (or `PartiallyCompleted` if some records failed).
+    """
+
+    def __init__(self, runtime_client: Any) -> None:
+        self._runtime_client = runtime_client
+        self._lock = threading.Lock()
+        self._jobs: dict[str, tuple[str, list[dict[str, Any]]]] = {}
+        self._outputs: dict[str, list[BatchRecordOutput]] = {}
+
+    def submit(self, *, job_name: str, model_id: str, records: Sequence[dict[str, Any]]) -> str:
+        job_id = f"local/{job_name}"
+        with self._lock:
+            self._jobs[job_id] = (model_id, [dict(record) for record in records])
+        return job_id
+
+    def _run(self, job_id: str) -> list[BatchRecordOutput]:
+        with self._lock:
+            outputs = self._outputs.get(job_id)
+            if outputs is not None:
+                return outputs
+            if job_id not in self._jobs:
+                raise BedrockBatchError(f"Unknown batch job: {job_id}")
+            model_id, records = self._jobs[job_id]
+            outputs = []
+            for record in records:
+                try:
+                    model_output = self._runtime_client.invoke_model(model_id, record["modelInput"])
+                except Exception as exc:  # noqa: BLE001 - recorded per record like the real service
+                    outputs.append(BatchRecordOutput(record_id=record["recordId"], model_output=None, error=str(exc)))
+                    continue
+                outputs.append(BatchRecordOutput(record_id=record["recordId"], model_output=model_output))
+            self._outputs[job_id] = outputs
+            return outputs
+
+    def get_state(self, job_id: str) -> BatchJobState:
+        outputs = self._run(job_id)
+        if any(output.error for output in outputs):
+            return BatchJobState(status=PROVIDER_STATUS_PARTIALLY_COMPLETED)
+        return BatchJobState(status=PROVIDER_STATUS_COMPLETED)
+
+    def read_outputs(self, job_id: str) -> Iterator[BatchRecordOutput]:
+        return iter(list(self._run(job_id)))
+
+
+__all__ = [
+    "PROVIDER_FAILED_STATUSES",
+    "PROVIDER_FINISHED_STATUSES",
+    "PROVIDER_STATUS_COMPLETED",
+    "PROVIDER_STATUS_PARTIALLY_COMPLETED",
+    "BatchClientProtocol",
+    "BatchJobState",
+    "BatchRecordOutput",
+    "BedrockBatchClient",
+    "BedrockBatchError",
+    "LocalBatchClient",
+]
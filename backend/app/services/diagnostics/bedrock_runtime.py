@@ -2,8 +2,11 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import time
+from collections.abc import Iterator
 from typing import Any
 
 try:  # pragma: no cover - dependency may be unavailable in test environments
@@ -15,29 +18,74 @@ except ImportError:  # pragma: no cover - boto3 not installed
     Config = None  # type: ignore[assignment]
     BotoCoreError = ClientError = Exception  # type: ignore[misc]
 
+try:  # pragma: no cover - optional native asyncio transport
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session as get_aio_session
+except ImportError:  # pragma: no cover - aiobotocore not installed
+    AioConfig = None  # type: ignore[assignment]
+    get_aio_session = None  # type: ignore[assignment]
+
+from .llm_admission import run_in_llm_pool_to_completion
+from .llm_metrics import observe_provider_error, observe_provider_request, observe_stream
+
 logger = logging.getLogger(__name__)
 
+# Retries are handled by `llm_resilience`; botocore's own would multiply them.
+_SINGLE_ATTEMPT = {"mode": "standard", "total_max_attempts": 1}
+
 
 class BedrockInvocationError(RuntimeError):
     """Raised when the Bedrock runtime returns an error or an invalid payload."""
 
 
 class BedrockRuntimeClient:
-    """Minimal Bedrock runtime client that operates with JSON payloads."""
-
-    def __init__(self, *, region: str, timeout_seconds: int) -> None:
+    """Minimal Bedrock runtime client that operates with JSON payloads.
+
+    Instances are safe to share between threads: the underlying botocore
+    client keeps a connection pool of `max_pool_connections` sockets.
+    """
+
+    def __init__(
+        self,
+        *,
+        region: str,
+        timeout_seconds: int,
+        max_pool_connections: int = 10,
+        tcp_keepalive: bool = False,
+    ) -> None:
         if boto3 is None or Config is None:
             raise BedrockInvocationError("boto3 is required to invoke Amazon Bedrock")
 
         if timeout_seconds <= 0:
             timeout_seconds = 30
 
+        self._region = region
+        self._timeout_seconds = timeout_seconds
+        self._max_pool_connections = max(1, max_pool_connections)
         config = Config(
             region_name=region,
             read_timeout=timeout_seconds,
             connect_timeout=timeout_seconds,
+            max_pool_connections=self._max_pool_connections,
+            tcp_keepalive=tcp_keepalive,
+            retries=_SINGLE_ATTEMPT,
         )
-        self._client = boto3.client("bedrock-runtime", config=config)
+        # A dedicated boto3 Session: the module-level default session is not
+        # safe to build clients from concurrently.
+        self._session = boto3.session.Session()
+        self._client = self._session.client("bedrock-runtime", config=config)
+        self._aio_client: Any = None
+        self._aio_client_context: Any = None
+        self._aio_lock: asyncio.Lock | None = None
+
+    def warm(self) -> None:
+        """Resolve credentials ahead of the first invocation."""
+
+        credentials = self._session.get_credentials()
+        if credentials is None:
+            logger.warning("No AWS credentials resolved for Bedrock runtime client")
+            return
+        credentials.get_frozen_credentials()
 
     def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
         """Invoke a Bedrock model and return the parsed JSON response."""
@@ -47,32 +95,154 @@ class BedrockRuntimeClient:
             raise BedrockInvocationError("Bedrock model identifier must be non-empty")
 
         body = json.dumps(payload, ensure_ascii=False)
+        with observe_provider_request("bedrock", requested_model):
+            try:
+                response = self._client.invoke_model(
+                    modelId=requested_model,
+                    body=body,
+                    contentType="application/json",
+                    accept="application/json",
+                )
+            except (BotoCoreError, ClientError) as exc:
+                logger.exception("Bedrock invocation failed: model=%s", requested_model)
+                raise BedrockInvocationError("Bedrock invocation failed") from exc
+
+            stream = response.get("body")
+            if hasattr(stream, "read"):
+                raw = stream.read()
+            else:
+                raw = stream
+        return _decode_response_body(raw)
+
+    async def ainvoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        """Async variant of `invoke_model`.
+
+        Uses aiobotocore when it is installed so the request is awaited on the
+        event loop; otherwise the blocking call is moved to the LLM thread pool.
+        """
+
+        if get_aio_session is None:
+            return await run_in_llm_pool_to_completion(self.invoke_model, model_id, payload)
+
+        requested_model = (model_id or "").strip()
+        if not requested_model:
+            raise BedrockInvocationError("Bedrock model identifier must be non-empty")
+
+        body = json.dumps(payload, ensure_ascii=False)
+        client = await self._get_aio_client()
+        with observe_provider_request("bedrock", requested_model):
+            try:
+                response = await client.invoke_model(
+                    modelId=requested_model,
+                    body=body,
+                    contentType="application/json",
+                    accept="application/json",
+                )
+                stream = response.get("body")
+                if hasattr(stream, "read"):
+                    raw = await stream.read()
+                else:
+                    raw = stream
+            except (BotoCoreError, ClientError) as exc:
+                logger.exception("Bedrock invocation failed: model=%s", requested_model)
+                raise BedrockInvocationError("Bedrock invocation failed") from exc
+        return _decode_response_body(raw)
+
+    async def _get_aio_client(self) -> Any:
+        # The aiobotocore client owns an aiohttp connector and must be entered
+        # once and then reused; creating one per call would defeat pooling.
+        if self._aio_client is not None:
+            return self._aio_client
+        if self._aio_lock is None:
+            self._aio_lock = asyncio.Lock()
+        async with self._aio_lock:
+            if self._aio_client is None:
+                config = AioConfig(
+                    region_name=self._region,
+                    read_timeout=self._timeout_seconds,
+                    connect_timeout=self._timeout_seconds,
+                    max_pool_connections=self._max_pool_connections,
+                    retries=_SINGLE_ATTEMPT,
+                )
+                context = get_aio_session().create_client("bedrock-runtime", config=config)
+                self._aio_client = await context.__aenter__()
+                self._aio_client_context = context
+        return self._aio_client
+
+    async def aclose(self) -> None:
+        """Close the async transport if it was opened."""
+
+        context, self._aio_client_context = self._aio_client_context, None
+        self._aio_client = None
+        if context is not None:
+            await context.__aexit__(None, None, None)
+
+    def invoke_model_stream(self, model_id: str, payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        """Invoke a Bedrock model with response streaming.
+
+        Returns an iterator over the decoded model events (for Claude these are
+        the Messages API stream events such as `content_block_delta`).
+        """
+
+        requested_model = (model_id or "").strip()
+        if not requested_model:
+            raise BedrockInvocationError("Bedrock model identifier must be non-empty")
+
+        body = json.dumps(payload, ensure_ascii=False)
+        started = time.perf_counter()
         try:
-            response = self._client.invoke_model(
+            response = self._client.invoke_model_with_response_stream(
                 modelId=requested_model,
                 body=body,
                 contentType="application/json",
                 accept="application/json",
             )
         except (BotoCoreError, ClientError) as exc:
-            logger.exception("Bedrock invocation failed: model=%s", requested_model)
+            logger.exception("Bedrock stream invocation failed: model=%s", requested_model)
+            observe_provider_error("bedrock", requested_model, started)
             raise BedrockInvocationError("Bedrock invocation failed") from exc
 
         stream = response.get("body")
-        if hasattr(stream, "read"):
-            raw = stream.read()
-        else:
-            raw = stream
-        if isinstance(raw, bytes):
-            raw = raw.decode("utf-8")
-
-        if not raw:
-            raise BedrockInvocationError("Bedrock returned an empty response body")
-
-        try:
-            return json.loads(raw)
-        except json.JSONDecodeError as exc:
-            raise BedrockInvocationError("Failed to decode Bedrock response body") from exc
+        if stream is None:
+            observe_provider_error("bedrock", requested_model, started)
+            raise BedrockInvocationError("Bedrock returned an empty response stream")
+        return observe_stream("bedrock", requested_model, _iter_stream_events(requested_model, stream), started)
+
+
+def _decode_response_body(raw: Any) -> dict[str, Any]:
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+
+    if not raw:
+        raise BedrockInvocationError("Bedrock returned an empty response body")
+
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise BedrockInvocationError("Failed to decode Bedrock response body") from exc
+
+
+def _iter_stream_events(model_id: str, stream: Any) -> Iterator[dict[str, Any]]:
+    try:
+        for event in stream:
+            chunk = event.get("chunk")
+            if chunk is None:
+                error_keys = [key for key in event if key.endswith("Exception")]
+                if error_keys:
+                    raise BedrockInvocationError(f"Bedrock stream error: {error_keys[0]}")
+                continue
+            raw = chunk.get("bytes")
+            if isinstance(raw, bytes):
+                raw = raw.decode("utf-8")
+            if not raw:
+                continue
+            try:
+                yield json.loads(raw)
+            except json.JSONDecodeError as exc:
+                raise BedrockInvocationError("Failed to decode Bedrock stream chunk") from exc
+    except (BotoCoreError, ClientError) as exc:
+        logger.exception("Bedrock stream interrupted: model=%s", model_id)
+        raise BedrockInvocationError("Bedrock stream interrupted") from exc
 
 
 __all__ = ["BedrockInvocationError", "BedrockRuntimeClient"]
@@ -0,0 +1,383 @@
+"""Simulated LLM provider for offline load tests.
+
+Selected with `MODE=fake` (speaks the Bedrock / Claude protocol) or
+`MODE=fake_gemini` (speaks the Gemini protocol). The client never leaves the
+process: every request sleeps for a latency drawn from a log-normal
+distribution and then either fails, throttles or returns a ranking document
+shaped like a real model answer. The behaviour is tuned through the
+`fake_llm_*` settings so that the whole diagnosis flow can be load-tested
+against a local database without spending provider quota.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from app.core.config import settings
+
+from .bedrock_runtime import BedrockInvocationError
+from .gemini_runtime import GeminiInvocationError
+from .llm_metrics import observe_provider_error, observe_provider_request, observe_stream
+
+FAKE_MODES: dict[str, str] = {"fake": "bedrock", "fake_gemini": "gemini"}
+
+_STREAM_CHUNKS = 8
+_RANKING_SIZE = 3
+
+
+def fake_protocol_for_mode(mode: str | None) -> str | None:
+    """Return the protocol simulated for `mode`, or None for a real provider."""
+
+    return FAKE_MODES.get((mode or "").strip().lower())
+
+
+class FakeProviderError(RuntimeError):
+    """Error raised inside the simulated provider.
+
+    Carries a botocore-style `response` so that the resilience layer
+    classifies throttles (and their `Retry-After` hint) exactly as it does for
+    the real SDKs.
+    """
+
+    def __init__(self, code: str, status: int, *, retry_after: float | None = None) -> None:
+        super().__init__(code)
+        headers = {"retry-after": f"{retry_after:g}"} if retry_after is not None else {}
+        self.response = {
+            "Error": {"Code": code},
+            "ResponseMetadata": {"HTTPStatusCode": status, "HTTPHeaders": headers},
+        }
+
+
+@dataclass(frozen=True)
+class FakeLlmProfile:
+    """Latency and failure behaviour of the simulated provider."""
+
+    latency_median_ms: float = 1500.0
+    latency_sigma: float = 0.5
+    first_token_ratio: float = 0.2
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    throttle_retry_after_seconds: float = 1.0
+    max_concurrency: int = 0
+    output_chars: int = 1200
+
+    @classmethod
+    def from_settings(cls) -> "FakeLlmProfile":
+        return cls(
+            latency_median_ms=float(settings.fake_llm_latency_median_ms),
+            latency_sigma=float(settings.fake_llm_latency_sigma),
+            first_token_ratio=float(settings.fake_llm_first_token_ratio),
+            error_rate=float(settings.fake_llm_error_rate),
+            throttle_rate=float(settings.fake_llm_throttle_rate),
+            throttle_retry_after_seconds=float(settings.fake_llm_throttle_retry_after_seconds),
+            max_concurrency=int(settings.fake_llm_max_concurrency or 0),
+            output_chars=int(settings.fake_llm_output_chars),
+        )
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _ranking_text(seed_text: str, output_chars: int) -> str:
+    """Build a ranking document in the format the result parser expects."""
+
+    digest = hashlib.sha256(seed_text.encode("utf-8")).digest()
+    reason_length = max(10, output_chars // (_RANKING_SIZE * 3))
+    reason = ("simulated reason " * (reason_length // 17 + 1))[:reason_length].strip()
+    ranking: dict[str, Any] = {}
+    for rank in range(1, _RANKING_SIZE + 1):
+        score = 95 - rank * 10 + digest[rank] % 10
+        ranking[str(rank)] = {
+            "name": f"Simulated outcome {digest[rank] % 20 + 1}",
+            "total_match": {"score": score, "reason": reason},
+            "personality_match": {"score": score - 3, "reason": reason},
+            "work_match": {"score": score - 5, "reason": reason},
+        }
+    return "```json\n" + json.dumps(ranking, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _split_text(text: str, chunks: int) -> list[str]:
+    size = max(1, math.ceil(len(text) / chunks))
+    return [text[index : index + size] for index in range(0, len(text), size)]
+
+
+class FakeLlmClient:
+    """In-process stand-in for `BedrockRuntimeClient` / `GeminiRuntimeClient`.
+
+    Implements the methods of both runtime clients; `protocol` decides the
+    response shape, the error type and the provider label of its metrics.
+    """
+
+    def __init__(
+        self,
+        protocol: str,
+        *,
+        profile: FakeLlmProfile | None = None,
+        seed: int | None = None,
+    ) -> None:
+        if protocol not in FAKE_MODES.values():
+            raise ValueError(f"Unknown fake LLM protocol: {protocol}")
+        self.protocol = protocol
+        self.profile = profile or FakeLlmProfile.from_settings()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    # -- simulation -----------------------------------------------------------------
+
+    def _error_type(self) -> type[RuntimeError]:
+        return GeminiInvocationError if self.protocol == "gemini" else BedrockInvocationError
+
+    def _sample_latency(self) -> float:
+        median = max(0.0, self.profile.latency_median_ms) / 1000.0
+        if median == 0.0:
+            return 0.0
+        with self._lock:
+            return self._random.lognormvariate(math.log(median), max(0.0, self.profile.latency_sigma))
+
+    def _sample_failure(self) -> FakeProviderError | None:
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.profile.throttle_rate:
+            return self._throttle()
+        if roll < self.profile.throttle_rate + self.profile.error_rate:
+            return FakeProviderError("InternalServerException", 500)
+        return None
+
+    def _throttle(self) -> FakeProviderError:
+        code = "RESOURCE_EXHAUSTED" if self.protocol == "gemini" else "ThrottlingException"
+        return FakeProviderError(code, 429, retry_after=self.profile.throttle_retry_after_seconds)
+
+    @contextmanager
+    def _slot(self) -> Iterator[None]:
+        """Count in-flight requests, throttling those above `max_concurrency`."""
+
+        with self._lock:
+            limit = self.profile.max_concurrency
+            if limit > 0 and self._in_flight >= limit:
+                raise self._error_type()("Simulated provider throttled the request") from self._throttle()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _raise_failure(self, failure: FakeProviderError) -> None:
+        raise self._error_type()("Simulated provider invocation failed") from failure
+
+    # -- response shapes ------------------------------------------------------------
+
+    def _bedrock_message(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        prompt = json.dumps(payload, ensure_ascii=False)
+        text = _ranking_text(prompt, self.profile.output_chars)
+        return {
+            "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+            "type": "message",
+            "role": "assistant",
+            "model": model_id,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": _estimate_tokens(prompt), "output_tokens": _estimate_tokens(text)},
+        }
+
+    def _gemini_response(self, model: str, system_instruction: str, user_payload: str) -> dict[str, Any]:
+        text = _ranking_text(system_instruction + user_payload, self.profile.output_chars)
+        return {
+            "text": text,
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finish_reason": "STOP"}],
+            "usage_metadata": {
+                "prompt_token_count": _estimate_tokens(system_instruction + user_payload),
+                "candidates_token_count": _estimate_tokens(text),
+            },
+            "model_version": model,
+        }
+
+    def _bedrock_events(self, message: dict[str, Any]) -> list[dict[str, Any]]:
+        text = message["content"][0]["text"]
+        start = {key: value for key, value in message.items() if key not in {"content", "stop_reason", "usage"}}
+        start["content"] = []
+        start["usage"] = {"input_tokens": message["usage"]["input_tokens"], "output_tokens": 1}
+        events: list[dict[str, Any]] = [
+            {"type": "message_start", "message": start},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        ]
+        events.extend(
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}
+            for chunk in _split_text(text, _STREAM_CHUNKS)
+        )
+        events.append({"type": "content_block_stop", "index": 0})
+        events.append(
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            }
+        )
+        events.append({"type": "message_stop"})
+        return events
+
+    def _gemini_chunks(self, response: dict[str, Any]) -> list[dict[str, Any]]:
+        chunks = _split_text(response["text"], _STREAM_CHUNKS)
+        events: list[dict[str, Any]] = []
+        for position, chunk in enumerate(chunks):
+            last = position == len(chunks) - 1
+            event: dict[str, Any] = {
+                "text": chunk,
+                "candidates": [
+                    {
+                        "content": {"role": "model", "parts": [{"text": chunk}]},
+                        "finish_reason": "STOP" if last else None,
+                    }
+                ],
+            }
+            if last:
+                event["usage_metadata"] = response["usage_metadata"]
+                event["model_version"] = response["model_version"]
+            events.append(event)
+        return events
+
+    # -- request lifecycle ----------------------------------------------------------
+
+    def _respond(self, build: Any) -> dict[str, Any]:
+        with self._slot():
+            time.sleep(self._sample_latency())
+            failure = self._sample_failure()
+            if failure is not None:
+                self._raise_failure(failure)
+            return build()
+
+    async def _arespond(self, build: Any) -> dict[str, Any]:
+        with self._slot():
+            await asyncio.sleep(self._sample_latency())
+            failure = self._sample_failure()
+            if failure is not None:
+                self._raise_failure(failure)
+            return build()
+
+    def _stream(self, events: list[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        with self._slot():
+            latency = self._sample_latency()
+            first_token = latency * min(1.0, max(0.0, self.profile.first_token_ratio))
+            gap = (latency - first_token) / max(1, len(events) - 1)
+            time.sleep(first_token)
+            failure = self._sample_failure()
+            for position, event in enumerate(events):
+                if failure is not None and position == len(events) // 2:
+                    # Fail mid-stream, after part of the answer was relayed.
+                    self._raise_failure(failure)
+                if position:
+                    time.sleep(gap)
+                yield event
+
+    # -- Bedrock protocol -----------------------------------------------------------
+
+    def warm(self) -> None:
+        """Nothing to resolve ahead of the first request."""
+
+    def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        with observe_provider_request(self.protocol, model_id):
+            return self._respond(lambda: self._bedrock_message(model_id, payload))
+
+    async def ainvoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        with observe_provider_request(self.protocol, model_id):
+            return await self._arespond(lambda: self._bedrock_message(model_id, payload))
+
+    def invoke_model_stream(self, model_id: str, payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        started = time.perf_counter()
+        events = self._bedrock_events(self._bedrock_message(model_id, payload))
+        return observe_stream(self.protocol, model_id, self._stream(events), started)
+
+    # -- Gemini protocol ------------------------------------------------------------
+
+    def generate_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> dict[str, Any]:
+        with observe_provider_request(self.protocol, model):
+            return self._respond(lambda: self._gemini_response(model, system_instruction, user_payload))
+
+    async def agenerate_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> dict[str, Any]:
+        with observe_provider_request(self.protocol, model):
+            return await self._arespond(lambda: self._gemini_response(model, system_instruction, user_payload))
+
+    def generate_content_stream(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            events = self._gemini_chunks(self._gemini_response(model, system_instruction, user_payload))
+        except Exception:
+            observe_provider_error(self.protocol, model, started)
+            raise
+        return observe_stream(self.protocol, model, self._stream(events), started)
+
+
+_FAKE_CLIENTS: dict[str, FakeLlmClient] = {}
+_FAKE_LOCK = threading.Lock()
+
+
+def get_fake_llm_client(protocol: str) -> FakeLlmClient:
+    """Return the process-wide simulated client for `protocol`."""
+
+    client = _FAKE_CLIENTS.get(protocol)
+    if client is None:
+        with _FAKE_LOCK:
+            client = _FAKE_CLIENTS.get(protocol)
+            if client is None:
+                client = FakeLlmClient(protocol, seed=settings.fake_llm_seed)
+                _FAKE_CLIENTS[protocol] = client
+    return client
+
+
+def reset_fake_llm_clients() -> None:
+    """Drop simulated clients so the next call picks up changed settings."""
+
+    with _FAKE_LOCK:
+        _FAKE_CLIENTS.clear()
+
+
+__all__ = [
+    "FAKE_MODES",
+    "FakeLlmClient",
+    "FakeLlmProfile",
+    "FakeProviderError",
+    "fake_protocol_for_mode",
+    "get_fake_llm_client",
+    "reset_fake_llm_clients",
+]
@@ -0,0 +1,107 @@
+"""In-process LRU cache of serialized form payloads.
+
+A finalized version never changes once `src_hash` is set, so the JSON body of
+`GET /diagnostics/versions/{version_id}/form` can be built once per process
+and replayed as bytes. Entries are only served for the `src_hash` they were
+built from (which doubles as the ETag): the caller reads the version's current
+hash, a single-column primary-key lookup, so a version id that now names other
+content (for example after a database restore) is rebuilt rather than served
+stale. Warm requests skip loading the version graph and Pydantic.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CachedForm:
+    version_id: int
+    src_hash: str
+    body: bytes
+
+
+class FormPayloadCache:
+    """LRU keyed by `(version_id, src_hash)`, bounded by entry count and total body bytes (0 disables a bound).
+
+    One entry is kept per version; a put for a new hash replaces the old one.
+    """
+
+    def __init__(self, *, max_entries: int, max_bytes: int) -> None:
+        self._max_entries = max(0, max_entries)
+        self._max_bytes = max(0, max_bytes)
+        self._entries: OrderedDict[int, CachedForm] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def get(self, version_id: int, src_hash: str) -> CachedForm | None:
+        with self._lock:
+            entry = self._entries.get(version_id)
+            if entry is None or entry.src_hash != src_hash:
+                return None
+            self._entries.move_to_end(version_id)
+            return entry
+
+    def put(self, version_id: int, src_hash: str, body: bytes) -> CachedForm:
+        entry = CachedForm(version_id=version_id, src_hash=src_hash, body=body)
+        if not self.enabled or (self._max_bytes and len(body) > self._max_bytes):
+            return entry
+        with self._lock:
+            previous = self._entries.pop(version_id, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+            self._entries[version_id] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self._max_entries or (self._max_bytes and self._bytes > self._max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_CACHE: FormPayloadCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_form_cache() -> FormPayloadCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = FormPayloadCache(
+                    max_entries=int(settings.form_cache_max_entries or 0),
+                    max_bytes=int(settings.form_cache_max_bytes or 0),
+                )
+    return _CACHE
+
+
+def reset_form_cache() -> None:
+    """Drop cached payloads and re-read the bounds from settings (used by tests)."""
+
+    global _CACHE
+    with _CACHE_LOCK:
+        _CACHE = None
+
+
+__all__ = [
+    "CachedForm",
+    "FormPayloadCache",
+    "get_form_cache",
+    "reset_form_cache",
+]
@@ -47,6 +47,25 @@ def load_finalized_version(
     return version
 
 
+def load_version_src_hash(db: Session, *, version_id: int) -> str:
+    """Return `src_hash` of a finalized version without loading its structure."""
+
+    row = db.execute(
+        select(DiagnosticVersion.src_hash).where(DiagnosticVersion.id == version_id)
+    ).one_or_none()
+    if row is None:
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND,
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    if row.src_hash is None:
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_VERSION_FROZEN,
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+    return row.src_hash
+
+
 def sorted_questions(version: DiagnosticVersion) -> list[VersionQuestion]:
     return sorted(
         version.version_questions,
@@ -83,6 +102,7 @@ def ensure_option_buckets(
 
 __all__ = [
     "load_finalized_version",
+    "load_version_src_hash",
     "sorted_questions",
     "sorted_options",
     "sorted_outcomes",
@@ -4,8 +4,13 @@ from __future__ import annotations
 
 import json
 import logging
+import time
+from collections.abc import Iterator
+from datetime import datetime
 from typing import Any
 
+from .llm_metrics import observe_provider_error, observe_provider_request, observe_stream
+
 logger = logging.getLogger(__name__)
 
 try:  # pragma: no cover - dependency may be unavailable in some environments
@@ -20,6 +25,24 @@ class GeminiInvocationError(RuntimeError):
     """Raised when the Gemini runtime returns an error or an invalid payload."""
 
 
+class GeminiCachedContentError(GeminiInvocationError):
+    """Raised when the referenced `cached_content` is missing, expired or invalid."""
+
+
+def _is_cached_content_error(exc: Exception) -> bool:
+    """Whether an SDK error rejects the request's `cached_content` handle."""
+
+    code = getattr(exc, "code", None)
+    message = str(getattr(exc, "message", None) or exc).lower()
+    return code in (400, 403, 404) and "cache" in message
+
+
+def _invocation_error(exc: Exception, message: str, *, cached_content: str | None) -> GeminiInvocationError:
+    if cached_content and _is_cached_content_error(exc):
+        return GeminiCachedContentError("Gemini cached content is unavailable")
+    return GeminiInvocationError(message)
+
+
 def _serialise_response(response: Any) -> dict[str, Any]:
     if response is None:
         raise GeminiInvocationError("Gemini returned an empty payload")
@@ -72,7 +95,7 @@ class GeminiRuntimeClient:
 
         self._client = genai.Client(api_key=api_key)
 
-    def generate_content(
+    def _build_request(
         self,
         *,
         model: str,
@@ -80,13 +103,17 @@ class GeminiRuntimeClient:
         user_payload: str,
         temperature: float | None,
         top_p: float | None,
+        cached_content: str | None = None,
     ) -> dict[str, Any]:
         requested_model = (model or "").strip()
         if not requested_model:
             raise GeminiInvocationError("Gemini model identifier must be non-empty")
 
         config_kwargs: dict[str, Any] = {}
-        if system_instruction:
+        if cached_content:
+            # The cached content already carries the system instruction.
+            config_kwargs["cached_content"] = cached_content
+        elif system_instruction:
             config_kwargs["system_instruction"] = system_instruction
         if temperature is not None:
             config_kwargs["temperature"] = float(temperature)
@@ -105,14 +132,145 @@ class GeminiRuntimeClient:
         }
         if config is not None:
             request["config"] = config
+        return request
+
+    def generate_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> dict[str, Any]:
+        request = self._build_request(
+            model=model,
+            system_instruction=system_instruction,
+            user_payload=user_payload,
+            temperature=temperature,
+            top_p=top_p,
+            cached_content=cached_content,
+        )
 
         try:
-            response = self._client.models.generate_content(**request)
+            with observe_provider_request("gemini", request["model"]):
+                response = self._client.models.generate_content(**request)
         except Exception as exc:  # pragma: no cover - broad catch for robustness
-            logger.exception("Gemini invocation failed: model=%s", requested_model)
-            raise GeminiInvocationError("Gemini invocation failed") from exc
+            logger.exception("Gemini invocation failed: model=%s", request["model"])
+            raise _invocation_error(exc, "Gemini invocation failed", cached_content=cached_content) from exc
 
         return _serialise_response(response)
 
+    def create_cached_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        display_name: str,
+    ) -> tuple[str, datetime | None]:
+        """Create a context cache holding the system instruction.
+
+        Returns the cache resource name and its expiry time.
+        """
+
+        if types is None:
+            raise GeminiInvocationError("Failed to load google.genai types module")
+        config = types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            ttl=f"{int(ttl_seconds)}s",
+            display_name=display_name,
+        )
+        try:
+            cached = self._client.caches.create(model=model, config=config)
+        except Exception as exc:  # pragma: no cover - broad catch for robustness
+            raise GeminiInvocationError("Gemini context cache creation failed") from exc
+        if not getattr(cached, "name", None):
+            raise GeminiInvocationError("Gemini returned a context cache without a name")
+        return cached.name, getattr(cached, "expire_time", None)
+
+    async def agenerate_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> dict[str, Any]:
+        """Async variant of `generate_content` using the SDK's `aio` client."""
+
+        request = self._build_request(
+            model=model,
+            system_instruction=system_instruction,
+            user_payload=user_payload,
+            temperature=temperature,
+            top_p=top_p,
+            cached_content=cached_content,
+        )
+
+        try:
+            with observe_provider_request("gemini", request["model"]):
+                response = await self._client.aio.models.generate_content(**request)
+        except Exception as exc:  # pragma: no cover - broad catch for robustness
+            logger.exception("Gemini invocation failed: model=%s", request["model"])
+            raise _invocation_error(exc, "Gemini invocation failed", cached_content=cached_content) from exc
+
+        return _serialise_response(response)
+
+    def generate_content_stream(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        user_payload: str,
+        temperature: float | None,
+        top_p: float | None,
+        cached_content: str | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """Stream a Gemini generation, yielding one serialised dict per chunk.
+
+        Each chunk carries the incremental `text` alongside the SDK payload.
+        """
+
+        request = self._build_request(
+            model=model,
+            system_instruction=system_instruction,
+            user_payload=user_payload,
+            temperature=temperature,
+            top_p=top_p,
+            cached_content=cached_content,
+        )
+
+        started = time.perf_counter()
+        try:
+            stream = self._client.models.generate_content_stream(**request)
+        except Exception as exc:  # pragma: no cover - broad catch for robustness
+            logger.exception("Gemini stream invocation failed: model=%s", request["model"])
+            observe_provider_error("gemini", request["model"], started)
+            raise _invocation_error(exc, "Gemini invocation failed", cached_content=cached_content) from exc
+
+        chunks = _iter_stream_chunks(request["model"], stream, cached_content=cached_content)
+        return observe_stream("gemini", request["model"], chunks, started)
+
+
+def _iter_stream_chunks(model: str, stream: Any, *, cached_content: str | None = None) -> Iterator[dict[str, Any]]:
+    try:
+        for chunk in stream:
+            data = _serialise_response(chunk)
+            if "text" not in data:
+                try:
+                    data["text"] = getattr(chunk, "text", None)
+                except ValueError:  # pragma: no cover - non-text parts
+                    data["text"] = None
+            yield data
+    except GeminiInvocationError:
+        raise
+    except Exception as exc:  # pragma: no cover - broad catch for robustness
+        logger.exception("Gemini stream interrupted: model=%s", model)
+        raise _invocation_error(exc, "Gemini stream interrupted", cached_content=cached_content) from exc
+
 
-__all__ = ["GeminiInvocationError", "GeminiRuntimeClient"]
+__all__ = ["GeminiCachedContentError", "GeminiInvocationError", "GeminiRuntimeClient"]
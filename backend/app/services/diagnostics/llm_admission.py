@@ -0,0 +1,348 @@
+"""Admission control for the session LLM endpoints.
+
+A session LLM call holds its request open for seconds. Left alone, a burst of
+them occupies the shared anyio threadpool that every synchronous endpoint
+(form, session reads, answers) runs on. This module keeps that work apart:
+
+* a bounded thread pool reserved for the blocking parts of LLM calls (the
+  ORM phases around the provider round-trip and streaming relays);
+* a cap on in-flight LLM requests per diagnostic (its queue depth) and for
+  the whole process.
+
+Requests above a cap are shed immediately instead of queueing: 429
+`E052_LLM_QUEUE_FULL` when one diagnostic has too many calls in flight, 503
+`E053_LLM_SERVER_BUSY` when the process is saturated. Both carry a
+`Retry-After` header.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import raise_app_error
+from app.core.metrics import registry
+from app.models.diagnostic import DiagnosticSession
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ADMISSION_ADMITTED = "admitted"
+ADMISSION_QUEUE_FULL = "queue_full"  # the diagnostic's in-flight cap was reached
+ADMISSION_BUSY = "busy"  # the process-wide in-flight cap was reached
+
+ADMISSIONS = registry.counter(
+    "llm_admission_total",
+    "Session LLM requests by admission outcome (admitted, queue_full, busy).",
+    ("outcome",),
+)
+
+_SESSION_CACHE_SIZE = 4096
+
+_POOL: ThreadPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_llm_thread_pool() -> ThreadPoolExecutor:
+    """Return the process-wide thread pool reserved for LLM work."""
+
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(
+                    max_workers=max(1, int(settings.llm_thread_pool_max_workers or 1)),
+                    thread_name_prefix="llm",
+                )
+    return _POOL
+
+
+def shutdown_llm_thread_pool(*, wait: bool = False) -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+async def run_in_llm_pool(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable on the LLM thread pool (`asyncio.to_thread` semantics)."""
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_llm_thread_pool(), call)
+
+
+async def run_in_llm_pool_to_completion(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Like `run_in_llm_pool`, but a cancelled caller resumes only once the call returns.
+
+    A pool thread cannot be interrupted, so the cancellation is re-raised
+    after the call has finished; whatever guards it (such as a provider
+    concurrency slot) stays held for as long as the call really runs.
+    """
+
+    future = asyncio.ensure_future(run_in_llm_pool(func, *args, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        if not future.cancelled():
+            future.exception()  # the outcome is discarded; mark it retrieved
+        raise
+
+
+def iterate_in_llm_pool(
+    iterator: Iterator[T],
+    *,
+    on_close: Callable[[], None] | None = None,
+) -> AsyncIterator[T]:
+    """Drive a blocking iterator from the LLM thread pool.
+
+    When the consumer stops early (for example a client disconnect) the
+    iterator is closed on the pool as soon as any pending `next` returns.
+    `on_close` runs exactly once afterwards, even if the consumer never
+    started iterating.
+    """
+
+    lock = threading.Lock()
+    closed = threading.Event()
+    exhausted = object()
+
+    def advance() -> Any:
+        with lock:
+            return next(iterator, exhausted)
+
+    def finish() -> None:
+        if closed.is_set():
+            return
+        closed.set()
+        if on_close is not None:
+            on_close()
+
+    def close() -> None:
+        try:
+            with lock:
+                close_iterator = getattr(iterator, "close", None)
+                if close_iterator is not None:
+                    close_iterator()
+        except Exception:  # pragma: no cover - logged for operators
+            logger.exception("Failed to close LLM iterator")
+        finally:
+            finish()
+
+    async def relay() -> AsyncIterator[T]:
+        try:
+            while True:
+                item = await run_in_llm_pool(advance)
+                if item is exhausted:
+                    break
+                yield item
+        finally:
+            # Not awaited: a cancelled consumer cannot await anything here.
+            get_llm_thread_pool().submit(close)
+
+    generator = relay()
+    weakref.finalize(generator, finish)
+    return generator
+
+
+class AdmissionTicket:
+    """One admitted request; `release` is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", diagnostic_id: int | None) -> None:
+        self._controller = controller
+        self.diagnostic_id = diagnostic_id
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self.diagnostic_id)
+
+
+class AdmissionController:
+    """Counts in-flight LLM requests and sheds those above the configured caps."""
+
+    def __init__(self, *, max_in_flight: int, max_per_diagnostic: int, retry_after_seconds: int) -> None:
+        self.max_in_flight = max(0, max_in_flight)
+        self.max_per_diagnostic = max(0, max_per_diagnostic)
+        self.retry_after_seconds = max(1, retry_after_seconds)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._per_diagnostic: dict[int, int] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def in_flight_for(self, diagnostic_id: int) -> int:
+        return self._per_diagnostic.get(diagnostic_id, 0)
+
+    def _reject(self, error_code: ErrorCode, outcome: str, diagnostic_id: int | None) -> None:
+        ADMISSIONS.inc(outcome=outcome)
+        logger.warning(
+            "LLM request shed: outcome=%s diagnostic_id=%s in_flight=%s",
+            outcome,
+            diagnostic_id,
+            self._in_flight,
+        )
+        raise_app_error(error_code, headers={"Retry-After": str(self.retry_after_seconds)})
+
+    def check_capacity(self) -> None:
+        """Raise `E053` when the process is saturated; needs no session lookup."""
+
+        with self._lock:
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self._reject(ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY, ADMISSION_BUSY, None)
+
+    def admit(self, diagnostic_id: int | None) -> AdmissionTicket:
+        """Reserve an in-flight slot or raise `E052` / `E053`."""
+
+        with self._lock:
+            if diagnostic_id is not None and self.max_per_diagnostic:
+                if self._per_diagnostic.get(diagnostic_id, 0) >= self.max_per_diagnostic:
+                    self._reject(ErrorCode.DIAGNOSTICS_LLM_QUEUE_FULL, ADMISSION_QUEUE_FULL, diagnostic_id)
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self._reject(ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY, ADMISSION_BUSY, diagnostic_id)
+            self._in_flight += 1
+            if diagnostic_id is not None:
+                self._per_diagnostic[diagnostic_id] = self._per_diagnostic.get(diagnostic_id, 0) + 1
+        ADMISSIONS.inc(outcome=ADMISSION_ADMITTED)
+        return AdmissionTicket(self, diagnostic_id)
+
+    def _release(self, diagnostic_id: int | None) -> None:
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if diagnostic_id is None:
+                return
+            remaining = self._per_diagnostic.get(diagnostic_id, 0) - 1
+            if remaining > 0:
+                self._per_diagnostic[diagnostic_id] = remaining
+            else:
+                self._per_diagnostic.pop(diagnostic_id, None)
+
+
+_CONTROLLER: AdmissionController | None = None
+_CONTROLLER_LOCK = threading.Lock()
+
+# Sessions never move to another diagnostic, so the lookup is cached for good.
+_SESSION_DIAGNOSTICS: OrderedDict[str, int] = OrderedDict()
+_SESSION_DIAGNOSTICS_LOCK = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        with _CONTROLLER_LOCK:
+            if _CONTROLLER is None:
+                _CONTROLLER = AdmissionController(
+                    max_in_flight=int(settings.llm_admission_max_in_flight or 0),
+                    max_per_diagnostic=int(settings.llm_admission_max_per_diagnostic or 0),
+                    retry_after_seconds=int(settings.llm_admission_retry_after_seconds or 1),
+                )
+    return _CONTROLLER
+
+
+def reset_llm_admission() -> None:
+    """Drop admission state and cached lookups (used by tests and after config changes)."""
+
+    global _CONTROLLER
+    with _CONTROLLER_LOCK:
+        _CONTROLLER = None
+    with _SESSION_DIAGNOSTICS_LOCK:
+        _SESSION_DIAGNOSTICS.clear()
+
+
+def cached_session_diagnostic(session_code: str) -> int | None:
+    """Return the cached diagnostic of a session without touching the database."""
+
+    with _SESSION_DIAGNOSTICS_LOCK:
+        diagnostic_id = _SESSION_DIAGNOSTICS.get(session_code)
+        if diagnostic_id is not None:
+            _SESSION_DIAGNOSTICS.move_to_end(session_code)
+        return diagnostic_id
+
+
+def lookup_session_diagnostic(db: Session, session_code: str) -> int | None:
+    """Return the diagnostic a session belongs to, or None if the session is unknown."""
+
+    diagnostic_id = cached_session_diagnostic(session_code)
+    if diagnostic_id is not None:
+        return diagnostic_id
+
+    diagnostic_id = db.execute(
+        select(DiagnosticSession.diagnostic_id).where(DiagnosticSession.session_code == session_code)
+    ).scalar_one_or_none()
+    if diagnostic_id is None:
+        return None
+    with _SESSION_DIAGNOSTICS_LOCK:
+        _SESSION_DIAGNOSTICS[session_code] = int(diagnostic_id)
+        while len(_SESSION_DIAGNOSTICS) > _SESSION_CACHE_SIZE:
+            _SESSION_DIAGNOSTICS.popitem(last=False)
+    return int(diagnostic_id)
+
+
+def admit_llm_request(db: Session, session_code: str) -> AdmissionTicket:
+    """Admit a session LLM request, keyed by the session's diagnostic.
+
+    Unknown sessions are admitted under the global cap only; the call itself
+    then fails with `E040_SESSION_NOT_FOUND`.
+    """
+
+    controller = get_admission_controller()
+    controller.check_capacity()
+    diagnostic_id = lookup_session_diagnostic(db, session_code)
+    return controller.admit(diagnostic_id)
+
+
+async def aadmit_llm_request(db: Session, session_code: str) -> AdmissionTicket:
+    """Awaitable `admit_llm_request` for the async endpoints.
+
+    The process-wide cap is checked first, so a saturated process sheds
+    requests without any database work. A session missing from the lookup
+    cache is resolved on the LLM thread pool rather than the shared one.
+    """
+
+    controller = get_admission_controller()
+    controller.check_capacity()
+    diagnostic_id = cached_session_diagnostic(session_code)
+    if diagnostic_id is None:
+        diagnostic_id = await run_in_llm_pool(lookup_session_diagnostic, db, session_code)
+    return controller.admit(diagnostic_id)
+
+
+__all__ = [
+    "ADMISSIONS",
+    "ADMISSION_ADMITTED",
+    "ADMISSION_BUSY",
+    "ADMISSION_QUEUE_FULL",
+    "AdmissionController",
+    "AdmissionTicket",
+    "aadmit_llm_request",
+    "admit_llm_request",
+    "cached_session_diagnostic",
+    "get_admission_controller",
+    "get_llm_thread_pool",
+    "iterate_in_llm_pool",
+    "lookup_session_diagnostic",
+    "reset_llm_admission",
+    "run_in_llm_pool",
+    "run_in_llm_pool_to_completion",
+    "shutdown_llm_thread_pool",
+]
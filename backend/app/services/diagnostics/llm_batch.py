@@ -0,0 +1,402 @@
+"""Bulk regeneration of LLM results through Bedrock batch inference.
+
+When a new version is published, none of the known answer combinations has a
+result under it yet. Instead of regenerating them one on-demand request at a
+time, this module:
+
+1. collects the distinct answer combinations of the diagnostic's history,
+   mapped onto the target version (`llm_pregeneration.plan_version_combinations`),
+   and keeps the ones without a stored result;
+2. submits them as one Bedrock batch-inference job, tracked in
+   `llm_batch_jobs`;
+3. polls the job until the provider reports it finished;
+4. bulk-loads the outputs into `llm_results` under the same keys a plain
+   `/llm` call uses, so later sessions are cache hits.
+
+Batch jobs run at batch pricing and take minutes to hours, so polling is
+driven by `scripts/llm_batch_regenerate.py` (cron) rather than a request
+thread; the admin status endpoint only reads the recorded state.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import raise_app_error
+from app.db.session import SessionLocal
+from app.models.diagnostic import DiagnosticVersion, LlmBatchJob, VersionOption, utcnow
+
+from . import llm_executor
+from .bedrock_batch import (
+    PROVIDER_FAILED_STATUSES,
+    PROVIDER_FINISHED_STATUSES,
+    BatchClientProtocol,
+    BedrockBatchClient,
+    BedrockBatchError,
+    LocalBatchClient,
+)
+from .fake_llm import fake_protocol_for_mode
+from .llm_jobs import generate_job_code
+from .llm_pregeneration import plan_version_combinations
+
+logger = logging.getLogger(__name__)
+
+BATCH_STATUS_PENDING = "pending"  # recorded, not yet accepted by the provider
+BATCH_STATUS_SUBMITTED = "submitted"
+BATCH_STATUS_COMPLETED = "completed"
+BATCH_STATUS_FAILED = "failed"
+ACTIVE_BATCH_STATUSES = (BATCH_STATUS_PENDING, BATCH_STATUS_SUBMITTED)
+
+_BATCH_CLIENT_FACTORY: Callable[[], BatchClientProtocol] | None = None
+_LOCAL_CLIENT: LocalBatchClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def create_batch_client() -> BatchClientProtocol:
+    """Return the batch client for the configured mode.
+
+    The simulated provider (`MODE=fake`) gets a process-wide local stand-in;
+    otherwise S3 location and service role must be configured.
+    """
+
+    global _LOCAL_CLIENT
+    if _BATCH_CLIENT_FACTORY is not None:
+        return _BATCH_CLIENT_FACTORY()
+    if fake_protocol_for_mode(getattr(settings, "mode", None)) is not None:
+        with _CLIENT_LOCK:
+            if _LOCAL_CLIENT is None:
+                _LOCAL_CLIENT = LocalBatchClient(llm_executor.create_bedrock_client())
+            return _LOCAL_CLIENT
+    if not settings.llm_batch_s3_uri or not settings.llm_batch_role_arn:
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE,
+            detail="LLM_BATCH_S3_URI と LLM_BATCH_ROLE_ARN を設定してください",
+        )
+    try:
+        return BedrockBatchClient(
+            region=settings.bedrock_region or "ap-northeast-1",
+            s3_uri=settings.llm_batch_s3_uri,
+            role_arn=settings.llm_batch_role_arn,
+        )
+    except BedrockBatchError as exc:
+        raise_app_error(ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE, detail=str(exc))
+
+
+def set_batch_client_factory(factory: Callable[[], BatchClientProtocol] | None) -> None:
+    """Override the batch client factory (used by tests)."""
+
+    global _BATCH_CLIENT_FACTORY, _LOCAL_CLIENT
+    _BATCH_CLIENT_FACTORY = factory
+    _LOCAL_CLIENT = None
+
+
+def _record_id(index: int) -> str:
+    # Bedrock record ids are 11 alphanumeric characters.
+    return f"R{index:010d}"
+
+
+def _record_index(record_id: str) -> int | None:
+    if len(record_id) != 11 or not record_id.startswith("R") or not record_id[1:].isdigit():
+        return None
+    return int(record_id[1:])
+
+
+def _provider_job_id(job: LlmBatchJob) -> str:
+    return job.provider_job_id or ""
+
+
+def get_batch_job(db: Session, *, job_code: str, version_id: int | None = None) -> LlmBatchJob:
+    stmt = select(LlmBatchJob).where(LlmBatchJob.job_code == job_code)
+    if version_id is not None:
+        stmt = stmt.where(LlmBatchJob.version_id == version_id)
+    job = db.execute(stmt).scalar_one_or_none()
+    if job is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_LLM_BATCH_JOB_NOT_FOUND)
+    return job
+
+
+def submit_batch_regeneration(
+    db: Session,
+    *,
+    version_id: int,
+    limit: int | None = None,
+    client: BatchClientProtocol | None = None,
+) -> LlmBatchJob:
+    """Submit the uncached answer combinations of a version as one batch job.
+
+    The job row is committed as `pending` before the provider is called, while
+    the version row is locked, so concurrent submissions for the same version
+    cannot both start a (billed) provider job. It is committed again once the
+    provider has accepted it, or as `failed` when the submission is rejected.
+    """
+
+    version = db.execute(
+        select(DiagnosticVersion).where(DiagnosticVersion.id == version_id).with_for_update()
+    ).scalar_one_or_none()
+    if version is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND)
+    if version.src_hash is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_FROZEN)
+    active = db.scalar(
+        select(LlmBatchJob.job_code).where(
+            LlmBatchJob.version_id == version_id,
+            LlmBatchJob.status.in_(ACTIVE_BATCH_STATUSES),
+        )
+    )
+    if active is not None:
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE,
+            detail=f"この版のバッチジョブ {active} が実行中です",
+        )
+
+    plan = plan_version_combinations(
+        db,
+        version=version,
+        limit=limit or int(settings.llm_batch_max_records or 1),
+        history_sessions=int(settings.llm_batch_history_sessions or 1),
+    )
+    missing = plan.missing
+    min_records = max(1, int(settings.llm_batch_min_records or 1))
+    if len(missing) < min_records:
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE,
+            detail=(
+                f"未生成の組み合わせが {len(missing)} 件で、バッチ推論の最小件数 {min_records} 件に満たないため"
+                " llm-pregeneration を利用してください"
+            ),
+        )
+
+    model_id = ""
+    records: list[dict[str, Any]] = []
+    for index, candidate in enumerate(missing):
+        _, model_id, model_input = llm_executor.build_batch_request(
+            version,
+            option_ids=list(candidate.version_option_ids),
+            llm_ops=list(candidate.llm_ops),
+        )
+        records.append({"recordId": _record_id(index), "modelInput": model_input})
+
+    if client is None:
+        client = create_batch_client()
+    job = LlmBatchJob(
+        job_code=generate_job_code(),
+        version_id=version.id,
+        status=BATCH_STATUS_PENDING,
+        model=model_id,
+        records=[list(candidate.version_option_ids) for candidate in missing],
+        record_count=len(records),
+    )
+    db.add(job)
+    # Releases the version lock; the pending row now blocks other submissions.
+    db.commit()
+
+    try:
+        provider_job_id = client.submit(
+            job_name=f"diagnostics-v{version_id}-{job.job_code.lower()}",
+            model_id=model_id,
+            records=records,
+        )
+    except BedrockBatchError as exc:
+        job.status = BATCH_STATUS_FAILED
+        job.error_detail = str(exc)
+        job.finished_at = utcnow()
+        db.commit()
+        raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(exc))
+
+    job.status = BATCH_STATUS_SUBMITTED
+    job.provider_status = "Submitted"
+    job.provider_job_id = provider_job_id
+    job.submitted_at = utcnow()
+    try:
+        db.commit()
+    except Exception:
+        # The provider job exists but is not tracked; its name carries the job code.
+        db.rollback()
+        logger.exception(
+            "LLM batch job submitted but not recorded: job=%s provider_job=%s",
+            job.job_code,
+            provider_job_id,
+        )
+        raise
+    logger.info(
+        "LLM batch job submitted: job=%s version_id=%s records=%s provider_job=%s",
+        job.job_code,
+        version_id,
+        len(records),
+        provider_job_id,
+    )
+    return job
+
+
+def _load_outputs(db: Session, job: LlmBatchJob, client: BatchClientProtocol) -> None:
+    version = db.get(DiagnosticVersion, job.version_id)
+    if version is None:  # pragma: no cover - versions are never deleted
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND)
+    llm_ops = dict(
+        db.execute(select(VersionOption.id, VersionOption.llm_op).where(VersionOption.version_id == job.version_id)).all()
+    )
+
+    results: list[tuple[list[int], list[Any], Any]] = []
+    failed = 0
+    for output in client.read_outputs(_provider_job_id(job)):
+        index = _record_index(output.record_id)
+        if index is None or index >= len(job.records):
+            continue
+        option_ids = [int(option_id) for option_id in job.records[index]]
+        ops = [llm_ops.get(option_id) for option_id in option_ids]
+        if output.error or output.model_output is None or any(op is None for op in ops):
+            failed += 1
+            logger.warning(
+                "LLM batch record failed: job=%s record=%s error=%s",
+                job.job_code,
+                output.record_id,
+                output.error or "option changed",
+            )
+            continue
+        results.append((option_ids, ops, output.model_output))
+
+    loaded = llm_executor.store_batch_results(db, version=version, results=results)
+    job.loaded_count = loaded
+    # Records without an output line count as failed as well.
+    job.failed_count = max(failed, job.record_count - loaded)
+    job.status = BATCH_STATUS_COMPLETED
+    job.finished_at = utcnow()
+
+
+def poll_batch_job(
+    db: Session,
+    job: LlmBatchJob,
+    *,
+    client: BatchClientProtocol | None = None,
+) -> LlmBatchJob:
+    """Refresh a submitted job and load its outputs once it has finished.
+
+    The job row is locked (`SKIP LOCKED`) until the caller commits, so a job
+    being polled elsewhere (another cron run, `--wait`) is left alone rather
+    than loaded twice. Transient lookup errors leave the job untouched.
+    """
+
+    claimed = db.execute(
+        select(LlmBatchJob.id)
+        .where(LlmBatchJob.id == job.id, LlmBatchJob.status == BATCH_STATUS_SUBMITTED)
+        .with_for_update(skip_locked=True)
+    ).scalar_one_or_none()
+    if claimed is None:
+        return job
+    db.refresh(job)
+    if client is None:
+        client = create_batch_client()
+    try:
+        state = client.get_state(_provider_job_id(job))
+    except BedrockBatchError:
+        logger.warning("LLM batch job status unavailable: job=%s", job.job_code)
+        return job
+
+    job.provider_status = state.status
+    if state.status in PROVIDER_FAILED_STATUSES:
+        job.status = BATCH_STATUS_FAILED
+        job.error_detail = state.message
+        job.finished_at = utcnow()
+    elif state.status in PROVIDER_FINISHED_STATUSES:
+        try:
+            _load_outputs(db, job, client)
+        except BedrockBatchError:
+            logger.warning("LLM batch job output unavailable: job=%s", job.job_code)
+            return job
+        logger.info(
+            "LLM batch job loaded: job=%s version_id=%s loaded=%s failed=%s",
+            job.job_code,
+            job.version_id,
+            job.loaded_count,
+            job.failed_count,
+        )
+    db.flush()
+    return job
+
+
+def poll_submitted_batch_jobs(
+    *,
+    session_factory: Callable[[], Session] = SessionLocal,
+    client: BatchClientProtocol | None = None,
+) -> list[LlmBatchJob]:
+    """Poll every submitted job once, committing each separately."""
+
+    db = session_factory()
+    try:
+        job_ids = list(
+            db.scalars(
+                select(LlmBatchJob.id).where(LlmBatchJob.status == BATCH_STATUS_SUBMITTED).order_by(LlmBatchJob.id)
+            )
+        )
+        jobs: list[LlmBatchJob] = []
+        for job_id in job_ids:
+            job = db.get(LlmBatchJob, job_id)
+            if job is None:  # pragma: no cover - deleted concurrently
+                continue
+            try:
+                poll_batch_job(db, job, client=client)
+                db.commit()
+                db.refresh(job)
+                db.expunge(job)
+            except Exception:
+                db.rollback()
+                logger.exception("LLM batch job poll failed: job=%s", job.job_code)
+                continue
+            jobs.append(job)
+        return jobs
+    finally:
+        db.close()
+
+
+def wait_for_batch_job(
+    job_code: str,
+    *,
+    interval_seconds: float | None = None,
+    timeout_seconds: float | None = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+    client: BatchClientProtocol | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> LlmBatchJob:
+    """Poll a job until it leaves `submitted` (or `timeout_seconds` elapses)."""
+
+    interval = float(interval_seconds if interval_seconds is not None else settings.llm_batch_poll_interval_seconds)
+    deadline = None if timeout_seconds is None else time.monotonic() + timeout_seconds
+    while True:
+        db = session_factory()
+        try:
+            job = poll_batch_job(db, get_batch_job(db, job_code=job_code), client=client)
+            db.commit()
+            db.refresh(job)
+            db.expunge(job)
+        finally:
+            db.close()
+        if job.status != BATCH_STATUS_SUBMITTED:
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return job
+        sleep(max(0.0, interval))
+
+
+__all__ = [
+    "ACTIVE_BATCH_STATUSES",
+    "BATCH_STATUS_COMPLETED",
+    "BATCH_STATUS_FAILED",
+    "BATCH_STATUS_PENDING",
+    "BATCH_STATUS_SUBMITTED",
+    "create_batch_client",
+    "get_batch_job",
+    "poll_batch_job",
+    "poll_submitted_batch_jobs",
+    "set_batch_client_factory",
+    "submit_batch_regeneration",
+    "wait_for_batch_job",
+]
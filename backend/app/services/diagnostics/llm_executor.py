@@ -2,24 +2,73 @@
 
 from __future__ import annotations
 
-import copy
 import json
 import logging
-from collections.abc import Callable
+import threading
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
 from typing import Any, Protocol, cast
 
 from sqlalchemy import Select, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session, joinedload
 
 from app.core.config import settings
 from app.core.errors import ErrorCode
-from app.core.exceptions import raise_app_error
-from app.core.registry import compute_version_options_hash
-from app.models.diagnostic import AnswerChoice, DiagnosticSession, DiagnosticVersion, VersionOption
-
+from app.core.exceptions import BaseAppException, raise_app_error
+from app.core.registry import compute_llm_result_key, compute_version_options_hash
+from app.db.session import SessionLocal
+from app.models.diagnostic import (
+    AnswerChoice,
+    DiagnosticSession,
+    DiagnosticVersion,
+    LlmResult,
+    VersionOption,
+)
+
+from .answer_recorder import FinalAnswers, record_final_answers
+from .answer_vector import unpack_answer_ids
 from .bedrock_runtime import BedrockInvocationError, BedrockRuntimeClient
-from .gemini_runtime import GeminiInvocationError, GeminiRuntimeClient
+from .fake_llm import fake_protocol_for_mode, get_fake_llm_client, reset_fake_llm_clients
+from .gemini_runtime import GeminiCachedContentError, GeminiInvocationError, GeminiRuntimeClient
+from .llm_admission import run_in_llm_pool, run_in_llm_pool_to_completion
+from .llm_metrics import (
+    RESULT_BYPASS,
+    RESULT_INFLIGHT_HIT,
+    RESULT_MISS,
+    RESULT_SESSION_HIT,
+    RESULT_SHARED_HIT,
+    extract_token_usage,
+    record_call,
+    record_token_usage,
+)
+from .llm_prompt_cache import (
+    bedrock_system_blocks,
+    gemini_context_caches,
+    prompt_cache_enabled,
+    record_prompt_cache_usage,
+    summarize_prompt_cache,
+)
+from .llm_ranking import build_ranking, load_outcome_names, ranking_is_complete, ranking_items
+from .llm_result_format import RESULT_FORMAT_VERSION, compact_raw, document_raw, encode_raw
+from .llm_resilience import (
+    acall_with_resilience,
+    call_with_resilience,
+    next_retry_delay,
+    provider_guard,
+)
+from .llm_routing import (
+    HedgeTarget,
+    get_hedge_target,
+    hedge_delay_seconds,
+    latency_tracker,
+    race_with_hedge,
+)
+from .llm_singleflight import LlmFlightLock, aacquire_flight_lock, acquire_flight_lock
+from .option_index import get_version_option_index
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +78,10 @@ DEFAULT_MAX_TOKENS = 5000
 _BEDROCK_FACTORY: Callable[[], "BedrockClientProtocol"] | None = None
 _GEMINI_FACTORY: Callable[[], "GeminiRuntimeClient"] | None = None
 
+_CLIENT_LOCK = threading.Lock()
+_BEDROCK_CLIENTS: dict[tuple[str, int, int, bool], BedrockRuntimeClient] = {}
+_GEMINI_CLIENTS: dict[str, GeminiRuntimeClient] = {}
+
 
 def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
@@ -38,16 +91,43 @@ class BedrockClientProtocol(Protocol):
     def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
         ...
 
+    def invoke_model_stream(self, model_id: str, payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        ...
+
+
+def create_bedrock_client(region: str | None = None) -> BedrockClientProtocol:
+    """Return the process-wide Bedrock runtime client for the configured defaults.
 
-def create_bedrock_client() -> BedrockClientProtocol:
-    """Instantiate a Bedrock runtime client using configured defaults."""
+    Clients are built once per distinct configuration and shared across
+    threads, so credential resolution, endpoint setup and pooled TLS
+    connections are reused between requests. `region` overrides
+    `settings.bedrock_region` (used for hedged calls to a secondary region).
+    """
 
     if _BEDROCK_FACTORY is not None:
         return _BEDROCK_FACTORY()
+    if _fake_llm_protocol() is not None:
+        return get_fake_llm_client("bedrock")
 
-    region = settings.bedrock_region or "ap-northeast-1"
+    region = region or settings.bedrock_region or "ap-northeast-1"
     timeout = int(settings.bedrock_request_timeout_seconds or 30)
-    return BedrockRuntimeClient(region=region, timeout_seconds=timeout)
+    max_pool_connections = int(getattr(settings, "bedrock_max_pool_connections", 10) or 10)
+    tcp_keepalive = bool(getattr(settings, "bedrock_tcp_keepalive", False))
+    key = (region, timeout, max_pool_connections, tcp_keepalive)
+
+    client = _BEDROCK_CLIENTS.get(key)
+    if client is None:
+        with _CLIENT_LOCK:
+            client = _BEDROCK_CLIENTS.get(key)
+            if client is None:
+                client = BedrockRuntimeClient(
+                    region=region,
+                    timeout_seconds=timeout,
+                    max_pool_connections=max_pool_connections,
+                    tcp_keepalive=tcp_keepalive,
+                )
+                _BEDROCK_CLIENTS[key] = client
+    return client
 
 
 def set_bedrock_client_factory(factory: Callable[[], BedrockClientProtocol] | None) -> None:
@@ -58,13 +138,22 @@ def set_bedrock_client_factory(factory: Callable[[], BedrockClientProtocol] | No
 
 
 def create_gemini_client() -> GeminiRuntimeClient:
-    """Instantiate a Gemini runtime client using configured defaults."""
+    """Return the process-wide Gemini runtime client for the configured API key."""
 
     if _GEMINI_FACTORY is not None:
         return _GEMINI_FACTORY()
+    if _fake_llm_protocol() is not None:
+        return cast(GeminiRuntimeClient, get_fake_llm_client("gemini"))
 
     api_key = settings.gemini_api_key or ""
-    return GeminiRuntimeClient(api_key=api_key)
+    client = _GEMINI_CLIENTS.get(api_key)
+    if client is None:
+        with _CLIENT_LOCK:
+            client = _GEMINI_CLIENTS.get(api_key)
+            if client is None:
+                client = GeminiRuntimeClient(api_key=api_key)
+                _GEMINI_CLIENTS[api_key] = client
+    return client
 
 
 def set_gemini_client_factory(factory: Callable[[], GeminiRuntimeClient] | None) -> None:
@@ -74,9 +163,34 @@ def set_gemini_client_factory(factory: Callable[[], GeminiRuntimeClient] | None)
     _GEMINI_FACTORY = factory
 
 
+def reset_llm_clients() -> None:
+    """Drop cached provider clients so the next call rebuilds them."""
+
+    with _CLIENT_LOCK:
+        _BEDROCK_CLIENTS.clear()
+        _GEMINI_CLIENTS.clear()
+    reset_fake_llm_clients()
+
+
+def warm_llm_clients() -> None:
+    """Build the client for the active provider ahead of the first request."""
+
+    if _current_llm_provider() == "gemini":
+        create_gemini_client()
+        return
+    client = create_bedrock_client()
+    warm = getattr(client, "warm", None)
+    if callable(warm):
+        warm()
+
+
+def _fake_llm_protocol() -> str | None:
+    return fake_protocol_for_mode(getattr(settings, "mode", None))
+
+
 def _current_llm_provider() -> str:
     mode_value = (getattr(settings, "mode", None) or "").strip().lower()
-    if mode_value == "gemini":
+    if mode_value == "gemini" or _fake_llm_protocol() == "gemini":
         return "gemini"
     return "bedrock"
 
@@ -110,7 +224,45 @@ def _load_answer_payload(db: Session, session_id: int) -> tuple[list[int], list[
         .where(AnswerChoice.session_id == session_id)
         .order_by(AnswerChoice.id)
     )
-    rows = db.execute(stmt).all()
+    return _split_answer_payload(db.execute(stmt).all())
+
+
+def _load_session_answers(
+    db: Session, session: DiagnosticSession, *, src_hash: str
+) -> tuple[list[int], list[Any]]:
+    """Answers of a session on a finalized version, from its answer vector when it is known."""
+
+    if session.answer_ids is None:
+        return _load_answer_payload(db, session.id)
+    option_ids = unpack_answer_ids(session.answer_ids)
+    index = get_version_option_index(db, version_id=session.version_id, src_hash=src_hash)
+    if not index.contains_all(option_ids):  # pragma: no cover - vector out of step with answer_choices
+        return _load_answer_payload(db, session.id)
+    return _split_answer_payload([(option_id, index.llm_ops[option_id]) for option_id in option_ids])
+
+
+def _stored_result_answers(
+    db: Session, document: dict[str, Any], *, version_id: int, src_hash: str
+) -> tuple[list[int], list[Any]] | None:
+    """Answers a stored result was generated from, or None when it does not record them.
+
+    Read from the version's option index, so a cache hit can echo its prompt
+    without touching the session's answers.
+    """
+
+    option_ids = document.get("option_ids")
+    prompt = document.get("prompt")
+    if not option_ids or not isinstance(option_ids, list) or not isinstance(prompt, dict):
+        return None
+    if prompt.get("src_hash") != src_hash:
+        return None
+    index = get_version_option_index(db, version_id=version_id, src_hash=src_hash)
+    if not index.contains_all(option_ids):
+        return None
+    return _split_answer_payload([(option_id, index.llm_ops[option_id]) for option_id in option_ids])
+
+
+def _split_answer_payload(rows: Sequence[tuple[int, Any]]) -> tuple[list[int], list[Any]]:
     if not rows:
         raise_app_error(ErrorCode.DIAGNOSTICS_NO_ANSWERS)
 
@@ -188,13 +340,13 @@ def _build_bedrock_payload(
     user_payload: str,
     temperature: float | None,
     top_p: float | None,
+    cache_system_prompt: bool = False,
 ) -> dict[str, Any]:
     payload: dict[str, Any] = {
         "anthropic_version": ANTHROPIC_VERSION,
-        # Bedrock inference profiles expect the Claude `system` field as a raw string.
-        # Single string works for both the legacy and the Messages APIs, so we avoid
-        # the richer block structure here for compatibility.
-        "system": system_prompt,
+        # A raw string works for both the legacy and the Messages APIs; the block
+        # form is only used when the prompt carries a cache breakpoint.
+        "system": bedrock_system_blocks(system_prompt) if cache_system_prompt else system_prompt,
         "messages": [
             {"role": "user", "content": [{"type": "text", "text": user_payload}]},
         ],
@@ -228,38 +380,17 @@ def _select_invocation_model_id(requested_model: str) -> str:
     return normalized
 
 
-def call_session_llm(
-    db: Session,
+def _resolve_model_and_sampling(
     *,
-    session_code: str,
     model_id: str | None,
     temperature: float | None,
     top_p: float | None,
-    force_regenerate: bool,
-    bedrock_client: BedrockClientProtocol | None = None,
-    gemini_client: GeminiRuntimeClient | None = None,
-    now_provider: Callable[[], datetime] = _now_utc,
-    max_attempts: int = 2,
-) -> dict[str, Any]:
-    """Execute or reuse an LLM result for the given session."""
-
-    session = _load_session(db, session_code)
-    version = cast(DiagnosticVersion, session.version)
-
-    if version.src_hash is None:
-        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_FROZEN)
-
-    system_prompt = (version.system_prompt or "").strip()
-    if not system_prompt:
-        raise_app_error(ErrorCode.DIAGNOSTICS_SYSTEM_PROMPT_MISSING)
+) -> tuple[str, str, str, float | None, float | None]:
+    """Resolve provider, model identifiers and sampling values for an invocation.
 
-    option_ids, llm_ops = _load_answer_payload(db, session.id)
-    current_hash = compute_version_options_hash(version.id, option_ids)
-
-    if session.version_options_hash != current_hash:
-        session.version_options_hash = current_hash
+    Returns `(provider, effective_model, invocation_model_id, temperature, top_p)`.
+    """
 
-    messages, user_payload = _build_response_messages(system_prompt, llm_ops)
     provider = _current_llm_provider()
 
     if provider == "gemini":
@@ -302,128 +433,1226 @@ def call_session_llm(
             top_p_was_provided=top_p_specified,
         )
 
+    return provider, effective_model, invocation_model_id, effective_temperature, effective_top_p
+
+
+@dataclass
+class _PreparedInvocation:
+    """Everything resolved from the session before talking to a provider.
+
+    `session` is None for invocations that are not tied to a user session
+    (result pre-generation).
+    """
+
+    session: DiagnosticSession | None
+    session_id: int
+    session_code: str
+    version_id: int
+    provider: str
+    effective_model: str
+    invocation_model_id: str
+    temperature: float | None
+    top_p: float | None
+    system_prompt: str
+    user_payload: str
+    messages: list[dict[str, str]]
+    current_hash: str
+    option_ids: list[int]
+    result_key: str
+    cached_result: dict[str, Any] | None
+    cached_result_id: str | None = None
+    src_hash: str | None = None
+    # Metrics: how a reused result was found, and the usage of a fresh one.
+    cache_source: str | None = None
+    token_usage: dict[str, int] | None = None
+
+
+def _load_stored_result(executor: Session | Connection, result_key: str) -> dict[str, Any] | None:
+    stmt = select(LlmResult.document).where(LlmResult.id == result_key)
+    return executor.execute(stmt).scalar_one_or_none()
+
+
+def _prepare_invocation(
+    db: Session,
+    *,
+    session_code: str,
+    model_id: str | None,
+    temperature: float | None,
+    top_p: float | None,
+    force_regenerate: bool,
+    final_answers: FinalAnswers | None = None,
+) -> _PreparedInvocation:
+    session = _load_session(db, session_code)
+    version = cast(DiagnosticVersion, session.version)
+
+    # Answers sent along with the evaluation request are recorded first, in the same transaction.
+    if final_answers is not None:
+        record_final_answers(
+            db,
+            session=session,
+            src_hash=version.src_hash,
+            version_option_ids=final_answers.version_option_ids,
+            answered_at=final_answers.answered_at,
+        )
+
+    if version.src_hash is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_FROZEN)
+
+    system_prompt = (version.system_prompt or "").strip()
+    if not system_prompt:
+        raise_app_error(ErrorCode.DIAGNOSTICS_SYSTEM_PROMPT_MISSING)
+
+    # Every submission folds its answers into the stored hash, so the result
+    # cache is keyed without looking at the answers themselves.
+    current_hash = session.version_options_hash
+    provider, effective_model, invocation_model_id, effective_temperature, effective_top_p = (
+        _resolve_model_and_sampling(model_id=model_id, temperature=temperature, top_p=top_p)
+    )
+
+    result_key = compute_llm_result_key(
+        version_id=version.id,
+        version_options_hash=current_hash,
+        provider=provider,
+        model=effective_model,
+        temperature=effective_temperature,
+        top_p=effective_top_p,
+    )
+
     # Attempt to reuse cached results when force regeneration is not requested.
     cached_result: dict[str, Any] | None = None
+    cached_result_id: str | None = None
+    cache_source: str | None = None
     if not force_regenerate:
-        if session.llm_result:
+        candidate = _load_stored_result(db, result_key)
+        if candidate is not None:
+            cached_result = dict(candidate)
+            cached_result_id = result_key
+            cache_source = RESULT_SESSION_HIT if session.llm_result_id == result_key else RESULT_SHARED_HIT
+        elif session.llm_result:
+            # Legacy inline document written before `llm_results` existed.
             stored_hash = session.llm_result.get("hash") or session.version_options_hash
             if stored_hash == current_hash and _document_provider(session.llm_result) == provider:
-                cached_result = copy.deepcopy(session.llm_result)
-        if cached_result is None:
-            reuse_stmt = (
-                select(DiagnosticSession.llm_result)
-                .where(
-                    DiagnosticSession.version_id == session.version_id,
-                    DiagnosticSession.version_options_hash == current_hash,
-                    DiagnosticSession.llm_result.is_not(None),
-                )
-                .order_by(DiagnosticSession.updated_at.desc())
-                .limit(1)
-            )
-            candidate = db.execute(reuse_stmt).scalar_one_or_none()
-            if candidate is not None and _document_provider(candidate) == provider:
-                cached_result = copy.deepcopy(candidate)
-                session.llm_result = copy.deepcopy(cached_result)
-
-    result_document: dict[str, Any] | None = cached_result
-
-    if result_document is None:
-        attempt = 0
-        last_error: Exception | None = None
-        while attempt < max_attempts:
-            attempt += 1
-            try:
-                if provider == "gemini":
-                    if gemini_client is None:
-                        gemini_client = create_gemini_client()
-                    raw_result = gemini_client.generate_content(
-                        model=invocation_model_id,
-                        system_instruction=system_prompt,
-                        user_payload=user_payload,
-                        temperature=effective_temperature,
-                        top_p=effective_top_p,
-                    )
-                    if not raw_result:
-                        raise GeminiInvocationError("Gemini returned an empty payload")
-                else:
-                    if bedrock_client is None:
-                        bedrock_client = create_bedrock_client()
-                    payload = _build_bedrock_payload(
-                        system_prompt=system_prompt,
-                        user_payload=user_payload,
-                        temperature=effective_temperature,
-                        top_p=effective_top_p,
-                    )
-                    raw_result = bedrock_client.invoke_model(invocation_model_id, payload)
-                    if not raw_result:
-                        raise BedrockInvocationError("Bedrock returned an empty payload")
-                now = now_provider()
-                result_document = {
-                    "provider": provider,
-                    "model": effective_model,
-                    "invoked_model": invocation_model_id,
-                    "generated_at": _isoformat(now),
-                    "temperature": effective_temperature,
-                    "top_p": effective_top_p,
-                    "hash": current_hash,
-                    "option_ids": option_ids,
-                    "messages": messages,
-                    "raw": raw_result,
-                }
-                session.llm_result = copy.deepcopy(result_document)
-                if session.ended_at is None:
-                    session.ended_at = now
-                break
-            except Exception as exc:  # pragma: no cover - broad catch for retry robustness
-                last_error = exc
-                logger.exception(
-                    "%s invocation attempt failed: session_code=%s attempt=%s",
-                    provider,
-                    session_code,
-                    attempt,
-                )
-                if attempt >= max_attempts:
-                    raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(exc))
-        if result_document is None and last_error is not None:
-            raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(last_error))
+                cached_result = dict(session.llm_result)
+                cache_source = RESULT_SESSION_HIT
+
+    # The echoed prompt is the one the stored result was generated from; the
+    # session's own answers are only read on a miss.
+    answers = (
+        _stored_result_answers(db, cached_result, version_id=version.id, src_hash=version.src_hash)
+        if cached_result is not None
+        else None
+    )
+    if answers is None:
+        answers = _load_session_answers(db, session, src_hash=version.src_hash)
+    option_ids, llm_ops = answers
+    messages, user_payload = _build_response_messages(system_prompt, llm_ops)
+
+    return _PreparedInvocation(
+        session=session,
+        session_id=session.id,
+        session_code=session.session_code,
+        version_id=session.version_id,
+        provider=provider,
+        effective_model=effective_model,
+        invocation_model_id=invocation_model_id,
+        temperature=effective_temperature,
+        top_p=effective_top_p,
+        system_prompt=system_prompt,
+        user_payload=user_payload,
+        messages=messages,
+        current_hash=current_hash,
+        option_ids=option_ids,
+        result_key=result_key,
+        cached_result=cached_result,
+        cached_result_id=cached_result_id,
+        src_hash=version.src_hash,
+        cache_source=cache_source,
+    )
+
+
+def _join_flight(db: Session, prepared: _PreparedInvocation) -> LlmFlightLock | None:
+    """Serialise identical invocations across workers.
+
+    Waits for any in-flight call with the same key, then re-checks the shared
+    cache on the lock's connection (a fresh snapshot, unlike `db`). When a
+    result appeared meanwhile it is adopted as the cached result and `None` is
+    returned; otherwise the caller becomes the leader and gets the held lock.
+    """
+
+    if not getattr(settings, "llm_singleflight_enabled", False):
+        return None
+
+    lock = acquire_flight_lock(db, **_flight_lock_key(prepared))
+    return _lead_or_adopt(prepared, lock)
+
+
+async def _ajoin_flight(db: Session, prepared: _PreparedInvocation) -> LlmFlightLock | None:
+    """Async `_join_flight`; the wait for the lock holds no LLM pool thread."""
+
+    if not getattr(settings, "llm_singleflight_enabled", False):
+        return None
+
+    lock = await aacquire_flight_lock(db, **_flight_lock_key(prepared))
+    return await run_in_llm_pool(_lead_or_adopt, prepared, lock)
+
+
+def _flight_lock_key(prepared: _PreparedInvocation) -> dict[str, Any]:
+    return {
+        "version_id": prepared.version_id,
+        "options_hash": prepared.current_hash,
+        "provider": prepared.provider,
+        "timeout_seconds": float(getattr(settings, "llm_singleflight_wait_seconds", 0) or 0),
+    }
+
+
+def _lead_or_adopt(prepared: _PreparedInvocation, lock: LlmFlightLock | None) -> LlmFlightLock | None:
+    if lock is None:
+        return None
+
+    try:
+        candidate = _load_stored_result(lock.connection, prepared.result_key)
+        lock.connection.rollback()
+    except Exception:
+        lock.release()
+        raise
+
+    if candidate is not None:
+        lock.release()
+        logger.info(
+            "Reusing LLM result produced by a concurrent call: session_code=%s",
+            prepared.session_code,
+        )
+        prepared.cached_result = dict(candidate)
+        prepared.cached_result_id = prepared.result_key
+        prepared.cache_source = RESULT_INFLIGHT_HIT
+        return None
+    return lock
+
+
+def _gemini_request(prepared: _PreparedInvocation, gemini_client: Any) -> dict[str, Any]:
+    request: dict[str, Any] = {
+        "model": prepared.invocation_model_id,
+        "system_instruction": prepared.system_prompt,
+        "user_payload": prepared.user_payload,
+        "temperature": prepared.temperature,
+        "top_p": prepared.top_p,
+    }
+    if prompt_cache_enabled():
+        cached_content = gemini_context_caches.resolve(
+            gemini_client,
+            model=prepared.invocation_model_id,
+            src_hash=prepared.src_hash,
+            system_instruction=prepared.system_prompt,
+        )
+        if cached_content:
+            request["cached_content"] = cached_content
+    return request
+
+
+def _without_gemini_cache(prepared: _PreparedInvocation, request: dict[str, Any]) -> dict[str, Any] | None:
+    """Forget a context cache handle the provider rejected and return the request without it.
+
+    The request always carries the full system instruction, so the retry does
+    not depend on the cache. Returns None when the request used no cache.
+    """
+
+    cached_content = request.get("cached_content")
+    if not cached_content:
+        return None
+    gemini_context_caches.invalidate(model=request["model"], src_hash=prepared.src_hash, name=cached_content)
+    logger.warning(
+        "Gemini context cache rejected; retrying with the full prompt: model=%s cached_content=%s",
+        request["model"],
+        cached_content,
+    )
+    return {key: value for key, value in request.items() if key != "cached_content"}
+
+
+def _bedrock_request_payload(prepared: _PreparedInvocation) -> dict[str, Any]:
+    return _build_bedrock_payload(
+        system_prompt=prepared.system_prompt,
+        user_payload=prepared.user_payload,
+        temperature=prepared.temperature,
+        top_p=prepared.top_p,
+        cache_system_prompt=prompt_cache_enabled(),
+    )
+
+
+def _invoke_provider(
+    prepared: _PreparedInvocation,
+    *,
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+) -> Any:
+    if prepared.provider == "gemini":
+        if gemini_client is None:
+            gemini_client = create_gemini_client()
+        request = _gemini_request(prepared, gemini_client)
+        try:
+            raw_result = gemini_client.generate_content(**request)
+        except GeminiCachedContentError:
+            fallback = _without_gemini_cache(prepared, request)
+            if fallback is None:
+                raise
+            raw_result = gemini_client.generate_content(**fallback)
+        if not raw_result:
+            raise GeminiInvocationError("Gemini returned an empty payload")
+        return raw_result
+
+    if bedrock_client is None:
+        bedrock_client = create_bedrock_client()
+    payload = _bedrock_request_payload(prepared)
+    raw_result = bedrock_client.invoke_model(prepared.invocation_model_id, payload)
+    if not raw_result:
+        raise BedrockInvocationError("Bedrock returned an empty payload")
+    return raw_result
+
+
+async def _agenerate_gemini(gemini_client: Any, request: dict[str, Any]) -> Any:
+    agenerate = getattr(gemini_client, "agenerate_content", None)
+    if agenerate is not None:
+        return await agenerate(**request)
+    return await run_in_llm_pool_to_completion(gemini_client.generate_content, **request)
+
+
+async def _ainvoke_provider(
+    prepared: _PreparedInvocation,
+    *,
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+) -> Any:
+    """Awaitable counterpart of `_invoke_provider`.
+
+    Clients without an async method (for example test doubles) are driven from
+    the LLM thread pool instead; a cancelled caller then waits for the thread
+    so the provider slot is not released while the call is still running.
+    """
+
+    if prepared.provider == "gemini":
+        if gemini_client is None:
+            gemini_client = create_gemini_client()
+        # Cache resolution may call the provider once per TTL; keep it off the loop.
+        request = await run_in_llm_pool(_gemini_request, prepared, gemini_client)
+        try:
+            raw_result = await _agenerate_gemini(gemini_client, request)
+        except GeminiCachedContentError:
+            fallback = _without_gemini_cache(prepared, request)
+            if fallback is None:
+                raise
+            raw_result = await _agenerate_gemini(gemini_client, fallback)
+        if not raw_result:
+            raise GeminiInvocationError("Gemini returned an empty payload")
+        return raw_result
+
+    if bedrock_client is None:
+        bedrock_client = create_bedrock_client()
+    payload = _bedrock_request_payload(prepared)
+    ainvoke = getattr(bedrock_client, "ainvoke_model", None)
+    if ainvoke is not None:
+        raw_result = await ainvoke(prepared.invocation_model_id, payload)
     else:
-        cached_now = now_provider()
-        if session.llm_result is None:
-            session.llm_result = copy.deepcopy(result_document)
-        if session.ended_at is None:
-            session.ended_at = cached_now
-        # Ensure cached documents have required metadata
-        result_document.setdefault("provider", provider)
-        result_document.setdefault("model", effective_model)
-        result_document.setdefault("invoked_model", invocation_model_id)
-        result_document.setdefault("generated_at", _isoformat(cached_now))
-        if "messages" not in result_document:
-            result_document["messages"] = messages
-        if "hash" not in result_document:
-            result_document["hash"] = current_hash
-        session.llm_result = copy.deepcopy(result_document)
+        raw_result = await run_in_llm_pool_to_completion(
+            bedrock_client.invoke_model, prepared.invocation_model_id, payload
+        )
+    if not raw_result:
+        raise BedrockInvocationError("Bedrock returned an empty payload")
+    return raw_result
 
-    db.flush()
 
+def _build_result_document(
+    prepared: _PreparedInvocation,
+    raw_result: Any,
+    now: datetime,
+    *,
+    raw_provider: str | None = None,
+    raw_model: str | None = None,
+    record_metrics: bool = True,
+) -> dict[str, Any]:
+    """Build the stored document for a fresh provider response.
+
+    `raw_provider` / `raw_model` name the endpoint that actually answered when
+    it differs from the primary (a hedged call won by the secondary).
+    `record_metrics=False` summarises usage without touching the live token
+    and prompt-cache counters (batch outputs are not live traffic).
+    """
+
+    raw_provider = raw_provider or prepared.provider
+    raw_model = raw_model or prepared.invocation_model_id
+    document: dict[str, Any] = {
+        "format": RESULT_FORMAT_VERSION,
+        "provider": prepared.provider,
+        "model": prepared.effective_model,
+        "invoked_model": prepared.invocation_model_id,
+        "generated_at": _isoformat(now),
+        "temperature": prepared.temperature,
+        "top_p": prepared.top_p,
+        "hash": prepared.current_hash,
+        "option_ids": prepared.option_ids,
+        # The prompt is referenced rather than embedded: the system prompt is
+        # stored on the version and the user payload follows from option_ids.
+        "prompt": {"version_id": prepared.version_id, "src_hash": prepared.src_hash},
+        **encode_raw(compact_raw(raw_provider, raw_result)),
+    }
+    if record_metrics:
+        prepared.token_usage = record_token_usage(raw_provider, raw_model, raw_result)
+        prompt_cache = record_prompt_cache_usage(raw_provider, raw_result)
+    else:
+        prepared.token_usage = extract_token_usage(raw_provider, raw_result)
+        prompt_cache = summarize_prompt_cache(raw_provider, raw_result)
+    if prompt_cache is not None:
+        document["prompt_cache"] = prompt_cache
+    return document
+
+
+def _store_result_document(
+    db: Session,
+    prepared: _PreparedInvocation,
+    session: DiagnosticSession,
+    document: dict[str, Any],
+    now: datetime,
+) -> None:
+    """Upsert the shared `llm_results` row and point the session at it."""
+
+    _upsert_result_document(db, prepared, document, now)
+    session.llm_result_id = prepared.result_key
+    session.llm_result = None
+    if session.ended_at is None:
+        session.ended_at = now
+
+
+def _result_row(prepared: _PreparedInvocation, document: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": prepared.result_key,
+        "version_id": prepared.version_id,
+        "version_options_hash": prepared.current_hash,
+        "provider": prepared.provider,
+        "model": prepared.effective_model,
+        "temperature": prepared.temperature,
+        "top_p": prepared.top_p,
+        "document": document,
+    }
+
+
+def _execute_result_upsert(db: Session, rows: list[dict[str, Any]], now: datetime) -> None:
+    insert_stmt = mysql_insert(LlmResult).values(rows)
+    # A forced regeneration (or a lost race without single-flight) replaces
+    # the shared document so later cache hits see the newest result.
+    db.execute(
+        insert_stmt.on_duplicate_key_update(
+            document=insert_stmt.inserted.document,
+            updated_at=now,
+        )
+    )
+
+
+def _upsert_result_document(
+    db: Session,
+    prepared: _PreparedInvocation,
+    document: dict[str, Any],
+    now: datetime,
+) -> None:
+    # Every fresh result passes through here: parse the ranking once so that
+    # readers get the validated outcomes instead of the provider envelope.
+    document["ranking"] = build_ranking(
+        document_raw(document),
+        load_outcome_names(db, version_id=prepared.version_id),
+    )
+    _execute_result_upsert(db, [_result_row(prepared, document)], now)
+
+
+def _apply_cached_result(prepared: _PreparedInvocation, now_provider: Callable[[], datetime]) -> dict[str, Any]:
+    session = cast(DiagnosticSession, prepared.session)
+    # `cached_result` is a shallow copy of the stored document; only top-level
+    # keys are filled in below.
+    result_document = cast(dict[str, Any], prepared.cached_result)
+    cached_now = now_provider()
+    if prepared.cached_result_id is not None and session.llm_result_id != prepared.cached_result_id:
+        session.llm_result_id = prepared.cached_result_id
+        session.llm_result = None
+    if session.ended_at is None:
+        session.ended_at = cached_now
+    # Ensure cached documents have required metadata
+    result_document.setdefault("provider", prepared.provider)
+    result_document.setdefault("model", prepared.effective_model)
+    result_document.setdefault("invoked_model", prepared.invocation_model_id)
+    result_document.setdefault("generated_at", _isoformat(cached_now))
+    if "hash" not in result_document:
+        result_document["hash"] = prepared.current_hash
+    return result_document
+
+
+def _build_call_response(prepared: _PreparedInvocation, result_document: dict[str, Any]) -> dict[str, Any]:
+    ranking = ranking_items(result_document)
     response_llm_result = {
-        "raw": copy.deepcopy(result_document.get("raw")),
+        # The provider envelope is only dropped when every ranking entry was used.
+        "raw": None if ranking_is_complete(result_document) else document_raw(result_document),
+        "ranking": ranking,
         "generated_at": result_document.get("generated_at"),
     }
 
     return {
-        "session_code": session.session_code,
-        "version_id": session.version_id,
-        "model": result_document.get("model", effective_model),
-        "messages": messages,
+        "session_code": prepared.session_code,
+        "version_id": prepared.version_id,
+        "model": result_document.get("model", prepared.effective_model),
+        "messages": prepared.messages,
         "llm_result": response_llm_result,
     }
 
 
+def _record_session_call(
+    prepared: _PreparedInvocation,
+    result_document: dict[str, Any],
+    *,
+    force_regenerate: bool,
+    started: float,
+) -> None:
+    if prepared.cache_source is not None:
+        result, usage, prompt_cache = prepared.cache_source, None, None
+    else:
+        result = RESULT_BYPASS if force_regenerate else RESULT_MISS
+        usage = prepared.token_usage
+        prompt_cache = (result_document.get("prompt_cache") or {}).get("status")
+    record_call(
+        session_code=prepared.session_code,
+        provider=prepared.provider,
+        model=prepared.effective_model,
+        result=result,
+        seconds=time.monotonic() - started,
+        usage=usage,
+        prompt_cache=prompt_cache,
+    )
+
+
+def call_session_llm(
+    db: Session,
+    *,
+    session_code: str,
+    model_id: str | None,
+    temperature: float | None,
+    top_p: float | None,
+    force_regenerate: bool,
+    bedrock_client: BedrockClientProtocol | None = None,
+    gemini_client: GeminiRuntimeClient | None = None,
+    now_provider: Callable[[], datetime] = _now_utc,
+    max_attempts: int | None = None,
+) -> dict[str, Any]:
+    """Execute or reuse an LLM result for the given session."""
+
+    call_started = time.monotonic()
+    prepared = _prepare_invocation(
+        db,
+        session_code=session_code,
+        model_id=model_id,
+        temperature=temperature,
+        top_p=top_p,
+        force_regenerate=force_regenerate,
+    )
+
+    result_document: dict[str, Any] | None = None
+
+    if prepared.cached_result is None and not force_regenerate:
+        flight_lock = _join_flight(db, prepared)
+        if flight_lock is not None:
+            # Held until the caller commits (or rolls back) the stored result.
+            flight_lock.release_after_transaction(db)
+
+    if prepared.cached_result is None:
+        started = time.monotonic()
+        raw_result = call_with_resilience(
+            lambda: _invoke_provider(
+                prepared,
+                bedrock_client=bedrock_client,
+                gemini_client=gemini_client,
+            ),
+            provider=prepared.provider,
+            model=prepared.invocation_model_id,
+            max_attempts=max_attempts,
+            log_context=f"session_code={session_code}",
+        )
+        latency_tracker.record(prepared.provider, prepared.invocation_model_id, time.monotonic() - started)
+        now = now_provider()
+        result_document = _build_result_document(prepared, raw_result, now)
+        _store_result_document(
+            db, prepared, cast(DiagnosticSession, prepared.session), result_document, now
+        )
+    else:
+        result_document = _apply_cached_result(prepared, now_provider)
+
+    db.flush()
+
+    _record_session_call(prepared, result_document, force_regenerate=force_regenerate, started=call_started)
+    return _build_call_response(prepared, cast(dict[str, Any], result_document))
+
+
+def _hedge_invocation(prepared: _PreparedInvocation, target: HedgeTarget) -> _PreparedInvocation:
+    if target.provider == "gemini":
+        model = target.model or settings.gemini_default_model
+    elif target.model:
+        model = target.model
+    elif prepared.provider == "bedrock":
+        model = prepared.invocation_model_id
+    else:
+        model = settings.bedrock_default_inference_profile or settings.bedrock_default_model
+    return replace(prepared, provider=target.provider, invocation_model_id=model)
+
+
+async def _ainvoke_routed(
+    prepared: _PreparedInvocation,
+    *,
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+    max_attempts: int | None,
+) -> tuple[Any, dict[str, Any] | None]:
+    """Invoke the primary provider, hedging to the configured secondary if enabled.
+
+    Returns the raw provider payload and, in hedged mode, the routing record
+    stored on the result document.
+    """
+
+    log_context = f"session_code={prepared.session_code}"
+
+    async def _primary() -> Any:
+        started = time.monotonic()
+        raw = await acall_with_resilience(
+            lambda: _ainvoke_provider(
+                prepared,
+                bedrock_client=bedrock_client,
+                gemini_client=gemini_client,
+            ),
+            provider=prepared.provider,
+            model=prepared.invocation_model_id,
+            max_attempts=max_attempts,
+            log_context=log_context,
+        )
+        latency_tracker.record(prepared.provider, prepared.invocation_model_id, time.monotonic() - started)
+        return raw
+
+    target = get_hedge_target()
+    if target is None:
+        return await _primary(), None
+
+    hedged = _hedge_invocation(prepared, target)
+    primary_region = settings.bedrock_region if prepared.provider == "bedrock" else None
+    secondary_region = (target.region or settings.bedrock_region) if hedged.provider == "bedrock" else None
+    if (hedged.provider, secondary_region, hedged.invocation_model_id) == (
+        prepared.provider,
+        primary_region,
+        prepared.invocation_model_id,
+    ):
+        # A hedge to the very same endpoint only doubles the load.
+        return await _primary(), None
+
+    async def _secondary() -> Any:
+        return await acall_with_resilience(
+            lambda: _ainvoke_provider(
+                hedged,
+                bedrock_client=create_bedrock_client(target.region) if hedged.provider == "bedrock" else None,
+                gemini_client=gemini_client if hedged.provider == "gemini" else None,
+            ),
+            provider=hedged.provider,
+            model=hedged.invocation_model_id,
+            max_attempts=1,
+            log_context=f"{log_context} hedge=1",
+        )
+
+    delay = hedge_delay_seconds(prepared.provider, prepared.invocation_model_id)
+    raw_result, from_secondary = await race_with_hedge(_primary, _secondary, delay_seconds=delay)
+    winner = hedged if from_secondary else prepared
+    if from_secondary:
+        logger.info(
+            "Hedged LLM call won by secondary: session_code=%s provider=%s model=%s",
+            prepared.session_code,
+            winner.provider,
+            winner.invocation_model_id,
+        )
+    return raw_result, {
+        "mode": "hedged",
+        "hedge_delay_seconds": round(delay, 3),
+        "winner": {
+            "provider": winner.provider,
+            "region": secondary_region if from_secondary else primary_region,
+            "model": winner.invocation_model_id,
+            "secondary": from_secondary,
+        },
+    }
+
+
+def compute_default_result_key(version_id: int, version_options_hash: str) -> str:
+    """Result key that a default `/llm` call (no overrides) would look up."""
+
+    provider, effective_model, _, temperature, top_p = _resolve_model_and_sampling(
+        model_id=None,
+        temperature=None,
+        top_p=None,
+    )
+    return compute_llm_result_key(
+        version_id=version_id,
+        version_options_hash=version_options_hash,
+        provider=provider,
+        model=effective_model,
+        temperature=temperature,
+        top_p=top_p,
+    )
+
+
+def _prepare_combination(
+    version: DiagnosticVersion,
+    *,
+    option_ids: list[int],
+    llm_ops: list[Any],
+    session_code: str,
+) -> _PreparedInvocation:
+    """Build a session-less invocation with the default model and sampling."""
+
+    if version.src_hash is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_FROZEN)
+    system_prompt = (version.system_prompt or "").strip()
+    if not system_prompt:
+        raise_app_error(ErrorCode.DIAGNOSTICS_SYSTEM_PROMPT_MISSING)
+    if not option_ids:
+        raise_app_error(ErrorCode.DIAGNOSTICS_NO_ANSWERS)
+    if any(llm_op is None for llm_op in llm_ops):
+        raise_app_error(ErrorCode.DIAGNOSTICS_LLM_OP_INCOMPLETE)
+
+    current_hash = compute_version_options_hash(version.id, option_ids)
+    messages, user_payload = _build_response_messages(system_prompt, llm_ops)
+    provider, effective_model, invocation_model_id, temperature, top_p = _resolve_model_and_sampling(
+        model_id=None,
+        temperature=None,
+        top_p=None,
+    )
+    result_key = compute_llm_result_key(
+        version_id=version.id,
+        version_options_hash=current_hash,
+        provider=provider,
+        model=effective_model,
+        temperature=temperature,
+        top_p=top_p,
+    )
+    return _PreparedInvocation(
+        session=None,
+        session_id=0,
+        session_code=session_code,
+        version_id=version.id,
+        provider=provider,
+        effective_model=effective_model,
+        invocation_model_id=invocation_model_id,
+        temperature=temperature,
+        top_p=top_p,
+        system_prompt=system_prompt,
+        user_payload=user_payload,
+        messages=messages,
+        current_hash=current_hash,
+        option_ids=list(option_ids),
+        result_key=result_key,
+        cached_result=None,
+        src_hash=version.src_hash,
+    )
+
+
+def pregenerate_llm_result(
+    db: Session,
+    *,
+    version: DiagnosticVersion,
+    option_ids: list[int],
+    llm_ops: list[Any],
+    bedrock_client: BedrockClientProtocol | None = None,
+    gemini_client: GeminiRuntimeClient | None = None,
+    now_provider: Callable[[], datetime] = _now_utc,
+) -> bool:
+    """Generate and store the shared result for an answer combination.
+
+    Uses the same defaults as a plain `/llm` call so that later sessions with
+    this combination hit the cache. No session row is touched. Returns False
+    when a result already existed (or was produced concurrently). The caller
+    commits; the single-flight lock is released with that transaction.
+    """
+
+    prepared = _prepare_combination(version, option_ids=option_ids, llm_ops=llm_ops, session_code="pregen")
+    if _load_stored_result(db, prepared.result_key) is not None:
+        return False
+
+    flight_lock = _join_flight(db, prepared)
+    if prepared.cached_result is not None:
+        return False
+    if flight_lock is not None:
+        flight_lock.release_after_transaction(db)
+
+    raw_result = call_with_resilience(
+        lambda: _invoke_provider(
+            prepared,
+            bedrock_client=bedrock_client,
+            gemini_client=gemini_client,
+        ),
+        provider=prepared.provider,
+        model=prepared.invocation_model_id,
+        log_context=f"pregen version_id={version.id} hash={prepared.current_hash}",
+    )
+    now = now_provider()
+    _upsert_result_document(db, prepared, _build_result_document(prepared, raw_result, now), now)
+    db.flush()
+    return True
+
+
+def build_batch_request(
+    version: DiagnosticVersion,
+    *,
+    option_ids: list[int],
+    llm_ops: list[Any],
+) -> tuple[str, str, dict[str, Any]]:
+    """Return `(result_key, model_id, model_input)` for a Bedrock batch record.
+
+    The request matches what a plain `/llm` call would send, so the stored
+    result is found by later sessions with this combination.
+    """
+
+    prepared = _prepare_combination(version, option_ids=option_ids, llm_ops=llm_ops, session_code="batch")
+    if prepared.provider != "bedrock":
+        raise_app_error(
+            ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE,
+            detail="バッチ推論は Bedrock のみ対応しています",
+        )
+    # Prompt caching does not apply to batch jobs; send the plain system prompt.
+    payload = _build_bedrock_payload(
+        system_prompt=prepared.system_prompt,
+        user_payload=prepared.user_payload,
+        temperature=prepared.temperature,
+        top_p=prepared.top_p,
+        cache_system_prompt=False,
+    )
+    return prepared.result_key, prepared.invocation_model_id, payload
+
+
+def store_batch_results(
+    db: Session,
+    *,
+    version: DiagnosticVersion,
+    results: list[tuple[list[int], list[Any], Any]],
+    now_provider: Callable[[], datetime] = _now_utc,
+    chunk_size: int = 200,
+) -> int:
+    """Bulk-load `(option_ids, llm_ops, raw_result)` batch outputs into `llm_results`.
+
+    Rows are written with multi-row upserts; the caller commits. Returns the
+    number of rows written.
+    """
+
+    if not results:
+        return 0
+    outcome_names = load_outcome_names(db, version_id=version.id)
+    now = now_provider()
+    rows: list[dict[str, Any]] = []
+    for option_ids, llm_ops, raw_result in results:
+        prepared = _prepare_combination(version, option_ids=option_ids, llm_ops=llm_ops, session_code="batch")
+        document = _build_result_document(prepared, raw_result, now, record_metrics=False)
+        document["ranking"] = build_ranking(document_raw(document), outcome_names)
+        rows.append(_result_row(prepared, document))
+    for start in range(0, len(rows), max(1, chunk_size)):
+        _execute_result_upsert(db, rows[start : start + chunk_size], now)
+    db.flush()
+    return len(rows)
+
+
+async def acall_session_llm(
+    db: Session,
+    *,
+    session_code: str,
+    model_id: str | None,
+    temperature: float | None,
+    top_p: float | None,
+    force_regenerate: bool,
+    bedrock_client: BedrockClientProtocol | None = None,
+    gemini_client: GeminiRuntimeClient | None = None,
+    now_provider: Callable[[], datetime] = _now_utc,
+    max_attempts: int | None = None,
+    final_answers: FinalAnswers | None = None,
+) -> dict[str, Any]:
+    """Async variant of `call_session_llm`.
+
+    The provider round-trip is awaited on the event loop. The short database
+    phases still use the synchronous ORM session, so they run one after
+    another on the LLM thread pool (`llm_admission`); the session is never
+    touched concurrently and the shared anyio threadpool stays free.
+
+    `final_answers` are recorded on the session before it is evaluated,
+    reusing the session row and option index loaded for the evaluation.
+    """
+
+    call_started = time.monotonic()
+    prepared = await run_in_llm_pool(
+        _prepare_invocation,
+        db,
+        session_code=session_code,
+        model_id=model_id,
+        temperature=temperature,
+        top_p=top_p,
+        force_regenerate=force_regenerate,
+        final_answers=final_answers,
+    )
+
+    result_document: dict[str, Any] | None = None
+
+    if prepared.cached_result is None and not force_regenerate:
+        flight_lock = await _ajoin_flight(db, prepared)
+        if flight_lock is not None:
+            flight_lock.release_after_transaction(db)
+
+    if prepared.cached_result is None:
+        raw_result, routing = await _ainvoke_routed(
+            prepared,
+            bedrock_client=bedrock_client,
+            gemini_client=gemini_client,
+            max_attempts=max_attempts,
+        )
+        now = now_provider()
+        winner = (routing or {}).get("winner") or {}
+        result_document = _build_result_document(
+            prepared,
+            raw_result,
+            now,
+            raw_provider=winner.get("provider"),
+            raw_model=winner.get("model"),
+        )
+        if routing is not None:
+            result_document["invoked_model"] = routing["winner"]["model"]
+            result_document["routing"] = routing
+        await run_in_llm_pool(
+            _store_result_document,
+            db,
+            prepared,
+            cast(DiagnosticSession, prepared.session),
+            result_document,
+            now,
+        )
+    else:
+        result_document = _apply_cached_result(prepared, now_provider)
+
+    await run_in_llm_pool(db.flush)
+
+    _record_session_call(prepared, result_document, force_regenerate=force_regenerate, started=call_started)
+    return _build_call_response(prepared, cast(dict[str, Any], result_document))
+
+
+class _StreamAccumulator:
+    """Rebuild a provider response document from streamed events.
+
+    The assembled document mirrors the non-streaming payload shape (Claude
+    `content` blocks / Gemini `candidates` with a top-level `text`) so that
+    stored results stay interchangeable with `invoke_model` output.
+    """
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+        self._parts: list[str] = []
+        self._message: dict[str, Any] = {}
+        self._usage: dict[str, Any] = {}
+        self._stop_reason: Any = None
+        self._last_chunk: dict[str, Any] = {}
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def emitted(self) -> bool:
+        return bool(self._parts)
+
+    def add(self, event: Any) -> str | None:
+        if not isinstance(event, dict):
+            return None
+        delta = self._add_gemini(event) if self.provider == "gemini" else self._add_bedrock(event)
+        if delta:
+            self._parts.append(delta)
+        return delta or None
+
+    def _add_bedrock(self, event: dict[str, Any]) -> str | None:
+        event_type = event.get("type")
+        if event_type == "message_start":
+            message = event.get("message") or {}
+            self._message = {
+                key: value
+                for key, value in message.items()
+                if key not in {"content", "usage", "stop_reason", "stop_sequence"}
+            }
+            self._usage.update(message.get("usage") or {})
+        elif event_type == "content_block_delta":
+            delta = event.get("delta") or {}
+            if delta.get("type") == "text_delta":
+                return delta.get("text")
+        elif event_type == "message_delta":
+            self._stop_reason = (event.get("delta") or {}).get("stop_reason")
+            self._usage.update(event.get("usage") or {})
+        return None
+
+    def _add_gemini(self, chunk: dict[str, Any]) -> str | None:
+        self._last_chunk = chunk
+        text = chunk.get("text")
+        if isinstance(text, str):
+            return text
+        for candidate in chunk.get("candidates") or []:
+            parts = ((candidate or {}).get("content") or {}).get("parts") or []
+            joined = "".join(part.get("text") or "" for part in parts if isinstance(part, dict))
+            if joined:
+                return joined
+        return None
+
+    def document(self) -> dict[str, Any]:
+        text = self.text
+        if self.provider == "gemini":
+            finish_reason = None
+            for candidate in self._last_chunk.get("candidates") or []:
+                finish_reason = (candidate or {}).get("finish_reason") or finish_reason
+            document: dict[str, Any] = {
+                "text": text,
+                "candidates": [
+                    {
+                        "content": {"role": "model", "parts": [{"text": text}]},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+            }
+            if self._last_chunk.get("usage_metadata") is not None:
+                document["usage_metadata"] = self._last_chunk["usage_metadata"]
+            if self._last_chunk.get("model_version") is not None:
+                document["model_version"] = self._last_chunk["model_version"]
+            return document
+
+        document = dict(self._message)
+        document.setdefault("type", "message")
+        document.setdefault("role", "assistant")
+        document["content"] = [{"type": "text", "text": text}]
+        document["stop_reason"] = self._stop_reason
+        if self._usage:
+            document["usage"] = dict(self._usage)
+        return document
+
+
+def _gemini_stream(prepared: _PreparedInvocation, gemini_client: Any) -> Iterator[dict[str, Any]]:
+    request = _gemini_request(prepared, gemini_client)
+    emitted = False
+    try:
+        for event in gemini_client.generate_content_stream(**request):
+            emitted = True
+            yield event
+        return
+    except GeminiCachedContentError:
+        # Only a stream that failed before its first chunk can be retried.
+        fallback = None if emitted else _without_gemini_cache(prepared, request)
+        if fallback is None:
+            raise
+    yield from gemini_client.generate_content_stream(**fallback)
+
+
+def _open_provider_stream(
+    prepared: _PreparedInvocation,
+    *,
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+) -> Iterator[dict[str, Any]]:
+    if prepared.provider == "gemini":
+        if gemini_client is None:
+            gemini_client = create_gemini_client()
+        return _gemini_stream(prepared, gemini_client)
+
+    if bedrock_client is None:
+        bedrock_client = create_bedrock_client()
+    payload = _bedrock_request_payload(prepared)
+    return bedrock_client.invoke_model_stream(prepared.invocation_model_id, payload)
+
+
+def _stream_meta(prepared: _PreparedInvocation, model: str, *, cached: bool) -> dict[str, Any]:
+    return {
+        "session_code": prepared.session_code,
+        "version_id": prepared.version_id,
+        "model": model,
+        "cached": cached,
+    }
+
+
+def _stream_provider_events(
+    prepared: _PreparedInvocation,
+    *,
+    session_factory: Callable[[], Session],
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+    now_provider: Callable[[], datetime],
+    max_attempts: int | None,
+    force_regenerate: bool,
+    call_started: float,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    # The request's session is closed once the response starts, so the stream
+    # works on its own. Nothing is opened or locked until the consumer first
+    # advances the iterator, so a client gone before then leaks nothing.
+    db = session_factory()
+    flight_lock: LlmFlightLock | None = None
+    try:
+        if not force_regenerate:
+            flight_lock = _join_flight(db, prepared)
+        if prepared.cached_result is not None:
+            # A concurrent call stored the result while this one waited.
+            prepared.session = db.get(DiagnosticSession, prepared.session_id)
+            result_document = _apply_cached_result(prepared, now_provider)
+            db.commit()
+            _record_session_call(prepared, result_document, force_regenerate=force_regenerate, started=call_started)
+            yield "meta", _stream_meta(prepared, result_document.get("model", prepared.effective_model), cached=True)
+            yield "done", _build_call_response(prepared, result_document)
+            return
+
+        yield from _relay_provider_stream(
+            db,
+            prepared,
+            _stream_meta(prepared, prepared.effective_model, cached=False),
+            bedrock_client=bedrock_client,
+            gemini_client=gemini_client,
+            now_provider=now_provider,
+            max_attempts=max_attempts,
+            force_regenerate=force_regenerate,
+            call_started=call_started,
+        )
+    finally:
+        # The result was committed before `done` was yielded, so waiters only
+        # wake once it is visible.
+        if flight_lock is not None:
+            flight_lock.release()
+        db.close()
+
+
+def _relay_provider_stream(
+    db: Session,
+    prepared: _PreparedInvocation,
+    meta: dict[str, Any],
+    *,
+    bedrock_client: BedrockClientProtocol | None,
+    gemini_client: GeminiRuntimeClient | None,
+    now_provider: Callable[[], datetime],
+    max_attempts: int | None,
+    force_regenerate: bool,
+    call_started: float,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    yield "meta", meta
+
+    attempts = max(1, max_attempts if max_attempts is not None else int(settings.llm_retry_max_attempts or 1))
+    attempt = 0
+    while True:
+        attempt += 1
+        accumulator = _StreamAccumulator(prepared.provider)
+        started = time.monotonic()
+        first_token_at: float | None = None
+        try:
+            with provider_guard(prepared.provider, prepared.invocation_model_id):
+                stream = _open_provider_stream(
+                    prepared,
+                    bedrock_client=bedrock_client,
+                    gemini_client=gemini_client,
+                )
+                for event in stream:
+                    delta = accumulator.add(event)
+                    if delta:
+                        if first_token_at is None:
+                            first_token_at = time.monotonic()
+                        yield "delta", {"text": delta}
+                if not accumulator.emitted:
+                    raise RuntimeError(f"{prepared.provider} returned an empty stream")
+            break
+        except BaseAppException:
+            raise
+        except Exception as exc:  # pragma: no cover - broad catch for retry robustness
+            logger.exception(
+                "%s stream attempt failed: session_code=%s attempt=%s",
+                prepared.provider,
+                prepared.session_code,
+                attempt,
+            )
+            # Deltas already reached the client, so a silent retry would garble the output.
+            if accumulator.emitted or attempt >= attempts:
+                raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(exc))
+            delay = next_retry_delay(attempt, exc)
+        if delay > 0:
+            time.sleep(delay)
+
+    now = now_provider()
+    result_document = _build_result_document(prepared, accumulator.document(), now)
+    if first_token_at is not None:
+        result_document["first_token_ms"] = int((first_token_at - started) * 1000)
+    # `db` is the stream's own session; the instance loaded by the request
+    # session is detached by now.
+    session = db.get(DiagnosticSession, prepared.session_id)
+    if session is None:  # pragma: no cover - session deleted mid-stream
+        raise_app_error(ErrorCode.DIAGNOSTICS_SESSION_NOT_FOUND)
+    _store_result_document(db, prepared, session, result_document, now)
+    db.commit()
+
+    _record_session_call(prepared, result_document, force_regenerate=force_regenerate, started=call_started)
+    yield "done", _build_call_response(prepared, result_document)
+
+
+def stream_session_llm(
+    db: Session,
+    *,
+    session_code: str,
+    model_id: str | None,
+    temperature: float | None,
+    top_p: float | None,
+    force_regenerate: bool,
+    session_factory: Callable[[], Session] = SessionLocal,
+    bedrock_client: BedrockClientProtocol | None = None,
+    gemini_client: GeminiRuntimeClient | None = None,
+    now_provider: Callable[[], datetime] = _now_utc,
+    max_attempts: int | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Stream an LLM result for the given session as `(event, data)` pairs.
+
+    Validation and cache lookup run eagerly on `db`, so request errors are
+    raised before any event is produced. The iterator yields `meta`, then
+    `delta` events with incremental text, and finally `done` carrying the same
+    payload as `call_session_llm`. Cached results skip straight to `done`.
+
+    The provider phase runs lazily on a session from `session_factory`, which
+    the iterator commits before `done` and closes when it is closed.
+    """
+
+    call_started = time.monotonic()
+    prepared = _prepare_invocation(
+        db,
+        session_code=session_code,
+        model_id=model_id,
+        temperature=temperature,
+        top_p=top_p,
+        force_regenerate=force_regenerate,
+    )
+
+    if prepared.cached_result is not None:
+        result_document = _apply_cached_result(prepared, now_provider)
+        db.flush()
+        _record_session_call(prepared, result_document, force_regenerate=force_regenerate, started=call_started)
+        meta = _stream_meta(prepared, result_document.get("model", prepared.effective_model), cached=True)
+        return iter([("meta", meta), ("done", _build_call_response(prepared, result_document))])
+
+    return _stream_provider_events(
+        prepared,
+        session_factory=session_factory,
+        bedrock_client=bedrock_client,
+        gemini_client=gemini_client,
+        now_provider=now_provider,
+        max_attempts=max_attempts,
+        force_regenerate=force_regenerate,
+        call_started=call_started,
+    )
+
+
 __all__ = [
     "BedrockClientProtocol",
+    "acall_session_llm",
+    "build_batch_request",
     "call_session_llm",
+    "compute_default_result_key",
+    "pregenerate_llm_result",
+    "store_batch_results",
+    "stream_session_llm",
     "create_bedrock_client",
     "set_bedrock_client_factory",
     "create_gemini_client",
     "set_gemini_client_factory",
+    "reset_llm_clients",
+    "warm_llm_clients",
 ]
@@ -0,0 +1,406 @@
+"""Background job queue for session LLM execution.
+
+`POST /sessions/{session_code}/llm` can hand the provider call off to a
+bounded worker pool instead of holding a request thread (and a pooled DB
+connection) for the whole Bedrock/Gemini round-trip. Job state lives in the
+`llm_jobs` table so that queued or interrupted work is picked up again when a
+worker restarts.
+"""
+
+from __future__ import annotations
+
+import base64
+import logging
+import secrets
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import BaseAppException, raise_app_error
+from app.db.session import SessionLocal
+from app.models.diagnostic import DiagnosticSession, LlmJob, utcnow
+
+from . import llm_executor
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+ACTIVE_JOB_STATUSES = (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+
+
+def generate_job_code() -> str:
+    """Generate a public job identifier using the session code alphabet."""
+
+    payload = secrets.token_bytes(16)
+    return base64.b32encode(payload).decode("ascii").rstrip("=")
+
+
+def _fetch_session_id(db: Session, session_code: str) -> int:
+    session_id = db.scalar(
+        select(DiagnosticSession.id).where(DiagnosticSession.session_code == session_code)
+    )
+    if session_id is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_SESSION_NOT_FOUND)
+    return session_id
+
+
+def enqueue_llm_job(
+    db: Session,
+    *,
+    session_code: str,
+    model_id: str | None,
+    temperature: float | None,
+    top_p: float | None,
+    force_regenerate: bool,
+) -> LlmJob:
+    """Persist a queued LLM job for the session.
+
+    An unfinished job for the same session is returned as-is so that client
+    retries do not stack duplicate provider calls, unless the caller asks to
+    force a regeneration.
+    """
+
+    session_id = _fetch_session_id(db, session_code)
+
+    if not force_regenerate:
+        existing = db.execute(
+            select(LlmJob)
+            .where(
+                LlmJob.session_id == session_id,
+                LlmJob.status.in_(ACTIVE_JOB_STATUSES),
+            )
+            .order_by(LlmJob.id.desc())
+            .limit(1)
+        ).scalar_one_or_none()
+        if existing is not None:
+            return existing
+
+    job = LlmJob(
+        job_code=generate_job_code(),
+        session_id=session_id,
+        status=JOB_STATUS_QUEUED,
+        request_json={
+            "model": model_id,
+            "temperature": temperature,
+            "top_p": top_p,
+            "force_regenerate": force_regenerate,
+        },
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+
+def get_llm_job(db: Session, *, session_code: str, job_code: str) -> LlmJob:
+    stmt = (
+        select(LlmJob)
+        .join(DiagnosticSession, DiagnosticSession.id == LlmJob.session_id)
+        .where(
+            DiagnosticSession.session_code == session_code,
+            LlmJob.job_code == job_code,
+        )
+    )
+    job = db.execute(stmt).scalar_one_or_none()
+    if job is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_LLM_JOB_NOT_FOUND)
+    return job
+
+
+def _pending_condition():
+    lease_expired_before = utcnow() - timedelta(seconds=int(settings.llm_job_lease_seconds or 300))
+    return or_(
+        LlmJob.status == JOB_STATUS_QUEUED,
+        (LlmJob.status == JOB_STATUS_RUNNING) & (LlmJob.started_at < lease_expired_before),
+    )
+
+
+def _claimable_condition():
+    """Pending jobs whose retry backoff, if any, has elapsed."""
+
+    return _pending_condition() & or_(LlmJob.next_attempt_at.is_(None), LlmJob.next_attempt_at <= utcnow())
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Exponential backoff before retrying a job that failed `attempts` times."""
+
+    base = float(settings.llm_job_retry_base_delay_seconds or 0)
+    ceiling = float(settings.llm_job_retry_max_delay_seconds or 0)
+    delay = base * (2 ** max(0, attempts - 1))
+    return min(delay, ceiling) if ceiling > 0 else delay
+
+
+def _seconds_until(next_attempt_at: datetime | None) -> float:
+    if next_attempt_at is None:
+        return 0.0
+    if next_attempt_at.tzinfo is None:
+        next_attempt_at = next_attempt_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (next_attempt_at - utcnow()).total_seconds())
+
+
+def _claim_job(db: Session, job_id: int) -> bool:
+    """Atomically move a job into `running`.
+
+    The conditional UPDATE lets several workers race on the same job (for
+    example when they all recover pending jobs at startup) while only one of
+    them actually executes it. Running jobs whose lease expired are treated as
+    abandoned by a crashed worker and may be claimed again.
+    """
+
+    result = db.execute(
+        update(LlmJob)
+        .where(LlmJob.id == job_id, _claimable_condition())
+        .values(
+            status=JOB_STATUS_RUNNING,
+            started_at=utcnow(),
+            attempts=LlmJob.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return bool(result.rowcount)
+
+
+def _finish_job(
+    db: Session,
+    job_id: int,
+    *,
+    status: str,
+    error_code: str | None = None,
+    error_detail: str | None = None,
+) -> None:
+    db.execute(
+        update(LlmJob)
+        .where(LlmJob.id == job_id)
+        .values(
+            status=status,
+            error_code=error_code,
+            error_detail=error_detail,
+            finished_at=utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def run_llm_job(db: Session, job_id: int) -> None:
+    """Execute a queued job using the given database session."""
+
+    if not _claim_job(db, job_id):
+        logger.debug("LLM job already claimed or finished: job_id=%s", job_id)
+        return
+
+    row = db.execute(
+        select(LlmJob.request_json, LlmJob.attempts, DiagnosticSession.session_code)
+        .join(DiagnosticSession, DiagnosticSession.id == LlmJob.session_id)
+        .where(LlmJob.id == job_id)
+    ).one()
+    request: dict[str, Any] = dict(row.request_json or {})
+
+    try:
+        llm_executor.call_session_llm(
+            db,
+            session_code=row.session_code,
+            model_id=request.get("model"),
+            temperature=request.get("temperature"),
+            top_p=request.get("top_p"),
+            force_regenerate=bool(request.get("force_regenerate")),
+        )
+        db.commit()
+    except BaseAppException as exc:
+        # The executor may already have flushed the recomputed hash or a
+        # partial result; discard it so only the failure is committed.
+        db.rollback()
+        logger.warning(
+            "LLM job failed: job_id=%s session_code=%s error=%s",
+            job_id,
+            row.session_code,
+            exc.error_code.value,
+        )
+        detail = exc.detail if isinstance(exc.detail, str) or exc.detail is None else str(exc.detail)
+        _finish_job(
+            db,
+            job_id,
+            status=JOB_STATUS_FAILED,
+            error_code=exc.error_code.value,
+            error_detail=detail,
+        )
+        return
+    except Exception as exc:
+        db.rollback()
+        max_attempts = int(settings.llm_job_max_attempts or 1)
+        if row.attempts < max_attempts:
+            # Leave the job queued, claimable again once its backoff elapses.
+            delay = retry_delay_seconds(row.attempts)
+            logger.exception(
+                "LLM job raised unexpectedly; will retry: job_id=%s attempt=%s delay=%.1fs",
+                job_id,
+                row.attempts,
+                delay,
+            )
+            db.execute(
+                update(LlmJob)
+                .where(LlmJob.id == job_id)
+                .values(status=JOB_STATUS_QUEUED, next_attempt_at=utcnow() + timedelta(seconds=delay))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            raise
+        logger.exception("LLM job exhausted retries: job_id=%s", job_id)
+        _finish_job(
+            db,
+            job_id,
+            status=JOB_STATUS_FAILED,
+            error_code=ErrorCode.COMMON_UNEXPECTED_ERROR.value,
+            error_detail=str(exc),
+        )
+        return
+
+    _finish_job(db, job_id, status=JOB_STATUS_SUCCEEDED)
+
+
+class LlmJobRunner:
+    """Bounded thread pool that executes persisted LLM jobs."""
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="llm-job",
+        )
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._timers: set[threading.Timer] = set()
+        self._closed = False
+
+    def _run(self, job_id: int) -> None:
+        db = self._session_factory()
+        try:
+            run_llm_job(db, job_id)
+        except Exception:  # pragma: no cover - logged for operators
+            logger.exception("LLM job worker crashed: job_id=%s", job_id)
+            self._resubmit_if_pending(job_id)
+        finally:
+            db.close()
+
+    def _resubmit_if_pending(self, job_id: int) -> None:
+        db = self._session_factory()
+        try:
+            row = db.execute(select(LlmJob.status, LlmJob.next_attempt_at).where(LlmJob.id == job_id)).one_or_none()
+        finally:
+            db.close()
+        if row is not None and row.status == JOB_STATUS_QUEUED:
+            self.submit_later(job_id, _seconds_until(row.next_attempt_at))
+
+    def submit(self, job_id: int) -> Future[None]:
+        return self._executor.submit(self._run, job_id)
+
+    def submit_later(self, job_id: int, delay: float) -> None:
+        """Submit the job once `delay` seconds have passed, without holding a worker."""
+
+        if delay <= 0:
+            self.submit(job_id)
+            return
+
+        def fire() -> None:
+            with self._lock:
+                self._timers.discard(timer)
+                if self._closed:
+                    return
+            self.submit(job_id)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        with self._lock:
+            if self._closed:
+                return
+            self._timers.add(timer)
+        timer.start()
+
+    def recover(self) -> int:
+        """Resubmit queued jobs and running jobs whose lease has expired.
+
+        Jobs still backing off are scheduled for when their backoff ends.
+        """
+
+        db = self._session_factory()
+        try:
+            rows = db.execute(
+                select(LlmJob.id, LlmJob.next_attempt_at).where(_pending_condition()).order_by(LlmJob.id)
+            ).all()
+        finally:
+            db.close()
+        for job_id, next_attempt_at in rows:
+            self.submit_later(job_id, _seconds_until(next_attempt_at))
+        if rows:
+            logger.info("Recovered %s pending LLM jobs", len(rows))
+        return len(rows)
+
+    def shutdown(self, *, wait: bool = False) -> None:
+        with self._lock:
+            self._closed = True
+            timers, self._timers = self._timers, set()
+        for timer in timers:
+            timer.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_RUNNER: LlmJobRunner | None = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_llm_job_runner() -> LlmJobRunner:
+    """Return the process-wide job runner, creating it on first use."""
+
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                _RUNNER = LlmJobRunner(max_workers=int(settings.llm_job_max_workers or 1))
+    return _RUNNER
+
+
+def set_llm_job_runner(runner: LlmJobRunner | None) -> None:
+    """Override the process-wide job runner (used by tests)."""
+
+    global _RUNNER
+    _RUNNER = runner
+
+
+def shutdown_llm_job_runner() -> None:
+    global _RUNNER
+    with _RUNNER_LOCK:
+        runner, _RUNNER = _RUNNER, None
+    if runner is not None:
+        runner.shutdown()
+
+
+__all__ = [
+    "ACTIVE_JOB_STATUSES",
+    "JOB_STATUS_FAILED",
+    "JOB_STATUS_QUEUED",
+    "JOB_STATUS_RUNNING",
+    "JOB_STATUS_SUCCEEDED",
+    "LlmJobRunner",
+    "enqueue_llm_job",
+    "generate_job_code",
+    "get_llm_job",
+    "get_llm_job_runner",
+    "retry_delay_seconds",
+    "run_llm_job",
+    "set_llm_job_runner",
+    "shutdown_llm_job_runner",
+]
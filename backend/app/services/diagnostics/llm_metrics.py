@@ -0,0 +1,199 @@
+"""Metrics and structured logs for LLM calls.
+
+Provider clients report the latency of every request they send, the
+resilience guard counts attempts, and `llm_executor` reports end-to-end call
+latency, token usage and how the result was obtained (session reuse,
+cross-session reuse or a fresh provider call). Everything is published on
+`/metrics` through `app.core.metrics.registry`.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# How a session call obtained its result.
+RESULT_SESSION_HIT = "session_hit"  # the session already pointed at a stored result
+RESULT_SHARED_HIT = "shared_hit"  # another session's result with the same key
+RESULT_INFLIGHT_HIT = "inflight_hit"  # adopted from a concurrent identical call
+RESULT_MISS = "miss"  # nothing reusable: the provider was called
+RESULT_BYPASS = "bypass"  # force_regenerate skipped the lookup
+
+PROVIDER_REQUEST_SECONDS = registry.histogram(
+    "llm_provider_request_duration_seconds",
+    "Latency of individual requests sent to an LLM provider.",
+    ("provider", "model", "outcome"),
+)
+PROVIDER_FIRST_TOKEN_SECONDS = registry.histogram(
+    "llm_provider_first_token_seconds",
+    "Time from opening a provider stream to its first event.",
+    ("provider", "model"),
+)
+PROVIDER_ATTEMPTS = registry.counter(
+    "llm_provider_attempts_total",
+    "Provider attempts made under the resilience guard, by outcome.",
+    ("provider", "model", "outcome"),
+)
+CALL_SECONDS = registry.histogram(
+    "llm_call_duration_seconds",
+    "End-to-end latency of session LLM calls, by how the result was obtained.",
+    ("provider", "model", "result"),
+)
+RESULT_LOOKUPS = registry.counter(
+    "llm_result_cache_total",
+    "Session LLM calls by result source (session_hit, shared_hit, inflight_hit, miss, bypass).",
+    ("provider", "result"),
+)
+TOKENS = registry.counter(
+    "llm_tokens_total",
+    "Tokens reported by provider responses (input, output, cache_read, cache_write).",
+    ("provider", "model", "kind"),
+)
+PROMPT_CACHE = registry.counter(
+    "llm_prompt_cache_total",
+    "Provider-side prompt cache outcomes per response.",
+    ("provider", "status"),
+)
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def extract_token_usage(provider: str, raw_result: Any) -> dict[str, int] | None:
+    """Read token counts from a Bedrock (Claude) or Gemini response."""
+
+    if not isinstance(raw_result, dict):
+        return None
+    if provider == "gemini":
+        usage = raw_result.get("usage_metadata")
+        if not isinstance(usage, dict):
+            return None
+        return {
+            "input": _as_int(usage.get("prompt_token_count")),
+            "output": _as_int(usage.get("candidates_token_count")),
+            "cache_read": _as_int(usage.get("cached_content_token_count")),
+            "cache_write": 0,
+        }
+    usage = raw_result.get("usage")
+    if not isinstance(usage, dict):
+        return None
+    return {
+        "input": _as_int(usage.get("input_tokens")),
+        "output": _as_int(usage.get("output_tokens")),
+        "cache_read": _as_int(usage.get("cache_read_input_tokens")),
+        "cache_write": _as_int(usage.get("cache_creation_input_tokens")),
+    }
+
+
+def record_token_usage(provider: str, model: str, raw_result: Any) -> dict[str, int] | None:
+    usage = extract_token_usage(provider, raw_result)
+    if usage is not None:
+        for kind, count in usage.items():
+            if count:
+                TOKENS.inc(count, provider=provider, model=model, kind=kind)
+    return usage
+
+
+@contextmanager
+def observe_provider_request(provider: str, model: str) -> Iterator[None]:
+    """Time one request to a provider SDK."""
+
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        PROVIDER_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            provider=provider,
+            model=model,
+            outcome=outcome,
+        )
+
+
+def observe_provider_error(provider: str, model: str, started: float) -> None:
+    PROVIDER_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        provider=provider,
+        model=model,
+        outcome="error",
+    )
+
+
+def observe_stream(provider: str, model: str, events: Iterator[Any], started: float) -> Iterator[Any]:
+    """Relay a provider stream, timing the first event and the whole stream."""
+
+    outcome = "error"
+    first = True
+    try:
+        for event in events:
+            if first:
+                PROVIDER_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, provider=provider, model=model)
+                first = False
+            yield event
+        outcome = "success"
+    finally:
+        PROVIDER_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            provider=provider,
+            model=model,
+            outcome=outcome,
+        )
+
+
+def record_call(
+    *,
+    session_code: str,
+    provider: str,
+    model: str,
+    result: str,
+    seconds: float,
+    usage: dict[str, int] | None = None,
+    prompt_cache: str | None = None,
+) -> None:
+    """Record a finished session call and emit one structured log line."""
+
+    CALL_SECONDS.observe(seconds, provider=provider, model=model, result=result)
+    RESULT_LOOKUPS.inc(provider=provider, result=result)
+    fields: dict[str, Any] = {
+        "session_code": session_code,
+        "provider": provider,
+        "model": model,
+        "result": result,
+        "latency_ms": int(seconds * 1000),
+        "input_tokens": (usage or {}).get("input"),
+        "output_tokens": (usage or {}).get("output"),
+        "prompt_cache": prompt_cache,
+    }
+    logger.info(
+        "LLM call finished: %s",
+        " ".join(f"{key}={value}" for key, value in fields.items() if value is not None),
+        extra={"llm_call": fields},
+    )
+
+
+__all__ = [
+    "RESULT_BYPASS",
+    "RESULT_INFLIGHT_HIT",
+    "RESULT_MISS",
+    "RESULT_SESSION_HIT",
+    "RESULT_SHARED_HIT",
+    "extract_token_usage",
+    "observe_provider_error",
+    "observe_provider_request",
+    "observe_stream",
+    "record_call",
+    "record_token_usage",
+]
@@ -0,0 +1,315 @@
+"""Pre-generation of LLM results for popular answer combinations.
+
+Traffic for a finalized version converges on a small set of answer
+combinations. This module finds the most frequent combinations in the recent
+`answer_choices` history of a diagnostic, maps them onto the active version
+in `cfg_active_versions` and stores their results in `llm_results` ahead of
+time, so that most `/llm` calls right after activation are cache hits.
+
+History is matched through the stable `options.id` (`version_options.option_id`)
+so that combinations observed on the previous version carry over to a newly
+activated one.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import BaseAppException, raise_app_error
+from app.core.registry import compute_version_options_hash
+from app.db.session import SessionLocal
+from app.models.diagnostic import (
+    AnswerChoice,
+    CfgActiveVersion,
+    Diagnostic,
+    DiagnosticSession,
+    DiagnosticVersion,
+    LlmResult,
+    VersionOption,
+    VersionQuestion,
+)
+
+from . import llm_executor
+
+logger = logging.getLogger(__name__)
+
+# Result keys checked per `WHERE id IN (...)` query when planning.
+RESULT_LOOKUP_CHUNK_SIZE = 500
+
+
+@dataclass(frozen=True)
+class PregenerationCandidate:
+    """An answer combination expressed in the active version's option ids."""
+
+    version_option_ids: tuple[int, ...]
+    llm_ops: tuple[Any, ...]
+    version_options_hash: str
+    sessions: int
+    cached: bool
+
+
+@dataclass
+class PregenerationPlan:
+    diagnostic_id: int
+    version_id: int
+    candidates: list[PregenerationCandidate] = field(default_factory=list)
+
+    @property
+    def missing(self) -> list[PregenerationCandidate]:
+        return [candidate for candidate in self.candidates if not candidate.cached]
+
+
+@dataclass
+class PregenerationReport:
+    diagnostic_id: int
+    version_id: int
+    generated: int = 0
+    skipped: int = 0
+    failed: int = 0
+
+
+def find_popular_option_combinations(
+    db: Session,
+    *,
+    diagnostic_id: int,
+    limit: int,
+    history_sessions: int,
+) -> list[tuple[frozenset[int], int]]:
+    """Return the most frequent stable option-id sets among recent completed sessions."""
+
+    recent_sessions = (
+        select(DiagnosticSession.id)
+        .where(
+            DiagnosticSession.diagnostic_id == diagnostic_id,
+            DiagnosticSession.ended_at.is_not(None),
+        )
+        .order_by(DiagnosticSession.id.desc())
+        .limit(max(1, history_sessions))
+        .subquery()
+    )
+    # A derived table rather than `IN (...)`: MySQL rejects LIMIT inside IN subqueries.
+    rows = db.execute(
+        select(AnswerChoice.session_id, VersionOption.option_id)
+        .join(recent_sessions, recent_sessions.c.id == AnswerChoice.session_id)
+        .join(VersionOption, VersionOption.id == AnswerChoice.version_option_id)
+    ).all()
+
+    combinations: dict[int, set[int]] = {}
+    for session_id, option_id in rows:
+        combinations.setdefault(session_id, set()).add(option_id)
+
+    counter: Counter[frozenset[int]] = Counter(frozenset(options) for options in combinations.values())
+    return counter.most_common(max(0, limit))
+
+
+def _load_active_version(db: Session, diagnostic_id: int) -> DiagnosticVersion:
+    if db.get(Diagnostic, diagnostic_id) is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_DIAGNOSTIC_NOT_FOUND)
+    version = db.execute(
+        select(DiagnosticVersion)
+        .join(CfgActiveVersion, CfgActiveVersion.version_id == DiagnosticVersion.id)
+        .where(CfgActiveVersion.diagnostic_id == diagnostic_id)
+    ).scalar_one_or_none()
+    if version is None:
+        raise_app_error(ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND, detail="アクティブな版が設定されていません")
+    return version
+
+
+def plan_version_combinations(
+    db: Session,
+    *,
+    version: DiagnosticVersion,
+    limit: int,
+    history_sessions: int,
+) -> PregenerationPlan:
+    """Map the diagnostic's most frequent answer combinations onto `version`."""
+
+    popular = find_popular_option_combinations(
+        db,
+        diagnostic_id=version.diagnostic_id,
+        limit=limit,
+        history_sessions=history_sessions,
+    )
+
+    option_rows = db.execute(
+        select(VersionOption.option_id, VersionOption.id, VersionOption.llm_op)
+        .join(VersionQuestion, VersionQuestion.id == VersionOption.version_question_id)
+        .where(VersionOption.version_id == version.id)
+        .order_by(VersionQuestion.sort_order, VersionOption.sort_order, VersionOption.id)
+    ).all()
+    position = {option_id: index for index, (option_id, _, _) in enumerate(option_rows)}
+    by_option_id = {option_id: (version_option_id, llm_op) for option_id, version_option_id, llm_op in option_rows}
+
+    mapped: list[tuple[tuple[int, ...], tuple[Any, ...], str, int, str]] = []
+    for option_ids, sessions in popular:
+        if not option_ids or any(option_id not in by_option_id for option_id in option_ids):
+            # The combination includes options that the version dropped.
+            continue
+        ordered = sorted(option_ids, key=position.__getitem__)
+        version_option_ids = tuple(by_option_id[option_id][0] for option_id in ordered)
+        llm_ops = tuple(by_option_id[option_id][1] for option_id in ordered)
+        if any(llm_op is None for llm_op in llm_ops):
+            continue
+        options_hash = compute_version_options_hash(version.id, version_option_ids)
+        result_key = llm_executor.compute_default_result_key(version.id, options_hash)
+        mapped.append((version_option_ids, llm_ops, options_hash, sessions, result_key))
+
+    cached_keys = _stored_result_keys(db, [result_key for *_, result_key in mapped])
+    plan = PregenerationPlan(diagnostic_id=version.diagnostic_id, version_id=version.id)
+    for version_option_ids, llm_ops, options_hash, sessions, result_key in mapped:
+        plan.candidates.append(
+            PregenerationCandidate(
+                version_option_ids=version_option_ids,
+                llm_ops=llm_ops,
+                version_options_hash=options_hash,
+                sessions=sessions,
+                cached=result_key in cached_keys,
+            )
+        )
+    return plan
+
+
+def _stored_result_keys(db: Session, result_keys: list[str]) -> set[str]:
+    """Return the subset of `result_keys` present in `llm_results`, one query per chunk."""
+
+    found: set[str] = set()
+    for start in range(0, len(result_keys), RESULT_LOOKUP_CHUNK_SIZE):
+        chunk = result_keys[start : start + RESULT_LOOKUP_CHUNK_SIZE]
+        found.update(db.scalars(select(LlmResult.id).where(LlmResult.id.in_(chunk))))
+    return found
+
+
+def plan_pregeneration(
+    db: Session,
+    *,
+    diagnostic_id: int,
+    limit: int | None = None,
+) -> PregenerationPlan:
+    """Resolve the popular combinations for the active version of a diagnostic."""
+
+    version = _load_active_version(db, diagnostic_id)
+    if limit is None:
+        limit = int(settings.llm_pregeneration_limit or 0)
+    return plan_version_combinations(
+        db,
+        version=version,
+        limit=limit,
+        history_sessions=int(settings.llm_pregeneration_history_sessions or 1),
+    )
+
+
+def execute_pregeneration(
+    plan: PregenerationPlan,
+    *,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> PregenerationReport:
+    """Generate the missing results of a plan, committing each one separately."""
+
+    report = PregenerationReport(diagnostic_id=plan.diagnostic_id, version_id=plan.version_id)
+    db = session_factory()
+    try:
+        version = db.get(DiagnosticVersion, plan.version_id)
+        if version is None:  # pragma: no cover - version deleted after planning
+            return report
+        for candidate in plan.missing:
+            try:
+                generated = llm_executor.pregenerate_llm_result(
+                    db,
+                    version=version,
+                    option_ids=list(candidate.version_option_ids),
+                    llm_ops=list(candidate.llm_ops),
+                )
+                db.commit()
+            except BaseAppException as exc:
+                db.rollback()
+                report.failed += 1
+                logger.warning(
+                    "LLM pre-generation failed: version_id=%s hash=%s error=%s",
+                    plan.version_id,
+                    candidate.version_options_hash,
+                    exc.error_code.value,
+                )
+                continue
+            if generated:
+                report.generated += 1
+            else:
+                report.skipped += 1
+    finally:
+        db.close()
+
+    logger.info(
+        "LLM pre-generation finished: diagnostic_id=%s version_id=%s generated=%s skipped=%s failed=%s",
+        report.diagnostic_id,
+        report.version_id,
+        report.generated,
+        report.skipped,
+        report.failed,
+    )
+    return report
+
+
+def run_pregeneration(
+    *,
+    diagnostic_id: int,
+    limit: int | None = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> PregenerationReport | None:
+    """Plan and run pre-generation for one diagnostic on dedicated sessions.
+
+    Intended as a background task: nothing is read on the caller's request
+    session, and planning failures are logged instead of raised.
+    """
+
+    db = session_factory()
+    try:
+        plan = plan_pregeneration(db, diagnostic_id=diagnostic_id, limit=limit)
+    except BaseAppException as exc:
+        logger.warning(
+            "LLM pre-generation skipped: diagnostic_id=%s error=%s",
+            diagnostic_id,
+            exc.error_code.value,
+        )
+        return None
+    finally:
+        db.close()
+    if not plan.missing:
+        return None
+    return execute_pregeneration(plan, session_factory=session_factory)
+
+
+def pregenerate_active_versions(
+    *,
+    limit: int | None = None,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> list[PregenerationReport]:
+    """Plan and run pre-generation for every diagnostic with an active version."""
+
+    db = session_factory()
+    try:
+        diagnostic_ids = list(db.scalars(select(CfgActiveVersion.diagnostic_id).order_by(CfgActiveVersion.diagnostic_id)))
+        plans = [plan_pregeneration(db, diagnostic_id=diagnostic_id, limit=limit) for diagnostic_id in diagnostic_ids]
+    finally:
+        db.close()
+    return [execute_pregeneration(plan, session_factory=session_factory) for plan in plans]
+
+
+__all__ = [
+    "PregenerationCandidate",
+    "PregenerationPlan",
+    "PregenerationReport",
+    "execute_pregeneration",
+    "find_popular_option_combinations",
+    "plan_pregeneration",
+    "plan_version_combinations",
+    "pregenerate_active_versions",
+    "run_pregeneration",
+]
@@ -0,0 +1,256 @@
+"""Provider-side caching of the per-version system prompt.
+
+A finalized version's `system_prompt` is immutable (it is covered by
+`src_hash`), so the static prefix of every request can be processed once by
+the provider and reused:
+
+* Bedrock / Anthropic: the system prompt is sent as a text block carrying
+  `cache_control: {"type": "ephemeral"}`.
+* Gemini: an explicit context cache holding the system instruction is
+  created per `(model, src_hash)` and referenced through `cached_content`.
+
+Cache hits, writes and misses are derived from the provider's usage block,
+counted here and stored on the result document so the effect on latency and
+input cost can be measured.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app.core.config import settings
+
+from .llm_metrics import PROMPT_CACHE
+
+logger = logging.getLogger(__name__)
+
+CACHE_HIT = "hit"
+CACHE_WRITE = "write"
+CACHE_MISS = "miss"
+
+# Refresh a Gemini cache this long before it expires rather than racing expiry.
+_GEMINI_REFRESH_MARGIN = timedelta(seconds=60)
+
+
+def prompt_cache_enabled() -> bool:
+    return bool(getattr(settings, "llm_prompt_cache_enabled", False))
+
+
+def bedrock_system_blocks(system_prompt: str) -> list[dict[str, Any]]:
+    """Claude `system` blocks with a cache breakpoint after the static prompt."""
+
+    return [
+        {
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"},
+        }
+    ]
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def summarize_prompt_cache(provider: str, raw_result: Any) -> dict[str, Any] | None:
+    """Classify a provider response as a prompt-cache hit, write or miss."""
+
+    if not isinstance(raw_result, dict):
+        return None
+
+    if provider == "gemini":
+        usage = raw_result.get("usage_metadata")
+        if not isinstance(usage, dict):
+            return None
+        read_tokens = _as_int(usage.get("cached_content_token_count"))
+        write_tokens = 0
+        input_tokens = _as_int(usage.get("prompt_token_count"))
+    else:
+        usage = raw_result.get("usage")
+        if not isinstance(usage, dict):
+            return None
+        read_tokens = _as_int(usage.get("cache_read_input_tokens"))
+        write_tokens = _as_int(usage.get("cache_creation_input_tokens"))
+        input_tokens = _as_int(usage.get("input_tokens"))
+
+    if read_tokens:
+        status = CACHE_HIT
+    elif write_tokens:
+        status = CACHE_WRITE
+    else:
+        status = CACHE_MISS
+    return {
+        "status": status,
+        "read_tokens": read_tokens,
+        "write_tokens": write_tokens,
+        "input_tokens": input_tokens,
+    }
+
+
+class PromptCacheStats:
+    """Process-wide counters of prompt-cache outcomes per provider."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: dict[tuple[str, str], int] = {}
+        self._tokens: dict[tuple[str, str], int] = {}
+
+    def record(self, provider: str, summary: dict[str, Any]) -> None:
+        with self._lock:
+            key = (provider, summary["status"])
+            self._counts[key] = self._counts.get(key, 0) + 1
+            for kind in ("read_tokens", "write_tokens", "input_tokens"):
+                token_key = (provider, kind)
+                self._tokens[token_key] = self._tokens.get(token_key, 0) + int(summary.get(kind) or 0)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            result: dict[str, dict[str, int]] = {}
+            for (provider, status), count in self._counts.items():
+                result.setdefault(provider, {})[status] = count
+            for (provider, kind), tokens in self._tokens.items():
+                result.setdefault(provider, {})[kind] = tokens
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._tokens.clear()
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def record_prompt_cache_usage(provider: str, raw_result: Any) -> dict[str, Any] | None:
+    summary = summarize_prompt_cache(provider, raw_result)
+    if summary is not None:
+        prompt_cache_stats.record(provider, summary)
+        PROMPT_CACHE.inc(provider=provider, status=summary["status"])
+        logger.debug(
+            "Prompt cache %s: provider=%s read_tokens=%s write_tokens=%s",
+            summary["status"],
+            provider,
+            summary["read_tokens"],
+            summary["write_tokens"],
+        )
+    return summary
+
+
+@dataclass
+class _CachedContentEntry:
+    name: str | None
+    expires_at: datetime
+
+
+class GeminiContextCacheRegistry:
+    """Maps `(model, src_hash)` to a live Gemini cached-content resource.
+
+    Creation failures (for example prompts below the provider's minimum
+    cacheable size) are remembered for one TTL so that every request does not
+    retry the create call. Creation is serialised per key, so a slow create
+    for one version does not hold up requests for the others.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple[str, str], threading.Lock] = {}
+        self._entries: dict[tuple[str, str], _CachedContentEntry] = {}
+
+    def _key_lock(self, key: tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def resolve(
+        self,
+        client: Any,
+        *,
+        model: str,
+        src_hash: str | None,
+        system_instruction: str,
+    ) -> str | None:
+        if not src_hash or not hasattr(client, "create_cached_content"):
+            return None
+
+        key = (model, src_hash)
+        now = datetime.now(timezone.utc)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at - _GEMINI_REFRESH_MARGIN > now:
+            return entry.name
+
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at - _GEMINI_REFRESH_MARGIN > now:
+                return entry.name
+
+            ttl_seconds = max(120, int(getattr(settings, "gemini_context_cache_ttl_seconds", 3600) or 3600))
+            try:
+                name, expires_at = client.create_cached_content(
+                    model=model,
+                    system_instruction=system_instruction,
+                    ttl_seconds=ttl_seconds,
+                    display_name=f"diagnostics-{src_hash[:32]}",
+                )
+            except Exception:
+                logger.warning(
+                    "Gemini context cache unavailable; sending the full prompt: model=%s",
+                    model,
+                    exc_info=True,
+                )
+                name, expires_at = None, None
+            if expires_at is None:
+                expires_at = now + timedelta(seconds=ttl_seconds)
+            elif expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            self._entries[key] = _CachedContentEntry(name=name, expires_at=expires_at)
+            return name
+
+    def invalidate(self, *, model: str, src_hash: str | None, name: str) -> None:
+        """Forget `name` after the provider rejected it (deleted or expired early)."""
+
+        if not src_hash:
+            return
+        with self._lock:
+            entry = self._entries.get((model, src_hash))
+            if entry is not None and entry.name == name:
+                del self._entries[(model, src_hash)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+
+gemini_context_caches = GeminiContextCacheRegistry()
+
+
+def reset_prompt_cache_state() -> None:
+    """Forget Gemini cache handles and counters (used by tests)."""
+
+    gemini_context_caches.reset()
+    prompt_cache_stats.reset()
+
+
+__all__ = [
+    "CACHE_HIT",
+    "CACHE_MISS",
+    "CACHE_WRITE",
+    "GeminiContextCacheRegistry",
+    "PromptCacheStats",
+    "bedrock_system_blocks",
+    "gemini_context_caches",
+    "prompt_cache_enabled",
+    "prompt_cache_stats",
+    "record_prompt_cache_usage",
+    "reset_prompt_cache_state",
+    "summarize_prompt_cache",
+]
@@ -0,0 +1,295 @@
+"""Parse LLM output into a ranking of version outcomes.
+
+The system prompt asks the model for a JSON object keyed by rank
+(`{"1": {"name": ..., "total_match": {"score", "reason"}, ...}}`), usually
+inside a ```json fence. The text is parsed once, when a result is generated,
+and every entry is matched against the active outcomes of the version through
+the diagnostic's outcome master table (`MST_AI_JOBS.name`). The validated
+ranking is stored on the result document as `ranking`, so readers no longer
+have to parse the provider envelope, and only ship it when the ranking is
+partial.
+
+The parsing rules mirror `frontend/features/diagnostics/result/parser.ts`,
+including the recovery of complete entries from a truncated answer.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+import unicodedata
+from collections.abc import Mapping
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.registry import OutcomeModelResolutionError, resolve_outcome_model
+from app.models.diagnostic import Diagnostic, DiagnosticVersion, VersionOutcome
+
+SCORE_KEYS = ("total_match", "personality_match", "work_match")
+
+RANKING_OK = "ok"  # every entry parsed and matched an outcome
+RANKING_PARTIAL = "partial"  # some entries are unmatched, unusable or recovered from a truncated answer
+RANKING_UNPARSED = "unparsed"  # nothing matched; readers fall back to `raw`
+
+_JSON_BLOCK = re.compile(r"```(?:json)?\s*([\s\S]*?)```", re.IGNORECASE)
+# Ranks are ASCII digits only: `\d` would also accept other scripts' digits.
+_RANK_KEY = re.compile(r"[0-9]+")
+_RANK_ENTRY = re.compile(r'"([0-9]+)"\s*:\s*\{')
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _join_text_entries(entries: Any) -> str | None:
+    if not isinstance(entries, list):
+        return None
+    buffer = [
+        entry["text"]
+        for entry in entries
+        if isinstance(entry, Mapping) and isinstance(entry.get("text"), str) and entry["text"].strip()
+    ]
+    combined = "\n".join(buffer).strip()
+    return combined or None
+
+
+def extract_result_text(raw: Any) -> str | None:
+    """Return the model text of a Bedrock (Claude) or Gemini response."""
+
+    if isinstance(raw, str):
+        return raw if raw.strip() else None
+    if not isinstance(raw, Mapping):
+        return None
+
+    text = raw.get("text")
+    if isinstance(text, str) and text.strip():
+        return text
+    content = raw.get("content")
+    if isinstance(content, list):
+        joined = _join_text_entries(content)
+        if joined:
+            return joined
+    for candidate in raw.get("candidates") or []:
+        if not isinstance(candidate, Mapping):
+            continue
+        candidate_content = candidate.get("content")
+        if isinstance(candidate_content, Mapping):
+            joined = _join_text_entries(candidate_content.get("parts"))
+            if joined:
+                return joined
+    return None
+
+
+def _json_snippet(text: str) -> str:
+    match = _JSON_BLOCK.search(text)
+    if match and match.group(1).strip():
+        return match.group(1).strip()
+    return text.strip()
+
+
+def _closing_brace(text: str, start: int) -> int:
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+    return -1
+
+
+def _recover_entries(text: str) -> dict[str, Any]:
+    """Salvage the complete `"<rank>": {...}` blocks of a truncated document."""
+
+    entries: dict[str, Any] = {}
+    for match in _RANK_ENTRY.finditer(text):
+        start = text.index("{", match.start())
+        end = _closing_brace(text, start)
+        if end == -1:
+            continue
+        try:
+            entry = json.loads(text[start : end + 1])
+        except ValueError:
+            continue
+        if isinstance(entry, dict):
+            entries[match.group(1)] = entry
+    return entries
+
+
+def parse_ranking_text(text: str) -> tuple[list[tuple[int, dict[str, Any]]], bool]:
+    """Parse rank entries from model text.
+
+    Returns `(entries, incomplete)` with entries sorted by rank;
+    `incomplete` is True when the document was not valid JSON (and entries
+    were salvaged) or when some of its keys were not usable rank entries.
+    """
+
+    snippet = _json_snippet(text)
+    incomplete = False
+    try:
+        document = json.loads(snippet)
+    except ValueError:
+        document = _recover_entries(snippet)
+        incomplete = True
+    if not isinstance(document, dict):
+        return [], True
+    entries = [
+        (int(key), value)
+        for key, value in document.items()
+        if _RANK_KEY.fullmatch(key) and isinstance(value, dict)
+    ]
+    if len(entries) != len(document):
+        incomplete = True
+    entries.sort(key=lambda item: item[0])
+    return entries, incomplete
+
+
+def _score(bucket: Any) -> float | None:
+    value = bucket.get("score") if isinstance(bucket, Mapping) else bucket
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    return round(min(max(number, 0.0), 100.0), 1)
+
+
+def _reason(bucket: Any) -> str | None:
+    value = bucket.get("reason") if isinstance(bucket, Mapping) else bucket
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return None
+
+
+def normalise_outcome_name(name: str) -> str:
+    """Matching key for outcome names (width, case and spacing insensitive)."""
+
+    return _WHITESPACE.sub("", unicodedata.normalize("NFKC", name)).casefold()
+
+
+def load_outcome_names(db: Session, *, version_id: int) -> dict[str, tuple[int, str]]:
+    """Map normalised names to `(outcome_id, name)` for the version's active outcomes."""
+
+    table_name = db.execute(
+        select(Diagnostic.outcome_table_name)
+        .join(DiagnosticVersion, DiagnosticVersion.diagnostic_id == Diagnostic.id)
+        .where(DiagnosticVersion.id == version_id)
+    ).scalar_one_or_none()
+    if not table_name:
+        return {}
+    try:
+        binding = resolve_outcome_model(table_name)
+    except OutcomeModelResolutionError:
+        return {}
+
+    model = binding.model
+    label = binding.default_label_column
+    rows = db.execute(
+        select(VersionOutcome.outcome_id, label)
+        .join(model, getattr(model, "id") == VersionOutcome.outcome_id)
+        .where(VersionOutcome.version_id == version_id, VersionOutcome.is_active.is_(True))
+        .order_by(VersionOutcome.sort_order, VersionOutcome.outcome_id)
+    ).all()
+    names: dict[str, tuple[int, str]] = {}
+    for outcome_id, name in rows:
+        if isinstance(name, str) and name.strip():
+            names.setdefault(normalise_outcome_name(name), (int(outcome_id), name))
+    return names
+
+
+def build_ranking(raw: Any, outcome_names: Mapping[str, tuple[int, str]]) -> dict[str, Any]:
+    """Build the stored `ranking` for a provider response.
+
+    Matched entries carry the outcome's id and master name. Entries whose
+    name matches no active outcome (or repeats one already ranked) stay in
+    place with `matched: false` and `outcome_id: None`, and are also listed
+    under `unmatched`.
+    """
+
+    text = extract_result_text(raw)
+    entries, incomplete = parse_ranking_text(text) if text else ([], False)
+
+    items: list[dict[str, Any]] = []
+    unmatched: list[str] = []
+    seen: set[int] = set()
+    for rank, entry in entries:
+        name = entry.get("name")
+        match = outcome_names.get(normalise_outcome_name(name)) if isinstance(name, str) else None
+        item: dict[str, Any]
+        if match is None or match[0] in seen:
+            label = name.strip() if isinstance(name, str) and name.strip() else f"#{rank}"
+            unmatched.append(label)
+            item = {"rank": rank, "outcome_id": None, "name": label, "matched": False}
+        else:
+            outcome_id, canonical_name = match
+            seen.add(outcome_id)
+            item = {"rank": rank, "outcome_id": outcome_id, "name": canonical_name, "matched": True}
+        for key in SCORE_KEYS:
+            item[key] = {"score": _score(entry.get(key)), "reason": _reason(entry.get(key))}
+        items.append(item)
+
+    if not seen:
+        status = RANKING_UNPARSED
+    elif unmatched or incomplete:
+        status = RANKING_PARTIAL
+    else:
+        status = RANKING_OK
+    ranking: dict[str, Any] = {"status": status, "items": items}
+    if unmatched:
+        ranking["unmatched"] = unmatched
+    return ranking
+
+
+def ranking_items(document: Mapping[str, Any]) -> list[dict[str, Any]] | None:
+    """Return the parsed ranking of a stored document, or None when nothing matched."""
+
+    ranking = document.get("ranking")
+    if not isinstance(ranking, Mapping):
+        return None
+    items = ranking.get("items")
+    if not isinstance(items, list) or not any(
+        isinstance(item, Mapping) and item.get("outcome_id") is not None for item in items
+    ):
+        return None
+    return items
+
+
+def ranking_is_complete(document: Mapping[str, Any]) -> bool:
+    """True when every entry of the stored ranking parsed and matched.
+
+    Readers may drop the provider envelope only then; a partial ranking
+    keeps `raw` so that nothing the model said is lost.
+    """
+
+    ranking = document.get("ranking")
+    return isinstance(ranking, Mapping) and ranking.get("status") == RANKING_OK
+
+
+__all__ = [
+    "RANKING_OK",
+    "RANKING_PARTIAL",
+    "RANKING_UNPARSED",
+    "SCORE_KEYS",
+    "build_ranking",
+    "extract_result_text",
+    "load_outcome_names",
+    "normalise_outcome_name",
+    "parse_ranking_text",
+    "ranking_is_complete",
+    "ranking_items",
+]
@@ -0,0 +1,477 @@
+"""Provider resilience for LLM invocations.
+
+Wraps each provider call with three guards:
+
+* retries with exponential backoff and full jitter, stretched to honour the
+  provider's `Retry-After` hint when it throttles us;
+* a circuit breaker per provider/model that fails fast after repeated
+  failures instead of queueing more work onto a struggling provider;
+* a per-provider cap on concurrent in-flight calls (bulkhead).
+
+When the breaker is open or no concurrency slot frees up in time the call is
+rejected with `E051_LLM_UNAVAILABLE` (503) and a `Retry-After` header.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.exceptions import BaseAppException, raise_app_error
+
+from .llm_admission import run_in_llm_pool
+from .llm_metrics import PROVIDER_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+_THROTTLING_ERROR_CODES = frozenset(
+    {
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceUnavailableException",
+        "ModelNotReadyException",
+        "RESOURCE_EXHAUSTED",
+        "UNAVAILABLE",
+    }
+)
+_THROTTLING_HTTP_STATUSES = frozenset({429, 503})
+
+
+def _iter_causes(exc: BaseException) -> list[BaseException]:
+    chain: list[BaseException] = []
+    current: BaseException | None = exc
+    while current is not None and current not in chain:
+        chain.append(current)
+        current = current.__cause__ or current.__context__
+    return chain
+
+
+def _client_error_code(exc: BaseException) -> str | None:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = (response.get("Error") or {}).get("Code")
+        if code:
+            return str(code)
+    status = getattr(exc, "status", None)
+    if isinstance(status, str) and status:
+        return status
+    return None
+
+
+def _http_status(exc: BaseException) -> int | None:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        status = (response.get("ResponseMetadata") or {}).get("HTTPStatusCode")
+        return int(status) if status else None
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    status_code = getattr(response, "status_code", None)
+    return int(status_code) if isinstance(status_code, int) else None
+
+
+def _response_headers(exc: BaseException) -> dict[str, Any]:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return dict((response.get("ResponseMetadata") or {}).get("HTTPHeaders") or {})
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return {}
+    return {str(key).lower(): value for key, value in dict(headers).items()}
+
+
+def is_throttling_error(exc: BaseException) -> bool:
+    """Return True if the error (or any error it wraps) is a provider throttle."""
+
+    for error in _iter_causes(exc):
+        if _client_error_code(error) in _THROTTLING_ERROR_CODES:
+            return True
+        if _http_status(error) in _THROTTLING_HTTP_STATUSES:
+            return True
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Extract a `Retry-After` hint in seconds from a wrapped provider error."""
+
+    for error in _iter_causes(exc):
+        value = _response_headers(error).get("retry-after")
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            retry_at = parsedate_to_datetime(str(value))
+        except (TypeError, ValueError):
+            continue
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    return None
+
+
+def compute_backoff_delay(
+    attempt: int,
+    *,
+    base_seconds: float,
+    max_seconds: float,
+    retry_after: float | None = None,
+    rand: Callable[[], float] = random.random,
+) -> float:
+    """Exponential backoff with full jitter for the given (1-based) attempt.
+
+    A provider `Retry-After` hint acts as a floor so that we never come back
+    earlier than asked, but it is still capped by `max_seconds`.
+    """
+
+    ceiling = min(max_seconds, base_seconds * (2 ** max(0, attempt - 1)))
+    delay = ceiling * rand()
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(max_seconds, delay)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected for `reset_seconds`. Then a single trial call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int,
+        reset_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_seconds = max(0.0, reset_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == CIRCUIT_OPEN and self._clock() - self._opened_at >= self._reset_seconds:
+                return CIRCUIT_HALF_OPEN
+            return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the open circuit lets a trial call through."""
+
+        with self._lock:
+            if self._state != CIRCUIT_OPEN:
+                return 0.0
+            return max(0.0, self._reset_seconds - (self._clock() - self._opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == CIRCUIT_CLOSED:
+                return True
+            if self._state == CIRCUIT_OPEN:
+                if self._clock() - self._opened_at < self._reset_seconds:
+                    return False
+                self._state = CIRCUIT_HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def abandon(self) -> None:
+        """Give back an allowed call that never reached the provider."""
+
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CIRCUIT_CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == CIRCUIT_HALF_OPEN or self._failures >= self._failure_threshold:
+                if self._state != CIRCUIT_OPEN:
+                    logger.warning("LLM circuit opened after %s consecutive failures", self._failures)
+                self._state = CIRCUIT_OPEN
+                self._opened_at = self._clock()
+
+
+class ConcurrencyLimiter:
+    """Bounded number of in-flight provider calls shared by threads and the event loop."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+
+    def acquire(self, timeout: float) -> bool:
+        return self._semaphore.acquire(timeout=max(0.0, timeout))
+
+    async def aacquire(self, timeout: float) -> bool:
+        if self._semaphore.acquire(blocking=False):
+            return True
+        # Only a saturated limiter parks a worker thread while waiting.
+        waiting = asyncio.ensure_future(run_in_llm_pool(self._semaphore.acquire, timeout=max(0.0, timeout)))
+        try:
+            return await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            # The blocking wait cannot be interrupted; give back a slot it still takes.
+            waiting.add_done_callback(self._release_if_acquired)
+            raise
+
+    def _release_if_acquired(self, waiting: asyncio.Future[bool]) -> None:
+        if not waiting.cancelled() and waiting.exception() is None and waiting.result():
+            self.release()
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+_REGISTRY_LOCK = threading.Lock()
+_BREAKERS: dict[tuple[str, str], CircuitBreaker] = {}
+_LIMITERS: dict[str, ConcurrencyLimiter] = {}
+
+
+def get_circuit_breaker(provider: str, model: str) -> CircuitBreaker:
+    key = (provider, model)
+    breaker = _BREAKERS.get(key)
+    if breaker is None:
+        with _REGISTRY_LOCK:
+            breaker = _BREAKERS.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=int(settings.llm_circuit_failure_threshold or 5),
+                    reset_seconds=float(settings.llm_circuit_reset_seconds or 30.0),
+                )
+                _BREAKERS[key] = breaker
+    return breaker
+
+
+def get_concurrency_limiter(provider: str) -> ConcurrencyLimiter:
+    limiter = _LIMITERS.get(provider)
+    if limiter is None:
+        with _REGISTRY_LOCK:
+            limiter = _LIMITERS.get(provider)
+            if limiter is None:
+                if provider == "gemini":
+                    limit = int(settings.llm_gemini_max_concurrency or 1)
+                else:
+                    limit = int(settings.llm_bedrock_max_concurrency or 1)
+                limiter = ConcurrencyLimiter(limit)
+                _LIMITERS[provider] = limiter
+    return limiter
+
+
+def reset_llm_resilience() -> None:
+    """Drop breaker and limiter state (used by tests and after config changes)."""
+
+    with _REGISTRY_LOCK:
+        _BREAKERS.clear()
+        _LIMITERS.clear()
+
+
+def _resolve_max_attempts(max_attempts: int | None) -> int:
+    if max_attempts is None:
+        max_attempts = int(settings.llm_retry_max_attempts or 1)
+    return max(1, max_attempts)
+
+
+def _reject_unavailable(provider: str, model: str, reason: str, retry_after: float) -> None:
+    PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="rejected")
+    logger.warning("LLM call rejected: provider=%s model=%s reason=%s", provider, model, reason)
+    raise_app_error(
+        ErrorCode.DIAGNOSTICS_LLM_UNAVAILABLE,
+        detail=reason,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+@contextmanager
+def provider_guard(provider: str, model: str) -> Iterator[None]:
+    """Hold a concurrency slot and report the outcome of one provider attempt.
+
+    Only `Exception`s count as provider failures; a consumer closing a stream
+    early (`GeneratorExit`) just gives the slot back.
+    """
+
+    breaker = get_circuit_breaker(provider, model)
+    limiter = get_concurrency_limiter(provider)
+    if not breaker.allow():
+        _reject_unavailable(provider, model, "circuit open", breaker.retry_after())
+    if not limiter.acquire(float(settings.llm_concurrency_wait_seconds or 0.0)):
+        breaker.abandon()
+        _reject_unavailable(
+            provider, model, "concurrency limit reached", float(settings.llm_admission_retry_after_seconds or 1)
+        )
+    try:
+        yield
+    except Exception:
+        breaker.record_failure()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="error")
+        raise
+    except BaseException:
+        # Cancelled (for example the losing side of a hedged call) or closed early.
+        breaker.abandon()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="cancelled")
+        raise
+    else:
+        breaker.record_success()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="success")
+    finally:
+        limiter.release()
+
+
+@asynccontextmanager
+async def aprovider_guard(provider: str, model: str) -> AsyncIterator[None]:
+    """Async counterpart of `provider_guard`."""
+
+    breaker = get_circuit_breaker(provider, model)
+    limiter = get_concurrency_limiter(provider)
+    if not breaker.allow():
+        _reject_unavailable(provider, model, "circuit open", breaker.retry_after())
+    try:
+        acquired = await limiter.aacquire(float(settings.llm_concurrency_wait_seconds or 0.0))
+    except BaseException:
+        # Cancelled while waiting for a slot; a half-open trial must not stay claimed.
+        breaker.abandon()
+        raise
+    if not acquired:
+        breaker.abandon()
+        _reject_unavailable(
+            provider, model, "concurrency limit reached", float(settings.llm_admission_retry_after_seconds or 1)
+        )
+    try:
+        yield
+    except Exception:
+        breaker.record_failure()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="error")
+        raise
+    except BaseException:
+        # Cancelled (for example the losing side of a hedged call) or closed early.
+        breaker.abandon()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="cancelled")
+        raise
+    else:
+        breaker.record_success()
+        PROVIDER_ATTEMPTS.inc(provider=provider, model=model, outcome="success")
+    finally:
+        limiter.release()
+
+
+def next_retry_delay(attempt: int, exc: BaseException) -> float:
+    """Backoff before retrying after `exc`, honouring throttling hints."""
+
+    throttled = is_throttling_error(exc)
+    return compute_backoff_delay(
+        attempt,
+        base_seconds=float(settings.llm_retry_base_delay_seconds or 0.0),
+        max_seconds=float(settings.llm_retry_max_delay_seconds or 0.0),
+        retry_after=retry_after_seconds(exc) if throttled else None,
+    )
+
+
+def call_with_resilience(
+    invoke: Callable[[], T],
+    *,
+    provider: str,
+    model: str,
+    max_attempts: int | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+    log_context: str = "",
+) -> T:
+    """Run a blocking provider call under retry, breaker and concurrency guards."""
+
+    attempts = _resolve_max_attempts(max_attempts)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with provider_guard(provider, model):
+                return invoke()
+        except BaseAppException:
+            raise
+        except Exception as exc:
+            logger.exception("%s invocation attempt failed: %s attempt=%s", provider, log_context, attempt)
+            if attempt >= attempts:
+                raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(exc))
+            delay = next_retry_delay(attempt, exc)
+        if delay > 0:
+            sleep(delay)
+
+
+async def acall_with_resilience(
+    invoke: Callable[[], Awaitable[T]],
+    *,
+    provider: str,
+    model: str,
+    max_attempts: int | None = None,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    log_context: str = "",
+) -> T:
+    """Async counterpart of `call_with_resilience`."""
+
+    attempts = _resolve_max_attempts(max_attempts)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            async with aprovider_guard(provider, model):
+                return await invoke()
+        except BaseAppException:
+            raise
+        except Exception as exc:
+            logger.exception("%s invocation attempt failed: %s attempt=%s", provider, log_context, attempt)
+            if attempt >= attempts:
+                raise_app_error(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail=str(exc))
+            delay = next_retry_delay(attempt, exc)
+        if delay > 0:
+            await sleep(delay)
+
+
+__all__ = [
+    "CIRCUIT_CLOSED",
+    "CIRCUIT_HALF_OPEN",
+    "CIRCUIT_OPEN",
+    "CircuitBreaker",
+    "ConcurrencyLimiter",
+    "acall_with_resilience",
+    "aprovider_guard",
+    "call_with_resilience",
+    "compute_backoff_delay",
+    "get_circuit_breaker",
+    "get_concurrency_limiter",
+    "is_throttling_error",
+    "next_retry_delay",
+    "provider_guard",
+    "reset_llm_resilience",
+    "retry_after_seconds",
+]
@@ -0,0 +1,135 @@
+"""Storage format of LLM result documents.
+
+Documents written by `llm_executor` (format 2) are kept lean:
+
+* the prompt is referenced through `prompt` (`version_id` / `src_hash`)
+  instead of embedding `messages`, since the system prompt is already stored
+  on the version and the user payload is derived from `option_ids`;
+* the provider response is reduced to the fields read back by the API and the
+  frontend parser (text blocks, stop reason, usage);
+* when the reduced payload is still larger than
+  `settings.llm_result_compress_threshold_bytes` it is stored zlib-compressed
+  and base64-encoded under `raw_z` instead of `raw`.
+
+Readers go through `document_raw`, which accepts both the compact format and
+documents written before it.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import zlib
+from collections.abc import Mapping
+from typing import Any
+
+from app.core.config import settings
+
+RESULT_FORMAT_VERSION = 2
+
+_BEDROCK_RAW_KEYS = ("id", "type", "role", "model", "stop_reason", "stop_sequence", "usage")
+_GEMINI_RAW_KEYS = ("text", "usage_metadata", "model_version")
+
+
+def _compact_bedrock_raw(raw: Mapping[str, Any]) -> dict[str, Any]:
+    compact = {key: raw[key] for key in _BEDROCK_RAW_KEYS if raw.get(key) is not None}
+    content = raw.get("content")
+    if isinstance(content, list):
+        compact["content"] = [
+            {"type": "text", "text": block.get("text") or ""}
+            for block in content
+            if isinstance(block, Mapping) and block.get("type", "text") == "text"
+        ]
+    elif content is not None:
+        compact["content"] = content
+    return compact
+
+
+def _compact_gemini_raw(raw: Mapping[str, Any]) -> dict[str, Any]:
+    compact = {key: raw[key] for key in _GEMINI_RAW_KEYS if raw.get(key) is not None}
+    candidates = raw.get("candidates")
+    if isinstance(candidates, list):
+        # The top-level `text` already joins the candidate parts; keep only one copy.
+        keep_parts = not isinstance(compact.get("text"), str)
+        compact_candidates: list[dict[str, Any]] = []
+        for candidate in candidates:
+            if not isinstance(candidate, Mapping):
+                continue
+            entry: dict[str, Any] = {}
+            if candidate.get("finish_reason") is not None:
+                entry["finish_reason"] = candidate["finish_reason"]
+            if not keep_parts:
+                compact_candidates.append(entry)
+                continue
+            content = candidate.get("content") or {}
+            parts = content.get("parts") if isinstance(content, Mapping) else None
+            entry["content"] = {
+                "role": content.get("role") if isinstance(content, Mapping) else None,
+                "parts": [
+                    {"text": part.get("text")}
+                    for part in parts or []
+                    if isinstance(part, Mapping) and part.get("text") is not None
+                ],
+            }
+            compact_candidates.append(entry)
+        compact["candidates"] = compact_candidates
+    return compact
+
+
+def compact_raw(provider: str, raw: Any) -> Any:
+    """Drop provider response fields that are never read back."""
+
+    if not isinstance(raw, Mapping):
+        return raw
+    if provider == "gemini":
+        return _compact_gemini_raw(raw)
+    return _compact_bedrock_raw(raw)
+
+
+def _compress_threshold() -> int:
+    return int(getattr(settings, "llm_result_compress_threshold_bytes", 0) or 0)
+
+
+def encode_raw(raw: Any) -> dict[str, Any]:
+    """Return the document fields holding `raw`, compressed when it is large."""
+
+    threshold = _compress_threshold()
+    if threshold > 0 and raw is not None:
+        encoded = json.dumps(raw, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(encoded) > threshold:
+            return {"raw_z": base64.b64encode(zlib.compress(encoded, 6)).decode("ascii")}
+    return {"raw": raw}
+
+
+def document_raw(document: Mapping[str, Any]) -> Any:
+    """Read the provider payload from a stored document of any format."""
+
+    packed = document.get("raw_z")
+    if isinstance(packed, str):
+        return json.loads(zlib.decompress(base64.b64decode(packed)).decode("utf-8"))
+    return document.get("raw")
+
+
+def compact_document(
+    document: Mapping[str, Any],
+    *,
+    version_id: int,
+    src_hash: str | None,
+) -> dict[str, Any]:
+    """Rewrite a stored document (of any format) in the compact format."""
+
+    compacted = {key: value for key, value in document.items() if key not in {"messages", "raw", "raw_z"}}
+    provider = str(document.get("provider") or "bedrock").strip().lower() or "bedrock"
+    compacted["format"] = RESULT_FORMAT_VERSION
+    compacted.setdefault("prompt", {"version_id": version_id, "src_hash": src_hash})
+    compacted.update(encode_raw(compact_raw(provider, document_raw(document))))
+    return compacted
+
+
+__all__ = [
+    "RESULT_FORMAT_VERSION",
+    "compact_document",
+    "compact_raw",
+    "document_raw",
+    "encode_raw",
+]
@@ -0,0 +1,166 @@
+"""Hedged routing between LLM providers and regions.
+
+With `settings.llm_routing_mode == "hedged"` the primary provider call is
+raced against a secondary target (another Bedrock region, an inference
+profile, or Gemini). The secondary is only fired once the primary has been
+outstanding for longer than the hedge delay, normally the observed p95
+latency of the primary, or straight away if the primary fails first
+(failover). The first successful answer wins and the other call is cancelled;
+a call running on a pool thread keeps its provider slot until it returns.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+ROUTING_MODE_SINGLE = "single"
+ROUTING_MODE_HEDGED = "hedged"
+
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+@dataclass(frozen=True)
+class HedgeTarget:
+    """Secondary destination for a hedged call.
+
+    `region` is only meaningful for Bedrock; `model` of None means "use the
+    provider's configured default".
+    """
+
+    provider: str
+    region: str | None = None
+    model: str | None = None
+
+
+def parse_hedge_target(raw: str | None) -> HedgeTarget | None:
+    """Parse `settings.llm_hedge_target`.
+
+    Accepted forms are `gemini`, `gemini:<model>`, `bedrock:<region>` and
+    `bedrock:<region>:<model or inference profile>`; Bedrock model ids may
+    themselves contain colons.
+    """
+
+    value = (raw or "").strip()
+    if not value:
+        return None
+    provider, _, rest = value.partition(":")
+    provider = provider.strip().lower()
+    if provider == "gemini":
+        return HedgeTarget(provider="gemini", model=rest.strip() or None)
+    if provider == "bedrock":
+        region, _, model = rest.partition(":")
+        return HedgeTarget(
+            provider="bedrock",
+            region=region.strip() or None,
+            model=model.strip() or None,
+        )
+    raise ValueError(f"Unsupported LLM hedge target: {raw!r}")
+
+
+def get_hedge_target() -> HedgeTarget | None:
+    mode = (settings.llm_routing_mode or ROUTING_MODE_SINGLE).strip().lower()
+    if mode != ROUTING_MODE_HEDGED:
+        return None
+    return parse_hedge_target(settings.llm_hedge_target)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per provider/model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._window = window
+        self._lock = threading.Lock()
+        self._samples: dict[tuple[str, str], deque[float]] = {}
+
+    def record(self, provider: str, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault((provider, model), deque(maxlen=self._window))
+            samples.append(seconds)
+
+    def percentile(self, provider: str, model: str, fraction: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get((provider, model), ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(fraction * len(samples)) - 1))
+        return samples[index]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+latency_tracker = LatencyTracker()
+
+
+def hedge_delay_seconds(provider: str, model: str) -> float:
+    """How long the primary may run before the hedged request is fired."""
+
+    if settings.llm_hedge_delay_seconds is not None:
+        return max(0.0, float(settings.llm_hedge_delay_seconds))
+    observed = latency_tracker.percentile(provider, model, float(settings.llm_hedge_percentile or 0.95))
+    if observed is None:
+        return max(0.0, float(settings.llm_hedge_default_delay_seconds or 0.0))
+    return observed
+
+
+async def race_with_hedge(
+    primary: Callable[[], Awaitable[T]],
+    secondary: Callable[[], Awaitable[T]] | None,
+    *,
+    delay_seconds: float,
+) -> tuple[T, bool]:
+    """Run `primary`, hedging with `secondary` after `delay_seconds`.
+
+    Returns the first successful result and whether it came from the
+    secondary. If both fail, the primary's error is raised.
+    """
+
+    primary_task = asyncio.ensure_future(primary())
+    is_secondary: dict[asyncio.Future[T], bool] = {primary_task: False}
+    try:
+        if secondary is None:
+            return await primary_task, False
+
+        done, _ = await asyncio.wait({primary_task}, timeout=delay_seconds)
+        if not done or primary_task.exception() is not None:
+            is_secondary[asyncio.ensure_future(secondary())] = True
+
+        pending: set[asyncio.Future[T]] = set(is_secondary)
+        errors: dict[bool, BaseException] = {}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None:
+                    return task.result(), is_secondary[task]
+                errors[is_secondary[task]] = error
+        raise errors.get(False) or errors[True]
+    finally:
+        # Also reached when the caller is cancelled mid-race.
+        for task in is_secondary:
+            task.cancel()
+
+
+__all__ = [
+    "HedgeTarget",
+    "LatencyTracker",
+    "ROUTING_MODE_HEDGED",
+    "ROUTING_MODE_SINGLE",
+    "get_hedge_target",
+    "hedge_delay_seconds",
+    "latency_tracker",
+    "parse_hedge_target",
+    "race_with_hedge",
+]
@@ -0,0 +1,190 @@
+"""Cross-worker single-flight for identical LLM invocations.
+
+Sessions that share `(version_id, version_options_hash, provider)` produce the
+same prompt, so only one of them needs to reach Bedrock/Gemini. The first
+caller takes a MySQL named lock (`GET_LOCK`) for that key and holds it until
+its transaction ends; concurrent callers block on the same lock and then
+re-check the shared cache on a fresh snapshot instead of invoking the provider.
+
+Named locks belong to a connection, so the lock is taken on a dedicated
+connection rather than the request session's: the session's connection goes
+back to the pool on commit, while the lock must outlive that commit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, SessionTransaction
+
+from .llm_admission import run_in_llm_pool
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME_PREFIX = "llm:"
+
+# Pauses between lock polls of async waiters (doubling up to the maximum).
+POLL_INITIAL_SECONDS = 0.05
+POLL_MAX_SECONDS = 1.0
+
+
+def build_lock_name(*, version_id: int, options_hash: str, provider: str) -> str:
+    """Return a MySQL lock name (max 64 chars) for the invocation key."""
+
+    digest = hashlib.sha1(f"{version_id}:{options_hash}:{provider}".encode("utf-8")).hexdigest()
+    return f"{LOCK_NAME_PREFIX}{digest}"
+
+
+class LlmFlightLock:
+    """Named lock held on a dedicated connection."""
+
+    def __init__(self, connection: Connection, name: str) -> None:
+        self.connection = connection
+        self.name = name
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        try:
+            self.connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+        except Exception:  # pragma: no cover - closing the connection frees the lock anyway
+            logger.exception("Failed to release LLM flight lock: name=%s", self.name)
+        finally:
+            self.connection.close()
+
+    def release_after_transaction(self, db: Session) -> None:
+        """Release once the session's current transaction commits or rolls back.
+
+        Waiters re-read the cache as soon as the lock is free, so the result
+        written by the leader must already be committed by then. Flushes and
+        savepoints end nested transactions of their own; only the end of the
+        outermost one releases the lock.
+        """
+
+        def _on_transaction_end(_session: Session, transaction: SessionTransaction) -> None:
+            # Listeners cannot be removed while the event dispatches; `release`
+            # is idempotent, so later transactions of the session are no-ops.
+            if transaction.parent is None:
+                self.release()
+
+        event.listen(db, "after_transaction_end", _on_transaction_end)
+
+
+def _open_lock_connection(db: Session) -> Connection | None:
+    bind = db.get_bind()
+    if bind.dialect.name != "mysql":
+        return None
+    engine = getattr(bind, "engine", bind)
+    return engine.connect()
+
+
+def _try_get_lock(connection: Connection, name: str, timeout_seconds: float) -> bool:
+    acquired = connection.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"),
+        {"name": name, "timeout": max(0, int(timeout_seconds))},
+    ).scalar()
+    # End the implicit transaction so the follow-up cache lookup on this
+    # connection reads a fresh snapshot. Named locks survive rollback.
+    connection.rollback()
+    return acquired == 1
+
+
+def acquire_flight_lock(
+    db: Session,
+    *,
+    version_id: int,
+    options_hash: str,
+    provider: str,
+    timeout_seconds: float,
+) -> LlmFlightLock | None:
+    """Block until the invocation key is free and return the held lock.
+
+    Returns `None` when the backend has no named locks (non-MySQL) or the wait
+    timed out; callers then fall back to invoking the provider directly.
+    """
+
+    name = build_lock_name(version_id=version_id, options_hash=options_hash, provider=provider)
+    connection = _open_lock_connection(db)
+    if connection is None:
+        return None
+    try:
+        acquired = _try_get_lock(connection, name, timeout_seconds)
+    except Exception:
+        connection.close()
+        logger.exception("Failed to acquire LLM flight lock: name=%s", name)
+        return None
+
+    if not acquired:
+        connection.close()
+        logger.warning("Timed out waiting for LLM flight lock: name=%s", name)
+        return None
+    return LlmFlightLock(connection, name)
+
+
+async def aacquire_flight_lock(
+    db: Session,
+    *,
+    version_id: int,
+    options_hash: str,
+    provider: str,
+    timeout_seconds: float,
+) -> LlmFlightLock | None:
+    """Async variant of `acquire_flight_lock` that waits on the event loop.
+
+    A blocking `GET_LOCK` would hold an LLM pool thread for the whole wait,
+    and enough waiters would starve the leader they are waiting for. Instead
+    the lock is polled with a zero timeout, each poll taking a pool thread
+    only for the round-trip, with a growing pause in between.
+    """
+
+    name = build_lock_name(version_id=version_id, options_hash=options_hash, provider=provider)
+    connection = await run_in_llm_pool(_open_lock_connection, db)
+    if connection is None:
+        return None
+
+    deadline = time.monotonic() + max(0.0, timeout_seconds)
+    delay = POLL_INITIAL_SECONDS
+    poll: asyncio.Future[bool] | None = None
+    try:
+        while True:
+            poll = asyncio.ensure_future(run_in_llm_pool(_try_get_lock, connection, name, 0))
+            if await asyncio.shield(poll):
+                return LlmFlightLock(connection, name)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX_SECONDS)
+    except asyncio.CancelledError:
+        # Let a running poll finish before closing its connection; closing
+        # also frees a lock that poll may have taken.
+        if poll is not None and not poll.done():
+            await asyncio.wait([poll])
+        await run_in_llm_pool(connection.close)
+        raise
+    except Exception:
+        await run_in_llm_pool(connection.close)
+        logger.exception("Failed to acquire LLM flight lock: name=%s", name)
+        return None
+
+    await run_in_llm_pool(connection.close)
+    logger.warning("Timed out waiting for LLM flight lock: name=%s", name)
+    return None
+
+
+__all__ = [
+    "LOCK_NAME_PREFIX",
+    "LlmFlightLock",
+    "POLL_INITIAL_SECONDS",
+    "POLL_MAX_SECONDS",
+    "aacquire_flight_lock",
+    "acquire_flight_lock",
+    "build_lock_name",
+]
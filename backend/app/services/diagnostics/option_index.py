@@ -0,0 +1,89 @@
+"""In-memory index of the `version_options` of each version.
+
+Answer submission only needs to know whether the submitted ids belong to the
+session's version, and the combined completion endpoint also needs their
+`llm_op`. A finalized version never changes once `src_hash` is set,
+so its id set is loaded once per process and reused until the version's
+`src_hash` differs from the one the index was built for. Draft versions
+(`src_hash IS NULL`) are still editable and are read from the database each
+time.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.diagnostic import VersionOption
+
+_INDEX_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class VersionOptionIndex:
+    version_id: int
+    src_hash: str | None
+    option_ids: frozenset[int]
+    llm_ops: Mapping[int, Any]
+
+    def contains_all(self, option_ids: Iterable[int]) -> bool:
+        return self.option_ids.issuperset(option_ids)
+
+
+_INDEXES: OrderedDict[int, VersionOptionIndex] = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def _load_index(db: Session, *, version_id: int, src_hash: str | None) -> VersionOptionIndex:
+    rows = db.execute(
+        select(VersionOption.id, VersionOption.llm_op).where(VersionOption.version_id == version_id)
+    ).all()
+    llm_ops = {option_id: llm_op for option_id, llm_op in rows}
+    return VersionOptionIndex(
+        version_id=version_id,
+        src_hash=src_hash,
+        option_ids=frozenset(llm_ops),
+        llm_ops=MappingProxyType(llm_ops),
+    )
+
+
+def get_version_option_index(db: Session, *, version_id: int, src_hash: str | None) -> VersionOptionIndex:
+    """Return the option index of a version, built once per `src_hash`."""
+
+    if src_hash is None:
+        return _load_index(db, version_id=version_id, src_hash=None)
+
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(version_id)
+        if index is not None and index.src_hash == src_hash:
+            _INDEXES.move_to_end(version_id)
+            return index
+
+    index = _load_index(db, version_id=version_id, src_hash=src_hash)
+    with _INDEXES_LOCK:
+        _INDEXES[version_id] = index
+        _INDEXES.move_to_end(version_id)
+        while len(_INDEXES) > _INDEX_CACHE_SIZE:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+def reset_version_option_indexes() -> None:
+    """Drop every cached index (used by tests)."""
+
+    with _INDEXES_LOCK:
+        _INDEXES.clear()
+
+
+__all__ = [
+    "VersionOptionIndex",
+    "get_version_option_index",
+    "reset_version_option_indexes",
+]
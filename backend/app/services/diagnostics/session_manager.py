@@ -5,9 +5,10 @@ from __future__ import annotations
 import base64
 import logging
 import secrets
-from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
 
-from sqlalchemy import Select, select
+from sqlalchemy import Select, insert, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -20,13 +21,27 @@ from app.models.diagnostic import (
     Diagnostic,
     DiagnosticSession,
     DiagnosticVersion,
+    utcnow,
 )
 
+from .active_version_cache import resolve_active_version
+
 logger = logging.getLogger(__name__)
 
 SESSION_CODE_MAX_ATTEMPTS = 3
 
 
+@dataclass(frozen=True)
+class StartedSession:
+    """Values of a freshly inserted `sessions` row, known without reading it back."""
+
+    id: int
+    session_code: str
+    diagnostic_id: int
+    version_id: int
+    created_at: datetime
+
+
 def generate_session_code() -> str:
     """Generate a random, URL-safe session code.
 
@@ -55,7 +70,7 @@ def _active_version_lookup_query(diagnostic_code: str) -> Select[tuple[int, bool
     )
 
 
-def _resolve_active_version_id(db: Session, diagnostic_code: str) -> tuple[int, int]:
+def _load_active_version_id(db: Session, diagnostic_code: str) -> tuple[int, int]:
     result = db.execute(_active_version_lookup_query(diagnostic_code)).first()
     if result is None:
         raise_app_error(ErrorCode.DIAGNOSTICS_DIAGNOSTIC_NOT_FOUND)
@@ -83,6 +98,10 @@ def _resolve_active_version_id(db: Session, diagnostic_code: str) -> tuple[int,
     return diagnostic_id, version_id
 
 
+def _resolve_active_version_id(db: Session, diagnostic_code: str) -> tuple[int, int]:
+    return resolve_active_version(diagnostic_code, lambda: _load_active_version_id(db, diagnostic_code))
+
+
 def _is_session_code_conflict(exc: IntegrityError) -> bool:
     orig = getattr(exc, "orig", None)
     if orig is None:  # pragma: no cover - defensive guard
@@ -107,10 +126,14 @@ def create_diagnostic_session(
     diagnostic_code: str,
     *,
     user_id: int | None,
-    option_ids: Iterable[int | str] | None = None,
-) -> DiagnosticSession:
+) -> StartedSession:
     """Create a new diagnostic session for the given diagnostic code.
 
+    The row is written with a single INSERT whose values (including the
+    timestamps) are fixed client-side, so the caller can respond without
+    re-reading it. Session codes carry 128 random bits, so collisions are
+    left to the unique constraint and only retried when the INSERT fails.
+
     Parameters
     ----------
     db:
@@ -120,45 +143,31 @@ def create_diagnostic_session(
     user_id:
         Optional authenticated user identifier. ``None`` indicates an
         anonymous session.
-    option_ids:
-        Optional collection of answer option identifiers to seed the
-        ``version_options_hash``. Defaults to an empty collection.
     """
 
-    option_ids = tuple(option_ids or ())
-
-    def _resolve_version_hash() -> tuple[int, int, str]:
-        diag_id, diag_version_id = _resolve_active_version_id(db, diagnostic_code)
-        return diag_id, diag_version_id, compute_version_options_hash(diag_version_id, option_ids)
-
-    diagnostic_id, version_id, version_hash = _resolve_version_hash()
+    diagnostic_id, version_id = _resolve_active_version_id(db, diagnostic_code)
+    # The hash of the empty answer set; each submission folds its answers into it.
+    version_hash = compute_version_options_hash(version_id, ())
 
     last_error: IntegrityError | None = None
     for attempt in range(SESSION_CODE_MAX_ATTEMPTS):
         session_code = generate_session_code()
-        conflict = db.scalar(
-            select(DiagnosticSession.id).where(
-                DiagnosticSession.session_code == session_code
-            )
-        )
-        if conflict is not None:
-            logger.warning(
-                "Session code collision detected before insert for diagnostic_code=%s attempt=%s",
-                diagnostic_code,
-                attempt + 1,
-            )
-            continue
-
-        session = DiagnosticSession(
-            user_id=user_id,
-            session_code=session_code,
-            diagnostic_id=diagnostic_id,
-            version_id=version_id,
-            version_options_hash=version_hash,
-        )
-        db.add(session)
+        created_at = utcnow()
         try:
-            db.flush()
+            # MySQL rolls back only the failed statement on a duplicate key, so the
+            # surrounding transaction stays usable for the retry.
+            result = db.execute(
+                insert(DiagnosticSession).values(
+                    user_id=user_id,
+                    session_code=session_code,
+                    diagnostic_id=diagnostic_id,
+                    version_id=version_id,
+                    version_options_hash=version_hash,
+                    answer_ids=b"",  # no answers yet; see answer_vector
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+            )
         except IntegrityError as exc:
             if _is_session_code_conflict(exc):
                 last_error = exc
@@ -167,12 +176,16 @@ def create_diagnostic_session(
                     diagnostic_code,
                     attempt + 1,
                 )
-                db.rollback()
-                diagnostic_id, version_id, version_hash = _resolve_version_hash()
                 continue
             db.rollback()
             raise
-        return session
+        return StartedSession(
+            id=result.inserted_primary_key[0],
+            session_code=session_code,
+            diagnostic_id=diagnostic_id,
+            version_id=version_id,
+            created_at=created_at,
+        )
 
     logger.error(
         "Failed to allocate unique session_code for diagnostic_code=%s after %s attempts",
@@ -188,6 +201,7 @@ def create_diagnostic_session(
 
 __all__ = [
     "SESSION_CODE_MAX_ATTEMPTS",
+    "StartedSession",
     "create_diagnostic_session",
     "generate_session_code",
 ]
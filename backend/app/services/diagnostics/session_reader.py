@@ -1,19 +1,24 @@
 from __future__ import annotations
 
-import copy
+import asyncio
 import re
-from collections.abc import Mapping
+import time
+from collections.abc import Awaitable, Callable, Mapping
 from typing import Any
 
 from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.errors import ErrorCode
 from app.core.exceptions import raise_app_error
-from app.models.diagnostic import DiagnosticSession, VersionOutcome
+from app.models.diagnostic import DiagnosticSession, LlmResult, VersionOutcome
+
+from .llm_ranking import ranking_is_complete, ranking_items
+from .llm_result_format import document_raw
 
 SESSION_CODE_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
-PUBLIC_LLM_RESULT_KEYS = ("raw", "generated_at")
+PUBLIC_LLM_RESULT_KEYS = ("raw", "ranking", "generated_at")
 
 
 def _validate_session_code(session_code: str) -> None:
@@ -25,34 +30,41 @@ def _sanitise_llm_result(document: Any) -> dict[str, Any] | None:
     if not isinstance(document, Mapping):
         return None
 
-    sanitised: dict[str, Any] = {}
-    for key in PUBLIC_LLM_RESULT_KEYS:
-        value = document.get(key)
-        if key == "raw" and value is not None:
-            sanitised[key] = copy.deepcopy(value)
-        else:
-            sanitised[key] = value
-    return sanitised
+    # Documents are freshly deserialised per query, so no defensive copy is needed.
+    # With a complete ranking the provider envelope is not sent (nor decompressed);
+    # documents without one (older results, partial or unparsable output) keep `raw`.
+    return {
+        "raw": None if ranking_is_complete(document) else document_raw(document),
+        "ranking": ranking_items(document),
+        "generated_at": document.get("generated_at"),
+    }
 
 
 def _sanitise_outcome_meta(document: Any) -> dict[str, Any] | None:
     if not isinstance(document, Mapping):
         return {}
-    return copy.deepcopy(document)
+    return dict(document)
 
 
 def get_public_session_payload(db: Session, *, session_code: str) -> dict[str, Any]:
     _validate_session_code(session_code)
 
-    stmt: Select[tuple[int, dict[str, Any] | None]] = select(
-        DiagnosticSession.version_id,
-        DiagnosticSession.llm_result,
-    ).where(DiagnosticSession.session_code == session_code)
+    stmt: Select[tuple[int, dict[str, Any] | None, dict[str, Any] | None]] = (
+        select(
+            DiagnosticSession.version_id,
+            LlmResult.document,
+            DiagnosticSession.llm_result,
+        )
+        .outerjoin(LlmResult, LlmResult.id == DiagnosticSession.llm_result_id)
+        .where(DiagnosticSession.session_code == session_code)
+    )
     row = db.execute(stmt).first()
     if row is None:
         raise_app_error(ErrorCode.DIAGNOSTICS_SESSION_NOT_FOUND)
 
-    version_id, llm_result = row
+    version_id, stored_result, inline_result = row
+    # Sessions written before `llm_results` existed keep the document inline.
+    llm_result = stored_result if stored_result is not None else inline_result
 
     outcomes_stmt: Select[tuple[int, int, dict[str, Any] | None]] = (
         select(
@@ -79,8 +91,59 @@ def get_public_session_payload(db: Session, *, session_code: str) -> dict[str, A
     }
 
 
+def wait_for_public_session_payload(
+    db: Session,
+    *,
+    session_code: str,
+    wait_seconds: float,
+    interval_seconds: float,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+) -> dict[str, Any]:
+    """Long-poll variant of `get_public_session_payload`.
+
+    Re-reads the session until `llm_result` is present or `wait_seconds`
+    elapse, whichever comes first. The last payload read is returned either
+    way so callers can tell a timeout apart by `llm_result` being `None`.
+    """
+
+    deadline = clock() + max(0.0, wait_seconds)
+    while True:
+        payload = get_public_session_payload(db, session_code=session_code)
+        remaining = deadline - clock()
+        if payload["llm_result"] is not None or remaining <= 0:
+            return payload
+        # End the current transaction so the next read sees rows committed
+        # by the job worker (MySQL REPEATABLE READ keeps a per-transaction snapshot).
+        db.commit()
+        sleep(min(max(interval_seconds, 0.01), remaining))
+
+
+async def wait_for_public_session_payload_async(
+    db: AsyncSession,
+    *,
+    session_code: str,
+    wait_seconds: float,
+    interval_seconds: float,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    clock: Callable[[], float] = time.monotonic,
+) -> dict[str, Any]:
+    """`wait_for_public_session_payload` for `AsyncSession`; waits without holding a thread."""
+
+    deadline = clock() + max(0.0, wait_seconds)
+    while True:
+        payload = await db.run_sync(lambda session: get_public_session_payload(session, session_code=session_code))
+        remaining = deadline - clock()
+        if payload["llm_result"] is not None or remaining <= 0:
+            return payload
+        await db.commit()
+        await sleep(min(max(interval_seconds, 0.01), remaining))
+
+
 __all__ = [
     "PUBLIC_LLM_RESULT_KEYS",
     "SESSION_CODE_PATTERN",
     "get_public_session_payload",
+    "wait_for_public_session_payload",
+    "wait_for_public_session_payload_async",
 ]
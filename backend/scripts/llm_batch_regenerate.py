@@ -0,0 +1,97 @@
+"""Regenerate LLM results for a version through Bedrock batch inference.
+
+`submit` sends every uncached answer combination of the version as one batch
+job; `poll` refreshes submitted jobs and loads finished outputs into
+`llm_results`. Run `poll` from a scheduler (cron / ECS scheduled task), or
+pass `--wait` to block until the job finishes.
+
+Usage:
+    python scripts/llm_batch_regenerate.py submit --version-id ID [--limit N] [--wait]
+    python scripts/llm_batch_regenerate.py poll [--job-id CODE] [--wait]
+"""
+from __future__ import annotations
+
+import argparse
+
+from app.core.exceptions import BaseAppException
+from app.db.session import SessionLocal
+from app.models.diagnostic import LlmBatchJob
+from app.services.diagnostics.llm_batch import (
+    BATCH_STATUS_FAILED,
+    poll_submitted_batch_jobs,
+    submit_batch_regeneration,
+    wait_for_batch_job,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Bulk-regenerate LLM results with Bedrock batch inference")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit = subparsers.add_parser("submit", help="Submit a batch job for a version")
+    submit.add_argument("--version-id", type=int, required=True)
+    submit.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Number of most frequent combinations to consider (default: LLM_BATCH_MAX_RECORDS).",
+    )
+    submit.add_argument("--wait", action="store_true", help="Poll until the job finishes.")
+
+    poll = subparsers.add_parser("poll", help="Refresh submitted jobs and load finished outputs")
+    poll.add_argument("--job-id", default=None, help="Only this job (default: every submitted job).")
+    poll.add_argument("--wait", action="store_true", help="With --job-id, poll until the job finishes.")
+
+    for sub in (submit, poll):
+        sub.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Seconds between polls with --wait (default: LLM_BATCH_POLL_INTERVAL_SECONDS).",
+        )
+    return parser.parse_args()
+
+
+def _print_job(job: LlmBatchJob) -> None:
+    print(
+        f"job_id={job.job_code} version_id={job.version_id} status={job.status} "
+        f"provider_status={job.provider_status} records={job.record_count} "
+        f"loaded={job.loaded_count} failed={job.failed_count}"
+    )
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.command == "submit":
+        db = SessionLocal()
+        try:
+            job = submit_batch_regeneration(db, version_id=args.version_id, limit=args.limit)
+            db.commit()
+            job_code = job.job_code
+            _print_job(job)
+        except BaseAppException as exc:
+            db.rollback()
+            print(f"{exc.error_code.value}: {exc.detail or exc.error_code.message}")
+            return 1
+        finally:
+            db.close()
+        if not args.wait:
+            return 0
+        job = wait_for_batch_job(job_code, interval_seconds=args.interval)
+        _print_job(job)
+        return 1 if job.status == BATCH_STATUS_FAILED else 0
+
+    if args.job_id is not None:
+        job = wait_for_batch_job(args.job_id, interval_seconds=args.interval, timeout_seconds=None if args.wait else 0)
+        _print_job(job)
+        return 1 if job.status == BATCH_STATUS_FAILED else 0
+
+    jobs = poll_submitted_batch_jobs()
+    for job in jobs:
+        _print_job(job)
+    return 1 if any(job.status == BATCH_STATUS_FAILED for job in jobs) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
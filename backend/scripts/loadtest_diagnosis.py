@@ -0,0 +1,341 @@
+"""Load-test the diagnosis flow against a local API with a simulated LLM provider.
+
+Each virtual user repeats the scenario
+start session -> get form -> submit answers -> call LLM -> get session
+and the run ends with a throughput / latency percentile report per step.
+
+Run the API with `MODE=fake` (or `MODE=fake_gemini`) and a local database, e.g.
+    MODE=fake FAKE_LLM_LATENCY_MEDIAN_MS=2000 uvicorn app.main:app --workers 2
+then:
+    python scripts/loadtest_diagnosis.py --diagnostic-code ai_career --users 20 --duration 60
+
+`--in-process` drives the ASGI app directly (no server needed) and forces the
+simulated provider. Only local targets are accepted unless `--allow-remote`.
+
+Usage:
+    python scripts/loadtest_diagnosis.py --diagnostic-code CODE [--users N]
+        [--duration SECONDS | --iterations N] [--combinations K] [--stream]
+        [--base-url URL | --in-process] [--json PATH]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlparse
+
+import httpx
+
+STEPS = ("start_session", "get_form", "submit_answers", "call_llm", "get_session")
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "testserver"}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test the diagnosis flow with a simulated LLM provider")
+    parser.add_argument("--diagnostic-code", required=True, help="Diagnostic code with an active version.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="API base URL (default: %(default)s).")
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Drive app.main:app in-process with MODE=fake instead of calling --base-url.",
+    )
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users (default: %(default)s).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Run time in seconds (default: %(default)s).")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=None,
+        help="Stop after this many scenarios in total instead of after --duration.",
+    )
+    parser.add_argument(
+        "--combinations",
+        type=int,
+        default=None,
+        help="Draw answers from K fixed combinations to exercise result reuse (default: random answers).",
+    )
+    parser.add_argument("--stream", action="store_true", help="Call /llm/stream instead of /llm.")
+    parser.add_argument("--force-regenerate", action="store_true", help="Send force_regenerate=true to /llm.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for answer selection.")
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the report to this JSON file.")
+    parser.add_argument("--allow-remote", action="store_true", help="Permit a non-local --base-url.")
+    return parser.parse_args()
+
+
+@dataclass
+class StepStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter[str] = field(default_factory=Counter)
+    errors: int = 0
+
+    def record(self, seconds: float, status: str, ok: bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+
+@dataclass
+class LoadTestResult:
+    steps: dict[str, StepStats] = field(default_factory=lambda: defaultdict(StepStats))
+    scenarios_started: int = 0
+    scenarios_completed: int = 0
+    elapsed: float = 0.0
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile of `values`."""
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FormCache:
+    """Per-run cache of version forms, revalidated with `If-None-Match` like a browser."""
+
+    def __init__(self) -> None:
+        self._forms: dict[int, tuple[str | None, dict[str, Any]]] = {}
+
+    def etag(self, version_id: int) -> str | None:
+        cached = self._forms.get(version_id)
+        return cached[0] if cached else None
+
+    def get(self, version_id: int) -> dict[str, Any] | None:
+        cached = self._forms.get(version_id)
+        return cached[1] if cached else None
+
+    def store(self, version_id: int, etag: str | None, form: dict[str, Any]) -> None:
+        self._forms[version_id] = (etag, form)
+
+
+def choose_answers(form: dict[str, Any], rng: random.Random) -> list[int]:
+    """Pick one active option per active question (one or two for multi-select ones)."""
+
+    selected: list[int] = []
+    for question in form.get("questions") or []:
+        if not question.get("is_active", True):
+            continue
+        options = [
+            option["version_option_id"]
+            for option in (form.get("options") or {}).get(str(question["id"]), [])
+            if option.get("is_active", True)
+        ]
+        if not options:
+            continue
+        count = rng.randint(1, min(2, len(options))) if question.get("multi") else 1
+        selected.extend(rng.sample(options, count))
+    return sorted(selected)
+
+
+class Scenario:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace, result: LoadTestResult) -> None:
+        self.client = client
+        self.args = args
+        self.result = result
+        self.forms = FormCache()
+        self.rng = random.Random(args.seed)
+        self._combinations: dict[int, list[list[int]]] = {}
+
+    async def _timed(self, step: str, method: str, url: str, **kwargs: Any) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            if step == "call_llm" and self.args.stream:
+                await response.aread()
+        except httpx.HTTPError as exc:
+            self.result.steps[step].record(time.perf_counter() - started, type(exc).__name__, False)
+            return None
+        ok = response.status_code < 400
+        if ok and step == "call_llm" and self.args.stream:
+            # SSE failures arrive as an `error` event on a 200 response.
+            ok = "event: error" not in response.text
+        self.result.steps[step].record(time.perf_counter() - started, str(response.status_code), ok)
+        return response if ok else None
+
+    def _answers(self, version_id: int, form: dict[str, Any]) -> list[int]:
+        if not self.args.combinations:
+            return choose_answers(form, self.rng)
+        pool = self._combinations.get(version_id)
+        if pool is None:
+            pool = [choose_answers(form, self.rng) for _ in range(self.args.combinations)]
+            self._combinations[version_id] = pool
+        return self.rng.choice(pool)
+
+    async def run_once(self) -> bool:
+        started = await self._timed("start_session", "POST", f"/diagnostics/{self.args.diagnostic_code}/sessions")
+        if started is None:
+            return False
+        session = started.json()
+        session_code = session["session_code"]
+        version_id = int(session["version_id"])
+
+        headers = {}
+        etag = self.forms.etag(version_id)
+        if etag:
+            headers["If-None-Match"] = etag
+        form_response = await self._timed("get_form", "GET", f"/diagnostics/versions/{version_id}/form", headers=headers)
+        if form_response is None:
+            return False
+        if form_response.status_code != 304:
+            self.forms.store(version_id, form_response.headers.get("ETag"), form_response.json())
+        form = self.forms.get(version_id)
+        if form is None:
+            return False
+
+        answers = self._answers(version_id, form)
+        submitted = await self._timed(
+            "submit_answers",
+            "POST",
+            f"/sessions/{session_code}/answers",
+            json={"version_option_ids": answers},
+        )
+        if submitted is None:
+            return False
+
+        llm_path = f"/sessions/{session_code}/llm/stream" if self.args.stream else f"/sessions/{session_code}/llm"
+        called = await self._timed("call_llm", "POST", llm_path, json={"force_regenerate": self.args.force_regenerate})
+        if called is None:
+            return False
+
+        return await self._timed("get_session", "GET", f"/sessions/{session_code}") is not None
+
+
+async def _virtual_user(scenario: Scenario, deadline: float, budget: list[int]) -> None:
+    result = scenario.result
+    while time.perf_counter() < deadline:
+        if budget:
+            if budget[0] <= 0:
+                return
+            budget[0] -= 1
+        result.scenarios_started += 1
+        if await scenario.run_once():
+            result.scenarios_completed += 1
+
+
+def _build_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    if not args.in_process:
+        return httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits)
+
+    from app.core.config import settings
+    from app.services.diagnostics import llm_executor
+    from app.services.diagnostics.fake_llm import fake_protocol_for_mode
+
+    if fake_protocol_for_mode(settings.mode) is None:
+        print(f"--in-process: switching MODE from {settings.mode!r} to 'fake'", file=sys.stderr)
+        settings.mode = "fake"
+        llm_executor.reset_llm_clients()
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=args.timeout, limits=limits)
+
+
+async def run_load_test(args: argparse.Namespace) -> LoadTestResult:
+    result = LoadTestResult()
+    budget = [args.iterations] if args.iterations is not None else []
+    deadline = math.inf if args.iterations is not None else time.perf_counter() + args.duration
+    async with _build_client(args) as client:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                _virtual_user(
+                    Scenario(client, _user_args(args, index), result),
+                    deadline,
+                    budget,
+                )
+                for index in range(args.users)
+            )
+        )
+        result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _user_args(args: argparse.Namespace, index: int) -> argparse.Namespace:
+    # Distinct, reproducible answer streams per virtual user.
+    user_args = argparse.Namespace(**vars(args))
+    user_args.seed = None if args.seed is None else args.seed + index
+    return user_args
+
+
+def build_report(result: LoadTestResult, args: argparse.Namespace) -> dict[str, Any]:
+    elapsed = max(result.elapsed, 1e-9)
+    requests = sum(len(stats.latencies) for stats in result.steps.values())
+    report: dict[str, Any] = {
+        "users": args.users,
+        "elapsed_seconds": round(result.elapsed, 3),
+        "scenarios_started": result.scenarios_started,
+        "scenarios_completed": result.scenarios_completed,
+        "scenarios_per_second": round(result.scenarios_completed / elapsed, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / elapsed, 3),
+        "steps": {},
+    }
+    for step in STEPS:
+        stats = result.steps.get(step)
+        if stats is None:
+            continue
+        latencies = stats.latencies
+        report["steps"][step] = {
+            "count": len(latencies),
+            "errors": stats.errors,
+            "statuses": dict(stats.statuses),
+            "mean_ms": round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+            **{
+                f"p{label}_ms": round(1000 * value, 1) if (value := percentile(latencies, fraction)) is not None else None
+                for label, fraction in (("50", 0.50), ("90", 0.90), ("95", 0.95), ("99", 0.99))
+            },
+            "max_ms": round(1000 * max(latencies), 1) if latencies else None,
+        }
+    return report
+
+
+def _print_report(report: dict[str, Any]) -> None:
+    print(
+        f"users={report['users']} elapsed={report['elapsed_seconds']}s "
+        f"scenarios={report['scenarios_completed']}/{report['scenarios_started']} "
+        f"({report['scenarios_per_second']}/s) requests={report['requests']} ({report['requests_per_second']}/s)"
+    )
+    header = f"{'step':<16}{'count':>8}{'errors':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    for step, stats in report["steps"].items():
+        cells = [stats[key] for key in ("mean_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(
+            f"{step:<16}{stats['count']:>8}{stats['errors']:>8}"
+            + "".join(f"{'-' if cell is None else cell:>10}" for cell in cells)
+        )
+    print("latencies in ms; statuses:", {step: stats["statuses"] for step, stats in report["steps"].items()})
+
+
+def main() -> int:
+    args = parse_args()
+    if args.users < 1:
+        print("--users must be at least 1")
+        return 2
+    host = urlparse(args.base_url).hostname or ""
+    if not args.in_process and host not in LOCAL_HOSTS and not args.allow_remote:
+        print(f"Refusing to load-test non-local host {host!r}; pass --allow-remote to override")
+        return 2
+
+    result = asyncio.run(run_load_test(args))
+    report = build_report(result, args)
+    _print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+    return 0 if result.scenarios_completed == result.scenarios_started else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
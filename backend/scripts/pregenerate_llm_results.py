@@ -0,0 +1,79 @@
+"""Pre-generate LLM results for the most popular answer combinations.
+
+Intended to run from a scheduler (cron / ECS scheduled task) after versions
+are activated.
+
+Usage:
+    python scripts/pregenerate_llm_results.py [--diagnostic-id ID] [--limit N] [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+
+from app.db.session import SessionLocal
+from app.services.diagnostics.llm_pregeneration import (
+    PregenerationReport,
+    execute_pregeneration,
+    plan_pregeneration,
+    pregenerate_active_versions,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-generate LLM results for popular answer combinations")
+    parser.add_argument(
+        "--diagnostic-id",
+        type=int,
+        default=None,
+        help="Only process this diagnostic (default: every diagnostic with an active version).",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Number of most frequent combinations to consider (default: LLM_PREGENERATION_LIMIT).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the plan without calling the LLM provider.",
+    )
+    return parser.parse_args()
+
+
+def _print_report(report: PregenerationReport) -> None:
+    print(
+        f"diagnostic_id={report.diagnostic_id} version_id={report.version_id} "
+        f"generated={report.generated} skipped={report.skipped} failed={report.failed}"
+    )
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.dry_run and args.diagnostic_id is None:
+        print("--dry-run requires --diagnostic-id")
+        return 2
+
+    if args.diagnostic_id is None:
+        reports = pregenerate_active_versions(limit=args.limit)
+    else:
+        db = SessionLocal()
+        try:
+            plan = plan_pregeneration(db, diagnostic_id=args.diagnostic_id, limit=args.limit)
+        finally:
+            db.close()
+        if args.dry_run:
+            for candidate in plan.candidates:
+                state = "cached" if candidate.cached else "missing"
+                print(f"{candidate.version_options_hash} sessions={candidate.sessions} {state}")
+            return 0
+        reports = [execute_pregeneration(plan)]
+
+    for report in reports:
+        _print_report(report)
+    return 1 if any(report.failed for report in reports) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
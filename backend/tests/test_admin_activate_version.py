@@ -20,6 +20,7 @@ from app.models.diagnostic import (
     DiagnosticVersionAuditLog,
     utcnow,
 )
+from app.services.diagnostics.active_version_cache import invalidate_active_versions, resolve_active_version
 from tests.factories import (
     AdminUserFactory,
     DiagnosticFactory,
@@ -181,6 +182,32 @@ def test_activate_version_without_diagnostic_body(client: TestClient, db_session
     assert active.version_id == version.id
 
 
+def test_activate_version_invalidates_cached_active_version(client: TestClient, db_session: Session) -> None:
+    admin = AdminUserFactory(user_id=f"admin_{uuid.uuid4().hex}", is_active=True)
+    diagnostic = DiagnosticFactory(code=f"diag-{uuid.uuid4().hex[:8]}")
+    version = DiagnosticVersionFactory(
+        diagnostic=diagnostic,
+        created_by_admin=admin,
+        updated_by_admin=admin,
+        src_hash="ready-hash",
+    )
+    invalidate_active_versions()
+    # Prime the cache as a session start would have done before the activation.
+    resolve_active_version(diagnostic.code, lambda: (diagnostic.id, -1))
+
+    response = client.post(
+        f"/admin/diagnostics/versions/{version.id}/activate",
+        headers=_auth_header(admin.id, user_id=admin.user_id),
+    )
+    assert response.status_code == 200, response.text
+
+    try:
+        resolved = resolve_active_version(diagnostic.code, lambda: (diagnostic.id, version.id))
+        assert resolved == (diagnostic.id, version.id)
+    finally:
+        invalidate_active_versions()
+
+
 def test_activate_version_diagnostic_mismatch(client: TestClient, db_session: Session) -> None:
     admin = AdminUserFactory(user_id=f"admin_{uuid.uuid4().hex}", is_active=True)
     diagnostic = DiagnosticFactory(code=f"diag-{uuid.uuid4().hex[:8]}")
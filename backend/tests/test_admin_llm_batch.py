@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.registry import compute_version_options_hash
+from app.core.security import create_access_token
+from app.deps import admin as admin_deps
+from app.main import app
+from app.models.admin_user import AdminUser
+from app.models.diagnostic import (
+    AnswerChoice,
+    CfgActiveVersion,
+    Diagnostic,
+    DiagnosticSession,
+    DiagnosticVersion,
+    LlmBatchJob,
+    LlmResult,
+    Option,
+    Question,
+    VersionOption,
+    VersionQuestion,
+)
+from app.services.diagnostics import llm_batch, llm_executor, llm_metrics, llm_prompt_cache, llm_resilience
+from app.services.diagnostics.bedrock_batch import BedrockBatchError, LocalBatchClient
+from tests.utils.db import DEFAULT_TABLES, truncate_tables
+
+
+def _database_url() -> str:
+    url = os.environ.get("TEST_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    assert url, "DATABASE_URL or TEST_DATABASE_URL must be configured for tests"
+    return url
+
+
+@pytest.fixture
+def db_session(prepare_db) -> Iterator[Session]:
+    engine = create_engine(_database_url(), future=True)
+    truncate_tables(engine, DEFAULT_TABLES)
+
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    TestingSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=connection,
+        future=True,
+    )
+    session = TestingSessionLocal()
+    session.begin_nested()
+
+    @event.listens_for(session, "after_transaction_end")
+    def restart_savepoint(sess, trans):  # pragma: no cover - SQLAlchemy internals
+        if trans.nested and not trans._parent.nested:
+            sess.begin_nested()
+
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def client(db_session: Session) -> Iterator[TestClient]:
+    def override_get_db() -> Iterator[Session]:
+        try:
+            yield db_session
+        finally:  # pragma: no cover - dependency teardown
+            pass
+
+    app.dependency_overrides[admin_deps.get_db] = override_get_db
+    llm_resilience.reset_llm_resilience()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(admin_deps.get_db, None)
+
+
+def _nested_session(db: Session) -> Session:
+    # A separate session inside the test transaction; its commits release savepoints.
+    return Session(bind=db.connection(), autoflush=False, join_transaction_mode="create_savepoint")
+
+
+class RecordingBedrockClient:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        self.calls.append((model_id, payload))
+        return {"content": [{"type": "text", "text": "pregenerated"}]}
+
+
+def _auth_header(admin: AdminUser) -> dict[str, str]:
+    token = create_access_token(
+        str(admin.id),
+        extra={"role": "admin", "user_id": admin.user_id},
+        expires_delta_minutes=15,
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _prepare_history(db: Session) -> tuple[AdminUser, DiagnosticVersion, list[VersionOption]]:
+    """Active version with two options; option A was chosen twice, option B once."""
+
+    admin = AdminUser(user_id="admin", hashed_password="hashed", is_active=True)
+    db.add(admin)
+    db.flush()
+
+    diagnostic = Diagnostic(code="ai-career", outcome_table_name="mst_ai_jobs", description="", is_active=True)
+    db.add(diagnostic)
+    db.flush()
+
+    version = DiagnosticVersion(
+        diagnostic_id=diagnostic.id,
+        name="Version 1",
+        description="",
+        system_prompt="You are an AI career assistant.",
+        src_hash="version-hash",
+        note=None,
+        created_by_admin_id=admin.id,
+        updated_by_admin_id=admin.id,
+        finalized_by_admin_id=admin.id,
+        finalized_at=datetime.now(timezone.utc),
+    )
+    db.add(version)
+    db.flush()
+
+    question = Question(
+        diagnostic_id=diagnostic.id,
+        q_code="Q001",
+        display_text="Select your focus area",
+        multi=False,
+        sort_order=1,
+        is_active=True,
+    )
+    db.add(question)
+    db.flush()
+
+    version_question = VersionQuestion(
+        version_id=version.id,
+        diagnostic_id=diagnostic.id,
+        question_id=question.id,
+        q_code=question.q_code,
+        display_text=question.display_text,
+        multi=question.multi,
+        sort_order=1,
+        is_active=True,
+        created_by_admin_id=admin.id,
+    )
+    db.add(version_question)
+    db.flush()
+
+    version_options: list[VersionOption] = []
+    for index, code in enumerate(("ML", "WEB"), start=1):
+        option = Option(
+            question_id=question.id,
+            opt_code=code,
+            display_label=code,
+            llm_op={"code": code},
+            sort_order=index,
+            is_active=True,
+        )
+        db.add(option)
+        db.flush()
+        version_option = VersionOption(
+            version_id=version.id,
+            version_question_id=version_question.id,
+            option_id=option.id,
+            q_code=question.q_code,
+            opt_code=option.opt_code,
+            display_label=option.display_label,
+            llm_op=option.llm_op,
+            sort_order=option.sort_order,
+            is_active=True,
+            created_by_admin_id=admin.id,
+        )
+        db.add(version_option)
+        db.flush()
+        version_options.append(version_option)
+
+    db.add(
+        CfgActiveVersion(
+            diagnostic_id=diagnostic.id,
+            version_id=version.id,
+            created_by_admin_id=admin.id,
+            updated_by_admin_id=admin.id,
+        )
+    )
+
+    now = datetime.now(timezone.utc)
+    for index, version_option in enumerate((version_options[0], version_options[0], version_options[1])):
+        session = DiagnosticSession(
+            session_code=f"SESS-{index:03d}",
+            diagnostic_id=diagnostic.id,
+            version_id=version.id,
+            version_options_hash=compute_version_options_hash(version.id, [version_option.id]),
+            ended_at=now,
+        )
+        db.add(session)
+        db.flush()
+        db.add(AnswerChoice(session_id=session.id, version_option_id=version_option.id, answered_at=now))
+    db.flush()
+
+    return admin, version, version_options
+
+
+@pytest.fixture
+def batch_client(monkeypatch: pytest.MonkeyPatch) -> Iterator[RecordingBedrockClient]:
+    runtime = RecordingBedrockClient()
+    local = LocalBatchClient(runtime)
+    monkeypatch.setattr(settings, "llm_batch_min_records", 1)
+    llm_batch.set_batch_client_factory(lambda: local)
+    try:
+        yield runtime
+    finally:
+        llm_batch.set_batch_client_factory(None)
+
+
+def test_batch_regeneration_loads_results_for_sessions(
+    client: TestClient,
+    db_session: Session,
+    batch_client: RecordingBedrockClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    admin, version, version_options = _prepare_history(db_session)
+
+    response = client.post(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == 202, response.text
+    submitted = response.json()
+    assert submitted["status"] == "submitted"
+    assert submitted["record_count"] == 2
+    assert batch_client.calls == []
+    job = db_session.scalar(select(LlmBatchJob).where(LlmBatchJob.job_code == submitted["job_id"]))
+    assert job is not None
+    assert sorted(job.records) == sorted([[version_options[0].id], [version_options[1].id]])
+
+    response = client.get(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch/{submitted['job_id']}",
+        headers=_auth_header(admin),
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "submitted"
+    assert batch_client.calls == [], "the status endpoint must not poll the provider"
+
+    polled = llm_batch.poll_submitted_batch_jobs(session_factory=lambda: _nested_session(db_session))
+    assert [job.job_code for job in polled] == [submitted["job_id"]]
+    db_session.expire_all()
+
+    response = client.get(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch/{submitted['job_id']}",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["status"] == "completed"
+    assert body["provider_status"] == "Completed"
+    assert body["loaded_count"] == 2
+    assert body["failed_count"] == 0
+    assert len(batch_client.calls) == 2
+    _, payload = batch_client.calls[0]
+    assert "cache_control" not in str(payload["system"])
+
+    stub = RecordingBedrockClient()
+    monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", lambda: stub, raising=False)
+    result = llm_executor.call_session_llm(
+        db_session,
+        session_code="SESS-000",
+        model_id=None,
+        temperature=None,
+        top_p=None,
+        force_regenerate=False,
+    )
+    assert result["llm_result"]["raw"] == {"content": [{"type": "text", "text": "pregenerated"}]}
+    assert stub.calls == [], "the session call should hit the batch-generated result"
+
+
+def test_batch_results_do_not_record_live_metrics(db_session: Session) -> None:
+    _, version, version_options = _prepare_history(db_session)
+    llm_prompt_cache.prompt_cache_stats.reset()
+    invoked_model = settings.bedrock_default_inference_profile or settings.bedrock_default_model
+    before_output = llm_metrics.TOKENS.value(provider="bedrock", model=invoked_model, kind="output")
+    before_hits = llm_metrics.PROMPT_CACHE.value(provider="bedrock", status="hit")
+    raw_result = {
+        "content": [{"type": "text", "text": "batch"}],
+        "usage": {"input_tokens": 12, "output_tokens": 20, "cache_read_input_tokens": 1800},
+    }
+
+    written = llm_executor.store_batch_results(
+        db_session,
+        version=version,
+        results=[([version_options[0].id], [version_options[0].llm_op], raw_result)],
+    )
+
+    assert written == 1
+    assert llm_metrics.TOKENS.value(provider="bedrock", model=invoked_model, kind="output") == before_output
+    assert llm_metrics.PROMPT_CACHE.value(provider="bedrock", status="hit") == before_hits
+    assert llm_prompt_cache.prompt_cache_stats.snapshot() == {}
+    stored = db_session.scalar(select(LlmResult.document).where(LlmResult.version_id == version.id))
+    assert stored["prompt_cache"]["status"] == "hit"
+
+
+def test_batch_regeneration_below_minimum_records_is_rejected(
+    client: TestClient,
+    db_session: Session,
+    batch_client: RecordingBedrockClient,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    admin, version, _ = _prepare_history(db_session)
+    monkeypatch.setattr(settings, "llm_batch_min_records", 3)
+
+    response = client.post(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE.value
+    assert db_session.scalar(select(LlmBatchJob.id)) is None
+
+
+class RejectingBatchClient(LocalBatchClient):
+    def __init__(self) -> None:
+        super().__init__(RecordingBedrockClient())
+        self.submitted: list[str] = []
+
+    def submit(self, *, job_name: str, model_id: str, records: Any) -> str:
+        self.submitted.append(job_name)
+        raise BedrockBatchError("quota exceeded")
+
+
+def test_batch_submission_is_blocked_by_pending_job(
+    client: TestClient,
+    db_session: Session,
+    batch_client: RecordingBedrockClient,
+) -> None:
+    admin, version, _ = _prepare_history(db_session)
+    rejecting = RejectingBatchClient()
+    llm_batch.set_batch_client_factory(lambda: rejecting)
+    db_session.add(
+        LlmBatchJob(
+            job_code="PENDING-JOB",
+            version_id=version.id,
+            status=llm_batch.BATCH_STATUS_PENDING,
+            model="model",
+            records=[],
+        )
+    )
+    db_session.flush()
+
+    response = client.post(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_BATCH_UNAVAILABLE.http_status
+    assert "PENDING-JOB" in response.json()["error"]["detail"]
+    assert rejecting.submitted == []
+
+
+def test_rejected_batch_submission_is_recorded_as_failed(
+    client: TestClient,
+    db_session: Session,
+    batch_client: RecordingBedrockClient,
+) -> None:
+    admin, version, _ = _prepare_history(db_session)
+    rejecting = RejectingBatchClient()
+    llm_batch.set_batch_client_factory(lambda: rejecting)
+
+    response = client.post(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.http_status
+    assert len(rejecting.submitted) == 1
+    job = db_session.scalar(select(LlmBatchJob).where(LlmBatchJob.version_id == version.id))
+    assert job is not None
+    db_session.refresh(job)
+    assert job.status == llm_batch.BATCH_STATUS_FAILED
+    assert job.provider_job_id is None
+    assert job.error_detail == "quota exceeded"
+    assert job.job_code.lower() in rejecting.submitted[0]
+
+
+def test_batch_job_not_found(
+    client: TestClient,
+    db_session: Session,
+    batch_client: RecordingBedrockClient,
+) -> None:
+    admin, version, _ = _prepare_history(db_session)
+
+    response = client.get(
+        f"/admin/diagnostics/versions/{version.id}/llm-batch/UNKNOWN",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_BATCH_JOB_NOT_FOUND.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_BATCH_JOB_NOT_FOUND.value
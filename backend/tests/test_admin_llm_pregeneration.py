@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.errors import ErrorCode
+from app.core.registry import compute_version_options_hash
+from app.core.security import create_access_token
+from app.deps import admin as admin_deps
+from app.main import app
+from app.models.admin_user import AdminUser
+from app.models.diagnostic import (
+    AnswerChoice,
+    CfgActiveVersion,
+    Diagnostic,
+    DiagnosticSession,
+    DiagnosticVersion,
+    LlmResult,
+    Option,
+    Question,
+    VersionOption,
+    VersionQuestion,
+)
+from app.services.diagnostics import llm_executor, llm_pregeneration, llm_resilience
+from tests.utils.db import DEFAULT_TABLES, truncate_tables
+
+
+def _database_url() -> str:
+    url = os.environ.get("TEST_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    assert url, "DATABASE_URL or TEST_DATABASE_URL must be configured for tests"
+    return url
+
+
+@pytest.fixture
+def db_session(prepare_db) -> Iterator[Session]:
+    engine = create_engine(_database_url(), future=True)
+    truncate_tables(engine, DEFAULT_TABLES)
+
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    TestingSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=connection,
+        future=True,
+    )
+    session = TestingSessionLocal()
+    session.begin_nested()
+
+    @event.listens_for(session, "after_transaction_end")
+    def restart_savepoint(sess, trans):  # pragma: no cover - SQLAlchemy internals
+        if trans.nested and not trans._parent.nested:
+            sess.begin_nested()
+
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def client(db_session: Session) -> Iterator[TestClient]:
+    def override_get_db() -> Iterator[Session]:
+        try:
+            yield db_session
+        finally:  # pragma: no cover - dependency teardown
+            pass
+
+    app.dependency_overrides[admin_deps.get_db] = override_get_db
+    llm_resilience.reset_llm_resilience()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(admin_deps.get_db, None)
+
+
+class RecordingBedrockClient:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        self.calls.append((model_id, payload))
+        return {"content": [{"type": "text", "text": "pregenerated"}]}
+
+
+def _auth_header(admin: AdminUser) -> dict[str, str]:
+    token = create_access_token(
+        str(admin.id),
+        extra={"role": "admin", "user_id": admin.user_id},
+        expires_delta_minutes=15,
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _prepare_history(db: Session) -> tuple[AdminUser, DiagnosticVersion, list[VersionOption]]:
+    """Active version with two options; option A was chosen twice, option B once."""
+
+    admin = AdminUser(user_id="admin", hashed_password="hashed", is_active=True)
+    db.add(admin)
+    db.flush()
+
+    diagnostic = Diagnostic(code="ai-career", outcome_table_name="mst_ai_jobs", description="", is_active=True)
+    db.add(diagnostic)
+    db.flush()
+
+    version = DiagnosticVersion(
+        diagnostic_id=diagnostic.id,
+        name="Version 1",
+        description="",
+        system_prompt="You are an AI career assistant.",
+        src_hash="version-hash",
+        note=None,
+        created_by_admin_id=admin.id,
+        updated_by_admin_id=admin.id,
+        finalized_by_admin_id=admin.id,
+        finalized_at=datetime.now(timezone.utc),
+    )
+    db.add(version)
+    db.flush()
+
+    question = Question(
+        diagnostic_id=diagnostic.id,
+        q_code="Q001",
+        display_text="Select your focus area",
+        multi=False,
+        sort_order=1,
+        is_active=True,
+    )
+    db.add(question)
+    db.flush()
+
+    version_question = VersionQuestion(
+        version_id=version.id,
+        diagnostic_id=diagnostic.id,
+        question_id=question.id,
+        q_code=question.q_code,
+        display_text=question.display_text,
+        multi=question.multi,
+        sort_order=1,
+        is_active=True,
+        created_by_admin_id=admin.id,
+    )
+    db.add(version_question)
+    db.flush()
+
+    version_options: list[VersionOption] = []
+    for index, code in enumerate(("ML", "WEB"), start=1):
+        option = Option(
+            question_id=question.id,
+            opt_code=code,
+            display_label=code,
+            llm_op={"code": code},
+            sort_order=index,
+            is_active=True,
+        )
+        db.add(option)
+        db.flush()
+        version_option = VersionOption(
+            version_id=version.id,
+            version_question_id=version_question.id,
+            option_id=option.id,
+            q_code=question.q_code,
+            opt_code=option.opt_code,
+            display_label=option.display_label,
+            llm_op=option.llm_op,
+            sort_order=option.sort_order,
+            is_active=True,
+            created_by_admin_id=admin.id,
+        )
+        db.add(version_option)
+        db.flush()
+        version_options.append(version_option)
+
+    db.add(
+        CfgActiveVersion(
+            diagnostic_id=diagnostic.id,
+            version_id=version.id,
+            created_by_admin_id=admin.id,
+            updated_by_admin_id=admin.id,
+        )
+    )
+
+    now = datetime.now(timezone.utc)
+    for index, version_option in enumerate((version_options[0], version_options[0], version_options[1])):
+        session = DiagnosticSession(
+            session_code=f"SESS-{index:03d}",
+            diagnostic_id=diagnostic.id,
+            version_id=version.id,
+            version_options_hash=compute_version_options_hash(version.id, [version_option.id]),
+            ended_at=now,
+        )
+        db.add(session)
+        db.flush()
+        db.add(AnswerChoice(session_id=session.id, version_option_id=version_option.id, answered_at=now))
+    db.flush()
+
+    return admin, version, version_options
+
+
+def test_pregeneration_plans_most_frequent_combinations(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    admin, version, version_options = _prepare_history(db_session)
+    executed: list[llm_pregeneration.PregenerationPlan] = []
+    monkeypatch.setattr(llm_pregeneration, "execute_pregeneration", executed.append)
+
+    response = client.post(
+        f"/admin/diagnostics/{version.diagnostic_id}/llm-pregeneration",
+        json={"limit": 1},
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == 202, response.text
+    body = response.json()
+    assert body == {
+        "diagnostic_id": version.diagnostic_id,
+        "version_id": version.id,
+        "candidates": 1,
+        "cached": 0,
+        "queued": 1,
+    }
+    assert len(executed) == 1
+    (candidate,) = executed[0].candidates
+    assert candidate.version_option_ids == (version_options[0].id,)
+    assert candidate.sessions == 2
+
+
+def test_pregeneration_without_active_version_returns_not_found(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    admin, version, _ = _prepare_history(db_session)
+    db_session.query(CfgActiveVersion).delete()
+    db_session.flush()
+
+    response = client.post(
+        f"/admin/diagnostics/{version.diagnostic_id}/llm-pregeneration",
+        headers=_auth_header(admin),
+    )
+
+    assert response.status_code == ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND.value
+
+
+def test_pregenerated_result_is_reused_by_sessions(
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, version, version_options = _prepare_history(db_session)
+    stub = RecordingBedrockClient()
+    monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", lambda: stub, raising=False)
+
+    plan = llm_pregeneration.plan_pregeneration(db_session, diagnostic_id=version.diagnostic_id, limit=2)
+    assert [candidate.cached for candidate in plan.candidates] == [False, False]
+
+    candidate = plan.candidates[0]
+    created = llm_executor.pregenerate_llm_result(
+        db_session,
+        version=version,
+        option_ids=list(candidate.version_option_ids),
+        llm_ops=list(candidate.llm_ops),
+    )
+    assert created is True
+    assert len(stub.calls) == 1
+    stored = db_session.scalar(select(LlmResult).where(LlmResult.version_id == version.id))
+    assert stored is not None
+    assert stored.version_options_hash == candidate.version_options_hash
+
+    result = llm_executor.call_session_llm(
+        db_session,
+        session_code="SESS-000",
+        model_id=None,
+        temperature=None,
+        top_p=None,
+        force_regenerate=False,
+    )
+    assert result["llm_result"]["raw"] == {"content": [{"type": "text", "text": "pregenerated"}]}
+    assert len(stub.calls) == 1, "the session call should hit the pre-generated result"
+
+
+def test_pregeneration_plan_resolves_cached_results_in_one_query(
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, version, _ = _prepare_history(db_session)
+    monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", lambda: RecordingBedrockClient(), raising=False)
+    first = llm_pregeneration.plan_pregeneration(db_session, diagnostic_id=version.diagnostic_id, limit=2)
+    llm_executor.pregenerate_llm_result(
+        db_session,
+        version=version,
+        option_ids=list(first.candidates[0].version_option_ids),
+        llm_ops=list(first.candidates[0].llm_ops),
+    )
+
+    statements: list[str] = []
+
+    def record(_conn, _cursor, statement, _parameters, _context, _executemany) -> None:
+        statements.append(statement)
+
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        plan = llm_pregeneration.plan_pregeneration(db_session, diagnostic_id=version.diagnostic_id, limit=2)
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+    assert [candidate.cached for candidate in plan.candidates] == [True, False]
+    assert len([statement for statement in statements if "FROM llm_results" in statement]) == 1
+
+
+def test_run_pregeneration_plans_on_its_own_session(
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, version, version_options = _prepare_history(db_session)
+    opened: list[Session] = []
+
+    def session_factory() -> Session:
+        session = Session(bind=db_session.connection(), autoflush=False, join_transaction_mode="create_savepoint")
+        opened.append(session)
+        return session
+
+    executed: list[llm_pregeneration.PregenerationPlan] = []
+    monkeypatch.setattr(llm_pregeneration, "execute_pregeneration", lambda plan, **_: executed.append(plan))
+
+    llm_pregeneration.run_pregeneration(diagnostic_id=version.diagnostic_id, limit=1, session_factory=session_factory)
+
+    assert len(opened) == 1
+    (plan,) = executed
+    assert plan.version_id == version.id
+    assert [candidate.version_option_ids for candidate in plan.candidates] == [(version_options[0].id,)]
+
+
+def test_run_pregeneration_skips_diagnostic_without_active_version(
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _, version, _ = _prepare_history(db_session)
+    db_session.query(CfgActiveVersion).delete()
+    db_session.flush()
+    monkeypatch.setattr(llm_pregeneration, "execute_pregeneration", pytest.fail)
+
+    report = llm_pregeneration.run_pregeneration(
+        diagnostic_id=version.diagnostic_id,
+        session_factory=lambda: Session(
+            bind=db_session.connection(), autoflush=False, join_transaction_mode="create_savepoint"
+        ),
+    )
+
+    assert report is None
@@ -2,11 +2,12 @@ from __future__ import annotations
 
 import os
 from datetime import datetime, timezone
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.errors import ErrorCode
@@ -16,6 +17,7 @@ from app.main import app
 from app.models.admin_user import AdminUser
 from app.models.diagnostic import CfgActiveVersion, Diagnostic, DiagnosticSession, DiagnosticVersion
 from app.models.user import User
+from tests.utils.db import as_async_session
 
 
 def _database_url() -> str:
@@ -70,11 +72,16 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - dependency teardown
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
 
 
 def _create_admin(db: Session, *, user_id: str = "admin") -> AdminUser:
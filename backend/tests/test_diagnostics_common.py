@@ -8,6 +8,7 @@ import uuid
 from app.core.registry import (
     OutcomeModelResolutionError,
     compute_version_options_hash,
+    extend_version_options_hash,
     resolve_outcome_model,
 )
 from app.db.session import SessionLocal
@@ -47,6 +48,18 @@ def test_compute_version_options_hash_is_stable():
     assert other != hash1
 
 
+def test_extend_version_options_hash_matches_full_computation():
+    partial = compute_version_options_hash(5, [205])
+    extended = extend_version_options_hash(5, partial, [302, 101])
+    assert extended == compute_version_options_hash(5, [101, 205, 302])
+    assert extend_version_options_hash(5, partial, []) == partial
+
+    # Shared with frontend/tests/unit/diagnostics/hash.test.ts
+    assert compute_version_options_hash(37, [101, 205]) == (
+        "48e6cb69f9110539cdccb5fe9efd290fd7a8609abb70de2b3592e634d4f41854"
+    )
+
+
 def test_resolve_outcome_model_returns_binding():
     binding = resolve_outcome_model("mst_ai_jobs")
     assert binding.model is MstAiJob
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import Settings, settings
+from app.core.errors import ErrorCode
+from app.core.loop_monitor import LOOP_BLOCKED, LOOP_LAG_SECONDS, EventLoopMonitor
+from app.core.metrics import registry
+from app.main import app
+from app.services.diagnostics import llm_metrics
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
+    monkeypatch.setattr(settings, "metrics_enabled", True, raising=False)
+    registry.reset()
+    try:
+        yield TestClient(app)
+    finally:
+        registry.reset()
+
+
+def test_metrics_exposes_llm_measurements(client: TestClient) -> None:
+    llm_metrics.record_token_usage(
+        "bedrock",
+        "claude",
+        {"usage": {"input_tokens": 120, "output_tokens": 30, "cache_read_input_tokens": 100}},
+    )
+    llm_metrics.record_call(
+        session_code="SESS-001",
+        provider="bedrock",
+        model="claude",
+        result=llm_metrics.RESULT_MISS,
+        seconds=1.5,
+    )
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'llm_tokens_total{provider="bedrock",model="claude",kind="input"} 120' in body
+    assert 'llm_tokens_total{provider="bedrock",model="claude",kind="cache_read"} 100' in body
+    assert 'llm_result_cache_total{provider="bedrock",result="miss"} 1' in body
+    assert 'llm_call_duration_seconds_bucket{provider="bedrock",model="claude",result="miss",le="2.5"} 1' in body
+    assert 'llm_call_duration_seconds_count{provider="bedrock",model="claude",result="miss"} 1' in body
+
+
+def test_metrics_requires_token_when_configured(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret", raising=False)
+
+    response = client.get("/metrics")
+    assert response.status_code == 401
+    assert response.json()["error"]["code"] == ErrorCode.COMMON_UNAUTHENTICATED.value
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+
+
+def test_metrics_can_be_disabled(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "metrics_enabled", False, raising=False)
+
+    response = client.get("/metrics")
+    assert response.status_code == 404
+
+
+def test_metrics_are_disabled_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "metrics_enabled", Settings.model_fields["metrics_enabled"].default, raising=False)
+
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 404
+    assert response.json()["error"]["code"] == ErrorCode.COMMON_RESOURCE_NOT_FOUND.value
+
+
+def test_metrics_rejects_wrong_token(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret", raising=False)
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer guessed"})
+    assert response.status_code == 401
+    assert response.json()["error"]["code"] == ErrorCode.COMMON_UNAUTHENTICATED.value
+
+
+def _blocking_handler(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def test_event_loop_monitor_reports_blocking_code(client: TestClient) -> None:
+    async def scenario() -> None:
+        monitor = EventLoopMonitor(
+            interval_seconds=0.05,
+            threshold_seconds=0.05,
+            app_root=Path(__file__).resolve().parent,
+        )
+        monitor.start()
+        try:
+            await asyncio.sleep(0.12)
+            _blocking_handler(0.4)
+            await asyncio.sleep(0.12)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(scenario())
+
+    location = "tests/test_metrics.py:_blocking_handler"
+    assert LOOP_BLOCKED.value(location=location) == 1
+    assert LOOP_LAG_SECONDS.count() >= 2
+    body = client.get("/metrics").text
+    assert f'event_loop_blocked_total{{location="{location}"}} 1' in body
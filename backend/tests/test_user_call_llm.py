@@ -1,18 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-from collections.abc import Iterator
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
 from datetime import datetime, timezone
 from typing import Any
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, delete, event
+from sqlalchemy import create_engine, delete, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
 from app.core.errors import ErrorCode
-from app.core.registry import compute_version_options_hash
+from app.core.exceptions import BaseAppException
+from app.core.registry import compute_llm_result_key, compute_version_options_hash
 from app.deps import auth as auth_deps
 from app.main import app
 from app.models.admin_user import AdminUser
@@ -21,14 +27,33 @@ from app.models.diagnostic import (
     Diagnostic,
     DiagnosticSession,
     DiagnosticVersion,
+    LlmJob,
+    LlmResult,
     Option,
     Question,
     VersionOption,
+    VersionOutcome,
     VersionQuestion,
 )
-from app.services.diagnostics import llm_executor
+from app.models.mst_ai_job import MstAiJob
+from app.services.diagnostics import (
+    fake_llm,
+    llm_admission,
+    llm_executor,
+    llm_jobs,
+    llm_metrics,
+    llm_prompt_cache,
+    llm_ranking,
+    llm_resilience,
+    llm_routing,
+)
+from app.services.diagnostics.answer_vector import pack_answer_ids
+from app.services.diagnostics.gemini_runtime import GeminiCachedContentError
+from app.services.diagnostics import llm_singleflight as singleflight
+from app.services.diagnostics.llm_singleflight import build_lock_name
+from app.services.diagnostics.option_index import reset_version_option_indexes
 from app.routers import sessions as sessions_router
-from tests.utils.db import DEFAULT_TABLES, truncate_tables
+from tests.utils.db import DEFAULT_TABLES, as_async_session, truncate_tables
 
 
 def _database_url() -> str:
@@ -69,6 +94,18 @@ def db_session(prepare_db) -> Iterator[Session]:
         engine.dispose()
 
 
+@pytest.fixture(autouse=True)
+def reset_resilience(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "llm_retry_base_delay_seconds", 0.0, raising=False)
+    llm_resilience.reset_llm_resilience()
+    llm_prompt_cache.reset_prompt_cache_state()
+    llm_admission.reset_llm_admission()
+    yield
+    llm_resilience.reset_llm_resilience()
+    llm_prompt_cache.reset_prompt_cache_state()
+    llm_admission.reset_llm_admission()
+
+
 @pytest.fixture
 def client(db_session: Session) -> Iterator[TestClient]:
     def override_get_db() -> Iterator[Session]:
@@ -77,17 +114,48 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - dependency teardown
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
+    async def override_get_llm_db() -> AsyncIterator[Session]:
+        yield db_session
+
+    def override_get_session_factory() -> Callable[[], Session]:
+        # Streams open their own session; keep it inside the test transaction.
+        return lambda: Session(
+            bind=db_session.connection(), autoflush=False, join_transaction_mode="create_savepoint"
+        )
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
+    app.dependency_overrides[auth_deps.get_llm_db] = override_get_llm_db
+    app.dependency_overrides[auth_deps.get_session_factory] = override_get_session_factory
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
+        app.dependency_overrides.pop(auth_deps.get_llm_db, None)
+        app.dependency_overrides.pop(auth_deps.get_session_factory, None)
 
 
 class RecordingBedrockClient:
-    def __init__(self, responses: list[Any] | None = None) -> None:
+    def __init__(
+        self,
+        responses: list[Any] | None = None,
+        stream_events: list[Any] | None = None,
+    ) -> None:
         self._queue = list(responses or [{"content": [{"type": "text", "text": "ok"}]}])
+        self._stream_events = list(stream_events or [])
         self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.stream_calls: list[tuple[str, dict[str, Any]]] = []
+
+    def invoke_model_stream(self, model_id: str, payload: dict[str, Any]) -> Iterator[dict[str, Any]]:
+        self.stream_calls.append((model_id, payload))
+        for item in self._stream_events:
+            if isinstance(item, Exception):
+                raise item
+            yield item
 
     def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
         self.calls.append((model_id, payload))
@@ -99,6 +167,36 @@ class RecordingBedrockClient:
         return {"content": [{"type": "text", "text": "ok"}]}
 
 
+class AsyncRecordingBedrockClient(RecordingBedrockClient):
+    def __init__(self, responses: list[Any] | None = None) -> None:
+        super().__init__(responses=responses)
+        self.async_calls: list[tuple[str, dict[str, Any]]] = []
+
+    async def ainvoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        self.async_calls.append((model_id, payload))
+        return self.invoke_model(model_id, payload)
+
+
+class SlowPrimaryBedrockClient(RecordingBedrockClient):
+    """Async client whose first call stalls so that a hedged call overtakes it."""
+
+    def __init__(self, stall_seconds: float) -> None:
+        super().__init__(responses=[{"content": [{"type": "text", "text": "hedge"}]}])
+        self._stall_seconds = stall_seconds
+        self.cancelled = False
+
+    async def ainvoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        if not self.calls:
+            self.calls.append((model_id, payload))
+            try:
+                await asyncio.sleep(self._stall_seconds)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+            return {"content": [{"type": "text", "text": "primary"}]}
+        return self.invoke_model(model_id, payload)
+
+
 @pytest.fixture
 def patch_bedrock(monkeypatch):
     created: list[RecordingBedrockClient] = []
@@ -125,6 +223,7 @@ class RecordingGeminiClient:
         user_payload: str,
         temperature: float | None,
         top_p: float | None,
+        cached_content: str | None = None,
     ) -> dict[str, Any]:
         self.calls.append(
             {
@@ -133,6 +232,7 @@ class RecordingGeminiClient:
                 "user_payload": user_payload,
                 "temperature": temperature,
                 "top_p": top_p,
+                "cached_content": cached_content,
             }
         )
         if self._queue:
@@ -143,6 +243,23 @@ class RecordingGeminiClient:
         return {"text": "ok"}
 
 
+class ContextCachingGeminiClient(RecordingGeminiClient):
+    def __init__(self, responses: list[Any] | None = None) -> None:
+        super().__init__(responses=responses)
+        self.cache_calls: list[dict[str, Any]] = []
+
+    def create_cached_content(
+        self,
+        *,
+        model: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        display_name: str,
+    ) -> tuple[str, datetime | None]:
+        self.cache_calls.append({"model": model, "system_instruction": system_instruction})
+        return f"cachedContents/{len(self.cache_calls)}", None
+
+
 @pytest.fixture
 def patch_gemini(monkeypatch):
     def _factory(client: RecordingGeminiClient) -> RecordingGeminiClient:
@@ -153,6 +270,56 @@ def patch_gemini(monkeypatch):
     return _factory
 
 
+class InlineJobRunner:
+    """Runs queued jobs immediately on the test session."""
+
+    def __init__(self, db: Session) -> None:
+        self._db = db
+        self.submitted: list[int] = []
+
+    def submit(self, job_id: int) -> None:
+        self.submitted.append(job_id)
+        llm_jobs.run_llm_job(self._db, job_id)
+
+
+@pytest.fixture
+def inline_job_runner(db_session: Session, monkeypatch) -> InlineJobRunner:
+    runner = InlineJobRunner(db_session)
+    monkeypatch.setattr(llm_jobs, "_RUNNER", runner, raising=False)
+    return runner
+
+
+def _stored_llm_result(db: Session, session: DiagnosticSession) -> dict[str, Any] | None:
+    db.refresh(session)
+    if session.llm_result_id is not None:
+        record = db.get(LlmResult, session.llm_result_id)
+        assert record is not None
+        db.refresh(record)
+        return record.document
+    return session.llm_result
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict[str, Any]]]:
+    events: list[tuple[str, dict[str, Any]]] = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _bedrock_stream(*texts: str) -> list[dict[str, Any]]:
+    events: list[dict[str, Any]] = [
+        {
+            "type": "message_start",
+            "message": {"id": "msg_1", "type": "message", "role": "assistant", "usage": {"input_tokens": 10}},
+        }
+    ]
+    for text in texts:
+        events.append({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}})
+    events.append({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 5}})
+    return events
+
+
 def _prepare_session(db: Session) -> tuple[DiagnosticSession, VersionOption]:
     admin = AdminUser(user_id="admin", hashed_password="hashed", is_active=True)
     db.add(admin)
@@ -271,21 +438,44 @@ def test_execute_llm_invokes_bedrock(client: TestClient, db_session: Session, pa
     expected_invoked_model = (
         settings.bedrock_default_inference_profile or settings.bedrock_default_model
     )
-    db_session.refresh(session)
-    assert session.llm_result is not None
-    assert session.llm_result["raw"] == {"content": [{"type": "text", "text": "LLM"}]}
-    assert session.llm_result["invoked_model"] == expected_invoked_model
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["raw"] == {"content": [{"type": "text", "text": "LLM"}]}
+    assert stored["invoked_model"] == expected_invoked_model
     assert stub.calls, "Bedrock client should be invoked"
     invoked_model, invoked_payload = stub.calls[0]
     system_prompt_value = db_session.get(DiagnosticVersion, session.version_id).system_prompt
     assert invoked_model == expected_invoked_model
-    assert invoked_payload["system"] == system_prompt_value
+    assert invoked_payload["system"] == [
+        {"type": "text", "text": system_prompt_value, "cache_control": {"type": "ephemeral"}}
+    ]
     assert invoked_payload["messages"][0]["role"] == "user"
     assert invoked_payload["messages"][0]["content"][0]["text"] == payload["messages"][1]["content"]
     assert invoked_payload["temperature"] == pytest.approx(0.2)
     assert "top_p" not in invoked_payload
 
 
+def test_execute_llm_reads_answers_from_answer_vector(
+    client: TestClient, db_session: Session, patch_bedrock
+) -> None:
+    session, version_option = _prepare_session(db_session)
+    session.answer_ids = pack_answer_ids([version_option.id])
+    db_session.flush()
+    reset_version_option_indexes()
+    patch_bedrock(RecordingBedrockClient())
+
+    statements: list[str] = []
+
+    @event.listens_for(db_session.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        statements.append(statement)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    assert json.loads(response.json()["messages"][1]["content"]) == [version_option.llm_op]
+    assert not [sql for sql in statements if "answer_choices" in sql]
+
+
 def test_execute_llm_invokes_gemini(
     client: TestClient,
     db_session: Session,
@@ -304,9 +494,9 @@ def test_execute_llm_invokes_gemini(
     assert payload["model"] == expected_model
     assert payload["llm_result"]["raw"]["text"] == "GEMINI"
 
-    db_session.refresh(session)
-    assert session.llm_result is not None
-    assert session.llm_result["provider"] == "gemini"
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["provider"] == "gemini"
 
     assert stub.calls, "Gemini client should be invoked"
     call = stub.calls[0]
@@ -316,6 +506,323 @@ def test_execute_llm_invokes_gemini(
     assert call["user_payload"] == payload["messages"][1]["content"]
 
 
+def test_execute_llm_records_prompt_cache_hit(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    patch_bedrock(
+        RecordingBedrockClient(
+            responses=[
+                {
+                    "content": [{"type": "text", "text": "LLM"}],
+                    "usage": {"input_tokens": 12, "cache_read_input_tokens": 1800, "output_tokens": 40},
+                }
+            ]
+        )
+    )
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["prompt_cache"] == {
+        "status": "hit",
+        "read_tokens": 1800,
+        "write_tokens": 0,
+        "input_tokens": 12,
+    }
+    stats = llm_prompt_cache.prompt_cache_stats.snapshot()
+    assert stats["bedrock"]["hit"] == 1
+    assert stats["bedrock"]["read_tokens"] == 1800
+
+
+def test_execute_llm_reuses_gemini_context_cache(
+    client: TestClient,
+    db_session: Session,
+    patch_gemini,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    monkeypatch.setattr(settings, "mode", "gemini", raising=False)
+    stub = patch_gemini(ContextCachingGeminiClient(responses=[{"text": "first"}, {"text": "second"}]))
+
+    for _ in range(2):
+        response = client.post(f"/sessions/{session.session_code}/llm", json={"force_regenerate": True})
+        assert response.status_code == 200, response.text
+
+    assert len(stub.cache_calls) == 1, "the context cache should be created once per version"
+    assert [call["cached_content"] for call in stub.calls] == ["cachedContents/1", "cachedContents/1"]
+
+
+def test_execute_llm_drops_rejected_gemini_context_cache(
+    client: TestClient,
+    db_session: Session,
+    patch_gemini,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    monkeypatch.setattr(settings, "mode", "gemini", raising=False)
+    stub = patch_gemini(
+        ContextCachingGeminiClient(
+            responses=[
+                GeminiCachedContentError("Gemini cached content is unavailable"),
+                {"text": "fallback"},
+                {"text": "recreated"},
+            ]
+        )
+    )
+
+    for _ in range(2):
+        response = client.post(f"/sessions/{session.session_code}/llm", json={"force_regenerate": True})
+        assert response.status_code == 200, response.text
+
+    assert [call["cached_content"] for call in stub.calls] == ["cachedContents/1", None, "cachedContents/2"]
+    assert stub.calls[1]["system_instruction"] == stub.calls[0]["system_instruction"]
+    assert len(stub.cache_calls) == 2, "the rejected handle should be recreated on the next call"
+
+
+def test_gemini_context_cache_creation_does_not_block_other_keys() -> None:
+    registry = llm_prompt_cache.GeminiContextCacheRegistry()
+    release = threading.Event()
+    entered = threading.Event()
+
+    class SlowCacheClient:
+        def create_cached_content(self, *, model: str, system_instruction: str, ttl_seconds: int, display_name: str):
+            if system_instruction == "slow":
+                entered.set()
+                assert release.wait(5)
+            return f"cachedContents/{system_instruction}", None
+
+    cache_client = SlowCacheClient()
+    slow = threading.Thread(
+        target=registry.resolve,
+        args=(cache_client,),
+        kwargs={"model": "gemini", "src_hash": "slow-hash", "system_instruction": "slow"},
+    )
+    slow.start()
+    try:
+        assert entered.wait(5)
+        name = registry.resolve(cache_client, model="gemini", src_hash="fast-hash", system_instruction="fast")
+        assert name == "cachedContents/fast"
+    finally:
+        release.set()
+        slow.join(5)
+
+    registry.invalidate(model="gemini", src_hash="fast-hash", name="cachedContents/other")
+    assert registry.resolve(cache_client, model="gemini", src_hash="fast-hash", system_instruction="again") == (
+        "cachedContents/fast"
+    )
+    registry.invalidate(model="gemini", src_hash="fast-hash", name="cachedContents/fast")
+    assert registry.resolve(cache_client, model="gemini", src_hash="fast-hash", system_instruction="again") == (
+        "cachedContents/again"
+    )
+
+
+def test_execute_llm_stores_compact_document(
+    client: TestClient,
+    db_session: Session,
+    patch_gemini,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    monkeypatch.setattr(settings, "mode", "gemini", raising=False)
+    monkeypatch.setattr(settings, "llm_result_compress_threshold_bytes", 64, raising=False)
+    long_text = '{"1": {"name": "' + "x" * 200 + '"}}'
+    patch_gemini(
+        RecordingGeminiClient(
+            responses=[
+                {
+                    "text": long_text,
+                    "candidates": [
+                        {
+                            "content": {"role": "model", "parts": [{"text": long_text}]},
+                            "finish_reason": "STOP",
+                            "safety_ratings": [{"category": "HARM_CATEGORY_HATE_SPEECH"}],
+                        }
+                    ],
+                    "usage_metadata": {"prompt_token_count": 10},
+                    "sdk_http_response": {"headers": {}},
+                }
+            ]
+        )
+    )
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    payload = response.json()
+    assert payload["messages"][0]["role"] == "system"
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert "messages" not in stored
+    assert "raw" not in stored
+    assert stored["prompt"] == {"version_id": session.version_id, "src_hash": session.version.src_hash}
+
+    expected_raw = {
+        "text": long_text,
+        "usage_metadata": {"prompt_token_count": 10},
+        "candidates": [{"finish_reason": "STOP"}],
+    }
+    assert payload["llm_result"]["raw"] == expected_raw
+    assert client.get(f"/sessions/{session.session_code}").json()["llm_result"]["raw"] == expected_raw
+
+
+def test_execute_llm_records_metrics(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    patch_bedrock(
+        RecordingBedrockClient(
+            responses=[
+                {
+                    "content": [{"type": "text", "text": "LLM"}],
+                    "usage": {"input_tokens": 50, "output_tokens": 20},
+                }
+            ]
+        )
+    )
+    model = settings.bedrock_default_model
+    invoked_model = settings.bedrock_default_inference_profile or settings.bedrock_default_model
+    before_miss = llm_metrics.RESULT_LOOKUPS.value(provider="bedrock", result=llm_metrics.RESULT_MISS)
+    before_hit = llm_metrics.RESULT_LOOKUPS.value(provider="bedrock", result=llm_metrics.RESULT_SESSION_HIT)
+    before_output = llm_metrics.TOKENS.value(provider="bedrock", model=invoked_model, kind="output")
+    before_attempts = llm_metrics.PROVIDER_ATTEMPTS.value(provider="bedrock", model=invoked_model, outcome="success")
+
+    for _ in range(2):
+        response = client.post(f"/sessions/{session.session_code}/llm", json={})
+        assert response.status_code == 200, response.text
+
+    assert llm_metrics.RESULT_LOOKUPS.value(provider="bedrock", result=llm_metrics.RESULT_MISS) == before_miss + 1
+    assert (
+        llm_metrics.RESULT_LOOKUPS.value(provider="bedrock", result=llm_metrics.RESULT_SESSION_HIT)
+        == before_hit + 1
+    )
+    assert llm_metrics.TOKENS.value(provider="bedrock", model=invoked_model, kind="output") == before_output + 20
+    assert (
+        llm_metrics.PROVIDER_ATTEMPTS.value(provider="bedrock", model=invoked_model, outcome="success")
+        == before_attempts + 1
+    )
+    assert llm_metrics.CALL_SECONDS.count(provider="bedrock", model=model, result=llm_metrics.RESULT_MISS) >= 1
+
+
+def _add_outcomes(db: Session, session: DiagnosticSession, *names: str) -> list[int]:
+    version = db.get(DiagnosticVersion, session.version_id)
+    outcome_ids: list[int] = []
+    for position, name in enumerate(names, start=1):
+        job = MstAiJob(name=name, role_summary="summary", description="description")
+        db.add(job)
+        db.flush()
+        db.add(
+            VersionOutcome(
+                version_id=version.id,
+                outcome_id=job.id,
+                outcome_meta_json={"name": name},
+                sort_order=position,
+                is_active=True,
+                created_by_admin_id=version.created_by_admin_id,
+            )
+        )
+        outcome_ids.append(job.id)
+    db.flush()
+    return outcome_ids
+
+
+def test_execute_llm_parses_ranking(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    engineer_id, scientist_id = _add_outcomes(db_session, session, "AI Engineer (ranking)", "Data Scientist (ranking)")
+    ranking_text = json.dumps(
+        {
+            "2": {
+                "name": "ｄａｔａ scientist (ranking)",
+                "total_match": {"score": 81.14, "reason": " analytical "},
+                "personality_match": {"score": "79.9", "reason": "patient"},
+                "work_match": {"score": 140, "reason": None},
+            },
+            "1": {
+                "name": "AI Engineer (ranking)",
+                "total_match": {"score": 92.4, "reason": "skills"},
+                "personality_match": {"score": 88.5, "reason": "curious"},
+                "work_match": {"score": 75, "reason": "experience"},
+            },
+            "3": {
+                "name": "Unknown Job",
+                "total_match": {"score": 50, "reason": "n/a"},
+                "personality_match": {"score": 50, "reason": "n/a"},
+                "work_match": {"score": 50, "reason": "n/a"},
+            },
+        },
+        ensure_ascii=False,
+    )
+    patch_bedrock(
+        RecordingBedrockClient(
+            responses=[{"content": [{"type": "text", "text": f"```json\n{ranking_text}\n```"}]}]
+        )
+    )
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    llm_result = response.json()["llm_result"]
+
+    # "Unknown Job" matched nothing, so the ranking is partial and keeps `raw`.
+    assert llm_result["raw"]["content"][0]["text"].startswith("```json")
+    assert [
+        (item["rank"], item["outcome_id"], item["name"], item["matched"]) for item in llm_result["ranking"]
+    ] == [
+        (1, engineer_id, "AI Engineer (ranking)", True),
+        (2, scientist_id, "Data Scientist (ranking)", True),
+        (3, None, "Unknown Job", False),
+    ]
+    assert llm_result["ranking"][1]["total_match"] == {"score": 81.1, "reason": "analytical"}
+    assert llm_result["ranking"][1]["personality_match"]["score"] == pytest.approx(79.9)
+    assert llm_result["ranking"][1]["work_match"] == {"score": 100.0, "reason": None}
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["ranking"]["status"] == "partial"
+    assert stored["ranking"]["unmatched"] == ["Unknown Job"]
+
+    read_back = client.get(f"/sessions/{session.session_code}").json()["llm_result"]
+    assert read_back["raw"] == llm_result["raw"]
+    assert read_back["ranking"] == llm_result["ranking"]
+
+
+def test_execute_llm_drops_raw_only_for_complete_ranking(
+    client: TestClient, db_session: Session, patch_bedrock
+) -> None:
+    session, _ = _prepare_session(db_session)
+    (engineer_id,) = _add_outcomes(db_session, session, "AI Engineer (complete)")
+    ranking_text = json.dumps({"1": {"name": "AI Engineer (complete)", "total_match": {"score": 90}}})
+    patch_bedrock(RecordingBedrockClient(responses=[{"content": [{"type": "text", "text": ranking_text}]}]))
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    llm_result = response.json()["llm_result"]
+    assert llm_result["raw"] is None
+    assert [(item["outcome_id"], item["matched"]) for item in llm_result["ranking"]] == [(engineer_id, True)]
+
+
+def test_parse_ranking_text_accepts_ascii_rank_keys_only() -> None:
+    text = json.dumps({"1": {"name": "a"}, "²": {"name": "b"}, "١": {"name": "c"}, "note": "x"})
+
+    entries, incomplete = llm_ranking.parse_ranking_text(text)
+
+    assert entries == [(1, {"name": "a"})]
+    assert incomplete
+
+
+def test_build_ranking_marks_unmatched_and_partial_entries() -> None:
+    outcome_names = {llm_ranking.normalise_outcome_name("AI Engineer"): (7, "AI Engineer")}
+    text = '{"1": {"name": "AI Engineer"}, "2": {"name": "AI Engineer"}, "3": {"name": "Poet"}, "4": {"na'
+
+    ranking = llm_ranking.build_ranking({"content": [{"type": "text", "text": text}]}, outcome_names)
+
+    assert ranking["status"] == llm_ranking.RANKING_PARTIAL
+    assert [(item["rank"], item["outcome_id"], item["matched"]) for item in ranking["items"]] == [
+        (1, 7, True),
+        (2, None, False),
+        (3, None, False),
+    ]
+    assert ranking["unmatched"] == ["AI Engineer", "Poet"]
+    assert not llm_ranking.ranking_is_complete({"ranking": ranking})
+
+
 def test_execute_llm_reuses_session_cache(client: TestClient, db_session: Session, patch_bedrock) -> None:
     session, _ = _prepare_session(db_session)
     cached = {
@@ -339,11 +846,37 @@ def test_execute_llm_reuses_session_cache(client: TestClient, db_session: Sessio
 
     assert payload["model"] == "anthropic.claude-3"
     assert payload["llm_result"]["raw"] == cached["raw"]
-    db_session.refresh(session)
-    assert session.llm_result["raw"] == cached["raw"]
+    stored = _stored_llm_result(db_session, session)
+    assert stored["raw"] == cached["raw"]
     assert not stub.calls, "Bedrock client should not be called when cache is reused"
 
 
+def test_execute_llm_cache_hit_skips_answer_query(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(responses=[{"content": [{"type": "text", "text": "first"}]}]))
+
+    first = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert first.status_code == 200, first.text
+
+    statements: list[str] = []
+
+    def record(_conn, _cursor, statement, _parameters, _context, _executemany) -> None:
+        statements.append(statement)
+
+    connection = db_session.connection()
+    event.listen(connection, "before_cursor_execute", record)
+    try:
+        second = client.post(f"/sessions/{session.session_code}/llm", json={})
+    finally:
+        event.remove(connection, "before_cursor_execute", record)
+
+    assert second.status_code == 200, second.text
+    assert len(stub.calls) == 1
+    assert second.json()["messages"] == first.json()["messages"]
+    assert statements
+    assert not [statement for statement in statements if "answer_choices" in statement]
+
+
 def test_execute_llm_switching_to_gemini_ignores_bedrock_cache(
     client: TestClient,
     db_session: Session,
@@ -369,31 +902,43 @@ def test_execute_llm_switching_to_gemini_ignores_bedrock_cache(
     assert payload["llm_result"]["raw"]["text"] == "gemini"
     assert stub.calls, "Gemini client should be invoked when cache provider differs"
 
-    db_session.refresh(session)
-    assert session.llm_result is not None
-    assert session.llm_result["provider"] == "gemini"
-    assert session.llm_result["raw"]["text"] == "gemini"
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["provider"] == "gemini"
+    assert stored["raw"]["text"] == "gemini"
 
 
 def test_execute_llm_reuses_shared_cache(client: TestClient, db_session: Session, patch_bedrock) -> None:
-    session, version_option = _prepare_session(db_session)
-    other_session = DiagnosticSession(
-        session_code="SESS-002",
-        diagnostic_id=session.diagnostic_id,
+    session, _ = _prepare_session(db_session)
+    result_key = compute_llm_result_key(
         version_id=session.version_id,
         version_options_hash=session.version_options_hash,
-        llm_result={
-            "model": "anthropic.claude-3-sonnet-20240229-v1:0",
-            "generated_at": "2024-09-18T01:00:00Z",
-            "hash": session.version_options_hash,
-            "raw": {"content": [{"type": "text", "text": "cached-shared"}]},
-        },
-        ended_at=datetime.now(timezone.utc),
+        provider="bedrock",
+        model=settings.bedrock_default_model,
+        temperature=settings.bedrock_default_temperature,
+        top_p=None,
+    )
+    db_session.add(
+        LlmResult(
+            id=result_key,
+            version_id=session.version_id,
+            version_options_hash=session.version_options_hash,
+            provider="bedrock",
+            model=settings.bedrock_default_model,
+            temperature=settings.bedrock_default_temperature,
+            top_p=None,
+            document={
+                "provider": "bedrock",
+                "model": settings.bedrock_default_model,
+                "generated_at": "2024-09-18T01:00:00Z",
+                "hash": session.version_options_hash,
+                "raw": {"content": [{"type": "text", "text": "cached-shared"}]},
+            },
+        )
     )
-    db_session.add(other_session)
     db_session.flush()
 
-    patch_bedrock(RecordingBedrockClient(responses=[]))
+    stub = patch_bedrock(RecordingBedrockClient(responses=[]))
 
     response = client.post(f"/sessions/{session.session_code}/llm", json={})
     assert response.status_code == 200, response.text
@@ -402,9 +947,46 @@ def test_execute_llm_reuses_shared_cache(client: TestClient, db_session: Session
     assert payload["llm_result"]["raw"] == {
         "content": [{"type": "text", "text": "cached-shared"}]
     }
+    assert not stub.calls
+    db_session.refresh(session)
+    assert session.llm_result_id == result_key
+    assert session.llm_result is None
+
+
+def test_execute_llm_stores_identical_results_once(
+    client: TestClient, db_session: Session, patch_bedrock
+) -> None:
+    session, version_option = _prepare_session(db_session)
+    other_session = DiagnosticSession(
+        session_code="SESS-002",
+        diagnostic_id=session.diagnostic_id,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+    )
+    db_session.add(other_session)
+    db_session.flush()
+    db_session.add(
+        AnswerChoice(
+            session_id=other_session.id,
+            version_option_id=version_option.id,
+            answered_at=datetime.now(timezone.utc),
+        )
+    )
+    db_session.flush()
+
+    stub = patch_bedrock(RecordingBedrockClient())
+
+    first = client.post(f"/sessions/{session.session_code}/llm", json={})
+    second = client.post(f"/sessions/{other_session.session_code}/llm", json={})
+    assert first.status_code == 200, first.text
+    assert second.status_code == 200, second.text
+    assert len(stub.calls) == 1
+
     db_session.refresh(session)
-    assert session.llm_result is not None
-    assert session.llm_result["raw"]["content"][0]["text"] == "cached-shared"
+    db_session.refresh(other_session)
+    assert session.llm_result_id is not None
+    assert session.llm_result_id == other_session.llm_result_id
+    assert db_session.query(LlmResult).count() == 1
 
 
 def test_execute_llm_force_regenerate_ignores_cache(
@@ -495,8 +1077,8 @@ def test_execute_llm_bedrock_failure_returns_error(
     assert body["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
     assert len(stub.calls) == 2
 
-    db_session.refresh(session)
-    assert session.llm_result is None
+    stored = _stored_llm_result(db_session, session)
+    assert stored is None
 
 
 def test_execute_llm_uses_custom_sampling_parameters(
@@ -516,3 +1098,866 @@ def test_execute_llm_uses_custom_sampling_parameters(
     _, payload = stub.calls[0]
     assert "temperature" not in payload
     assert payload["top_p"] == pytest.approx(0.55)
+
+
+def test_execute_llm_async_enqueues_job(
+    client: TestClient, db_session: Session, patch_bedrock, inline_job_runner
+) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(responses=[{"content": [{"type": "text", "text": "JOB"}]}]))
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={"run_async": True})
+    assert response.status_code == 202, response.text
+    body = response.json()
+    assert body["session_code"] == session.session_code
+    assert body["status"] == llm_jobs.JOB_STATUS_QUEUED
+    assert inline_job_runner.submitted
+    assert len(stub.calls) == 1
+
+    job_response = client.get(f"/sessions/{session.session_code}/llm/jobs/{body['job_id']}")
+    assert job_response.status_code == 200, job_response.text
+    assert job_response.json()["status"] == llm_jobs.JOB_STATUS_SUCCEEDED
+
+    session_response = client.get(f"/sessions/{session.session_code}", params={"wait": 1})
+    assert session_response.status_code == 200, session_response.text
+    assert session_response.json()["llm_result"]["raw"] == {"content": [{"type": "text", "text": "JOB"}]}
+
+
+def test_execute_llm_async_records_failure(
+    client: TestClient, db_session: Session, patch_bedrock, inline_job_runner
+) -> None:
+    session, _ = _prepare_session(db_session)
+    error = RuntimeError("bedrock down")
+    patch_bedrock(RecordingBedrockClient(responses=[error, error]))
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={"run_async": True})
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+
+    job_response = client.get(f"/sessions/{session.session_code}/llm/jobs/{job_id}")
+    assert job_response.status_code == 200, job_response.text
+    payload = job_response.json()
+    assert payload["status"] == llm_jobs.JOB_STATUS_FAILED
+    assert payload["error_code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is None
+
+
+def test_execute_llm_async_discards_partial_writes_on_domain_error(
+    client: TestClient, db_session: Session, inline_job_runner, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    session, _ = _prepare_session(db_session)
+    original_hash = session.version_options_hash
+
+    def fail_after_write(db: Session, *, session_code: str, **_kwargs: Any) -> None:
+        target = db.execute(
+            select(DiagnosticSession).where(DiagnosticSession.session_code == session_code)
+        ).scalar_one()
+        target.version_options_hash = "partial"
+        db.flush()
+        raise BaseAppException(ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED, detail="provider rejected")
+
+    monkeypatch.setattr(llm_executor, "call_session_llm", fail_after_write)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={"run_async": True})
+    assert response.status_code == 202, response.text
+
+    job_response = client.get(f"/sessions/{session.session_code}/llm/jobs/{response.json()['job_id']}")
+    assert job_response.status_code == 200, job_response.text
+    assert job_response.json()["status"] == llm_jobs.JOB_STATUS_FAILED
+    assert job_response.json()["error_code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
+
+    db_session.refresh(session)
+    assert session.version_options_hash == original_hash
+
+
+def test_llm_job_retry_waits_for_backoff(
+    db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "llm_job_max_attempts", 3, raising=False)
+    monkeypatch.setattr(settings, "llm_job_retry_base_delay_seconds", 30.0, raising=False)
+    session, _ = _prepare_session(db_session)
+
+    def crash(_db: Session, **_kwargs: Any) -> None:
+        raise RuntimeError("worker bug")
+
+    monkeypatch.setattr(llm_executor, "call_session_llm", crash)
+    job = llm_jobs.enqueue_llm_job(
+        db_session,
+        session_code=session.session_code,
+        model_id=None,
+        temperature=None,
+        top_p=None,
+        force_regenerate=False,
+    )
+    db_session.commit()
+
+    with pytest.raises(RuntimeError):
+        llm_jobs.run_llm_job(db_session, job.id)
+    db_session.refresh(job)
+    assert job.status == llm_jobs.JOB_STATUS_QUEUED
+    assert job.next_attempt_at is not None
+
+    llm_jobs.run_llm_job(db_session, job.id)
+    db_session.refresh(job)
+    assert job.attempts == 1, "a job still backing off must not be claimed"
+
+    job.next_attempt_at = datetime.now(timezone.utc)
+    db_session.commit()
+    with pytest.raises(RuntimeError):
+        llm_jobs.run_llm_job(db_session, job.id)
+    db_session.refresh(job)
+    assert job.attempts == 2
+
+
+def test_llm_job_retry_delay_grows_exponentially(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "llm_job_retry_base_delay_seconds", 2.0, raising=False)
+    monkeypatch.setattr(settings, "llm_job_retry_max_delay_seconds", 10.0, raising=False)
+
+    assert [llm_jobs.retry_delay_seconds(attempts) for attempts in (1, 2, 3, 4)] == [2.0, 4.0, 8.0, 10.0]
+
+
+def test_llm_job_runner_defers_submission_until_backoff_ends() -> None:
+    runner = llm_jobs.LlmJobRunner(max_workers=1)
+    submitted = threading.Event()
+    runner.submit = lambda job_id: submitted.set()  # type: ignore[method-assign]
+    try:
+        runner.submit_later(1, 0.05)
+        assert not submitted.is_set()
+        assert submitted.wait(2)
+
+        submitted.clear()
+        runner.submit_later(2, 5)
+    finally:
+        runner.shutdown()
+    assert not submitted.wait(0.1), "shutdown cancels pending resubmissions"
+
+
+def test_get_llm_job_unknown_returns_not_found(client: TestClient, db_session: Session) -> None:
+    session, _ = _prepare_session(db_session)
+
+    response = client.get(f"/sessions/{session.session_code}/llm/jobs/UNKNOWN")
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_JOB_NOT_FOUND.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_JOB_NOT_FOUND.value
+
+
+def test_stream_llm_relays_bedrock_deltas(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(stream_events=_bedrock_stream("{\"1\":", " {}}")))
+
+    response = client.post(f"/sessions/{session.session_code}/llm/stream", json={})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["meta", "delta", "delta", "done"]
+    assert events[0][1]["cached"] is False
+    assert "".join(data["text"] for name, data in events if name == "delta") == '{"1": {}}'
+
+    done = events[-1][1]
+    assert done["llm_result"]["raw"]["content"] == [{"type": "text", "text": '{"1": {}}'}]
+    assert done["llm_result"]["raw"]["stop_reason"] == "end_turn"
+    assert len(stub.stream_calls) == 1
+    assert not stub.calls
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["raw"] == done["llm_result"]["raw"]
+    assert stored["raw"]["usage"] == {"input_tokens": 10, "output_tokens": 5}
+
+
+def test_stream_llm_reuses_cached_result(client: TestClient, db_session: Session, patch_bedrock) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(responses=[{"content": [{"type": "text", "text": "cached"}]}]))
+
+    first = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert first.status_code == 200, first.text
+
+    response = client.post(f"/sessions/{session.session_code}/llm/stream", json={})
+    assert response.status_code == 200, response.text
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["meta", "done"]
+    assert events[0][1]["cached"] is True
+    assert events[1][1]["llm_result"]["raw"] == {"content": [{"type": "text", "text": "cached"}]}
+    assert not stub.stream_calls
+
+
+def test_stream_llm_emits_error_event_on_interrupted_stream(
+    client: TestClient, db_session: Session, patch_bedrock
+) -> None:
+    session, _ = _prepare_session(db_session)
+    events = _bedrock_stream("partial")
+    events.insert(2, RuntimeError("stream reset"))
+    patch_bedrock(RecordingBedrockClient(stream_events=events))
+
+    response = client.post(f"/sessions/{session.session_code}/llm/stream", json={})
+    assert response.status_code == 200, response.text
+    parsed = _parse_sse(response.text)
+    assert [name for name, _ in parsed] == ["meta", "delta", "error"]
+    assert parsed[-1][1]["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
+
+    stored = _stored_llm_result(db_session, session)
+    assert stored is None
+
+
+def test_stream_llm_emits_error_event_on_unexpected_failure(
+    client: TestClient, db_session: Session, patch_bedrock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    session, _ = _prepare_session(db_session)
+    patch_bedrock(RecordingBedrockClient(stream_events=_bedrock_stream("partial")))
+
+    def fail_store(*_args: Any, **_kwargs: Any) -> None:
+        raise RuntimeError("store failed")
+
+    monkeypatch.setattr(llm_executor, "_store_result_document", fail_store)
+
+    response = client.post(f"/sessions/{session.session_code}/llm/stream", json={})
+    assert response.status_code == 200, response.text
+    parsed = _parse_sse(response.text)
+    assert [name for name, _ in parsed] == ["meta", "delta", "error"]
+    assert parsed[-1][1]["error"]["code"] == ErrorCode.COMMON_UNEXPECTED_ERROR.value
+
+
+def test_stream_closed_before_first_event_takes_no_lock_or_session(
+    db_session: Session, patch_bedrock
+) -> None:
+    session, version_option = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(stream_events=_bedrock_stream("unused")))
+    opened: list[Session] = []
+
+    def session_factory() -> Session:
+        stream_db = Session(bind=db_session.connection(), join_transaction_mode="create_savepoint")
+        opened.append(stream_db)
+        return stream_db
+
+    events = llm_executor.stream_session_llm(
+        db_session,
+        session_code=session.session_code,
+        model_id=None,
+        temperature=None,
+        top_p=None,
+        force_regenerate=False,
+        session_factory=session_factory,
+    )
+    # A client that disconnects before the body starts only ever closes the iterator.
+    events.close()
+
+    lock_name = build_lock_name(
+        version_id=session.version_id,
+        options_hash=compute_version_options_hash(session.version_id, [version_option.id]),
+        provider="bedrock",
+    )
+    assert db_session.execute(text("SELECT IS_FREE_LOCK(:name)"), {"name": lock_name}).scalar() == 1
+    assert not opened
+    assert not stub.stream_calls
+
+
+def test_execute_llm_releases_flight_lock_after_commit(
+    client: TestClient, db_session: Session, patch_bedrock
+) -> None:
+    session, version_option = _prepare_session(db_session)
+    patch_bedrock(RecordingBedrockClient())
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+
+    lock_name = build_lock_name(
+        version_id=session.version_id,
+        options_hash=compute_version_options_hash(session.version_id, [version_option.id]),
+        provider="bedrock",
+    )
+    assert db_session.execute(text("SELECT IS_FREE_LOCK(:name)"), {"name": lock_name}).scalar() == 1
+
+
+def test_execute_llm_invokes_provider_when_flight_lock_is_busy(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, version_option = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient())
+    monkeypatch.setattr(settings, "llm_singleflight_wait_seconds", 0, raising=False)
+
+    lock_name = build_lock_name(
+        version_id=session.version_id,
+        options_hash=compute_version_options_hash(session.version_id, [version_option.id]),
+        provider="bedrock",
+    )
+    holder_engine = create_engine(_database_url(), future=True)
+    with holder_engine.connect() as holder:
+        assert holder.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": lock_name}).scalar() == 1
+        try:
+            response = client.post(f"/sessions/{session.session_code}/llm", json={})
+        finally:
+            holder.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+    holder_engine.dispose()
+
+    assert response.status_code == 200, response.text
+    assert len(stub.calls) == 1
+
+
+class GatedBedrockClient(RecordingBedrockClient):
+    """Holds the first invocation until the test lets it finish."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.entered = threading.Event()
+        self.proceed = threading.Event()
+
+    def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        self.entered.set()
+        assert self.proceed.wait(timeout=10)
+        return super().invoke_model(model_id, payload)
+
+
+def test_flight_waiter_reuses_committed_leader_result(prepare_db, monkeypatch: pytest.MonkeyPatch) -> None:
+    # Leader and waiter commit for real on their own connections, as two workers would.
+    monkeypatch.setattr(settings, "llm_singleflight_wait_seconds", 10, raising=False)
+    engine = create_engine(_database_url(), future=True)
+    truncate_tables(engine, (*DEFAULT_TABLES, "admin_users"))
+    reset_version_option_indexes()
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, future=True)
+
+    with SessionLocal() as setup:
+        leader_session, version_option = _prepare_session(setup)
+        waiter_session = DiagnosticSession(
+            session_code="SESS-002",
+            diagnostic_id=leader_session.diagnostic_id,
+            version_id=leader_session.version_id,
+            version_options_hash=leader_session.version_options_hash,
+            llm_result=None,
+        )
+        setup.add(waiter_session)
+        setup.flush()
+        setup.add(AnswerChoice(session_id=waiter_session.id, version_option_id=version_option.id))
+        setup.commit()
+
+    stub = GatedBedrockClient()
+    outcomes: dict[str, Any] = {}
+
+    def run(session_code: str) -> None:
+        with SessionLocal() as db:
+            try:
+                outcomes[session_code] = llm_executor.call_session_llm(
+                    db,
+                    session_code=session_code,
+                    model_id=None,
+                    temperature=None,
+                    top_p=None,
+                    force_regenerate=False,
+                    bedrock_client=stub,
+                )
+                db.commit()
+            except Exception as exc:  # pragma: no cover - surfaced by the assertions below
+                outcomes[session_code] = exc
+
+    leader = threading.Thread(target=run, args=("SESS-001",))
+    waiter = threading.Thread(target=run, args=("SESS-002",))
+    try:
+        leader.start()
+        assert stub.entered.wait(timeout=10)
+        waiter.start()
+        waiter.join(timeout=0.5)  # let the waiter block on the leader's lock
+        assert waiter.is_alive()
+        stub.proceed.set()
+        leader.join(timeout=10)
+        waiter.join(timeout=10)
+
+        assert isinstance(outcomes["SESS-001"], dict), outcomes
+        assert isinstance(outcomes["SESS-002"], dict), outcomes
+        assert len(stub.calls) == 1
+        assert outcomes["SESS-002"]["llm_result"]["raw"] == outcomes["SESS-001"]["llm_result"]["raw"]
+    finally:
+        stub.proceed.set()
+        truncate_tables(engine, (*DEFAULT_TABLES, "admin_users"))
+        reset_version_option_indexes()
+        engine.dispose()
+
+
+def test_create_bedrock_client_is_shared_per_configuration(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", None, raising=False)
+    monkeypatch.setattr(settings, "bedrock_region", "us-east-1", raising=False)
+    llm_executor.reset_llm_clients()
+    try:
+        first = llm_executor.create_bedrock_client()
+        assert llm_executor.create_bedrock_client() is first
+
+        monkeypatch.setattr(settings, "bedrock_max_pool_connections", 7, raising=False)
+        second = llm_executor.create_bedrock_client()
+        assert second is not first
+        assert second._client.meta.config.max_pool_connections == 7
+    finally:
+        llm_executor.reset_llm_clients()
+
+
+def test_execute_llm_awaits_async_bedrock_client(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(
+        AsyncRecordingBedrockClient(responses=[{"content": [{"type": "text", "text": "async"}]}])
+    )
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["llm_result"]["raw"] == {"content": [{"type": "text", "text": "async"}]}
+    assert len(stub.async_calls) == 1
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["raw"] == {"content": [{"type": "text", "text": "async"}]}
+
+
+class ThrottledError(RuntimeError):
+    def __init__(self, retry_after: str) -> None:
+        super().__init__("ThrottlingException")
+        self.response = {
+            "Error": {"Code": "ThrottlingException"},
+            "ResponseMetadata": {"HTTPStatusCode": 429, "HTTPHeaders": {"retry-after": retry_after}},
+        }
+
+
+def test_execute_llm_backs_off_on_throttling(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(responses=[ThrottledError("3")]))
+    delays: list[float] = []
+    original_delay = llm_resilience.next_retry_delay
+
+    def _record_delay(attempt: int, exc: BaseException) -> float:
+        delays.append(original_delay(attempt, exc))
+        return 0.0
+
+    monkeypatch.setattr(llm_resilience, "next_retry_delay", _record_delay)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    assert len(stub.calls) == 2
+    # Retry-After is honoured even though the exponential base delay is zero.
+    assert delays == [pytest.approx(3.0)]
+
+
+def test_execute_llm_fails_fast_when_circuit_open(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "llm_circuit_failure_threshold", 2, raising=False)
+    session, _ = _prepare_session(db_session)
+    error = RuntimeError("bedrock down")
+    stub = patch_bedrock(RecordingBedrockClient(responses=[error, error]))
+
+    first = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert first.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
+
+    second = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert second.status_code == ErrorCode.DIAGNOSTICS_LLM_UNAVAILABLE.http_status
+    assert second.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_UNAVAILABLE.value
+    assert int(second.headers["Retry-After"]) >= 1
+    assert len(stub.calls) == 2
+
+
+def test_circuit_breaker_half_opens_after_reset_window() -> None:
+    now = [0.0]
+    breaker = llm_resilience.CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    assert not breaker.allow(), "only one trial call while half-open"
+    breaker.record_success()
+    assert breaker.state == llm_resilience.CIRCUIT_CLOSED
+
+
+def test_cancelled_slot_wait_gives_back_its_slot() -> None:
+    limiter = llm_resilience.ConcurrencyLimiter(1)
+
+    async def scenario() -> bool:
+        assert await limiter.aacquire(0)
+        waiter = asyncio.create_task(limiter.aacquire(5))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # The cancelled waiter's blocking acquire takes this slot and must hand it back.
+        limiter.release()
+        await asyncio.sleep(0.2)
+        return await limiter.aacquire(0)
+
+    assert asyncio.run(scenario())
+
+
+def test_cancelled_half_open_trial_does_not_wedge_circuit(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "llm_circuit_failure_threshold", 1, raising=False)
+    monkeypatch.setattr(settings, "llm_circuit_reset_seconds", 0.01, raising=False)
+    monkeypatch.setattr(settings, "llm_bedrock_max_concurrency", 1, raising=False)
+    monkeypatch.setattr(settings, "llm_concurrency_wait_seconds", 5, raising=False)
+    breaker = llm_resilience.get_circuit_breaker("bedrock", "model")
+    limiter = llm_resilience.get_concurrency_limiter("bedrock")
+
+    async def trial() -> None:
+        async with llm_resilience.aprovider_guard("bedrock", "model"):
+            pass  # pragma: no cover - cancelled while waiting for a slot
+
+    async def scenario() -> None:
+        task = asyncio.create_task(trial())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        limiter.release()
+        await asyncio.sleep(0.2)
+
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert limiter.acquire(0)
+    asyncio.run(scenario())
+    assert breaker.allow(), "the abandoned trial frees the half-open circuit"
+    assert limiter.acquire(0), "the slot taken after cancellation was given back"
+
+
+def test_bedrock_client_leaves_retries_to_resilience_layer() -> None:
+    pytest.importorskip("boto3")
+    from app.services.diagnostics.bedrock_runtime import BedrockRuntimeClient
+
+    client = BedrockRuntimeClient(region="us-east-1", timeout_seconds=5)
+    assert client._client.meta.config.retries["total_max_attempts"] == 1
+
+
+def test_bedrock_ainvoke_model_awaits_aiobotocore(monkeypatch: pytest.MonkeyPatch) -> None:
+    from aiohttp import web
+
+    from app.services.diagnostics.bedrock_runtime import BedrockRuntimeClient
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    requests: list[tuple[str, Any]] = []
+
+    async def invoke(request: web.Request) -> web.Response:
+        requests.append((request.match_info["model_id"], await request.json()))
+        return web.json_response({"content": [{"type": "text", "text": "aio"}]})
+
+    async def scenario() -> dict[str, Any]:
+        server = web.Application()
+        server.router.add_post("/model/{model_id}/invoke", invoke)
+        runner = web.AppRunner(server)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        monkeypatch.setenv("AWS_ENDPOINT_URL_BEDROCK_RUNTIME", f"http://127.0.0.1:{port}")
+        client = BedrockRuntimeClient(region="us-east-1", timeout_seconds=5)
+        # The blocking transport must not be used on the async path.
+        monkeypatch.setattr(client, "invoke_model", lambda *_: pytest.fail("sync Bedrock call"))
+        try:
+            return await client.ainvoke_model("model-x", {"messages": []})
+        finally:
+            await client.aclose()
+            await runner.cleanup()
+
+    assert asyncio.run(scenario()) == {"content": [{"type": "text", "text": "aio"}]}
+    assert requests == [("model-x", {"messages": []})]
+
+
+def test_execute_llm_sheds_when_diagnostic_queue_is_full(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "llm_admission_max_per_diagnostic", 1, raising=False)
+    monkeypatch.setattr(settings, "llm_admission_retry_after_seconds", 7, raising=False)
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient())
+    held = llm_admission.get_admission_controller().admit(session.diagnostic_id)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 429, response.text
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_QUEUE_FULL.value
+    assert response.headers["Retry-After"] == "7"
+
+    stream = client.post(f"/sessions/{session.session_code}/llm/stream", json={})
+    assert stream.status_code == 429, stream.text
+    queued = client.post(f"/sessions/{session.session_code}/llm", json={"run_async": True})
+    assert queued.status_code == 429, queued.text
+    assert db_session.scalar(select(LlmJob.id)) is None
+    assert not stub.calls and not stub.stream_calls
+
+    held.release()
+    retried = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert retried.status_code == 200, retried.text
+    assert llm_admission.get_admission_controller().in_flight == 0
+
+
+def test_execute_llm_sheds_when_process_is_saturated(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "llm_admission_max_in_flight", 1, raising=False)
+    session, _ = _prepare_session(db_session)
+    patch_bedrock(RecordingBedrockClient())
+    held = llm_admission.get_admission_controller().admit(None)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 503, response.text
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY.value
+    assert response.headers["Retry-After"] == str(settings.llm_admission_retry_after_seconds)
+
+    held.release()
+    assert client.post(f"/sessions/{session.session_code}/llm", json={}).status_code == 200
+
+
+def test_execute_llm_runs_blocking_work_on_llm_pool(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    threads: list[str] = []
+
+    class ThreadRecordingClient(RecordingBedrockClient):
+        def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+            threads.append(threading.current_thread().name)
+            return super().invoke_model(model_id, payload)
+
+    patch_bedrock(ThreadRecordingClient())
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+    assert response.status_code == 200, response.text
+    assert threads and all(name.startswith("llm") for name in threads)
+
+
+def test_flight_waiters_leave_llm_pool_free_at_admission_capacity(
+    db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "llm_thread_pool_max_workers", 2, raising=False)
+    monkeypatch.setattr(settings, "llm_admission_max_in_flight", 4, raising=False)
+    llm_admission.shutdown_llm_thread_pool()
+    lock_key = {"version_id": 1, "options_hash": "capacity", "provider": "bedrock"}
+    holder_engine = create_engine(_database_url(), future=True)
+
+    async def scenario() -> list[bool]:
+        waiters = [
+            asyncio.create_task(singleflight.aacquire_flight_lock(db_session, **lock_key, timeout_seconds=10))
+            for _ in range(settings.llm_admission_max_in_flight)
+        ]
+        await asyncio.sleep(0.3)
+        # A leader still gets pool threads for its own work while every admitted request waits.
+        assert await asyncio.wait_for(llm_admission.run_in_llm_pool(lambda: "leader"), timeout=1) == "leader"
+        holder.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+        acquired = []
+        for waiter in asyncio.as_completed(waiters, timeout=10):
+            lock = await waiter
+            acquired.append(lock is not None)
+            if lock is not None:
+                await llm_admission.run_in_llm_pool(lock.release)
+        return acquired
+
+    lock_name = build_lock_name(**lock_key)
+    try:
+        with holder_engine.connect() as holder:
+            assert holder.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": lock_name}).scalar() == 1
+            assert asyncio.run(scenario()) == [True] * settings.llm_admission_max_in_flight
+    finally:
+        holder_engine.dispose()
+        llm_admission.shutdown_llm_thread_pool()
+
+
+def test_admission_checks_process_cap_before_session_lookup(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "llm_admission_max_in_flight", 1, raising=False)
+    threads: list[str] = []
+
+    class LookupSession:
+        def execute(self, _statement: Any) -> Any:
+            threads.append(threading.current_thread().name)
+            return self
+
+        def scalar_one_or_none(self) -> int:
+            return 5
+
+    controller = llm_admission.get_admission_controller()
+    held = controller.admit(None)
+    with pytest.raises(BaseAppException) as exc_info:
+        asyncio.run(llm_admission.aadmit_llm_request(LookupSession(), "SESSION"))
+    assert exc_info.value.error_code == ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY
+    assert threads == [], "a saturated process must shed before any database work"
+
+    held.release()
+    ticket = asyncio.run(llm_admission.aadmit_llm_request(LookupSession(), "SESSION"))
+    assert ticket.diagnostic_id == 5
+    assert len(threads) == 1 and threads[0].startswith("llm")
+    ticket.release()
+
+    cached = asyncio.run(llm_admission.aadmit_llm_request(LookupSession(), "SESSION"))
+    assert len(threads) == 1, "cached lookups do not touch the database"
+    cached.release()
+    assert controller.in_flight == 0
+
+
+def test_admission_ticket_is_released_once() -> None:
+    controller = llm_admission.AdmissionController(max_in_flight=2, max_per_diagnostic=1, retry_after_seconds=3)
+
+    ticket = controller.admit(1)
+    with pytest.raises(BaseAppException) as exc_info:
+        controller.admit(1)
+    assert exc_info.value.error_code == ErrorCode.DIAGNOSTICS_LLM_QUEUE_FULL
+    assert exc_info.value.headers == {"Retry-After": "3"}
+
+    other = controller.admit(2)
+    with pytest.raises(BaseAppException) as exc_info:
+        controller.admit(3)
+    assert exc_info.value.error_code == ErrorCode.DIAGNOSTICS_LLM_SERVER_BUSY
+
+    ticket.release()
+    ticket.release()
+    assert controller.in_flight == 1
+    assert controller.in_flight_for(1) == 0
+    other.release()
+    assert controller.in_flight == 0
+
+
+def test_execute_llm_hedges_slow_primary_to_secondary_region(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "llm_routing_mode", "hedged", raising=False)
+    monkeypatch.setattr(settings, "llm_hedge_target", "bedrock:us-west-2", raising=False)
+    monkeypatch.setattr(settings, "llm_hedge_delay_seconds", 0.05, raising=False)
+    session, _ = _prepare_session(db_session)
+    stub = patch_bedrock(SlowPrimaryBedrockClient(stall_seconds=5))
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["llm_result"]["raw"] == {"content": [{"type": "text", "text": "hedge"}]}
+    assert len(stub.calls) == 2
+    assert stub.cancelled, "the losing primary call should be cancelled"
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["routing"]["winner"]["secondary"] is True
+    assert stored["routing"]["winner"]["region"] == "us-west-2"
+
+
+def test_hedge_race_cancels_primary_when_caller_is_cancelled() -> None:
+    cancelled: list[bool] = []
+
+    async def primary() -> str:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "primary"  # pragma: no cover - cancelled first
+
+    async def secondary() -> str:  # pragma: no cover - never fired
+        return "secondary"
+
+    async def scenario() -> None:
+        race = asyncio.create_task(llm_routing.race_with_hedge(primary, secondary, delay_seconds=5))
+        await asyncio.sleep(0.05)
+        race.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await race
+        await asyncio.sleep(0)
+        assert cancelled, "the primary must not outlive a cancelled race"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_pool_call_keeps_provider_slot_until_it_returns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "llm_bedrock_max_concurrency", 1, raising=False)
+    limiter = llm_resilience.get_concurrency_limiter("bedrock")
+    started = threading.Event()
+    finish = threading.Event()
+
+    def blocking_call() -> str:
+        started.set()
+        finish.wait(5)
+        return "late"
+
+    async def guarded_call() -> str:
+        async with llm_resilience.aprovider_guard("bedrock", "model"):
+            return await llm_admission.run_in_llm_pool_to_completion(blocking_call)
+
+    async def scenario() -> None:
+        task = asyncio.create_task(guarded_call())
+        assert await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        assert not limiter.acquire(0), "the slot stays held while the provider call runs"
+        finish.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.acquire(0)
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def fake_mode(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", None, raising=False)
+    monkeypatch.setattr(llm_executor, "_GEMINI_FACTORY", None, raising=False)
+    monkeypatch.setattr(settings, "mode", "fake", raising=False)
+    monkeypatch.setattr(settings, "fake_llm_latency_median_ms", 0.0, raising=False)
+    monkeypatch.setattr(settings, "fake_llm_seed", 7, raising=False)
+    llm_executor.reset_llm_clients()
+    yield
+    llm_executor.reset_llm_clients()
+
+
+def test_execute_llm_with_fake_provider(client: TestClient, db_session: Session, fake_mode) -> None:
+    session, _ = _prepare_session(db_session)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+
+    assert response.status_code == 200, response.text
+    assert isinstance(llm_executor.create_bedrock_client(), fake_llm.FakeLlmClient)
+    stored = _stored_llm_result(db_session, session)
+    assert stored is not None
+    assert stored["provider"] == "bedrock"
+    text = stored["raw"]["content"][0]["text"]
+    ranking = json.loads(text.removeprefix("```json\n").removesuffix("\n```"))
+    assert set(ranking) == {"1", "2", "3"}
+    assert {"name", "total_match", "personality_match", "work_match"} <= set(ranking["1"])
+    assert stored["raw"]["usage"]["output_tokens"] > 0
+
+
+def test_execute_llm_retries_fake_provider_throttle(
+    client: TestClient,
+    db_session: Session,
+    fake_mode,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    session, _ = _prepare_session(db_session)
+    monkeypatch.setattr(settings, "fake_llm_throttle_rate", 1.0, raising=False)
+    monkeypatch.setattr(settings, "llm_retry_max_attempts", 3, raising=False)
+    hints: list[float | None] = []
+
+    def _record_delay(attempt: int, exc: BaseException) -> float:
+        assert llm_resilience.is_throttling_error(exc)
+        hints.append(llm_resilience.retry_after_seconds(exc))
+        return 0.0
+
+    monkeypatch.setattr(llm_resilience, "next_retry_delay", _record_delay)
+
+    response = client.post(f"/sessions/{session.session_code}/llm", json={})
+
+    # Every simulated call throttles: the resilience layer retries, then gives up.
+    assert response.status_code == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.http_status, response.text
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_LLM_CALL_FAILED.value
+    assert hints == [pytest.approx(1.0), pytest.approx(1.0)]
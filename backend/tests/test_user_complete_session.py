@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import AsyncIterator, Iterator
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.errors import ErrorCode
+from app.core.registry import compute_version_options_hash
+from app.deps import auth as auth_deps
+from app.main import app
+from app.models.admin_user import AdminUser
+from app.models.diagnostic import (
+    AnswerChoice,
+    Diagnostic,
+    DiagnosticSession,
+    DiagnosticVersion,
+    Option,
+    Question,
+    VersionOption,
+    VersionQuestion,
+)
+from app.routers import sessions as sessions_router
+from app.services.diagnostics import llm_admission, llm_executor, llm_jobs, llm_prompt_cache, llm_resilience
+from app.services.diagnostics.answer_vector import unpack_answer_ids
+from app.services.diagnostics.option_index import reset_version_option_indexes
+from tests.utils.db import DEFAULT_TABLES, as_async_session, truncate_tables
+
+
+def _database_url() -> str:
+    url = os.environ.get("TEST_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    assert url, "DATABASE_URL or TEST_DATABASE_URL must be configured for tests"
+    return url
+
+
+@pytest.fixture
+def db_session(prepare_db) -> Iterator[Session]:
+    engine = create_engine(_database_url(), future=True)
+    truncate_tables(engine, DEFAULT_TABLES)
+
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    TestingSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=connection,
+        future=True,
+    )
+    session = TestingSessionLocal()
+    session.begin_nested()
+
+    @event.listens_for(session, "after_transaction_end")
+    def restart_savepoint(sess, trans):  # pragma: no cover - SQLAlchemy internals
+        if trans.nested and not trans._parent.nested:
+            sess.begin_nested()
+
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def reset_llm_state(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setattr(settings, "llm_retry_base_delay_seconds", 0.0, raising=False)
+    llm_resilience.reset_llm_resilience()
+    llm_prompt_cache.reset_prompt_cache_state()
+    llm_admission.reset_llm_admission()
+    # Truncation reuses version ids, so cached option indexes must not leak between tests.
+    reset_version_option_indexes()
+    yield
+    llm_resilience.reset_llm_resilience()
+    llm_prompt_cache.reset_prompt_cache_state()
+    llm_admission.reset_llm_admission()
+    reset_version_option_indexes()
+
+
+@pytest.fixture
+def client(db_session: Session) -> Iterator[TestClient]:
+    def override_get_db() -> Iterator[Session]:
+        try:
+            yield db_session
+        finally:  # pragma: no cover - dependency teardown
+            pass
+
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
+    async def override_get_llm_db() -> AsyncIterator[Session]:
+        yield db_session
+
+    app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
+    app.dependency_overrides[auth_deps.get_llm_db] = override_get_llm_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
+        app.dependency_overrides.pop(auth_deps.get_llm_db, None)
+
+
+class RecordingBedrockClient:
+    def __init__(self, text: str = "ok") -> None:
+        self._text = text
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+
+    def invoke_model(self, model_id: str, payload: dict[str, Any]) -> dict[str, Any]:
+        self.calls.append((model_id, payload))
+        return {"content": [{"type": "text", "text": self._text}]}
+
+
+@pytest.fixture
+def patch_bedrock(monkeypatch):
+    def _factory(client: RecordingBedrockClient) -> RecordingBedrockClient:
+        monkeypatch.setattr(llm_executor, "_BEDROCK_FACTORY", lambda: client, raising=False)
+        monkeypatch.setattr(sessions_router, "llm_executor", llm_executor, raising=False)
+        return client
+
+    return _factory
+
+
+class InlineJobRunner:
+    """Runs queued jobs immediately on the test session."""
+
+    def __init__(self, db: Session) -> None:
+        self._db = db
+        self.submitted: list[int] = []
+
+    def submit(self, job_id: int) -> None:
+        self.submitted.append(job_id)
+        llm_jobs.run_llm_job(self._db, job_id)
+
+
+@pytest.fixture
+def inline_job_runner(db_session: Session, monkeypatch) -> InlineJobRunner:
+    runner = InlineJobRunner(db_session)
+    monkeypatch.setattr(llm_jobs, "_RUNNER", runner, raising=False)
+    return runner
+
+
+def _prepare_session(db: Session) -> tuple[DiagnosticSession, list[VersionOption]]:
+    """Create a finalized version with two options and a freshly started session."""
+
+    admin = AdminUser(user_id="admin", hashed_password="hashed", is_active=True)
+    db.add(admin)
+    db.flush()
+
+    diagnostic = Diagnostic(code="ai-career", outcome_table_name="mst_ai_jobs", description="", is_active=True)
+    db.add(diagnostic)
+    db.flush()
+
+    version = DiagnosticVersion(
+        diagnostic_id=diagnostic.id,
+        name="Version 1",
+        description="",
+        system_prompt="You are an AI career assistant.",
+        src_hash="version-hash",
+        note=None,
+        created_by_admin_id=admin.id,
+        updated_by_admin_id=admin.id,
+        finalized_by_admin_id=admin.id,
+        finalized_at=datetime.now(timezone.utc),
+    )
+    db.add(version)
+    db.flush()
+
+    question = Question(
+        diagnostic_id=diagnostic.id,
+        q_code="Q001",
+        display_text="Select your focus areas",
+        multi=True,
+        sort_order=1,
+        is_active=True,
+    )
+    db.add(question)
+    db.flush()
+
+    version_question = VersionQuestion(
+        version_id=version.id,
+        diagnostic_id=diagnostic.id,
+        question_id=question.id,
+        q_code=question.q_code,
+        display_text=question.display_text,
+        multi=question.multi,
+        sort_order=1,
+        is_active=True,
+        created_by_admin_id=admin.id,
+    )
+    db.add(version_question)
+    db.flush()
+
+    version_options: list[VersionOption] = []
+    for index, code in enumerate(("ML", "DATA"), start=1):
+        option = Option(
+            question_id=question.id,
+            opt_code=f"OPT{index}",
+            display_label=code,
+            llm_op={"code": code},
+            sort_order=index,
+            is_active=True,
+        )
+        db.add(option)
+        db.flush()
+
+        version_option = VersionOption(
+            version_id=version.id,
+            version_question_id=version_question.id,
+            option_id=option.id,
+            q_code=question.q_code,
+            opt_code=option.opt_code,
+            display_label=option.display_label,
+            llm_op=option.llm_op,
+            sort_order=option.sort_order,
+            is_active=True,
+            created_by_admin_id=admin.id,
+        )
+        db.add(version_option)
+        db.flush()
+        version_options.append(version_option)
+
+    session = DiagnosticSession(
+        session_code="SESS-COMPLETE",
+        diagnostic_id=diagnostic.id,
+        version_id=version.id,
+        version_options_hash=compute_version_options_hash(version.id, []),
+        answer_ids=b"",
+        llm_result=None,
+    )
+    db.add(session)
+    db.flush()
+    return session, version_options
+
+
+def _stored_answer_ids(db: Session, session: DiagnosticSession) -> list[int]:
+    return list(
+        db.scalars(
+            select(AnswerChoice.version_option_id)
+            .where(AnswerChoice.session_id == session.id)
+            .order_by(AnswerChoice.id)
+        )
+    )
+
+
+def test_complete_session_records_answers_and_evaluates(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+) -> None:
+    session, options = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(text="DONE"))
+    option_ids = [options[1].id, options[0].id]
+
+    statements: list[str] = []
+
+    @event.listens_for(db_session.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        statements.append(statement)
+
+    response = client.post(
+        f"/sessions/{session.session_code}/complete",
+        json={"version_option_ids": option_ids},
+    )
+    assert response.status_code == 200, response.text
+    payload = response.json()
+    assert payload["session_code"] == session.session_code
+    assert payload["llm_result"]["raw"] == {"content": [{"type": "text", "text": "DONE"}]}
+    assert json.loads(payload["messages"][1]["content"]) == [{"code": "DATA"}, {"code": "ML"}]
+    assert len(stub.calls) == 1
+
+    answer_reads = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and "answer_choices" in sql]
+    assert not answer_reads, "answers are taken from the answer vector and option index"
+
+    assert _stored_answer_ids(db_session, session) == option_ids
+    db_session.refresh(session)
+    assert session.version_options_hash == compute_version_options_hash(session.version_id, option_ids)
+    assert unpack_answer_ids(session.answer_ids) == option_ids
+    assert session.llm_result_id is not None
+    assert session.ended_at is not None
+
+
+def test_complete_session_includes_earlier_answers(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+) -> None:
+    session, options = _prepare_session(db_session)
+    patch_bedrock(RecordingBedrockClient())
+
+    earlier = client.post(
+        f"/sessions/{session.session_code}/answers",
+        json={"version_option_ids": [options[0].id]},
+    )
+    assert earlier.status_code == 204, earlier.text
+
+    response = client.post(
+        f"/sessions/{session.session_code}/complete",
+        json={"version_option_ids": [options[1].id]},
+    )
+    assert response.status_code == 200, response.text
+    assert json.loads(response.json()["messages"][1]["content"]) == [{"code": "ML"}, {"code": "DATA"}]
+
+    db_session.refresh(session)
+    assert session.version_options_hash == compute_version_options_hash(
+        session.version_id, [options[0].id, options[1].id]
+    )
+
+
+def test_complete_session_rejects_foreign_option(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+) -> None:
+    session, options = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient())
+
+    response = client.post(
+        f"/sessions/{session.session_code}/complete",
+        json={"version_option_ids": [options[0].id, options[1].id + 1000]},
+    )
+    assert response.status_code == ErrorCode.DIAGNOSTICS_OPTION_OUT_OF_VERSION.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_OPTION_OUT_OF_VERSION.value
+    assert not stub.calls
+    assert _stored_answer_ids(db_session, session) == []
+
+
+def test_complete_session_rejects_invalid_payload(client: TestClient, db_session: Session) -> None:
+    session, _ = _prepare_session(db_session)
+
+    response = client.post(f"/sessions/{session.session_code}/complete", json={"version_option_ids": []})
+    assert response.status_code == ErrorCode.DIAGNOSTICS_INVALID_PAYLOAD.http_status
+    assert response.json()["error"]["code"] == ErrorCode.DIAGNOSTICS_INVALID_PAYLOAD.value
+
+
+def test_complete_session_async_enqueues_job(
+    client: TestClient,
+    db_session: Session,
+    patch_bedrock,
+    inline_job_runner: InlineJobRunner,
+) -> None:
+    session, options = _prepare_session(db_session)
+    stub = patch_bedrock(RecordingBedrockClient(text="JOB"))
+
+    response = client.post(
+        f"/sessions/{session.session_code}/complete",
+        json={"version_option_ids": [options[0].id], "run_async": True},
+    )
+    assert response.status_code == 202, response.text
+    body = response.json()
+    assert body["session_code"] == session.session_code
+    assert inline_job_runner.submitted
+    assert len(stub.calls) == 1
+    assert _stored_answer_ids(db_session, session) == [options[0].id]
+
+    job_response = client.get(f"/sessions/{session.session_code}/llm/jobs/{body['job_id']}")
+    assert job_response.status_code == 200, job_response.text
+    assert job_response.json()["status"] == llm_jobs.JOB_STATUS_SUCCEEDED
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 import os
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.errors import ErrorCode
@@ -22,8 +23,9 @@ from app.models.diagnostic import (
     VersionOutcome,
     VersionQuestion,
 )
+from app.services.diagnostics.form_cache import FormPayloadCache, reset_form_cache
 from tests.factories import AdminUserFactory, set_factory_session
-from tests.utils.db import DEFAULT_TABLES, truncate_tables
+from tests.utils.db import DEFAULT_TABLES, as_async_session, truncate_tables
 
 
 def _database_url() -> str:
@@ -74,11 +76,19 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - dependency teardown
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
+    # Truncation reuses version ids, so cached payloads must not leak between tests.
+    reset_form_cache()
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
+        reset_form_cache()
 
 
 def _create_version(
@@ -292,6 +302,113 @@ def test_get_form_returns_304_when_etag_matches(client: TestClient, db_session:
     assert response.headers["Cache-Control"] == "public, max-age=86400, stale-while-revalidate=86400"
 
 
+def _record_selects(db: Session) -> list[str]:
+    statements: list[str] = []
+
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    return statements
+
+
+def test_get_form_serves_cached_payload_without_loading_version(client: TestClient, db_session: Session) -> None:
+    admin = AdminUserFactory(is_active=True)
+    diagnostic = Diagnostic(
+        code="ai-career",
+        description="",
+        outcome_table_name="mst_ai_jobs",
+        is_active=True,
+    )
+    db_session.add(diagnostic)
+    db_session.flush()
+
+    version = _create_version(db_session, diagnostic=diagnostic, admin_id=admin.id, src_hash="cached-1")
+
+    response_initial = client.get(f"/diagnostics/versions/{version.id}/form")
+    assert response_initial.status_code == 200
+
+    statements = _record_selects(db_session)
+    response = client.get(f"/diagnostics/versions/{version.id}/form")
+    not_modified = client.get(
+        f"/diagnostics/versions/{version.id}/form",
+        headers={"If-None-Match": '"cached-1"'},
+    )
+
+    assert response.status_code == 200
+    assert response.content == response_initial.content
+    assert response.headers["ETag"] == '"cached-1"'
+    assert response.headers["content-type"] == "application/json"
+    assert not_modified.status_code == 304
+    assert len(statements) == 2, "only the src_hash lookup runs on warm requests"
+    assert all("src_hash" in statement and "JOIN" not in statement for statement in statements), statements
+
+
+def test_get_form_rebuilds_payload_when_src_hash_changes(client: TestClient, db_session: Session) -> None:
+    admin = AdminUserFactory(is_active=True)
+    diagnostic = Diagnostic(
+        code="ai-career",
+        description="",
+        outcome_table_name="mst_ai_jobs",
+        is_active=True,
+    )
+    db_session.add(diagnostic)
+    db_session.flush()
+
+    version = _create_version(db_session, diagnostic=diagnostic, admin_id=admin.id, src_hash="before")
+    assert client.get(f"/diagnostics/versions/{version.id}/form").headers["ETag"] == '"before"'
+
+    # The same id now names different content (for example after a database restore).
+    version.src_hash = "after"
+    db_session.flush()
+
+    response = client.get(f"/diagnostics/versions/{version.id}/form")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"after"'
+
+
+def test_get_form_checks_etag_before_loading_version(client: TestClient, db_session: Session) -> None:
+    admin = AdminUserFactory(is_active=True)
+    diagnostic = Diagnostic(
+        code="ai-career",
+        description="",
+        outcome_table_name="mst_ai_jobs",
+        is_active=True,
+    )
+    db_session.add(diagnostic)
+    db_session.flush()
+
+    version = _create_version(db_session, diagnostic=diagnostic, admin_id=admin.id, src_hash="etag-2")
+
+    statements = _record_selects(db_session)
+    response = client.get(
+        f"/diagnostics/versions/{version.id}/form",
+        headers={"If-None-Match": '"etag-2"'},
+    )
+
+    assert response.status_code == 304
+    assert len(statements) == 1, statements
+
+
+def test_form_payload_cache_evicts_least_recently_used() -> None:
+    cache = FormPayloadCache(max_entries=2, max_bytes=10)
+
+    cache.put(1, "h1", b"aaaa")
+    cache.put(2, "h2", b"bbbb")
+    assert cache.get(1, "h1") is not None
+    cache.put(3, "h3", b"cccc")
+
+    assert cache.get(2, "h2") is None, "entry 2 was least recently used"
+    assert cache.get(1, "h1") is not None and cache.get(3, "h3") is not None
+    assert cache.get(1, "other") is None, "entries are only served for their own src_hash"
+
+    cache.put(4, "h4", b"ddddddd")
+    assert len(cache) == 1, "the byte bound evicts until the new entry fits"
+    cache.put(5, "h5", b"x" * 11)
+    assert cache.get(5, "h5") is None, "payloads larger than the byte bound are not cached"
+
+
 def test_get_form_returns_404_for_draft_version(client: TestClient, db_session: Session) -> None:
     admin = AdminUserFactory(is_active=True)
     diagnostic = Diagnostic(
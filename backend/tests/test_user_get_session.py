@@ -2,19 +2,28 @@ from __future__ import annotations
 
 import os
 from datetime import datetime, timezone
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
+from app.core.config import settings
 from app.core.errors import ErrorCode
 from app.deps import auth as auth_deps
 from app.main import app
 from app.models.admin_user import AdminUser
-from app.models.diagnostic import Diagnostic, DiagnosticSession, DiagnosticVersion, VersionOutcome
-from tests.utils.db import DEFAULT_TABLES, truncate_tables
+from app.models.diagnostic import (
+    Diagnostic,
+    DiagnosticSession,
+    DiagnosticVersion,
+    LlmResult,
+    VersionOutcome,
+)
+from app.services.diagnostics.llm_result_format import encode_raw
+from tests.utils.db import DEFAULT_TABLES, as_async_session, truncate_tables
 
 
 def _database_url() -> str:
@@ -65,11 +74,16 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - dependency teardown
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
 
 
 def _create_session(
@@ -159,6 +173,7 @@ def test_get_session_returns_sanitised_payload(client: TestClient, db_session: S
     ]
     assert payload["llm_result"] == {
         "raw": {"content": [{"type": "text", "text": "recommendations"}]},
+        "ranking": None,
         "generated_at": "2024-09-19T02:10:00Z",
     }
 
@@ -177,6 +192,106 @@ def test_get_session_returns_sanitised_payload(client: TestClient, db_session: S
     }
 
 
+def test_get_session_prefers_shared_result_record(client: TestClient, db_session: Session) -> None:
+    session = _create_session(db_session, session_code="SESS-SHARED", llm_result=None)
+    record = LlmResult(
+        id="a" * 64,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+        provider="bedrock",
+        model="anthropic.claude-3-sonnet-20240229-v1:0",
+        temperature=0.2,
+        top_p=None,
+        document={
+            "raw": {"content": [{"type": "text", "text": "shared"}]},
+            "generated_at": "2024-09-19T02:10:00Z",
+            "messages": [{"role": "system", "content": "hidden"}],
+        },
+    )
+    db_session.add(record)
+    db_session.flush()
+    session.llm_result_id = record.id
+    db_session.flush()
+
+    response = client.get(f"/sessions/{session.session_code}")
+    assert response.status_code == 200, response.text
+    assert response.json()["llm_result"] == {
+        "raw": {"content": [{"type": "text", "text": "shared"}]},
+        "ranking": None,
+        "generated_at": "2024-09-19T02:10:00Z",
+    }
+
+
+def test_get_session_expands_compressed_result(
+    client: TestClient,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "llm_result_compress_threshold_bytes", 16, raising=False)
+    raw = {"content": [{"type": "text", "text": "compressed " * 20}]}
+    encoded = encode_raw(raw)
+    assert "raw_z" in encoded
+
+    session = _create_session(db_session, session_code="SESS-PACKED", llm_result=None)
+    record = LlmResult(
+        id="b" * 64,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+        provider="bedrock",
+        model="anthropic.claude-3-sonnet-20240229-v1:0",
+        temperature=0.2,
+        top_p=None,
+        document={"format": 2, "generated_at": "2024-09-19T02:10:00Z", **encoded},
+    )
+    db_session.add(record)
+    db_session.flush()
+    session.llm_result_id = record.id
+    db_session.flush()
+
+    response = client.get(f"/sessions/{session.session_code}")
+    assert response.status_code == 200, response.text
+    assert response.json()["llm_result"] == {"raw": raw, "ranking": None, "generated_at": "2024-09-19T02:10:00Z"}
+
+
+def test_get_session_returns_parsed_ranking_without_raw(client: TestClient, db_session: Session) -> None:
+    session = _create_session(db_session, session_code="SESS-RANKED", llm_result=None)
+    item = {
+        "rank": 1,
+        "outcome_id": 101,
+        "name": "AI Strategist",
+        "total_match": {"score": 90.0, "reason": "fit"},
+        "personality_match": {"score": 80.0, "reason": None},
+        "work_match": {"score": None, "reason": None},
+    }
+    record = LlmResult(
+        id="c" * 64,
+        version_id=session.version_id,
+        version_options_hash=session.version_options_hash,
+        provider="bedrock",
+        model="anthropic.claude-3-sonnet-20240229-v1:0",
+        temperature=0.2,
+        top_p=None,
+        document={
+            "format": 2,
+            "generated_at": "2024-09-19T02:10:00Z",
+            "raw": {"content": [{"type": "text", "text": "provider envelope"}]},
+            "ranking": {"status": "ok", "items": [item]},
+        },
+    )
+    db_session.add(record)
+    db_session.flush()
+    session.llm_result_id = record.id
+    db_session.flush()
+
+    response = client.get(f"/sessions/{session.session_code}")
+    assert response.status_code == 200, response.text
+    assert response.json()["llm_result"] == {
+        "raw": None,
+        "ranking": [{**item, "matched": True}],
+        "generated_at": "2024-09-19T02:10:00Z",
+    }
+
+
 def test_get_session_returns_null_when_result_missing(
     client: TestClient, db_session: Session
 ) -> None:
@@ -2,13 +2,15 @@ from __future__ import annotations
 
 import os
 from datetime import datetime
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
+from app.core.config import settings
 from app.core.errors import ErrorCode
 from app.core.registry import compute_version_options_hash
 from app.core.security import create_access_token
@@ -23,6 +25,8 @@ from app.models.diagnostic import (
 )
 from app.models.user import User
 from app.services.diagnostics import session_manager
+from app.services.diagnostics.active_version_cache import invalidate_active_versions, resolve_active_version
+from tests.utils.db import as_async_session
 
 
 def _database_url() -> str:
@@ -77,11 +81,19 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - nothing to clean
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
+    # Truncation reuses diagnostic and version ids, so cached resolutions must not leak between tests.
+    invalidate_active_versions()
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
+        invalidate_active_versions()
 
 
 def _parse_datetime(value: str) -> datetime:
@@ -207,6 +219,78 @@ def test_start_session_without_active_version(client: TestClient, db_session: Se
     assert payload["error"]["code"] == ErrorCode.DIAGNOSTICS_VERSION_NOT_FOUND.value
 
 
+def test_start_session_caches_active_version_until_invalidated(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    admin = _create_admin(db_session, user_id="admin_cache")
+    diagnostic, version, active = _create_diagnostic(db_session, code="diag-cache", admin=admin)
+
+    first = client.post(f"/diagnostics/{diagnostic.code}/sessions", json={})
+    assert first.status_code == 201, first.text
+    assert first.json()["version_id"] == version.id
+
+    next_version = DiagnosticVersion(
+        diagnostic_id=diagnostic.id,
+        name="Version 2",
+        description="",
+        system_prompt=None,
+        note=None,
+        created_by_admin_id=admin.id,
+        updated_by_admin_id=admin.id,
+    )
+    db_session.add(next_version)
+    db_session.flush()
+    active.version_id = next_version.id
+    db_session.flush()
+
+    statements: list[str] = []
+
+    @event.listens_for(db_session.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        statements.append(statement)
+
+    cached = client.post(f"/diagnostics/{diagnostic.code}/sessions", json={})
+    assert cached.status_code == 201, cached.text
+    assert cached.json()["version_id"] == version.id, "resolution is served from the cache"
+    assert not [sql for sql in statements if "cfg_active_versions" in sql]
+
+    invalidate_active_versions(diagnostic_id=diagnostic.id)
+    refreshed = client.post(f"/diagnostics/{diagnostic.code}/sessions", json={})
+    assert refreshed.status_code == 201, refreshed.text
+    assert refreshed.json()["version_id"] == next_version.id
+
+
+def test_start_session_issues_single_insert_without_reread(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    diagnostic, active = _create_active_diagnostic(db_session, code="diag-single-insert")
+    warm = client.post(f"/diagnostics/{diagnostic.code}/sessions", json={})
+    assert warm.status_code == 201, warm.text
+
+    statements: list[str] = []
+
+    @event.listens_for(db_session.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        statements.append(statement)
+
+    response = client.post(f"/diagnostics/{diagnostic.code}/sessions", json={})
+    assert response.status_code == 201, response.text
+    payload = response.json()
+
+    session_sql = [sql for sql in statements if "sessions" in sql and "cfg_active_versions" not in sql]
+    assert len(session_sql) == 1, session_sql
+    assert session_sql[0].lstrip().upper().startswith("INSERT")
+
+    stored = db_session.scalar(
+        select(DiagnosticSession).where(DiagnosticSession.session_code == payload["session_code"])
+    )
+    assert stored is not None
+    assert stored.version_id == active.version_id
+    assert stored.created_at == _parse_datetime(payload["started_at"])
+
+
 def test_start_session_retries_on_code_collision(
     client: TestClient,
     db_session: Session,
@@ -241,3 +325,23 @@ def test_start_session_retries_on_code_collision(
     payload = response.json()
     assert payload["session_code"] == fallback_code
 
+
+
+def test_active_version_cache_expires_after_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "active_version_cache_ttl_seconds", 5.0)
+    invalidate_active_versions()
+    now = [100.0]
+    loads: list[int] = []
+
+    def loader() -> tuple[int, int]:
+        loads.append(1)
+        return 1, len(loads)
+
+    try:
+        assert resolve_active_version("diag-ttl", loader, clock=lambda: now[0]) == (1, 1)
+        now[0] += 4.9
+        assert resolve_active_version("diag-ttl", loader, clock=lambda: now[0]) == (1, 1)
+        now[0] += 0.2
+        assert resolve_active_version("diag-ttl", loader, clock=lambda: now[0]) == (1, 2)
+    finally:
+        invalidate_active_versions()
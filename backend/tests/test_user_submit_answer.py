@@ -1,10 +1,11 @@
 import os
-from collections.abc import Iterator
+from collections.abc import AsyncIterator, Iterator
 from datetime import datetime, timezone
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.errors import ErrorCode
@@ -22,7 +23,9 @@ from app.models.diagnostic import (
     VersionOption,
     VersionQuestion,
 )
-from tests.utils.db import DEFAULT_TABLES, truncate_tables
+from app.services.diagnostics.answer_vector import unpack_answer_ids
+from app.services.diagnostics.option_index import reset_version_option_indexes
+from tests.utils.db import DEFAULT_TABLES, as_async_session, truncate_tables
 
 
 def _database_url() -> str:
@@ -71,11 +74,19 @@ def client(db_session: Session) -> Iterator[TestClient]:
         finally:  # pragma: no cover - dependency teardown
             pass
 
+    async def override_get_async_db() -> AsyncIterator[AsyncSession]:
+        yield as_async_session(db_session)
+
     app.dependency_overrides[auth_deps.get_db] = override_get_db
+    app.dependency_overrides[auth_deps.get_async_db] = override_get_async_db
+    # Truncation reuses version ids, so cached option indexes must not leak between tests.
+    reset_version_option_indexes()
     try:
         yield TestClient(app)
     finally:
         app.dependency_overrides.pop(auth_deps.get_db, None)
+        app.dependency_overrides.pop(auth_deps.get_async_db, None)
+        reset_version_option_indexes()
 
 
 def _create_admin(db: Session, *, user_id: str = "admin") -> AdminUser:
@@ -201,12 +212,14 @@ def _create_session(
     *,
     diagnostic: Diagnostic,
     version: DiagnosticVersion,
+    session_code: str = "SESS-ABC123",
 ) -> DiagnosticSession:
     session = DiagnosticSession(
-        session_code="SESS-ABC123",
+        session_code=session_code,
         diagnostic_id=diagnostic.id,
         version_id=version.id,
         version_options_hash=compute_version_options_hash(version.id, []),
+        answer_ids=b"",
     )
     db.add(session)
     db.flush()
@@ -282,6 +295,83 @@ def test_submit_answers_success(client: TestClient, db_session: Session) -> None
     )
 
 
+def test_submit_answers_reuses_option_index_of_finalized_version(
+    client: TestClient,
+    db_session: Session,
+) -> None:
+    diagnostic, version, version_option, session = _prepare_entities(db_session)
+    version.src_hash = "finalized-hash"
+    db_session.flush()
+    other_session = _create_session(db_session, diagnostic=diagnostic, version=version, session_code="SESS-DEF456")
+
+    response = client.post(
+        f"/sessions/{session.session_code}/answers",
+        json={"version_option_ids": [version_option.id]},
+    )
+    assert response.status_code == 204, response.text
+
+    statements: list[str] = []
+
+    @event.listens_for(db_session.get_bind(), "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):  # pragma: no cover - SQLAlchemy hook
+        statements.append(statement)
+
+    response = client.post(
+        f"/sessions/{other_session.session_code}/answers",
+        json={"version_option_ids": [version_option.id]},
+    )
+    assert response.status_code == 204, response.text
+
+    option_reads = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and "version_options" in sql]
+    assert option_reads == [], "membership should be checked against the cached index"
+    inserts = [sql for sql in statements if sql.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 1
+
+
+def test_submit_answers_appends_to_answer_vector(client: TestClient, db_session: Session) -> None:
+    diagnostic, version, version_option, session = _prepare_entities(db_session)
+    question = _create_question(
+        db_session,
+        diagnostic_id=diagnostic.id,
+        code="Q002",
+        text="希望する職種を教えてください",
+        multi=False,
+        sort_order=20,
+    )
+    option = _create_option(db_session, question=question, code="OPT002", label="データ", sort_order=10)
+    second_option = _create_version_option(
+        db_session,
+        version=version,
+        question=question,
+        option=option,
+        admin_id=version.created_by_admin_id,
+    )
+    legacy_session = _create_session(db_session, diagnostic=diagnostic, version=version, session_code="SESS-LEGACY")
+    legacy_session.answer_ids = None
+    db_session.flush()
+
+    for option_id in (second_option.id, version_option.id):
+        response = client.post(
+            f"/sessions/{session.session_code}/answers",
+            json={"version_option_ids": [option_id]},
+        )
+        assert response.status_code == 204, response.text
+    response = client.post(
+        f"/sessions/{legacy_session.session_code}/answers",
+        json={"version_option_ids": [version_option.id]},
+    )
+    assert response.status_code == 204, response.text
+
+    db_session.expire_all()
+    stored = db_session.get(DiagnosticSession, session.id)
+    assert unpack_answer_ids(stored.answer_ids) == [second_option.id, version_option.id]
+    # Each submission folds into the stored hash; the result matches a full recomputation in any order.
+    assert stored.version_options_hash == compute_version_options_hash(
+        version.id, [version_option.id, second_option.id]
+    )
+    assert db_session.get(DiagnosticSession, legacy_session.id).answer_ids is None
+
+
 def test_submit_answers_missing_session(client: TestClient) -> None:
     response = client.post(
         "/sessions/unknown/answers",
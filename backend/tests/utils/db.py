@@ -5,6 +5,8 @@ from pathlib import Path
 
 from sqlalchemy import Engine, text
 from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from alembic import command
 from alembic.config import Config
 
@@ -13,7 +15,10 @@ DEFAULT_TABLES: tuple[str, ...] = (
     "version_outcomes",
     "version_options",
     "version_questions",
+    "llm_jobs",
+    "llm_batch_jobs",
     "sessions",
+    "llm_results",
     "aud_diagnostic_version_logs",
     "cfg_active_versions",
     "diagnostic_versions",
@@ -23,6 +28,17 @@ DEFAULT_TABLES: tuple[str, ...] = (
 )
 
 
+def as_async_session(session: Session) -> AsyncSession:
+    """Expose a test's savepoint-bound Session as an AsyncSession.
+
+    `run_sync` / `commit` on the result run on the same connection and
+    transaction, so async endpoints see the rows a test created and their
+    writes roll back with it.
+    """
+
+    return AsyncSession(sync_session_class=lambda **_: session)
+
+
 def truncate_tables(engine: Engine, tables: Sequence[str] | None = None) -> None:
     """Truncate the given tables using an AUTOCOMMIT connection.
 
@@ -395,7 +395,7 @@ function ScreenBody({ diagnosticCode }: Props) {
           break;
         }
 
-        await sleep(LLM_EXECUTION_POLL_INTERVAL_MS);
+        await sleep(Math.max(LLM_EXECUTION_POLL_INTERVAL_MS, execution.retryAfterMs ?? 0));
         execution = await executor({ sessionCode: session.session_code, force_regenerate: false });
       }
 
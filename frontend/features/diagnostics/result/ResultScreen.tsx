@@ -6,7 +6,7 @@ import { useEffect, useMemo, useRef, useState } from "react";
 import {
   useDiagnosticSessionActions,
   useDiagnosticSessionState,
-  sanitizeSessionLlmResult,
+  sessionLlmResultFromResponse,
 } from "../session";
 import { useSessionLinker } from "../session/useSessionLinker";
 import { getSession } from "../../../lib/backend";
@@ -206,7 +206,7 @@ export default function ResultScreen({ diagnosticCode, sessionCode }: Props) {
           }
 
           clearExistingTimer();
-          const sanitised = sanitizeSessionLlmResult(response.llm_result.raw);
+          const sanitised = sessionLlmResultFromResponse(response.llm_result);
           if (!sanitised) {
             clearExistingTimer();
             setSessionResult(null);
@@ -1,5 +1,10 @@
 const HEX_TABLE = Array.from({ length: 256 }, (_, index) => index.toString(16).padStart(2, "0"));
 
+// Mirrors app.core.registry on the backend: the hash is the sum of one SHA-256
+// digest per element (plus a per-version seed) modulo 2^256, so it does not
+// depend on answer order and can be extended one submission at a time.
+const MULTISET_HASH_MODULUS = BigInt(2) ** BigInt(256);
+
 const toHexString = (buffer: ArrayBuffer): string => {
   const view = new Uint8Array(buffer);
   let result = "";
@@ -22,13 +27,18 @@ async function digestSha256(payload: string): Promise<string> {
   return toHexString(hashBuffer);
 }
 
+const digestInt = async (payload: string): Promise<bigint> => BigInt(`0x${await digestSha256(payload)}`);
+
 export async function computeVersionOptionsHash(
   versionId: number,
   optionIds: readonly number[],
 ): Promise<string> {
-  const sorted = optionIds.map((id) => String(id)).sort();
-  const payload = `v${versionId}:${sorted.join(",")}`;
-  return digestSha256(payload);
+  const digests = await Promise.all([
+    digestInt(`v${versionId}`),
+    ...optionIds.map((id) => digestInt(`v${versionId}:${id}`)),
+  ]);
+  const total = digests.reduce((sum, value) => sum + value, BigInt(0)) % MULTISET_HASH_MODULUS;
+  return total.toString(16).padStart(64, "0");
 }
 
 export type ComputeVersionOptionsHash = typeof computeVersionOptionsHash;
@@ -1,6 +1,6 @@
 import { backend, type ExecuteSessionLlmPayload, type ExecuteSessionLlmResponse, extractErrorCode } from '../../../lib/backend'
 import type { DiagnosticSessionActions } from './context'
-import { sanitizeSessionLlmResult } from './llmResult'
+import { sessionLlmResultFromResponse } from './llmResult'
 import type { ToastPayload } from '../../../app/providers/feedback_provider'
 import type { ErrorCodeDefinition } from '../../../lib/error-codes'
 
@@ -56,6 +56,8 @@ export type ExecuteLlmFailureResult = {
 export type ExecuteLlmRetryableResult = {
   status: 'retryable_error'
   error: unknown
+  /** Server-provided `Retry-After` (429/503 load shedding), in milliseconds. */
+  retryAfterMs?: number
 }
 
 export type ExecuteLlmUnknownErrorResult = {
@@ -99,15 +101,23 @@ const CODE_LLM_OP_INCOMPLETE = 'E044'
 const CODE_VERSION_FROZEN = 'E020'
 const CODE_LLM_FAILED = 'E050'
 
-const RETRYABLE_GATEWAY_STATUS = new Set([502, 503, 504])
+const RETRYABLE_HTTP_STATUS = new Set([429, 502, 503, 504])
 const RETRYABLE_ERROR_CODES = new Set(['ECONNABORTED', 'ERR_NETWORK'])
 
 type MaybeAxiosError = {
   isAxiosError?: boolean
-  response?: { status?: number }
+  response?: { status?: number; headers?: Record<string, unknown> }
   code?: string
 }
 
+function parseRetryAfterMs(headers: Record<string, unknown> | undefined): number | undefined {
+  const value = headers?.['retry-after']
+  if (value === undefined || value === null) return undefined
+  const seconds = Number(value)
+  if (!Number.isFinite(seconds) || seconds < 0) return undefined
+  return seconds * 1000
+}
+
 export function createLlmExecutor({ actions, toast, deps }: CreateExecutorOptions) {
   const executeRequest = deps?.executeRequest ?? defaultExecuteRequest
   const extractError = deps?.extractError ?? extractErrorCode
@@ -117,7 +127,7 @@ export function createLlmExecutor({ actions, toast, deps }: CreateExecutorOption
     try {
       const response = await executeRequest(sessionCode, payload)
 
-      actions.markCompleted(sanitizeSessionLlmResult(response.llm_result.raw), {
+      actions.markCompleted(sessionLlmResultFromResponse(response.llm_result), {
         llm_messages: response.messages,
         completed_at: response.llm_result.generated_at,
       })
@@ -127,8 +137,11 @@ export function createLlmExecutor({ actions, toast, deps }: CreateExecutorOption
       const maybeAxios = error as MaybeAxiosError | undefined
       if (maybeAxios?.isAxiosError) {
         const status = maybeAxios.response?.status
-        if ((status && RETRYABLE_GATEWAY_STATUS.has(status)) || (!status && maybeAxios.code && RETRYABLE_ERROR_CODES.has(maybeAxios.code))) {
-          return { status: 'retryable_error', error }
+        if ((status && RETRYABLE_HTTP_STATUS.has(status)) || (!status && maybeAxios.code && RETRYABLE_ERROR_CODES.has(maybeAxios.code))) {
+          const retryAfterMs = parseRetryAfterMs(maybeAxios.response?.headers)
+          return retryAfterMs === undefined
+            ? { status: 'retryable_error', error }
+            : { status: 'retryable_error', error, retryAfterMs }
         }
       }
 
@@ -1,3 +1,4 @@
+import type { RankedOutcome } from "../../../lib/backend";
 import { normaliseLlmResult } from "../result/parser";
 import type {
   MatchScoreSnapshot,
@@ -64,3 +65,27 @@ export const sanitizeSessionLlmResult = (raw: unknown): SessionLlmResultSnapshot
 
   return Object.keys(next).length ? next : null;
 };
+
+export const snapshotFromRanking = (ranking: RankedOutcome[]): SessionLlmResultSnapshot | null => {
+  const next: SessionLlmResultSnapshot = {};
+  ranking.forEach((item, index) => {
+    const key = Number.isFinite(item.rank) && item.rank > 0 ? String(item.rank) : String(index + 1);
+    next[key] = {
+      name: item.name,
+      total_match: { score: item.total_match.score, reason: item.total_match.reason },
+      personality_match: { score: item.personality_match.score, reason: item.personality_match.reason },
+      work_match: { score: item.work_match.score, reason: item.work_match.reason },
+    };
+  });
+  return Object.keys(next).length ? next : null;
+};
+
+export const sessionLlmResultFromResponse = (llmResult: {
+  raw: unknown;
+  ranking?: RankedOutcome[] | null;
+}): SessionLlmResultSnapshot | null => {
+  if (llmResult.ranking && llmResult.ranking.length) {
+    return snapshotFromRanking(llmResult.ranking);
+  }
+  return sanitizeSessionLlmResult(llmResult.raw);
+};
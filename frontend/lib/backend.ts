@@ -150,13 +150,31 @@ export type LlmResponseMessage = {
   content: string
 }
 
+export type RankedOutcomeScore = {
+  score: number | null
+  reason: string | null
+}
+
+export type RankedOutcome = {
+  rank: number
+  // `null` (with `matched: false`) when the name matched no outcome of the version.
+  outcome_id: number | null
+  name: string
+  matched?: boolean
+  total_match: RankedOutcomeScore
+  personality_match: RankedOutcomeScore
+  work_match: RankedOutcomeScore
+}
+
 export type ExecuteSessionLlmResponse = {
   session_code: string
   version_id: number
   model: string
   messages: LlmResponseMessage[]
   llm_result: {
+    // `raw` is only omitted when every entry of `ranking` parsed and matched.
     raw: unknown
+    ranking?: RankedOutcome[] | null
     generated_at: string
   }
 }
@@ -184,6 +202,7 @@ export type GetSessionResponse = {
   outcomes: SessionOutcomeSnapshot[]
   llm_result: {
     raw: unknown
+    ranking?: RankedOutcome[] | null
     generated_at?: string | null
   } | null
 }
@@ -27,6 +27,9 @@ export const ERROR_DEFINITIONS = {
   "E044": { code: "E044", domain: "diagnostics", name: "LLM_OP_INCOMPLETE", uiMessage: "選択肢情報が不足しているため結果を生成できません", action: "回答を再送信してください" },
   "E045": { code: "E045", domain: "diagnostics", name: "NO_ANSWERS", uiMessage: "回答が不足しているため結果を生成できません", action: "必要な設問に回答する" },
   "E050": { code: "E050", domain: "diagnostics", name: "LLM_CALL_FAILED", uiMessage: "結果の生成に失敗しました。時間をおいて再度お試しください", action: "再実行する" },
+  "E051": { code: "E051", domain: "diagnostics", name: "LLM_UNAVAILABLE", uiMessage: "結果の生成が混み合っています。時間をおいて再度お試しください", action: "再実行する" },
+  "E052": { code: "E052", domain: "diagnostics", name: "LLM_QUEUE_FULL", uiMessage: "結果の生成が混み合っています。時間をおいて再度お試しください", action: "再実行する" },
+  "E053": { code: "E053", domain: "diagnostics", name: "LLM_SERVER_BUSY", uiMessage: "結果の生成が混み合っています。時間をおいて再度お試しください", action: "再実行する" },
   "E10100": { code: "E10100", domain: "auth", name: "EMAIL_ALREADY_REGISTERED", uiMessage: "このメールアドレスはすでに登録されています", action: "ログインする" },
   "E10101": { code: "E10101", domain: "auth", name: "INVALID_CREDENTIALS", uiMessage: "メールアドレスまたはパスワードが正しくありません", action: "入力を確認する" },
   "E10102": { code: "E10102", domain: "auth", name: "GITHUB_NOT_CONFIGURED", uiMessage: "現在 GitHub ログインを利用できません", action: "通常ログインを試す" },
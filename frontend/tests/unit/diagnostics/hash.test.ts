@@ -0,0 +1,25 @@
+/** @jest-environment node */
+
+import { computeVersionOptionsHash } from "../../../features/diagnostics/session/hash";
+
+describe("computeVersionOptionsHash", () => {
+  it("matches the backend multiset hash", async () => {
+    // Shared with backend/tests/test_diagnostics_common.py
+    await expect(computeVersionOptionsHash(37, [101, 205])).resolves.toBe(
+      "48e6cb69f9110539cdccb5fe9efd290fd7a8609abb70de2b3592e634d4f41854",
+    );
+  });
+
+  it("does not depend on answer order", async () => {
+    const forward = await computeVersionOptionsHash(37, [101, 205, 9]);
+    const reversed = await computeVersionOptionsHash(37, [9, 205, 101]);
+    expect(forward).toBe(reversed);
+    expect(forward).toHaveLength(64);
+  });
+
+  it("distinguishes versions", async () => {
+    const first = await computeVersionOptionsHash(1, [101]);
+    const second = await computeVersionOptionsHash(2, [101]);
+    expect(first).not.toBe(second);
+  });
+});
@@ -119,6 +119,50 @@ describe('createLlmExecutor', () => {
     expect(result).toEqual({ status: 'success', response })
   })
 
+  it('prefers the server-parsed ranking over the raw provider payload', async () => {
+    const response: ExecuteSessionLlmResponse = {
+      ...createResponse(),
+      llm_result: {
+        raw: null,
+        ranking: [
+          {
+            rank: 1,
+            outcome_id: 11,
+            name: 'AIエンジニア',
+            total_match: { score: 92.4, reason: '技術スキルが高い' },
+            personality_match: { score: 88.5, reason: '挑戦志向が強い' },
+            work_match: { score: 75, reason: '実務経験が豊富' },
+          },
+          {
+            rank: 2,
+            outcome_id: 12,
+            name: 'データサイエンティスト',
+            total_match: { score: 81.1, reason: '分析志向が強い' },
+            personality_match: { score: 79.9, reason: '粘り強い' },
+            work_match: { score: 68.2, reason: '実務経験がある' },
+          },
+        ],
+        generated_at: '2024-09-20T00:00:00Z',
+      },
+    }
+    const executeRequest = jest
+      .fn<Promise<ExecuteSessionLlmResponse>, [string, ExecuteSessionLlmPayload | undefined]>()
+      .mockResolvedValue(response)
+
+    const executor = createLlmExecutor({
+      actions,
+      toast,
+      deps: { executeRequest },
+    })
+
+    await executor({ sessionCode: 'SESS' })
+
+    expect(actions.markCompleted).toHaveBeenCalledWith(EXPECTED_SANITISED_RESULT, {
+      llm_messages: response.messages,
+      completed_at: response.llm_result.generated_at,
+    })
+  })
+
   it('treats gateway timeout responses as retryable without surfacing toasts', async () => {
     const executeRequest = jest.fn().mockRejectedValue({
       isAxiosError: true,
@@ -139,6 +183,24 @@ describe('createLlmExecutor', () => {
     expect(toast.warning).not.toHaveBeenCalled()
   })
 
+  it('returns the Retry-After hint when the backend sheds load', async () => {
+    const executeRequest = jest.fn().mockRejectedValue({
+      isAxiosError: true,
+      response: { status: 429, headers: { 'retry-after': '5' } },
+    })
+
+    const executor = createLlmExecutor({
+      actions,
+      toast,
+      deps: { executeRequest },
+    })
+
+    const result = await executor({ sessionCode: 'SESS' })
+
+    expect(result).toEqual({ status: 'retryable_error', error: expect.any(Object), retryAfterMs: 5000 })
+    expect(toast.error).not.toHaveBeenCalled()
+  })
+
   it('handles no answers error gracefully', async () => {
     const executeRequest = jest.fn().mockRejectedValue(new Error('no answers'))
     const errorDef = definition('E045', '回答が不足しています')